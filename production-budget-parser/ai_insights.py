@@ -0,0 +1,354 @@
+"""
+AI Insights
+Background generation of narrative budget insights with Claude
+
+POST /api/ai-insights/<id> queues the model call and answers 202; the
+result is stored in BudgetAnalysis.ai_insights_json, where the poll and
+event-stream routes pick it up. Each analysis has at most one call in
+flight: requests in one process share the running Future, and an atomic
+claim on the row (insights_requested_at) keeps other processes from
+starting a second one.
+
+The Anthropic client is created once per process and shared by all
+workers, so calls reuse its pooled keep-alive connections instead of
+opening a new TLS connection each time.
+
+The prompt is built only from prompt_inputs(), and results are shared
+through the insight cache (insight_cache.py): an analysis with the same
+inputs as an earlier one, such as a re-upload, gets its insights without a
+model call.
+
+Usage:
+    insights_worker = InsightsWorker(app, on_done=pages.invalidate)
+    insights_worker.request(analysis_id)
+    insights_worker.status(analysis_id)  # {'status': 'pending' | 'done' | 'failed', ...}
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import anthropic
+import httpx
+from sqlalchemy import or_, select, update
+
+from database_models import db, BudgetAnalysis
+from insight_cache import InsightCache, fingerprint, DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES, DEFAULT_TTL_SECONDS as DEFAULT_CACHE_TTL
+from keyed_locks import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'claude-sonnet-4-6'
+# Bump whenever build_prompt() changes, so cached insights of the old prompt are not reused
+PROMPT_VERSION = 2
+DEFAULT_MAX_TOKENS = 1000
+# Model calls run at once per process; they wait on the network, not the CPU
+DEFAULT_WORKERS = 4
+# A claim older than this is treated as abandoned by a dead process
+DEFAULT_CLAIM_SECONDS = 300
+# Seconds an HTTP request to the API may take
+DEFAULT_TIMEOUT_SECONDS = 120
+# Idle keep-alive connections kept open to the API
+DEFAULT_KEEPALIVE_CONNECTIONS = 8
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Process-wide Anthropic client (rebuilt only when the API key changes)"""
+    global _client, _client_key
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            _client = anthropic.Anthropic(
+                api_key=api_key,
+                timeout=DEFAULT_TIMEOUT_SECONDS,
+                http_client=anthropic.DefaultHttpxClient(limits=httpx.Limits(
+                    max_connections=DEFAULT_KEEPALIVE_CONNECTIONS * 2,
+                    max_keepalive_connections=DEFAULT_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=60
+                ))
+            )
+            _client_key = api_key
+        return _client
+
+
+def prompt_inputs(analysis):
+    """
+    Everything the prompt says about an analysis, normalized
+
+    Analyses with equal inputs get the same prompt and share cached
+    insights, so the file name and dates are not part of it; the risk
+    flags and optimizations are the (truncated) text the model reads.
+    """
+    risk_data = analysis.get_risk_analysis()
+    return {
+        'total_budget': round(analysis.total_budget or 0, 2),
+        'line_items': analysis.line_items,
+        'num_departments': analysis.num_departments,
+        'risk_level': analysis.risk_level,
+        'risk_score': round(analysis.risk_score or 0, 2),
+        'risk_flags': json.dumps(risk_data.get('items_by_category', {}), indent=2, sort_keys=True)[:2000],
+        'optimizations': json.dumps(analysis.get_optimizations(), indent=2, sort_keys=True)[:1000],
+    }
+
+
+def build_prompt(inputs):
+    """Prompt asking for executive insights on one analysis (from prompt_inputs())"""
+    return f"""You are a senior film/TV production financial analyst. Review the following budget analysis and provide concise, actionable executive insights.
+
+BUDGET SUMMARY:
+- Total Budget: ${inputs['total_budget']:,.2f}
+- Line Items: {inputs['line_items']}
+- Departments: {inputs['num_departments']}
+- Risk Level: {inputs['risk_level']} (score: {inputs['risk_score']:.2f})
+
+RISK FLAGS:
+{inputs['risk_flags']}
+
+OPTIMIZATION OPPORTUNITIES:
+{inputs['optimizations']}
+
+Return ONLY a valid JSON object with this structure:
+{{
+  "executive_summary": "<2-3 sentence overview of the budget health>",
+  "key_concerns": ["<concern 1>", "<concern 2>", "<concern 3>"],
+  "top_recommendations": [
+    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}},
+    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}},
+    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}}
+  ],
+  "budget_health_score": <integer 0-100>,
+  "outlook": "<POSITIVE|CAUTIONARY|CRITICAL>"
+}}"""
+
+
+def parse_insights(response_text):
+    """Insights dict from the model's reply (tolerates a ```json fence)"""
+    response_text = response_text.strip()
+    if response_text.startswith('```'):
+        response_text = response_text.split('\n', 1)[1]
+        response_text = response_text.rsplit('```', 1)[0]
+    return json.loads(response_text)
+
+
+def generate_insights(prompt, client, model=DEFAULT_MODEL):
+    """One model call; returns the insights dict"""
+    message = client.messages.create(
+        model=model,
+        max_tokens=DEFAULT_MAX_TOKENS,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return parse_insights(message.content[0].text)
+
+
+class InsightsWorker:
+    """
+    Thread pool that generates insights, one call per analysis at a time
+
+    Usage:
+        worker = InsightsWorker()
+        worker.init_app(app, on_done=pages.invalidate)
+        worker.request(analysis_id)
+
+    on_done(analysis_id) runs after new insights are committed. With
+    INSIGHTS_EAGER set, calls run inline in request() (for tests). Insight
+    cache hits are answered inline too, without a model call.
+    """
+
+    def __init__(self, app=None, on_done=None):
+        self.app = None
+        self.on_done = None
+        self._executor = None
+        self._inflight = {}
+        self._key_locks = KeyedLocks()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, on_done)
+
+    def init_app(self, app, on_done=None):
+        self.app = app
+        self.on_done = on_done
+        app.config.setdefault('INSIGHTS_WORKERS', DEFAULT_WORKERS)
+        app.config.setdefault('INSIGHTS_CLAIM_SECONDS', DEFAULT_CLAIM_SECONDS)
+        app.config.setdefault('INSIGHTS_MODEL', DEFAULT_MODEL)
+        app.config.setdefault('INSIGHTS_EAGER', False)
+        app.config.setdefault('INSIGHTS_CACHE_TTL', DEFAULT_CACHE_TTL)
+        app.config.setdefault('INSIGHTS_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+
+    @property
+    def cache(self):
+        """The insight cache, as currently configured"""
+        return InsightCache(self.app.config['INSIGHTS_CACHE_TTL'], self.app.config['INSIGHTS_CACHE_MAX_BYTES'])
+
+    def _get_executor(self):
+        # Created on first use so each gunicorn worker gets its own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['INSIGHTS_WORKERS'],
+                    thread_name_prefix='ai-insights'
+                )
+            return self._executor
+
+    def request(self, analysis_id):
+        """
+        Start generating insights for an analysis unless a call is already in flight
+
+        Returns:
+            The Future of the call in this process, or None when there is
+            nothing to start (insights stored, or another process claimed it)
+        """
+        with self._lock:
+            future = self._inflight.get(analysis_id)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[analysis_id] = future
+
+        # The claim commits to the database, so it runs outside the lock;
+        # requests arriving meanwhile share the reserved future
+        try:
+            claimed = self._claim(analysis_id)
+        except Exception as e:
+            self._release(analysis_id, future, exception=e)
+            raise
+        if not claimed:
+            self._release(analysis_id, future)
+            return None
+
+        if self.app.config['INSIGHTS_EAGER']:
+            self._run(analysis_id, future)
+        elif not self._run(analysis_id, future, cache_only=True):
+            self._get_executor().submit(self._run_in_context, analysis_id, future)
+        return future
+
+    def wait(self, analysis_id, timeout):
+        """Wait up to timeout seconds for a call in flight in this process"""
+        future = self._inflight.get(analysis_id)
+        if future is None:
+            time.sleep(timeout)
+            return
+        try:
+            future.exception(timeout=timeout)
+        except TimeoutError:
+            pass
+
+    def status(self, analysis_id):
+        """
+        Current state of an analysis' insights
+
+        Returns:
+            dict with 'status': 'done' (with 'insights'), 'pending',
+            'failed' (with 'error') or None when never requested;
+            None instead of a dict when the analysis does not exist
+        """
+        table = BudgetAnalysis.__table__
+        row = db.session.execute(
+            select(table.c.ai_insights_json, table.c.insights_requested_at, table.c.insights_error)
+            .where(table.c.id == analysis_id)
+        ).first()
+        db.session.commit()  # end the read so the next poll sees new commits
+        if row is None:
+            return None
+        if row.ai_insights_json:
+            return {'status': 'done', 'insights': json.loads(row.ai_insights_json)}
+        if row.insights_error:
+            return {'status': 'failed', 'error': row.insights_error}
+        if analysis_id in self._inflight or (row.insights_requested_at and row.insights_requested_at > self._claim_cutoff()):
+            return {'status': 'pending'}
+        return {'status': None}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def _claim_cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.app.config['INSIGHTS_CLAIM_SECONDS'])
+
+    def _claim(self, analysis_id):
+        # Core UPDATE: claiming must not bump content_version
+        table = BudgetAnalysis.__table__
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == analysis_id, or_(table.c.ai_insights_json.is_(None), table.c.ai_insights_json == ''),
+                   or_(table.c.insights_requested_at.is_(None), table.c.insights_requested_at < self._claim_cutoff(),
+                       table.c.insights_error.isnot(None)))
+            .values(insights_requested_at=datetime.utcnow(), insights_error=None)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _release(self, analysis_id, future, exception=None):
+        # Give up a reserved future that no call will complete
+        with self._lock:
+            self._inflight.pop(analysis_id, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(None)
+
+    def _run_in_context(self, analysis_id, future):
+        with self.app.app_context():
+            try:
+                self._run(analysis_id, future)
+            finally:
+                db.session.remove()
+
+    def _run(self, analysis_id, future, cache_only=False):
+        """
+        Store insights for an analysis, from the cache or a model call
+
+        With cache_only, a miss returns False and leaves the future pending.
+        """
+        start = time.perf_counter()
+        try:
+            analysis = db.session.get(BudgetAnalysis, analysis_id)
+            model = self.app.config['INSIGHTS_MODEL']
+            inputs = prompt_inputs(analysis)
+            key = fingerprint(inputs, model, PROMPT_VERSION)
+            generated = False
+            if cache_only:
+                # The background run records the miss
+                insights = self.cache.get(key, record_miss=False)
+                if insights is None:
+                    return False
+            else:
+                # Analyses with the same inputs wait for one call instead of making their own
+                with self._key_locks.hold(key):
+                    insights = self.cache.get(key)
+                    if insights is None:
+                        started = time.perf_counter()
+                        insights = generate_insights(build_prompt(inputs), get_client(os.environ.get('ANTHROPIC_API_KEY')), model)
+                        self.cache.put(key, insights, model, PROMPT_VERSION, time.perf_counter() - started)
+                        generated = True
+            analysis.ai_insights_json = json.dumps(insights)
+            db.session.commit()
+            logger.info('AI insights for %s %s in %.2fs', analysis_id,
+                        'generated' if generated else 'served from cache', time.perf_counter() - start)
+            if self.on_done is not None:
+                self.on_done(analysis_id)
+            future.set_result(insights)
+            return True
+        except Exception as e:
+            db.session.rollback()
+            if cache_only:
+                logger.warning('Insight cache lookup for %s failed: %s', analysis_id, e)
+                return False
+            logger.error('Error generating AI insights for %s: %s', analysis_id, e, exc_info=True)
+            table = BudgetAnalysis.__table__
+            db.session.execute(update(table).where(table.c.id == analysis_id)
+                               .values(insights_error='Unable to generate insights. Please try again.'))
+            db.session.commit()
+            future.set_exception(e)
+        finally:
+            if future.done():
+                with self._lock:
+                    self._inflight.pop(analysis_id, None)
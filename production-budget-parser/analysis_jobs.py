@@ -0,0 +1,337 @@
+"""
+Analysis Jobs
+Background worker pool for budget analysis with progress stored in the database
+
+Job state lives in the analysis_jobs table, so any web worker can answer a
+progress poll and jobs interrupted by a restart are picked up again on
+startup. Jobs of a worker that dies while the others keep running (e.g. a
+gunicorn timeout kill) are picked up by a throttled sweep from progress
+polls. No external broker is needed.
+
+Each claim of a job stores a fresh owner token, and the worker running it
+refreshes heartbeat_at from a side thread. Only jobs whose heartbeat has
+stopped are re-queued, and every progress and final status write is a
+compare-and-set on (status='running', owner), so a worker whose job was
+taken over discards its results instead of finishing the job twice.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from database_models import db, AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+# A 'running' job without a heartbeat for this long is treated as orphaned by a dead process
+DEFAULT_STALE_SECONDS = 900
+# Seconds between heartbeats of a running job (well below the stale timeout)
+DEFAULT_HEARTBEAT_SECONDS = 30
+# Minimum seconds between two stale-job sweeps in one process
+DEFAULT_SWEEP_SECONDS = 60
+
+
+class JobError(Exception):
+    """Analysis failure with a message that is safe to show the user"""
+
+
+class JobLost(Exception):
+    """The job was re-queued and claimed by another worker while this one ran it"""
+
+
+class JobProgress:
+    """Records stage, percent and per-stage timings on an AnalysisJob"""
+
+    def __init__(self, job_id, owner=None):
+        self.job_id = job_id
+        self.owner = owner
+        self.timings = {}
+        self._stage = None
+        self._stage_started = None
+
+    def _close_stage(self):
+        if self._stage is not None:
+            self.timings[self._stage] = round(time.perf_counter() - self._stage_started, 4)
+
+    def stage(self, name, percent):
+        """
+        Start a new pipeline stage and commit the progress update
+
+        Call before adding anything to the session for that stage: the
+        commit here would otherwise write it early.
+        """
+        self._close_stage()
+        self._stage = name
+        self._stage_started = time.perf_counter()
+        self._update(stage=name, percent=percent)
+        db.session.commit()
+
+    def report(self, percent):
+        """Commit a percent update within the current stage"""
+        self._update(percent=percent)
+        db.session.commit()
+
+    def commit(self):
+        """
+        Commit the session's pending writes with a heartbeat
+
+        Raises JobLost instead when the job is no longer running under this owner.
+        """
+        self._update()
+        db.session.commit()
+
+    def finish(self, status, error_message=None):
+        """
+        Mark the job finished (the caller commits)
+
+        Raises JobLost when the job is no longer running under this owner.
+        """
+        self._close_stage()
+        self._stage = None
+        self._update(
+            status=status,
+            stage=status,
+            percent=100 if status == 'done' else None,
+            error_message=error_message,
+            finished_at=datetime.utcnow()
+        )
+
+    def _update(self, **values):
+        values = {k: v for k, v in values.items() if v is not None}
+        values['timings_json'] = json.dumps(self.timings)
+        values['updated_at'] = values['heartbeat_at'] = datetime.utcnow()
+        statement = update(AnalysisJob).where(AnalysisJob.id == self.job_id)
+        if self.owner is not None:
+            statement = statement.where(AnalysisJob.status == 'running', AnalysisJob.owner == self.owner)
+        result = db.session.execute(statement.values(**values))
+        if self.owner is not None and result.rowcount != 1:
+            raise JobLost(self.job_id)
+
+
+class JobHeartbeat:
+    """
+    Refreshes heartbeat_at of a claimed job from a daemon thread
+
+    Writes go through their own short transactions on the engine, so they
+    do not touch the runner's session. A heartbeat that cannot get the
+    write lock (SQLite, while the runner saves) is skipped, not retried.
+    """
+
+    def __init__(self, app, job_id, owner, interval):
+        self.app = app
+        self.job_id = job_id
+        self.owner = owner
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f'analysis-heartbeat-{job_id[:8]}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(
+                            update(AnalysisJob)
+                            .where(AnalysisJob.id == self.job_id, AnalysisJob.status == 'running',
+                                   AnalysisJob.owner == self.owner)
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+                except Exception as e:
+                    logger.debug('Heartbeat for analysis job %s skipped: %s', self.job_id, e)
+
+
+class AnalysisJobQueue:
+    """
+    Thread pool that runs queued AnalysisJobs
+
+    Usage:
+        jobs = AnalysisJobQueue()
+        jobs.init_app(app, runner=run_budget_analysis)
+        jobs.submit(job.id)
+
+    The runner is called as runner(job, progress) inside an app context. It
+    reports stages through progress.stage() and leaves its database writes
+    uncommitted; the queue commits them together with the 'done' status.
+    With ANALYSIS_JOBS_EAGER set, jobs run inline in submit() (for tests).
+    """
+
+    def __init__(self, app=None, runner=None):
+        self.app = None
+        self.runner = None
+        self._executor = None
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, runner)
+
+    def init_app(self, app, runner):
+        self.app = app
+        self.runner = runner
+        app.config.setdefault('ANALYSIS_WORKERS', DEFAULT_WORKERS)
+        app.config.setdefault('ANALYSIS_JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+        app.config.setdefault('ANALYSIS_JOB_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+        app.config.setdefault('ANALYSIS_JOB_SWEEP_SECONDS', DEFAULT_SWEEP_SECONDS)
+        app.config.setdefault('ANALYSIS_JOBS_EAGER', False)
+
+    def _get_executor(self):
+        # Created on first use so each gunicorn worker gets its own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['ANALYSIS_WORKERS'],
+                    thread_name_prefix='analysis-job'
+                )
+            return self._executor
+
+    def submit(self, job_id):
+        """Queue a committed AnalysisJob for processing"""
+        if self.app.config['ANALYSIS_JOBS_EAGER']:
+            self._run(job_id)
+        else:
+            self._get_executor().submit(self._run_in_context, job_id)
+
+    def resume_pending(self):
+        """
+        Re-queue jobs left behind by a previous process
+
+        Queued jobs are submitted again and running jobs without a heartbeat
+        within ANALYSIS_JOB_STALE_SECONDS are reset to queued first, dropping
+        their owner. Claiming is atomic, so two processes resuming the same
+        job run it once, and a worker that was only slow loses the job
+        instead of finishing it a second time.
+
+        Returns:
+            Number of jobs submitted
+        """
+        self._requeue_stale()
+        job_ids = [job_id for (job_id,) in db.session.query(AnalysisJob.id)
+                   .filter(AnalysisJob.status == 'queued')
+                   .order_by(AnalysisJob.created_at)]
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info('Resumed %d pending analysis jobs', len(job_ids))
+        return len(job_ids)
+
+    def sweep(self):
+        """
+        Re-queue and run jobs orphaned by a process that died while this one runs
+
+        Throttled to once per ANALYSIS_JOB_SWEEP_SECONDS per process, so it
+        can be called from every progress poll. Running jobs with a stale
+        heartbeat are reset as in resume_pending(), and queued jobs left
+        untouched for the stale timeout (queued in a process that died) are
+        submitted again; jobs queued recently are left to their own process.
+
+        Returns:
+            Number of jobs submitted
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sweep:
+                return 0
+            self._next_sweep = now + self.app.config['ANALYSIS_JOB_SWEEP_SECONDS']
+
+        reset = self._requeue_stale()
+        cutoff = self._stale_cutoff()
+        job_ids = reset + [job_id for (job_id,) in db.session.query(AnalysisJob.id)
+                           .filter(AnalysisJob.status == 'queued', AnalysisJob.updated_at < cutoff)
+                           .order_by(AnalysisJob.created_at)]
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info('Sweep re-queued %d orphaned analysis jobs', len(job_ids))
+        return len(job_ids)
+
+    def _stale_cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.app.config['ANALYSIS_JOB_STALE_SECONDS'])
+
+    def _requeue_stale(self):
+        """Reset running jobs without a recent heartbeat to queued; returns their ids"""
+        stale = (AnalysisJob.status == 'running',
+                 func.coalesce(AnalysisJob.heartbeat_at, AnalysisJob.updated_at) < self._stale_cutoff())
+        job_ids = [job_id for (job_id,) in db.session.query(AnalysisJob.id).filter(*stale)]
+        if job_ids:
+            # Conditions repeated: a job whose heartbeat resumed in between is left
+            # alone (submitting it is then a no-op, since claims are atomic)
+            db.session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id.in_(job_ids), *stale)
+                .values(status='queued', stage='queued', percent=0, owner=None, updated_at=datetime.utcnow())
+            )
+        db.session.commit()
+        return job_ids
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def _claim(self, job_id):
+        """Move a queued job to running under a new owner token (None if another worker has it)"""
+        owner = str(uuid.uuid4())
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == 'queued')
+            .values(status='running', stage='starting', percent=0, owner=owner,
+                    started_at=now, updated_at=now, heartbeat_at=now)
+        )
+        db.session.commit()
+        return owner if result.rowcount == 1 else None
+
+    def _run_in_context(self, job_id):
+        with self.app.app_context():
+            try:
+                self._run(job_id)
+            finally:
+                db.session.remove()
+
+    def _run(self, job_id):
+        owner = self._claim(job_id)
+        if owner is None:
+            return
+
+        job = db.session.get(AnalysisJob, job_id)
+        progress = JobProgress(job_id, owner)
+        start = time.perf_counter()
+        heartbeat = JobHeartbeat(self.app, job_id, owner, self.app.config['ANALYSIS_JOB_HEARTBEAT_SECONDS'])
+        try:
+            with heartbeat:
+                self.runner(job, progress)
+                progress.finish('done')
+                db.session.commit()
+            logger.info('Analysis job %s finished in %.2fs %s', job_id, time.perf_counter() - start, progress.timings)
+        except JobLost:
+            db.session.rollback()
+            logger.warning('Analysis job %s was taken over by another worker; results discarded', job_id)
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, JobError):
+                message = str(e)
+                logger.warning('Analysis job %s failed: %s', job_id, message)
+            else:
+                message = 'An error occurred while analyzing the file. Please check the file format and try again.'
+                logger.error('Error in analysis job %s: %s', job_id, e, exc_info=True)
+            try:
+                progress.finish('failed', error_message=message)
+                db.session.commit()
+            except JobLost:
+                db.session.rollback()
+                logger.warning('Analysis job %s was taken over by another worker; failure not recorded', job_id)
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the budget parser.
+Run from the production-budget-parser folder, e.g.:
+    python -m benchmarks.bench_risk_manager
+"""
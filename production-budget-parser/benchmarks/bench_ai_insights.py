@@ -0,0 +1,141 @@
+"""
+Benchmark: AI insights — the old blocking route (new client and model call
+per request) vs background generation with single-flight per analysis.
+
+The model is simulated with a fixed latency, so no API key or network is
+needed; what is measured is how long request threads are held and how
+many model calls concurrent requests for one uncached analysis cause, and
+how many re-uploads of one budget cause through the insight cache. Also
+times building an Anthropic client, which the old route did per request
+(each new client also opens a new TLS connection on its first call).
+
+Usage:
+    python -m benchmarks.bench_ai_insights [--requests 20] [--latency 2.0]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+INSIGHTS = {'executive_summary': 'Healthy', 'key_concerns': [], 'top_recommendations': [],
+            'budget_health_score': 80, 'outlook': 'POSITIVE'}
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-insights-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+        'ANTHROPIC_API_KEY': 'sk-bench',
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    import flask_auth
+    flask_auth.verify_api_key = lambda key: True
+    from web_app import app, limiter
+    limiter.enabled = False
+    return app
+
+
+class SlowModel:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.messages = self
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(INSIGHTS))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=2.0)
+    args = parser.parse_args()
+
+    import anthropic
+    start = time.perf_counter()
+    for _ in range(20):
+        anthropic.Anthropic(api_key='sk-bench')
+    print(f'new Anthropic client: {(time.perf_counter() - start) / 20 * 1000:.1f}ms each (old route: one per request)')
+
+    app = _setup()
+    import ai_insights
+    from benchmarks.synthetic import make_budget
+    from database_models import db, BudgetAnalysis
+    from web_app import insights_worker
+
+    def analysis(name):
+        df = make_budget(1000)
+        item = BudgetAnalysis(id=name, filename=f'{name}.csv', total_budget=float(df.Amount.sum()), line_items=len(df),
+                              risk_analysis_json='{}', optimizations_json='[]')
+        item.set_dataframe(df)
+        db.session.add(item)
+        db.session.commit()
+
+    model = SlowModel(args.latency)
+    ai_insights.get_client = lambda api_key: model
+    with app.app_context():
+        analysis('blocking')
+        analysis('background')
+
+        # Old route: every request builds the prompt and waits for its own model call
+        def blocking(_):
+            with app.app_context():
+                started = time.perf_counter()
+                item = db.session.get(BudgetAnalysis, 'blocking')
+                ai_insights.generate_insights(ai_insights.build_prompt(ai_insights.prompt_inputs(item)), model)
+                db.session.remove()
+                return time.perf_counter() - started
+
+        with ThreadPoolExecutor(args.requests) as pool:
+            held = list(pool.map(blocking, range(args.requests)))
+        old_calls = model.calls
+        print(f"{'route':<28} {'model calls':>12} {'thread held (avg s)':>20} {'until result (s)':>17}")
+        print(f"{'blocking (old)':<28} {old_calls:>12} {sum(held) / len(held):>20.3f} {max(held):>17.2f}")
+
+    client = app.test_client()
+    model.calls = 0
+
+    def background(_):
+        started = time.perf_counter()
+        client.post('/api/ai-insights/background', headers={'X-API-Key': 'bench'})
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.requests) as pool:
+        held = list(pool.map(background, range(args.requests)))
+    with app.app_context():
+        insights_worker.wait('background', args.latency * 5)
+        result = client.get('/api/ai-insights/background', headers={'X-API-Key': 'bench'}).status_code
+    print(f"{'202 + single-flight':<28} {model.calls:>12} {sum(held) / len(held):>20.3f} {time.perf_counter() - started:>17.2f}"
+          f"  (poll: {result})")
+
+    # Re-uploads: analyses with the same inputs as 'background' are served from the insight cache
+    model.calls = 0
+    with app.app_context():
+        for n in range(args.requests):
+            analysis(f'reupload-{n}')
+    started = time.perf_counter()
+    for n in range(args.requests):
+        client.post(f'/api/ai-insights/reupload-{n}', headers={'X-API-Key': 'bench'})
+    with app.app_context():
+        stats = insights_worker.cache.stats()
+    print(f"{f'{args.requests} re-uploads (cached)':<28} {model.calls:>12} {'':>20} {time.perf_counter() - started:>17.2f}"
+          f"  (hit rate {stats['hit_rate']:.0%}, {stats['saved_seconds']:.1f}s of model time saved)")
+    insights_worker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: line-item matching between two budget revisions, single merge pass
+vs the per-key reference (row-wise keys, one full scan per unmatched key),
+plus the optional fuzzy stage that pairs renamed items through its blocking
+index.
+
+The second revision keeps a share of the first one's line items, renames a
+few and replaces the rest, so new, removed and renamed items are plentiful.
+
+Usage:
+    python -m benchmarks.bench_budget_comparison [--sizes 5000,50000] [--per-key-max 50000]
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import make_budget
+from budget_comparison import fuzzy_match_items, match_line_items, normalize_dataframe
+from tests.test_budget_comparison import match_line_items_per_key
+
+
+def revisions(n_rows, kept=0.7, renamed=0.05):
+    """
+    Two normalized budget revisions of n_rows sharing `kept` of their line
+    items, `renamed` of which get a reworded description
+    """
+    before = make_budget(n_rows, seed=1)
+    after = make_budget(n_rows, seed=2)
+    shared = int(n_rows * kept)
+    after.iloc[:shared] = before.iloc[:shared].to_numpy()
+    renames = after.index[:int(n_rows * renamed)]
+    after.loc[renames, 'Description'] = after.loc[renames, 'Description'] + ' (revised)'
+    return normalize_dataframe(before), normalize_dataframe(after)
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='5000,50000')
+    parser.add_argument('--per-key-max', type=int, default=50000,
+                        help='Skip the per-key reference above this many rows')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'merge':>10} {'per-key':>10} {'speedup':>9} {'fuzzy':>9} {'renamed':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        df1, df2 = revisions(size)
+        merged = _time(match_line_items, df1, df2)
+        matches = match_line_items(df1, df2)
+        start = time.perf_counter()
+        modified, _, _ = fuzzy_match_items(matches['removed_items'], matches['new_items'])
+        fuzzy = time.perf_counter() - start
+        if size <= args.per_key_max:
+            per_key = _time(match_line_items_per_key, df1, df2)
+            print(f"{size:>10,} {merged:>9.3f}s {per_key:>9.2f}s {per_key / merged:>8.0f}x {fuzzy:>8.2f}s {len(modified):>8,}")
+        else:
+            print(f"{size:>10,} {merged:>9.3f}s {'skipped':>10} {'-':>9} {fuzzy:>8.2f}s {len(modified):>8,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: CPU time of the upload analysis steps with separate scans vs a
+shared BudgetProfile.
+
+Times the steps web_app.run_budget_analysis performs on the cleaned
+DataFrame, one by one: keyword flags, risk analysis, optimizations and
+aggregates. "separate" lets every step scan the DataFrame on its own;
+"shared" builds one BudgetProfile and passes it to all of them (the
+profile computes lazily, so its work is counted in the step that first
+needs it). The app is not imported, so no database is touched.
+
+Usage:
+    python -m benchmarks.bench_budget_profile [--sizes 10000,100000,500000]
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import make_budget
+from budget_aggregates import compute_aggregates
+from budget_profile import BudgetProfile
+from budget_recommendations import find_optimizations
+from risk_manager import RiskManager
+
+STEPS = ('flags', 'risks', 'optimizations', 'aggregates')
+
+
+def _upload_steps(df, risk_manager, shared):
+    """CPU seconds per upload step"""
+    timings = {}
+    started = time.process_time()
+
+    def lap(step):
+        nonlocal started
+        now = time.process_time()
+        timings[step] = now - started
+        started = now
+
+    profile = BudgetProfile(df) if shared else None
+    flags = risk_manager.keyword_flags(df, profile=profile)
+    lap('flags')
+    risk_manager.analyze_risks(df, profile=profile, keyword_flags=flags)
+    lap('risks')
+    find_optimizations(df, profile=profile)
+    lap('optimizations')
+    compute_aggregates(df, profile=profile)
+    lap('aggregates')
+    return timings
+
+
+def _best(df, risk_manager, shared, repeat):
+    runs = [_upload_steps(df, risk_manager, shared) for _ in range(repeat)]
+    return min(runs, key=lambda timings: sum(timings.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,500000')
+    args = parser.parse_args()
+
+    risk_manager = RiskManager()
+    print(f"{'rows':>10} {'mode':>9} " + ' '.join(f'{step:>13}' for step in STEPS) + f" {'total':>9} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        df = make_budget(size)
+        repeat = 3 if size <= 100000 else 1
+        totals = {}
+        for mode in ('separate', 'shared'):
+            timings = _best(df, risk_manager, mode == 'shared', repeat)
+            totals[mode] = sum(timings.values())
+            speedup = f"{totals['separate'] / totals[mode]:>7.2f}x" if mode == 'shared' else ''
+            print(f"{size:>10,} {mode:>9} " + ' '.join(f'{timings[step]:>12.3f}s' for step in STEPS)
+                  + f" {totals[mode]:>8.3f}s {speedup:>8}")
+
+
+if __name__ == '__main__':
+    main()
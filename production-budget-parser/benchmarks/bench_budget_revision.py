@@ -0,0 +1,86 @@
+"""
+Benchmark: uploading a budget revision with its parent declared (incremental
+re-analysis) vs as a brand-new analysis.
+
+Runs the real job pipeline (web_app.run_budget_analysis) against a scratch
+SQLite database. Each revision re-prices or rewords a share of the parent's
+rows and inserts and deletes a few more.
+
+Usage:
+    python -m benchmarks.bench_budget_revision [--rows 300000] [--changes 0.001,0.01,0.1]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-revision-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app
+    app.config['ANALYSIS_JOBS_EAGER'] = True
+    return tmp, app
+
+
+def revise(df, share, seed=7):
+    """A revision of df with `share` of its rows edited, plus as many inserted and deleted"""
+    changed = df.sample(frac=share, random_state=seed).index
+    revised = df.copy()
+    revised.loc[changed[::2], 'Amount'] = (revised.loc[changed[::2], 'Amount'] * 1.1).round(2)
+    revised.loc[changed[1::2], 'Description'] = revised.loc[changed[1::2], 'Description'] + ' (revised)'
+    dropped = df.sample(n=len(changed), random_state=seed + 1).index
+    inserted = df.sample(n=len(changed), random_state=seed + 2).assign(Vendor='New Vendor Co')
+    return pd.concat([revised.drop(index=dropped.difference(changed)), inserted], ignore_index=True)
+
+
+def _analyze(tmp, df, parent_id=None):
+    from web_app import analysis_jobs
+    from database_models import db, AnalysisJob
+
+    path = os.path.join(tmp, f'{uuid.uuid4()}.csv')
+    df.to_csv(path, index=False)
+    job_id = str(uuid.uuid4())
+    db.session.add(AnalysisJob(id=job_id, filename='bench.csv', filepath=path, parent_id=parent_id))
+    db.session.commit()
+    start = time.perf_counter()
+    analysis_jobs.submit(job_id)
+    elapsed = time.perf_counter() - start
+    assert db.session.get(AnalysisJob, job_id).status == 'done'
+    return job_id, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--changes', default='0.001,0.01,0.1')
+    args = parser.parse_args()
+
+    tmp, app = _setup()
+    from benchmarks.synthetic import make_budget
+
+    with app.app_context():
+        df = make_budget(args.rows)
+        parent_id, parent_s = _analyze(tmp, df)
+        print(f'parent: {args.rows:,} rows analyzed in {parent_s:.2f}s')
+        print(f"{'changed':>9} {'rows':>8} {'full':>8} {'revision':>9} {'speedup':>8}")
+        for share in (float(s) for s in args.changes.split(',')):
+            revised = revise(df, share)
+            _, full_s = _analyze(tmp, revised)
+            _, revision_s = _analyze(tmp, revised, parent_id)
+            print(f"{share:>8.1%} {int(args.rows * share) * 2:>8,} {full_s:>7.2f}s {revision_s:>8.2f}s {full_s / revision_s:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
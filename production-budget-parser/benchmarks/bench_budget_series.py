@@ -0,0 +1,63 @@
+"""
+Benchmark: N-way comparison of a draft series in one pass vs chaining
+pairwise compare_budgets over consecutive drafts.
+
+Each draft keeps most of the previous draft's line items, re-prices them and
+adds a few new ones, like successive revisions of one production budget.
+
+Usage:
+    python -m benchmarks.bench_budget_series [--drafts 6,12,20] [--rows 20000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_budget
+from budget_comparison import compare_budgets
+from budget_series import compare_budget_series
+
+
+def drafts(n_drafts, n_rows, seed=42):
+    """n_drafts successive revisions of a budget of about n_rows line items"""
+    rng = np.random.default_rng(seed)
+    pool = make_budget(n_rows * 2, seed=seed)
+    current = pool.iloc[:n_rows]
+    result = []
+    for step in range(n_drafts):
+        draft = current.sample(frac=0.95, random_state=step)
+        added = pool.iloc[n_rows + step * n_rows // 20:n_rows + (step + 1) * n_rows // 20]
+        draft = pd.concat([draft, added])
+        draft['Amount'] = (draft['Amount'] * rng.uniform(0.95, 1.05, len(draft))).round(2)
+        result.append(draft.reset_index(drop=True))
+        current = draft
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drafts', default='6,12,20')
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'drafts':>7} {'rows':>8} {'series':>9} {'pairwise':>10} {'speedup':>9}")
+    for n_drafts in (int(d) for d in args.drafts.split(',')):
+        dfs = drafts(n_drafts, args.rows)
+        names = [f'Draft {i + 1}' for i in range(n_drafts)]
+
+        start = time.perf_counter()
+        compare_budget_series(dfs, names)
+        series = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for df1, df2 in zip(dfs, dfs[1:]):
+            compare_budgets(df1, df2)
+        pairwise = time.perf_counter() - start
+
+        print(f"{n_drafts:>7} {args.rows:>8,} {series:>8.3f}s {pairwise:>9.3f}s {pairwise / series:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
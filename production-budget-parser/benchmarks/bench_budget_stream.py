@@ -0,0 +1,79 @@
+"""
+Benchmark: peak memory and time of in-memory vs streaming upload analysis.
+
+Each mode runs the real job pipeline (web_app.run_budget_analysis) in a fresh
+subprocess against a scratch SQLite database, so peak RSS is per mode.
+
+Usage:
+    python -m benchmarks.bench_budget_stream [--sizes 100000,500000,1000000] [--chunk-rows 50000]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def _child(mode, csv_path, chunk_rows):
+    tmp = tempfile.mkdtemp(prefix='bench-stream-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+        'STREAM_CHUNK_ROWS': str(chunk_rows),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app, analysis_jobs
+    from database_models import db, AnalysisJob
+
+    app.config['ANALYSIS_JOBS_EAGER'] = True
+    with app.app_context():
+        job_id = str(uuid.uuid4())
+        db.session.add(AnalysisJob(id=job_id, filename='bench.csv', filepath=csv_path, mode=mode))
+        db.session.commit()
+        start = time.perf_counter()
+        analysis_jobs.submit(job_id)
+        elapsed = time.perf_counter() - start
+        status = db.session.get(AnalysisJob, job_id).status
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{status} {elapsed:.2f} {peak_mb:.0f}')
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        _child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,500000,1000000')
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import make_budget
+
+    print(f"{'rows':>10} {'CSV MB':>8} {'memory s':>9} {'memory MB':>10} {'stream s':>9} {'stream MB':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            csv_path = f.name
+        make_budget(size).to_csv(csv_path, index=False)
+        results = []
+        for mode in ('memory', 'stream'):
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_budget_stream', '--child', mode, csv_path, str(args.chunk_rows)],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            results.append(out)
+        csv_mb = os.path.getsize(csv_path) / 1024 / 1024
+        os.unlink(csv_path)
+        (_, mem_s, mem_mb), (_, stream_s, stream_mb) = results
+        print(f"{size:>10,} {csv_mb:>8.1f} {float(mem_s):>9.2f} {mem_mb:>10} {float(stream_s):>9.2f} {stream_mb:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: cold-storage tiering — database size and query latency before
+and after archiving old analyses' payloads, and the cost of reading an
+archived payload back (file vs LRU hit vs row).
+
+Fills a scratch SQLite database with analyses carrying synthetic
+DataFrames, risk reports and row indexes, most of them old, then archives
+the old ones and VACUUMs.
+
+Usage:
+    python -m benchmarks.bench_cold_storage [--analyses 1000] [--rows 5000] [--recent 50]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-cold-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+        'ARCHIVE_FOLDER': os.path.join(tmp, 'archive'),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app
+    return app, os.path.join(tmp, 'bench.db')
+
+
+def _timed(fn, repeat=10):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--recent', type=int, default=50)
+    args = parser.parse_args()
+
+    app, db_path = _setup()
+    from benchmarks.synthetic import make_budget
+    from cold_storage import PayloadCache, archive_analyses, get_store
+    from database_models import db, BudgetAnalysis, get_recent_analyses, search_analyses
+
+    with app.app_context():
+        now = datetime.utcnow()
+        for i in range(args.analyses):
+            df = make_budget(args.rows, seed=i)
+            analysis = BudgetAnalysis(
+                id=f'analysis-{i:06d}', filename=f'budget-{i}.csv', total_budget=float(df.Amount.sum()),
+                line_items=len(df), risk_level=('LOW', 'MODERATE', 'HIGH')[i % 3],
+                upload_date=now - timedelta(days=1 if i >= args.analyses - args.recent else 400 + i),
+                risk_analysis_json=json.dumps({'items': df.head(500).to_dict(orient='records')}),
+                optimizations_json=json.dumps([{'department': d, 'saving': 1000.0} for d in df.Department.unique()]),
+                row_index_blob=os.urandom(args.rows * 12),
+            )
+            analysis.set_dataframe(df)
+            db.session.add(analysis)
+            if i % 100 == 99:
+                db.session.commit()
+        db.session.commit()
+
+        def measure(label):
+            db.session.remove()
+            recent = _timed(lambda: get_recent_analyses(20))
+            by_risk = _timed(lambda: [a.filename for a in search_analyses(risk_level='HIGH')], repeat=3)
+            size = os.path.getsize(db_path) / 1024 / 1024
+            print(f'{label:<22} {size:>9.1f} {recent:>13.2f} {by_risk:>16.2f}')
+
+        print(f'{args.analyses:,} analyses of {args.rows:,} rows, {args.recent} recent')
+        print(f"{'':<22} {'db MB':>9} {'recent 20 ms':>13} {'risk filter ms':>16}")
+        measure('all payloads inline')
+
+        report = archive_analyses(days_old=180)
+        db.session.execute(db.text('VACUUM'))
+        measure('old ones archived')
+        print(f"archived {report['analyses']:,} analyses in {report['seconds']:.1f}s: "
+              f"{report['freed_bytes'] / 1024 / 1024:.0f} MB out, {report['stored_bytes'] / 1024 / 1024:.0f} MB in {get_store().compression} files")
+
+        store = get_store()
+        hot = db.session.get(BudgetAnalysis, f'analysis-{args.analyses - 1:06d}')
+        cold = db.session.get(BudgetAnalysis, 'analysis-000000')
+
+        def read_cold():
+            store.cache = PayloadCache()
+            cold.get_dataframe()
+        print(f"{'get_dataframe':<22} {'ms':>9}")
+        print(f"{'  row (hot)':<22} {_timed(hot.get_dataframe):>9.2f}")
+        print(f"{'  archive file':<22} {_timed(read_cold):>9.2f}")
+        print(f"{'  archive, LRU hit':<22} {_timed(cold.get_dataframe):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: dashboard statistics — the aggregate queries get_database_stats
+used to run vs reading the running totals of the stats table, and the old
+/api/health (a COUNT per probe) vs the liveness and deep-health routes.
+
+Fills a scratch SQLite database with synthetic analyses and line items
+(core inserts, then one recount of the totals) and times each read.
+
+Usage:
+    python -m benchmarks.bench_dashboard_stats [--analyses 20000] [--line-items 2000000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-stats-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app, limiter
+    limiter.enabled = False
+    return app
+
+
+def _timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=20000)
+    parser.add_argument('--line-items', type=int, default=2000000)
+    args = parser.parse_args()
+
+    app = _setup()
+    from dashboard_stats import read_stats, rebuild_stats
+    from database_models import db, BudgetAnalysis, BudgetComparison, BudgetLineItem
+
+    def aggregates():
+        # get_database_stats before the stats table
+        return {
+            'total_analyses': BudgetAnalysis.query.count(),
+            'total_line_items': BudgetLineItem.query.count(),
+            'total_comparisons': BudgetComparison.query.count(),
+            'total_budget_tracked': db.session.query(db.func.sum(BudgetAnalysis.total_budget)).scalar() or 0,
+            'avg_budget': db.session.query(db.func.avg(BudgetAnalysis.total_budget)).scalar() or 0,
+            'risk_distribution': db.session.query(
+                BudgetAnalysis.risk_level, db.func.count(BudgetAnalysis.id)
+            ).group_by(BudgetAnalysis.risk_level).all()
+        }
+
+    rng = random.Random(0)
+    with app.app_context():
+        start = time.perf_counter()
+        db.session.execute(db.insert(BudgetAnalysis.__table__), [
+            {'id': f'analysis-{i:06d}', 'filename': f'budget-{i}.csv', 'total_budget': rng.uniform(1e5, 1e7),
+             'line_items': 0, 'risk_level': rng.choice(['LOW', 'MODERATE', 'HIGH', 'CRITICAL']),
+             'dataframe_json': ''}
+            for i in range(args.analyses)
+        ])
+        per_analysis = max(1, args.line_items // args.analyses)
+        for first in range(0, args.line_items, 100000):
+            db.session.execute(db.insert(BudgetLineItem.__table__), [
+                {'analysis_id': f'analysis-{n // per_analysis % args.analyses:06d}', 'category': 'Camera',
+                 'department': 'Camera', 'description': 'Camera package rental', 'amount': 100.0, 'line_number': n}
+                for n in range(first, min(first + 100000, args.line_items))
+            ])
+        rebuild_stats()
+        db.session.commit()
+        print(f'{args.analyses:,} analyses, {args.line_items:,} line items loaded in {time.perf_counter() - start:.1f}s')
+
+        assert read_stats()['total_line_items'] == aggregates()['total_line_items']
+        old_ms, new_ms = _timed(aggregates, repeat=5), _timed(read_stats, repeat=200)
+        print(f"{'read':<34} {'ms':>9}")
+        print(f"{'get_database_stats, aggregates':<34} {old_ms:>9.2f}")
+        print(f"{'get_database_stats, stats table':<34} {new_ms:>9.3f}  ({old_ms / new_ms:,.0f}x)")
+
+    client = app.test_client()
+    with app.app_context():
+        print(f"{'COUNT per probe (old /api/health)':<34} {_timed(lambda: BudgetAnalysis.query.count(), repeat=20):>9.2f}")
+    print(f"{'/api/health (liveness)':<34} {_timed(lambda: client.get('/api/health'), repeat=200):>9.3f}")
+    print(f"{'/api/health/deep':<34} {_timed(lambda: client.get('/api/health/deep'), repeat=200):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
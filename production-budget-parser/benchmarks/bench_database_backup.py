@@ -0,0 +1,101 @@
+"""
+Benchmark: database backups — the old checkpoint + file copy vs online
+compressed full and incremental backups, and restores.
+
+Builds a scratch WAL database of synthetic line items, then times each
+backup kind (MB/s of database read), reports the stored size, and measures
+the slowest commit of a writer running during an online backup.
+
+Usage:
+    python -m benchmarks.bench_database_backup [--rows 1000000] [--changed 1000]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import make_budget
+from database_backup import create_backup, default_compression, restore_backup
+
+
+def _build(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('CREATE TABLE budget_line_items (id INTEGER PRIMARY KEY, analysis_id TEXT, category TEXT, '
+                 'department TEXT, description TEXT, vendor TEXT, amount REAL, line_number INTEGER)')
+    for start in range(0, rows, 100000):
+        df = make_budget(min(100000, rows - start), seed=start)
+        conn.executemany(
+            'INSERT INTO budget_line_items (analysis_id, category, department, description, vendor, amount, line_number) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(f'analysis-{start // 10000}', c, d, desc, v, a, i) for i, (c, d, desc, v, a) in
+             enumerate(zip(df.Category, df.Department, df.Description, df.Vendor, df.Amount.astype(float)))]
+        )
+    conn.commit()
+    return conn
+
+
+def _legacy_copy(db_path, backup_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    shutil.copy2(db_path, backup_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--changed', type=int, default=1000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-backup-')
+    db_path, backup_dir = os.path.join(tmp, 'bench.db'), os.path.join(tmp, 'backups')
+    conn = _build(db_path, args.rows)
+    size_mb = os.path.getsize(db_path) / 1024 / 1024
+    print(f'{args.rows:,} line items, {size_mb:.1f} MB database, {default_compression()} compression')
+    print(f"{'operation':<36} {'seconds':>8} {'MB/s':>8} {'stored MB':>10}")
+
+    start = time.perf_counter()
+    _legacy_copy(db_path, os.path.join(tmp, 'copy.db'))
+    seconds = time.perf_counter() - start
+    print(f"{'checkpoint + file copy (old)':<36} {seconds:>8.2f} {size_mb / seconds:>8.1f} {size_mb:>10.1f}")
+
+    full = create_backup(db_path, backup_dir)
+    print(f"{'online full backup':<36} {full['seconds']:>8.2f} {full['mb_per_s']:>8.1f} {full['backup_bytes'] / 1024 / 1024:>10.1f}")
+
+    conn.execute('UPDATE budget_line_items SET amount = amount + 1 WHERE id % ? = 0', (max(1, args.rows // args.changed),))
+    conn.commit()
+    increment = create_backup(db_path, backup_dir, incremental=True)
+    label = f"incremental ({increment['changed_pages']:,} pages)"
+    print(f"{label:<36} {increment['seconds']:>8.2f} {increment['mb_per_s']:>8.1f} {increment['backup_bytes'] / 1024 / 1024:>10.1f}")
+
+    restored = restore_backup(increment['path'], os.path.join(tmp, 'restored.db'))
+    print(f"{'restore full + incremental':<36} {restored['seconds']:>8.2f} {restored['mb_per_s']:>8.1f}")
+
+    # Slowest commit of a writer while an online backup runs
+    stop, latencies = threading.Event(), []
+
+    def writer():
+        writer_conn = sqlite3.connect(db_path, timeout=30)
+        while not stop.is_set():
+            started = time.perf_counter()
+            writer_conn.execute("INSERT INTO budget_line_items (analysis_id, amount) VALUES ('live', 1.0)")
+            writer_conn.commit()
+            latencies.append(time.perf_counter() - started)
+        writer_conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    create_backup(db_path, backup_dir)
+    stop.set()
+    thread.join()
+    print(f'writer during online backup: {len(latencies):,} commits, slowest {max(latencies) * 1000:.1f}ms')
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: peak memory and time of the regular vs write-only Excel export.
+
+Each mode runs export_to_excel in a fresh subprocess, so peak RSS is per
+mode. The RSS column includes the synthetic DataFrame itself.
+
+Usage:
+    python -m benchmarks.bench_excel_export [--sizes 10000,50000,100000]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _child(mode, n_rows):
+    from benchmarks.synthetic import make_budget
+    from excel_exporter import export_to_excel
+
+    df = make_budget(n_rows)
+    budget_data = {
+        'filename': 'bench.csv',
+        'total_budget': float(df['Amount'].sum()),
+        'line_items': len(df),
+        'num_departments': df['Department'].nunique()
+    }
+    risk_data = {'risk_level': 'MODERATE', 'overall_risk_score': 42.0}
+    optimizations = [{'recommendation': 'Consolidate vendors', 'potential_savings': 1000.0, 'priority': 'HIGH'}]
+
+    with tempfile.TemporaryDirectory(prefix='bench-excel-') as tmp:
+        path = os.path.join(tmp, 'bench.xlsx')
+        start = time.perf_counter()
+        export_to_excel(df, budget_data, risk_data, optimizations, path, write_only=(mode == 'write-only'))
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1024 / 1024
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{elapsed:.2f} {peak_mb:.0f} {size_mb:.1f}')
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        _child(sys.argv[2], int(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,50000,100000')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'xlsx MB':>8} {'regular s':>10} {'regular MB':>11} {'write-only s':>13} {'write-only MB':>14}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        results = []
+        for mode in ('regular', 'write-only'):
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_excel_export', '--child', mode, str(size)],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            results.append(out)
+        (regular_s, regular_mb, xlsx_mb), (stream_s, stream_mb, _) = results
+        print(f"{size:>10,} {float(xlsx_mb):>8.1f} {float(regular_s):>10.2f} {regular_mb:>11} {float(stream_s):>13.2f} {stream_mb:>14}")
+
+
+if __name__ == '__main__':
+    main()
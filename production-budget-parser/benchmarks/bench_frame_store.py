@@ -0,0 +1,61 @@
+"""
+Benchmark: columnar frame storage vs dataframe_json for stored budgets.
+
+Reports stored size and load time for the sample budgets in data/input plus a
+synthetic large budget, for a full load and for the columns the comparison
+route reads.
+
+Usage:
+    python -m benchmarks.bench_frame_store [--synthetic-rows 100000]
+"""
+
+import argparse
+import glob
+import io
+import os
+import time
+
+import pandas as pd
+
+from frame_store import encode_frame, decode_frame
+from benchmarks.synthetic import make_budget
+
+INPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'input')
+SUBSET = ['Category', 'Department', 'Description', 'Vendor', 'Amount']
+
+
+def _time(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _report(name, df):
+    as_json = df.to_json(orient='records')
+    blob = encode_frame(df)
+    json_load = _time(lambda: pd.read_json(io.StringIO(as_json)))
+    blob_load = _time(lambda: decode_frame(blob))
+    subset_load = _time(lambda: decode_frame(blob, SUBSET))
+    print(f"{name:<28} {len(df):>8,} {len(as_json) / 1024:>10.1f} {len(blob) / 1024:>10.1f} "
+          f"{json_load * 1000:>10.2f} {blob_load * 1000:>10.2f} {subset_load * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic-rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'budget':<28} {'rows':>8} {'json KB':>10} {'blob KB':>10} "
+          f"{'json ms':>10} {'blob ms':>10} {'subset ms':>10}")
+    for path in sorted(glob.glob(os.path.join(INPUT_DIR, '*.xlsx'))):
+        _report(os.path.basename(path), pd.read_excel(path))
+    if args.synthetic_rows:
+        _report(f'synthetic ({args.synthetic_rows:,})', make_budget(args.synthetic_rows, unique_suffix=False))
+
+
+if __name__ == '__main__':
+    main()
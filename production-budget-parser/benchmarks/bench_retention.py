@@ -0,0 +1,99 @@
+"""
+Benchmark: retention purge — the old per-object ORM delete vs the batched
+set-based purge in retention.py.
+
+Loads synthetic budgets into a scratch SQLite database, backdates half of
+them, and deletes them each way (rows/s), while a reader thread measures
+the slowest query the app would have seen during the purge.
+
+Usage:
+    python -m benchmarks.bench_retention [--budgets 40] [--rows 20000]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-retention-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', type=int, default=40)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = _setup()
+    from benchmarks.synthetic import make_budget
+    from budget_ingest import bulk_insert_line_items
+    from database_models import db, BudgetAnalysis, BudgetLineItem
+    from retention import purge_analyses
+
+    def load(prefix):
+        old = datetime.utcnow() - timedelta(days=365)
+        for i in range(args.budgets):
+            df = make_budget(args.rows, seed=i)
+            analysis_id = f'{prefix}-{i:05d}'
+            db.session.add(BudgetAnalysis(id=analysis_id, filename=f'{prefix}-{i}.csv', total_budget=0.0,
+                                          line_items=len(df), upload_date=old if i % 2 else datetime.utcnow()))
+            db.session.flush()
+            bulk_insert_line_items(df, analysis_id)
+            db.session.commit()
+
+    def orm_delete(cutoff):
+        # cleanup_old_analyses before retention.py: cascades load every line item
+        for analysis in BudgetAnalysis.query.filter(BudgetAnalysis.upload_date < cutoff).all():
+            db.session.delete(analysis)
+        db.session.commit()
+
+    def timed(label, purge):
+        stop, latencies = threading.Event(), []
+
+        def reader():
+            with app.app_context():
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    BudgetAnalysis.query.order_by(BudgetAnalysis.upload_date.desc()).limit(20).all()
+                    latencies.append(time.perf_counter() - started)
+                    db.session.remove()
+                    time.sleep(0.005)
+
+        rows = db.session.scalar(db.select(db.func.count()).select_from(BudgetLineItem)) // 2
+        thread = threading.Thread(target=reader)
+        thread.start()
+        start = time.perf_counter()
+        purge(datetime.utcnow() - timedelta(days=90))
+        seconds = time.perf_counter() - start
+        stop.set()
+        thread.join()
+        print(f'{label:<28} {seconds:>8.2f} {rows / seconds:>12,.0f} {max(latencies) * 1000:>14.1f}')
+
+    with app.app_context():
+        print(f'{args.budgets:,} budgets of {args.rows:,} line items, half older than the cutoff')
+        print(f"{'purge':<28} {'seconds':>8} {'rows/s':>12} {'slowest read ms':>14}")
+        load('orm')
+        timed('ORM delete (old)', orm_delete)
+        db.session.execute(db.delete(BudgetLineItem.__table__))
+        db.session.execute(db.delete(BudgetAnalysis.__table__))
+        db.session.commit()
+        load('batched')
+        timed('batched purge', lambda cutoff: purge_analyses(cutoff))
+
+
+if __name__ == '__main__':
+    main()
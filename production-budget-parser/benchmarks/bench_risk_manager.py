@@ -0,0 +1,47 @@
+"""
+Benchmark: RiskManager.analyze_risks (column-wise) vs the row-by-row reference.
+
+Usage:
+    python -m benchmarks.bench_risk_manager [--sizes 1000,10000,100000,1000000] [--rowwise-max 100000]
+"""
+
+import argparse
+import time
+
+from risk_manager import RiskManager
+from benchmarks.synthetic import make_budget
+from tests.test_risk_manager import analyze_risks_rowwise
+
+
+def _time(fn, *args, repeat=1):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--rowwise-max', type=int, default=100000,
+                        help='Skip the row-by-row reference above this many rows')
+    args = parser.parse_args()
+
+    risk_manager = RiskManager()
+    print(f"{'rows':>10} {'column-wise':>14} {'row-wise':>12} {'speedup':>9}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        df = make_budget(size)
+        repeat = 3 if size <= 10000 else 1
+        vectorized = _time(risk_manager.analyze_risks, df, repeat=repeat)
+        if size <= args.rowwise_max:
+            rowwise = _time(analyze_risks_rowwise, risk_manager, df, repeat=repeat)
+            print(f"{size:>10,} {vectorized:>13.3f}s {rowwise:>11.3f}s {rowwise / vectorized:>8.1f}x")
+        else:
+            print(f"{size:>10,} {vectorized:>13.3f}s {'skipped':>12} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: full-text search (FTS5, search_index.search) vs the LIKE '%x%'
+scans it replaces, over line items of many stored budgets.
+
+Loads synthetic budgets into a scratch SQLite database through
+bulk_insert_line_items, so the time includes keeping the index in sync,
+then times ranked searches against substring scans of the same columns.
+The scans stop at the first 20 hits, so they are only quick for words
+found on many rows.
+
+Usage:
+    python -m benchmarks.bench_search_index [--budgets 200] [--rows 5000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+
+def _setup():
+    tmp = tempfile.mkdtemp(prefix='bench-search-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from web_app import app
+    return app
+
+
+def _timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = _setup()
+    from benchmarks.synthetic import make_budget
+    from budget_ingest import bulk_insert_line_items
+    from database_models import db, BudgetAnalysis, BudgetLineItem
+    from search_index import search
+
+    with app.app_context():
+        start = time.perf_counter()
+        for i in range(args.budgets):
+            df = make_budget(args.rows, seed=i)
+            if i == args.budgets // 2:
+                df.loc[:49, 'Vendor'] = 'Northwind Grip & Electric'  # a vendor found in one budget only
+            analysis_id = f'budget-{i:05d}'
+            db.session.add(BudgetAnalysis(id=analysis_id, filename=f'budget-{i}.csv', total_budget=0.0, line_items=len(df)))
+            db.session.flush()
+            bulk_insert_line_items(df, analysis_id)
+            db.session.commit()
+        total = args.budgets * args.rows
+        elapsed = time.perf_counter() - start
+        print(f'{total:,} line items loaded with the index in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)')
+
+        print(f"{'query':<24} {'fts ms':>8} {'like ms':>9} {'speedup':>8} {'matches':>8}")
+        for query in ('northwind grip', 'catering', 'panavision', 'insurance liability', 'cater*', 'stunt rigging'):
+            fts_ms, results = _timed(lambda: search(query, limit=20))
+
+            def like():
+                filters = [db.or_(BudgetLineItem.description.ilike(f'%{term.rstrip("*")}%'), BudgetLineItem.vendor.ilike(f'%{term.rstrip("*")}%'),
+                                  BudgetLineItem.department.ilike(f'%{term.rstrip("*")}%')) for term in query.split()]
+                return BudgetLineItem.query.filter(*filters).limit(20).all()
+            like_ms, _ = _timed(like, repeat=3)
+            print(f'{query:<24} {fts_ms:>8.2f} {like_ms:>9.2f} {like_ms / fts_ms:>7.1f}x {len(results["line_items"]):>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark: SQLite with default PRAGMAs and without the lookup indexes vs the
+tuned profile (WAL, synchronous=NORMAL, mmap, cache, busy timeout) with the
+indexes from upgrade_schema().
+
+Each profile runs in a fresh subprocess against its own scratch database
+seeded with the same analyses, line items and comparisons, and times the
+queries the app issues against them plus small upload-sized write
+transactions.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profile [--analyses 10000] [--items 20] [--comparisons 2000]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Indexes the "before" profile runs without
+LOOKUP_INDEXES = [
+    'ix_budget_analyses_upload_date_id',
+    'ix_budget_analyses_risk_level_upload_date',
+    'ix_budget_line_items_analysis_line',
+    'ix_budget_comparisons_analysis2_id',
+]
+
+RISK_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+
+
+def _seed(db, n_analyses, n_items, n_comparisons):
+    from sqlalchemy import insert
+    from database_models import BudgetAnalysis, BudgetComparison, BudgetLineItem
+
+    rng = np.random.default_rng(0)
+    start = datetime(2024, 1, 1)
+    ids = [f'analysis-{i:06d}' for i in range(n_analyses)]
+    db.session.execute(insert(BudgetAnalysis.__table__), [
+        {'id': analysis_id, 'filename': f'budget-{i}.csv', 'upload_date': start + timedelta(minutes=int(rng.integers(0, 10 ** 6))),
+         'total_budget': float(rng.integers(10 ** 4, 10 ** 7)), 'line_items': n_items,
+         'risk_level': RISK_LEVELS[int(rng.integers(0, 4))], 'dataframe_json': '', 'content_version': 1}
+        for i, analysis_id in enumerate(ids)
+    ])
+    for chunk in range(0, n_analyses, 500):
+        db.session.execute(insert(BudgetLineItem.__table__), [
+            {'analysis_id': analysis_id, 'category': 'Camera', 'department': 'Camera', 'description': f'Item {line}',
+             'amount': float(line * 100), 'is_flagged': False, 'line_number': line}
+            for analysis_id in ids[chunk:chunk + 500] for line in range(1, n_items + 1)
+        ])
+    pairs = rng.choice(n_analyses, size=(n_comparisons, 2))
+    db.session.execute(insert(BudgetComparison.__table__), [
+        {'analysis1_id': ids[a], 'analysis2_id': ids[b], 'algorithm_version': i, 'comparison_data_json': '{}'}
+        for i, (a, b) in enumerate(pairs)
+    ])
+    db.session.commit()
+    return ids
+
+
+def _timed(label, fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f'{label}\t{elapsed / repeat * 1000:.3f}')
+
+
+def _child(profile, n_analyses, n_items, n_comparisons):
+    tmp = tempfile.mkdtemp(prefix='bench-sqlite-')
+    os.environ.update({
+        'SECRET_KEY': 'bench',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(tmp, 'uploads'),
+        'OUTPUT_FOLDER': os.path.join(tmp, 'outputs'),
+        'SQLITE_TUNING': '1' if profile == 'tuned' else '0',
+    })
+    import dotenv
+    dotenv.load_dotenv = lambda *args, **kwargs: False
+    from sqlalchemy import insert, text
+    from web_app import app
+    from database_models import db, BudgetAnalysis, BudgetComparison, BudgetLineItem, get_recent_analyses, search_analyses
+
+    with app.app_context():
+        if profile == 'default':
+            for name in LOOKUP_INDEXES:
+                db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+            db.session.commit()
+        ids = _seed(db, n_analyses, n_items, n_comparisons)
+        rng = np.random.default_rng(1)
+        picks = [ids[i] for i in rng.integers(0, len(ids), 1000)]
+
+        _timed('recent analyses (limit 10)', lambda i: get_recent_analyses(limit=10), 200)
+        _timed('search by risk level', lambda i: search_analyses(risk_level=RISK_LEVELS[i % 4])[:20], 20)
+        _timed('line items of an analysis', lambda i: BudgetLineItem.query.filter_by(analysis_id=picks[i]).all(), 500)
+        _timed('comparisons as second analysis', lambda i: BudgetComparison.query.filter_by(analysis2_id=picks[i]).all(), 500)
+
+        def delete_line_items(i):
+            db.session.query(BudgetLineItem).filter_by(analysis_id=picks[500 + i]).delete()
+            db.session.commit()
+        _timed('delete line items of an analysis', delete_line_items, 200)
+
+        def upload_transaction(i):
+            analysis_id = f'upload-{i:05d}'
+            db.session.execute(insert(BudgetAnalysis.__table__), [{
+                'id': analysis_id, 'filename': 'new.csv', 'upload_date': datetime.now(), 'total_budget': 1.0,
+                'line_items': n_items, 'dataframe_json': '', 'content_version': 1
+            }])
+            db.session.execute(insert(BudgetLineItem.__table__), [
+                {'analysis_id': analysis_id, 'amount': 1.0, 'is_flagged': False, 'line_number': line}
+                for line in range(1, n_items + 1)
+            ])
+            db.session.commit()
+        _timed('upload-sized write transaction', upload_transaction, 300)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        _child(sys.argv[2], *map(int, sys.argv[3:6]))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyses', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--comparisons', type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for profile in ('default', 'tuned'):
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_sqlite_profile', '--child', profile,
+             str(args.analyses), str(args.items), str(args.comparisons)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results[profile] = dict(line.rsplit('\t', 1) for line in out.splitlines() if '\t' in line)
+
+    print(f'{args.analyses:,} analyses, {args.analyses * args.items:,} line items, {args.comparisons:,} comparisons (ms per operation)')
+    print(f"{'operation':<34} {'default':>10} {'tuned':>10} {'speedup':>8}")
+    for label, before in results['default'].items():
+        before, after = float(before), float(results['tuned'][label])
+        print(f'{label:<34} {before:>10.3f} {after:>10.3f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
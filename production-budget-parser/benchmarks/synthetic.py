@@ -0,0 +1,66 @@
+"""
+Synthetic budget generator for benchmarks and tests.
+Produces DataFrames shaped like uploaded budget CSVs at any size.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEPARTMENTS = [
+    'Camera', 'Grip & Electric', 'Locations', 'Cast', 'Art', 'Wardrobe',
+    'Post-Production', 'VFX', 'Stunts', 'Transportation', 'Production', 'Legal'
+]
+
+CATEGORIES = [
+    'Above the Line', 'Production', 'Post', 'Other', 'Equipment', 'Talent',
+    'Location', 'Insurance'
+]
+
+DESCRIPTIONS = [
+    'Camera package rental', 'Crane operator', 'Exterior night shoot', 'Principal cast fees',
+    'Location permit', 'International travel', 'Delivery schedule buffer', 'VFX compositing',
+    'Stunt coordinator', 'Practical effects', 'Insurance liability', 'Catering',
+    'Office supplies', 'Set dressing', 'Wardrobe fittings', 'Editorial', 'Sound mix',
+    'Color grade', 'Background performers', 'Drone aerial unit', 'Green screen stage',
+    'Picture vehicles', 'Contingency', 'Production assistant wages'
+]
+
+VENDORS = [
+    'Panavision', 'Keslow Camera', 'Cinelease', 'Location Partners', 'Talent Agency Plus',
+    'Prime Logistics', 'Quality Catering', 'Elite Consulting', 'Design Hub', 'Media Experts',
+    'Studio City Rentals', 'Global Services LLC'
+]
+
+NOTES = ['', 'weather dependent', 'rain day cover', 'remote location', 'tight deadline', 'per diem']
+
+
+def make_budget(n_rows, seed=42, unique_suffix=True):
+    """
+    Build a synthetic budget DataFrame.
+
+    Args:
+        n_rows: Number of line items
+        seed: Random seed for reproducible data
+        unique_suffix: Append a scene number to descriptions so text is not
+            entirely repetitive (closer to real consolidated budgets)
+
+    Returns:
+        DataFrame with Category, Department, Description, Vendor, Amount, Notes
+    """
+    rng = np.random.default_rng(seed)
+    descriptions = np.array(DESCRIPTIONS, dtype=object)[rng.integers(0, len(DESCRIPTIONS), n_rows)]
+    if unique_suffix:
+        scenes = rng.integers(1, max(2, n_rows // 20), n_rows).astype(str)
+        descriptions = descriptions + ' - Sc ' + scenes.astype(object)
+
+    notes = np.array(NOTES, dtype=object)[rng.integers(0, len(NOTES), n_rows)]
+    notes[notes == ''] = np.nan
+
+    return pd.DataFrame({
+        'Category': np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), n_rows)],
+        'Department': np.array(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), n_rows)],
+        'Description': descriptions,
+        'Vendor': np.array(VENDORS, dtype=object)[rng.integers(0, len(VENDORS), n_rows)],
+        'Amount': rng.lognormal(mean=8, sigma=1.2, size=n_rows).round(2),
+        'Notes': notes,
+    })
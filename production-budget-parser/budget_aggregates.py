@@ -0,0 +1,235 @@
+"""
+Budget Aggregates
+Department, category, vendor and amount-band totals computed once per upload
+
+Rows are stored in the analysis_aggregates table so page views, exports and
+comparisons read a handful of totals instead of regrouping the line items.
+"""
+
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import exists, insert
+
+from database_models import db, AnalysisAggregate, BudgetAnalysis
+
+logger = logging.getLogger(__name__)
+
+# Aggregate dimension -> budget column
+DIMENSIONS = {
+    'department': 'Department',
+    'category': 'Category',
+    'vendor': 'Vendor',
+}
+
+# Amount bands used by the risk distribution chart (share of the budget total)
+HIGH_BAND_SHARE = 0.10
+MEDIUM_BAND_SHARE = 0.02
+
+_COLUMNS = ['key', 'total', 'count', 'share']
+
+
+class AggregateAccumulator:
+    """
+    Group totals over a budget delivered in row chunks
+
+    Missing keys are kept (as None) so consumers that treat blanks as a group,
+    like budget comparison, see them; display code skips them.
+    """
+
+    def __init__(self, columns, budget_total):
+        self.budget_total = budget_total
+        self.totals = {
+            dimension: {}
+            for dimension, column in DIMENSIONS.items() if column in columns
+        }
+        self.bands = {'high': [0.0, 0], 'medium': [0.0, 0]}
+
+    def add(self, df, profile=None):
+        """Add one chunk of rows (profile: optional BudgetProfile of this chunk)"""
+        if profile is not None:
+            self._add_profile(profile)
+            return
+        self.add_groups(df)
+        self.add_bands(df['Amount'])
+
+    def add_groups(self, df, sign=1):
+        """Add (sign=1) or take out (sign=-1) the group totals of some rows, leaving the amount bands alone"""
+        for dimension, totals in self.totals.items():
+            grouped = df.groupby(DIMENSIONS[dimension], dropna=False, sort=False)['Amount'].agg(['sum', 'size'])
+            self._merge(totals, grouped.index.tolist(), (grouped['sum'] * sign).tolist(), (grouped['size'] * sign).tolist())
+
+    def add_bands(self, amounts):
+        """Add the amount-band totals of some rows (a Series or array of amounts)"""
+        amounts = np.asarray(amounts, dtype=float)
+        high = amounts > self.budget_total * HIGH_BAND_SHARE
+        medium = (amounts > self.budget_total * MEDIUM_BAND_SHARE) & ~high
+        for band, mask in (('high', high), ('medium', medium)):
+            self.bands[band][0] += float(amounts[mask].sum())
+            self.bands[band][1] += int(mask.sum())
+
+    def add_rows(self, rows):
+        """Add the group totals of stored aggregate rows (e.g. another analysis'); amount bands are skipped"""
+        for row in rows:
+            if row.dimension in self.totals:
+                self._merge(self.totals[row.dimension], [row.key], [row.total], [row.count])
+
+    def series(self, dimension):
+        """Totals of one dimension as a Series sorted by key, rows with no value left out"""
+        totals = {key: amount for key, (amount, count) in self.totals[dimension].items() if key is not None and count}
+        return pd.Series(totals, dtype=float).sort_index()
+
+    def _add_profile(self, profile):
+        """Add a chunk from the group totals and masks a BudgetProfile already holds"""
+        for dimension, totals in self.totals.items():
+            group = profile.group(DIMENSIONS[dimension])
+            keys, sums, counts = list(group.keys), group.sums.tolist(), group.counts.tolist()
+            if group.missing_count:
+                keys.append(None)
+                sums.append(group.missing_sum)
+                counts.append(group.missing_count)
+            self._merge(totals, keys, sums, counts)
+
+        amounts = profile.amounts
+        if self.budget_total == profile.total:
+            high = profile.above(HIGH_BAND_SHARE)
+            medium = profile.above(MEDIUM_BAND_SHARE) & ~high
+        else:
+            high = amounts > self.budget_total * HIGH_BAND_SHARE
+            medium = (amounts > self.budget_total * MEDIUM_BAND_SHARE) & ~high
+        for band, mask in (('high', high), ('medium', medium)):
+            self.bands[band][0] += float(amounts[mask].sum())
+            self.bands[band][1] += int(mask.sum())
+
+    @staticmethod
+    def _merge(totals, keys, sums, counts):
+        for key, amount, count in zip(keys, sums, counts):
+            key = None if pd.isna(key) else str(key)
+            entry = totals.setdefault(key, [0.0, 0])
+            entry[0] += amount
+            entry[1] += count
+
+    def rows(self, row_count):
+        """
+        analysis_aggregates rows (without analysis_id), keys sorted per dimension
+
+        Args:
+            row_count: Total number of line items (for the low band count)
+        """
+        def share(amount):
+            return amount / self.budget_total if self.budget_total else 0.0
+
+        rows = []
+        for dimension, totals in self.totals.items():
+            for key in sorted(totals, key=lambda k: (k is None, k or '')):
+                amount, count = totals[key]
+                if not count:
+                    continue  # every row of the group was taken out
+                rows.append({'dimension': dimension, 'key': key, 'total': float(amount), 'count': int(count), 'share': share(amount)})
+
+        high_total, high_count = self.bands['high']
+        medium_total, medium_count = self.bands['medium']
+        low_total = self.budget_total - high_total - medium_total
+        for band, amount, count in (('low', low_total, row_count - high_count - medium_count),
+                                    ('medium', medium_total, medium_count),
+                                    ('high', high_total, high_count)):
+            rows.append({'dimension': 'amount_band', 'key': band, 'total': float(amount), 'count': int(count), 'share': share(amount)})
+        return rows
+
+
+def compute_aggregates(df, budget_total=None, profile=None):
+    """Aggregate rows for a whole budget DataFrame (reusing a BudgetProfile of it when given)"""
+    if budget_total is None:
+        budget_total = profile.total if profile is not None else float(df['Amount'].sum())
+    accumulator = AggregateAccumulator(df.columns, budget_total)
+    accumulator.add(df, profile=profile)
+    return accumulator.rows(len(df))
+
+
+def save_aggregates(analysis_id, rows):
+    """Insert aggregate rows in the current transaction (the caller commits)"""
+    if rows:
+        db.session.execute(insert(AnalysisAggregate.__table__), [{'analysis_id': analysis_id, **row} for row in rows])
+
+
+class BudgetAggregates:
+    """Stored aggregates of one analysis, one DataFrame (key, total, count, share) per dimension"""
+
+    def __init__(self, rows):
+        by_dimension = {}
+        for row in rows:
+            by_dimension.setdefault(row.dimension, []).append((row.key, row.total, row.count, row.share))
+        self._frames = {
+            dimension: pd.DataFrame(values, columns=_COLUMNS)
+            for dimension, values in by_dimension.items()
+        }
+
+    def has(self, dimension):
+        return dimension in self._frames
+
+    def frame(self, dimension, include_missing=False):
+        """Totals for a dimension in key order; missing keys are dropped unless include_missing"""
+        frame = self._frames.get(dimension, pd.DataFrame(columns=_COLUMNS))
+        if not include_missing:
+            frame = frame[frame['key'].notna()]
+        return frame.reset_index(drop=True)
+
+    def ranked(self, dimension, limit=None):
+        """Totals for a dimension, largest first"""
+        frame = self.frame(dimension).sort_values('total', ascending=False)
+        return frame.head(limit) if limit else frame
+
+    def band(self, name):
+        frame = self._frames.get('amount_band')
+        if frame is None:
+            return 0.0
+        return float(frame.loc[frame['key'] == name, 'total'].sum())
+
+
+def _stored_dataframe_aggregates(analysis):
+    df = analysis.get_dataframe(list(DIMENSIONS.values()) + ['Amount'])
+    return compute_aggregates(df, analysis.total_budget)
+
+
+def get_aggregates(analysis):
+    """
+    Load an analysis' aggregates
+
+    Never writes: analyses saved before aggregates existed get them computed
+    from the stored DataFrame for this read only, until backfill_aggregates()
+    (python database_utils.py build-aggregates) stores them.
+    """
+    rows = AnalysisAggregate.query.filter_by(analysis_id=analysis.id).order_by(AnalysisAggregate.id).all()
+    if not rows and analysis.line_items:
+        logger.warning('Analysis %s has no stored aggregates; run build-aggregates', analysis.id)
+        rows = [SimpleNamespace(**row) for row in _stored_dataframe_aggregates(analysis)]
+    return BudgetAggregates(rows)
+
+
+def backfill_aggregates(batch_size=50):
+    """
+    Store aggregates for analyses saved before aggregates existed
+
+    Args:
+        batch_size: analyses built per commit
+
+    Returns:
+        Number of analyses backfilled
+    """
+    missing = ~exists().where(AnalysisAggregate.analysis_id == BudgetAnalysis.id)
+    built = 0
+    last_id = ''
+    while True:
+        # Keyset over id, so an analysis whose DataFrame yields no rows is not retried forever
+        batch = BudgetAnalysis.query.filter(BudgetAnalysis.line_items > 0, BudgetAnalysis.id > last_id, missing) \
+            .order_by(BudgetAnalysis.id).limit(batch_size).all()
+        if not batch:
+            break
+        for analysis in batch:
+            save_aggregates(analysis.id, _stored_dataframe_aggregates(analysis))
+        db.session.commit()
+        built += len(batch)
+        last_id = batch[-1].id
+    return built
@@ -6,10 +6,22 @@ Copyright © 2024-2025. All Rights Reserved.
 PROPRIETARY AND CONFIDENTIAL
 """
 
+import re
+from collections import defaultdict
+
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Any
 
+# Bump when compare_budgets output changes, so stored comparisons are recomputed
+COMPARISON_ALGORITHM_VERSION = 2
+
+# Fuzzy matching of renamed line items (see fuzzy_match_items)
+FUZZY_MATCH_THRESHOLD = 0.6
+# Tokens shared by more candidates than this in one department block are too
+# common to suggest a rename and are not used to pair items
+FUZZY_MAX_TOKEN_BUCKET = 50
+
 
 def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -34,30 +46,26 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def calculate_department_changes(df1: pd.DataFrame, df2: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+def _total_changes(totals1, totals2, skip=()) -> Dict[str, Dict[str, float]]:
     """
-    Calculate changes at department level
+    Change records for two mappings of group name -> total amount
     """
     changes = {}
     
-    if 'Department' not in df1.columns or 'Department' not in df2.columns:
-        return changes
-    
-    # Get department totals for both budgets
-    dept1 = df1.groupby('Department')['Amount'].sum()
-    dept2 = df2.groupby('Department')['Amount'].sum()
-    
-    # Get all unique departments
-    all_depts = set(dept1.index) | set(dept2.index)
+    # Get all unique groups
+    all_keys = set(totals1.keys()) | set(totals2.keys())
     
-    for dept in all_depts:
-        amount1 = dept1.get(dept, 0)
-        amount2 = dept2.get(dept, 0)
+    for key in all_keys:
+        if key in skip:
+            continue
+            
+        amount1 = totals1.get(key, 0)
+        amount2 = totals2.get(key, 0)
         
         difference = amount2 - amount1
         percent_change = ((amount2 - amount1) / amount1 * 100) if amount1 > 0 else (100 if amount2 > 0 else 0)
         
-        changes[dept] = {
+        changes[key] = {
             'budget1_amount': float(amount1),
             'budget2_amount': float(amount2),
             'difference': float(difference),
@@ -68,145 +76,242 @@ def calculate_department_changes(df1: pd.DataFrame, df2: pd.DataFrame) -> Dict[s
     return changes
 
 
-def calculate_category_changes(df1: pd.DataFrame, df2: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+def aggregate_totals(aggregates, dimension: str) -> Dict[str, float]:
+    """
+    Group totals from stored analysis aggregates, keyed the way
+    normalize_dataframe leaves the column (blank for missing, stripped)
+    
+    Returns:
+        Dictionary of totals, or None if the budget has no such column
+    """
+    if not aggregates.has(dimension):
+        return None
+    
+    frame = aggregates.frame(dimension, include_missing=True)
+    totals = {}
+    for key, total in zip(frame['key'].tolist(), frame['total'].tolist()):
+        key = '' if pd.isna(key) else key.strip()
+        totals[key] = totals.get(key, 0) + total
+    return totals
+
+
+def _group_changes(df1: pd.DataFrame, df2: pd.DataFrame, column: str,
+                   aggregates1=None, aggregates2=None, skip=()) -> Dict[str, Dict[str, float]]:
+    if aggregates1 is not None and aggregates2 is not None:
+        totals1 = aggregate_totals(aggregates1, column.lower())
+        totals2 = aggregate_totals(aggregates2, column.lower())
+        if totals1 is None or totals2 is None:
+            return {}
+        return _total_changes(totals1, totals2, skip)
+    
+    if column not in df1.columns or column not in df2.columns:
+        return {}
+    
+    # Get group totals for both budgets
+    totals1 = df1.groupby(column)['Amount'].sum()
+    totals2 = df2.groupby(column)['Amount'].sum()
+    return _total_changes(totals1, totals2, skip)
+
+
+def calculate_department_changes(df1: pd.DataFrame, df2: pd.DataFrame,
+                                 aggregates1=None, aggregates2=None) -> Dict[str, Dict[str, float]]:
+    """
+    Calculate changes at department level
+    """
+    return _group_changes(df1, df2, 'Department', aggregates1, aggregates2)
+
+
+def calculate_category_changes(df1: pd.DataFrame, df2: pd.DataFrame,
+                               aggregates1=None, aggregates2=None) -> Dict[str, Dict[str, float]]:
     """
     Calculate changes at category level
     """
-    changes = {}
-    
-    if 'Category' not in df1.columns or 'Category' not in df2.columns:
-        return changes
-    
-    # Get category totals for both budgets
-    cat1 = df1.groupby('Category')['Amount'].sum()
-    cat2 = df2.groupby('Category')['Amount'].sum()
-    
-    # Get all unique categories
-    all_cats = set(cat1.index) | set(cat2.index)
-    
-    for cat in all_cats:
-        amount1 = cat1.get(cat, 0)
-        amount2 = cat2.get(cat, 0)
-        
-        difference = amount2 - amount1
-        percent_change = ((amount2 - amount1) / amount1 * 100) if amount1 > 0 else (100 if amount2 > 0 else 0)
-        
-        changes[cat] = {
-            'budget1_amount': float(amount1),
-            'budget2_amount': float(amount2),
-            'difference': float(difference),
-            'percent_change': float(percent_change),
-            'status': 'increased' if difference > 0 else ('decreased' if difference < 0 else 'unchanged')
-        }
-    
-    return changes
+    return _group_changes(df1, df2, 'Category', aggregates1, aggregates2)
 
 
-def calculate_vendor_changes(df1: pd.DataFrame, df2: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+def calculate_vendor_changes(df1: pd.DataFrame, df2: pd.DataFrame,
+                             aggregates1=None, aggregates2=None) -> Dict[str, Dict[str, float]]:
     """
     Calculate changes at vendor level
     """
-    changes = {}
+    return _group_changes(df1, df2, 'Vendor', aggregates1, aggregates2, skip=('', 'nan'))
+
+
+# Columns that identify a line item across budget revisions
+LINE_ITEM_KEY_COLUMNS = ['Description', 'Department', 'Category']
+
+
+def line_item_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Matching key of every row: "Description_Department_Category"
     
-    if 'Vendor' not in df1.columns or 'Vendor' not in df2.columns:
-        return changes
+    Missing columns contribute an empty string and missing values 'nan',
+    as the row-wise f-string this replaces did.
+    """
+    key = None
+    for column in LINE_ITEM_KEY_COLUMNS:
+        if column in df.columns:
+            part = df[column].astype(str).fillna('nan')
+        else:
+            part = pd.Series('', index=df.index, dtype=str)
+        key = part if key is None else key + '_' + part
+    return key.reset_index(drop=True)
+
+
+def _item_records(df: pd.DataFrame, positions: np.ndarray) -> List[Dict[str, Any]]:
+    """Item dicts for the rows at positions, largest amount first"""
+    rows = df.iloc[positions]
+    
+    def text(column):
+        return [str(value) for value in rows[column].tolist()] if column in rows.columns else ['N/A'] * len(rows)
+    
+    amounts = rows['Amount'].astype(float).tolist() if 'Amount' in rows.columns else [0.0] * len(rows)
+    items = [
+        {'description': description, 'department': department, 'category': category,
+         'vendor': vendor, 'amount': amount}
+        for description, department, category, vendor, amount in zip(
+            text('Description'), text('Department'), text('Category'), text('Vendor'), amounts)
+    ]
+    return sorted(items, key=lambda x: x['amount'], reverse=True)
+
+
+def match_line_items(df1: pd.DataFrame, df2: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Match the line items of two budgets in one pass
+    
+    Keys are built once per DataFrame and the distinct keys of both sides are
+    joined with a single outer merge; its indicator column says whether a key
+    is new, removed or matched. Like the original per-key lookups, the first
+    row with a key stands for it. The input DataFrames are not modified.
+    
+    Returns:
+        Dictionary with 'new_items' and 'removed_items' (item dicts, largest
+        amount first) and 'matched' (DataFrame of key, row1, row2: positions
+        of the first row with that key in each budget)
+    """
+    keys1 = line_item_keys(df1)
+    keys2 = line_item_keys(df2)
+    first1 = keys1[~keys1.duplicated()]
+    first2 = keys2[~keys2.duplicated()]
+    
+    joined = pd.merge(
+        pd.DataFrame({'key': first1.to_numpy(), 'row1': first1.index.to_numpy()}),
+        pd.DataFrame({'key': first2.to_numpy(), 'row2': first2.index.to_numpy()}),
+        on='key', how='outer', sort=False, indicator=True
+    )
+    side = joined['_merge']
+    
+    matched = joined.loc[side == 'both', ['key', 'row1', 'row2']].astype({'row1': int, 'row2': int})
+    return {
+        'new_items': _item_records(df2, joined.loc[side == 'right_only', 'row2'].to_numpy(dtype=int)),
+        'removed_items': _item_records(df1, joined.loc[side == 'left_only', 'row1'].to_numpy(dtype=int)),
+        'matched': matched.reset_index(drop=True)
+    }
+
+
+def _description_tokens(text: str) -> frozenset:
+    return frozenset(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def _trigrams(tokens: frozenset) -> frozenset:
+    text = f" {' '.join(sorted(tokens))} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+def description_similarity(description1: str, description2: str) -> float:
+    """
+    Similarity of two line item descriptions between 0 and 1
     
-    # Get vendor totals for both budgets
-    vendor1 = df1.groupby('Vendor')['Amount'].sum()
-    vendor2 = df2.groupby('Vendor')['Amount'].sum()
+    Average of the Dice coefficients of their word tokens and of the
+    character trigrams of the sorted tokens, so both reordered words
+    ("Camera package rental" / "Rental, camera package") and small spelling
+    changes score high.
+    """
+    tokens1, tokens2 = _description_tokens(description1), _description_tokens(description2)
+    return (_dice(tokens1, tokens2) + _dice(_trigrams(tokens1), _trigrams(tokens2))) / 2
+
+
+def fuzzy_match_items(removed_items: List[Dict[str, Any]], new_items: List[Dict[str, Any]],
+                      threshold: float = FUZZY_MATCH_THRESHOLD,
+                      max_bucket: int = FUZZY_MAX_TOKEN_BUCKET) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Pair removed and new line items that look like the same item renamed
     
-    # Get all unique vendors
-    all_vendors = set(vendor1.index) | set(vendor2.index)
+    Candidates are found through a blocking index instead of scoring every
+    pair: items are grouped by department, and within a department only
+    items sharing at least one description token are scored (tokens in more
+    than max_bucket items of the block are ignored as too common). Pairs
+    scoring at least threshold are taken best first, each item at most once.
     
-    for vendor in all_vendors:
-        if vendor == '' or vendor == 'nan':
+    Returns:
+        (modified items, removed items left, new items left); modified items
+        carry both descriptions and amounts, the amount change and the
+        similarity, largest absolute change first
+    """
+    blocks = defaultdict(lambda: (defaultdict(list), defaultdict(list)))
+    removed_tokens = [_description_tokens(item['description']) for item in removed_items]
+    new_tokens = [_description_tokens(item['description']) for item in new_items]
+    for side, items, tokens in ((0, removed_items, removed_tokens), (1, new_items, new_tokens)):
+        for index, (item, item_tokens) in enumerate(zip(items, tokens)):
+            buckets = blocks[item['department'].strip().lower()][side]
+            for token in item_tokens:
+                buckets[token].append(index)
+    
+    candidates = []
+    for removed_buckets, new_buckets in blocks.values():
+        pairs = set()
+        for token, removed_indexes in removed_buckets.items():
+            new_indexes = new_buckets.get(token)
+            if not new_indexes or len(removed_indexes) + len(new_indexes) > max_bucket:
+                continue
+            pairs.update((r, n) for r in removed_indexes for n in new_indexes)
+        for r, n in pairs:
+            score = description_similarity(removed_items[r]['description'], new_items[n]['description'])
+            if score >= threshold:
+                candidates.append((-score, r, n))
+    
+    modified = []
+    used_removed, used_new = set(), set()
+    for negative_score, r, n in sorted(candidates):
+        if r in used_removed or n in used_new:
             continue
-            
-        amount1 = vendor1.get(vendor, 0)
-        amount2 = vendor2.get(vendor, 0)
-        
-        difference = amount2 - amount1
-        percent_change = ((amount2 - amount1) / amount1 * 100) if amount1 > 0 else (100 if amount2 > 0 else 0)
-        
-        changes[vendor] = {
-            'budget1_amount': float(amount1),
-            'budget2_amount': float(amount2),
-            'difference': float(difference),
-            'percent_change': float(percent_change),
-            'status': 'increased' if difference > 0 else ('decreased' if difference < 0 else 'unchanged')
-        }
+        used_removed.add(r)
+        used_new.add(n)
+        before, after = removed_items[r], new_items[n]
+        modified.append({
+            **after,
+            'previous_description': before['description'],
+            'previous_category': before['category'],
+            'previous_vendor': before['vendor'],
+            'previous_amount': before['amount'],
+            'amount_change': after['amount'] - before['amount'],
+            'similarity': round(-negative_score, 3)
+        })
     
-    return changes
+    modified.sort(key=lambda x: abs(x['amount_change']), reverse=True)
+    return (
+        modified,
+        [item for i, item in enumerate(removed_items) if i not in used_removed],
+        [item for i, item in enumerate(new_items) if i not in used_new]
+    )
 
 
 def identify_new_items(df1: pd.DataFrame, df2: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Identify items that appear in budget2 but not in budget1
     """
-    new_items = []
-    
-    # Create a composite key for matching items
-    df1['_key'] = df1.apply(lambda x: f"{x.get('Description', '')}_{x.get('Department', '')}_{x.get('Category', '')}", axis=1)
-    df2['_key'] = df2.apply(lambda x: f"{x.get('Description', '')}_{x.get('Department', '')}_{x.get('Category', '')}", axis=1)
-    
-    # Find keys in df2 that aren't in df1
-    keys1 = set(df1['_key'])
-    keys2 = set(df2['_key'])
-    new_keys = keys2 - keys1
-    
-    for key in new_keys:
-        item = df2[df2['_key'] == key].iloc[0]
-        new_items.append({
-            'description': str(item.get('Description', 'N/A')),
-            'department': str(item.get('Department', 'N/A')),
-            'category': str(item.get('Category', 'N/A')),
-            'vendor': str(item.get('Vendor', 'N/A')),
-            'amount': float(item.get('Amount', 0))
-        })
-    
-    # Clean up temporary column
-    df1.drop('_key', axis=1, inplace=True)
-    df2.drop('_key', axis=1, inplace=True)
-    
-    # Sort by amount descending
-    new_items = sorted(new_items, key=lambda x: x['amount'], reverse=True)
-    
-    return new_items
+    return match_line_items(df1, df2)['new_items']
 
 
 def identify_removed_items(df1: pd.DataFrame, df2: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Identify items that appear in budget1 but not in budget2
     """
-    removed_items = []
-    
-    # Create a composite key for matching items
-    df1['_key'] = df1.apply(lambda x: f"{x.get('Description', '')}_{x.get('Department', '')}_{x.get('Category', '')}", axis=1)
-    df2['_key'] = df2.apply(lambda x: f"{x.get('Description', '')}_{x.get('Department', '')}_{x.get('Category', '')}", axis=1)
-    
-    # Find keys in df1 that aren't in df2
-    keys1 = set(df1['_key'])
-    keys2 = set(df2['_key'])
-    removed_keys = keys1 - keys2
-    
-    for key in removed_keys:
-        item = df1[df1['_key'] == key].iloc[0]
-        removed_items.append({
-            'description': str(item.get('Description', 'N/A')),
-            'department': str(item.get('Department', 'N/A')),
-            'category': str(item.get('Category', 'N/A')),
-            'vendor': str(item.get('Vendor', 'N/A')),
-            'amount': float(item.get('Amount', 0))
-        })
-    
-    # Clean up temporary column
-    df1.drop('_key', axis=1, inplace=True)
-    df2.drop('_key', axis=1, inplace=True)
-    
-    # Sort by amount descending
-    removed_items = sorted(removed_items, key=lambda x: x['amount'], reverse=True)
-    
-    return removed_items
+    return match_line_items(df1, df2)['removed_items']
 
 
 def generate_insights(comparison_data: Dict[str, Any], threshold: float = 10.0) -> List[str]:
@@ -270,6 +375,13 @@ def generate_insights(comparison_data: Dict[str, Any], threshold: float = 10.0)
             f"This represents {(total_removed / comparison_data['budget1_total'] * 100):.1f}% of the original budget."
         )
     
+    # Renamed items insight
+    if comparison_data.get('total_modified_items', 0) > 0:
+        insights.append(
+            f"Matched {comparison_data['total_modified_items']} renamed line items "
+            f"(net change ${comparison_data['modified_items_change']:+,.0f}) instead of counting them as removed and re-added."
+        )
+    
     # Vendor changes
     vendor_changes = comparison_data.get('vendor_changes', {})
     new_vendors = [v for v, data in vendor_changes.items() if data['budget1_amount'] == 0]
@@ -312,7 +424,9 @@ def generate_insights(comparison_data: Dict[str, Any], threshold: float = 10.0)
 
 def compare_budgets(df1: pd.DataFrame, df2: pd.DataFrame, 
                    budget1_name: str = "Budget 1", 
-                   budget2_name: str = "Budget 2") -> Dict[str, Any]:
+                   budget2_name: str = "Budget 2",
+                   aggregates1=None, aggregates2=None,
+                   fuzzy: bool = False) -> Dict[str, Any]:
     """
     Main comparison function that analyzes two budgets comprehensively
     
@@ -321,6 +435,12 @@ def compare_budgets(df1: pd.DataFrame, df2: pd.DataFrame,
         df2: Second budget DataFrame
         budget1_name: Name/label for first budget (e.g., "Q1 2025")
         budget2_name: Name/label for second budget (e.g., "Q2 2025")
+        aggregates1, aggregates2: optional BudgetAggregates of each budget;
+            when both are given, department/category/vendor changes are
+            computed from them instead of regrouping the rows
+        fuzzy: also pair removed and new items whose descriptions look like
+            a rename (see fuzzy_match_items); they are reported as modified
+            items instead of one removal plus one addition
     
     Returns:
         Dictionary containing comprehensive comparison data
@@ -336,13 +456,17 @@ def compare_budgets(df1: pd.DataFrame, df2: pd.DataFrame,
     percent_change = ((total2 - total1) / total1 * 100) if total1 > 0 else 0
     
     # Calculate detailed changes
-    department_changes = calculate_department_changes(df1, df2)
-    category_changes = calculate_category_changes(df1, df2)
-    vendor_changes = calculate_vendor_changes(df1, df2)
-    
-    # Identify new and removed items
-    new_items = identify_new_items(df1, df2)
-    removed_items = identify_removed_items(df1, df2)
+    department_changes = calculate_department_changes(df1, df2, aggregates1, aggregates2)
+    category_changes = calculate_category_changes(df1, df2, aggregates1, aggregates2)
+    vendor_changes = calculate_vendor_changes(df1, df2, aggregates1, aggregates2)
+    
+    # Identify new and removed items (one matching pass for both)
+    matches = match_line_items(df1, df2)
+    new_items = matches['new_items']
+    removed_items = matches['removed_items']
+    modified_items = []
+    if fuzzy:
+        modified_items, removed_items, new_items = fuzzy_match_items(removed_items, new_items)
     
     # Build comparison result
     comparison_data = {
@@ -360,8 +484,11 @@ def compare_budgets(df1: pd.DataFrame, df2: pd.DataFrame,
         'vendor_changes': vendor_changes,
         'new_items': new_items[:10],  # Top 10 new items
         'removed_items': removed_items[:10],  # Top 10 removed items
+        'modified_items': modified_items[:10],  # Top 10 renamed items by amount change
         'total_new_items': len(new_items),
         'total_removed_items': len(removed_items),
+        'total_modified_items': len(modified_items),
+        'modified_items_change': float(sum(item['amount_change'] for item in modified_items)),
     }
     
     # Generate AI insights
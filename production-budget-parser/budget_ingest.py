@@ -0,0 +1,243 @@
+"""
+Budget Ingestion
+Bulk loading of budget line items into the database
+
+Line items are written with batched executemany inserts, or streamed with
+COPY ... FROM STDIN on PostgreSQL (psycopg or psycopg2 driver), and added
+to the full-text search index and the line item count once per load (see
+search_index.py and dashboard_stats.py).
+"""
+
+import csv
+import io
+import logging
+import time
+
+from sqlalchemy import bindparam, delete, insert, select
+
+from database_models import db, BudgetLineItem
+from dashboard_stats import add_line_items
+from search_index import indexing_line_items
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany batch when writing budget_line_items
+DEFAULT_CHUNK_SIZE = 5000
+
+# Columns written for each line item, in COPY order
+LINE_ITEM_COLUMNS = ('analysis_id', 'category', 'department', 'description', 'vendor', 'amount', 'is_flagged', 'line_number')
+
+
+def _text_values(df, column, default='', max_length=None):
+    """
+    Column values as strings (str() of each value, like the per-row ORM path did)
+    
+    Values are cut to max_length, the size of the target column, which
+    PostgreSQL enforces and SQLite does not.
+    """
+    if column not in df.columns:
+        return [default] * len(df)
+    values = map(str, df[column].tolist())
+    if max_length:
+        return [value[:max_length] for value in values]
+    return list(values)
+
+
+def line_item_rows(df, analysis_id, start_line=1, line_numbers=None):
+    """
+    Build budget_line_items rows straight from DataFrame columns
+    
+    Args:
+        df: pandas DataFrame with budget data (Amount already numeric)
+        analysis_id: ID of the owning BudgetAnalysis
+        start_line: Line number of the first row
+        line_numbers: optional line number of each row (overrides start_line)
+        
+    Yields:
+        dict: One row per line item, keyed by column name
+    """
+    if line_numbers is None:
+        line_numbers = range(start_line, start_line + len(df))
+    table = BudgetLineItem.__table__
+    columns = zip(
+        _text_values(df, 'Category', max_length=table.c.category.type.length),
+        _text_values(df, 'Department', max_length=table.c.department.type.length),
+        _text_values(df, 'Description', max_length=table.c.description.type.length),
+        _text_values(df, 'Vendor', max_length=table.c.vendor.type.length),
+        df['Amount'].astype(float).tolist() if 'Amount' in df.columns else [0.0] * len(df),
+    )
+    for line_number, (category, department, description, vendor, amount) in zip(map(int, line_numbers), columns):
+        yield {
+            'analysis_id': analysis_id,
+            'category': category,
+            'department': department,
+            'description': description,
+            'vendor': vendor,
+            'amount': amount,
+            'is_flagged': False,
+            'line_number': line_number,
+        }
+
+
+def _copy_rows(connection, rows, chunk_size):
+    """
+    Stream line item rows into PostgreSQL with COPY ... FROM STDIN
+    
+    Runs on the session's own DBAPI connection, so the rows share the
+    caller's transaction.
+    
+    Returns:
+        int: Number of rows copied, or None when the driver has no COPY
+        support (the caller falls back to executemany)
+    """
+    driver = connection.dialect.driver
+    if driver not in ('psycopg', 'psycopg2'):
+        return None
+    
+    statement = f"COPY {BudgetLineItem.__tablename__} ({', '.join(LINE_ITEM_COLUMNS)}) FROM STDIN"
+    raw = connection.connection.driver_connection
+    copied = 0
+    if driver == 'psycopg':
+        with raw.cursor() as cursor, cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in LINE_ITEM_COLUMNS])
+                copied += 1
+        return copied
+    
+    # psycopg2: CSV batches; strings are quoted so empty values stay '' rather than NULL
+    with raw.cursor() as cursor:
+        batch = []
+        for row in rows:
+            batch.append([row[column] for column in LINE_ITEM_COLUMNS])
+            if len(batch) >= chunk_size:
+                copied += _copy_csv_batch(cursor, statement, batch)
+                batch = []
+        if batch:
+            copied += _copy_csv_batch(cursor, statement, batch)
+    return copied
+
+
+def _copy_csv_batch(cursor, statement, batch):
+    """One COPY of rows as CSV through a psycopg2 cursor"""
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(batch)
+    buffer.seek(0)
+    cursor.copy_expert(f'{statement} WITH (FORMAT csv)', buffer)
+    return len(batch)
+
+
+def bulk_insert_line_items(df, analysis_id, chunk_size=DEFAULT_CHUNK_SIZE, start_line=1, session=None, line_numbers=None):
+    """
+    Insert all line items of a budget with batched Core inserts
+    
+    Rows are written in fixed-size executemany batches on the current
+    session, so they share the caller's transaction; the caller commits.
+    On PostgreSQL they are streamed with COPY instead, which avoids the
+    per-statement round trips of executemany.
+    
+    Args:
+        df: pandas DataFrame with budget data
+        analysis_id: ID of the owning BudgetAnalysis
+        chunk_size: Rows per batch
+        start_line: Line number of the first row
+        session: SQLAlchemy session (defaults to db.session)
+        line_numbers: optional line number of each row (overrides start_line)
+        
+    Returns:
+        int: Number of rows inserted
+    """
+    session = session or db.session
+    statement = insert(BudgetLineItem.__table__)
+    chunk_size = max(1, int(chunk_size))
+    
+    started = time.perf_counter()
+    rows = line_item_rows(df, analysis_id, start_line, line_numbers)
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        copied = _copy_rows(connection, rows, chunk_size)
+        if copied is not None:
+            elapsed = time.perf_counter() - started
+            logger.info(
+                'Copied %d line items for %s in %.3fs (%.0f rows/s, COPY)',
+                copied, analysis_id, elapsed, copied / elapsed if elapsed > 0 else 0
+            )
+            return copied
+    
+    inserted = 0
+    batch = []
+    with indexing_line_items(session, analysis_id):
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                session.execute(statement, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            session.execute(statement, batch)
+            inserted += len(batch)
+    add_line_items(session, inserted)
+    
+    elapsed = time.perf_counter() - started
+    logger.info(
+        'Ingested %d line items for %s in %.3fs (%.0f rows/s, chunk size %d)',
+        inserted, analysis_id, elapsed, inserted / elapsed if elapsed > 0 else 0, chunk_size
+    )
+    return inserted
+
+
+def delete_line_items(analysis_id, session=None):
+    """Delete the line items of an analysis (the caller commits); returns the number deleted"""
+    session = session or db.session
+    table = BudgetLineItem.__table__
+    return session.execute(delete(table).where(table.c.analysis_id == analysis_id)).rowcount
+
+
+def copy_line_items(source_id, analysis_id, runs, session=None):
+    """
+    Copy line items of another analysis inside the database
+    
+    Each run is one INSERT ... SELECT of a block of consecutive source line
+    numbers, shifted by a fixed offset, so unchanged rows of a budget
+    revision never pass through Python. The statement is compiled once and
+    the runs are passed to the driver's executemany as plain parameter
+    tuples, since a revision with scattered edits has tens of thousands of
+    runs. The caller commits.
+    
+    Args:
+        source_id: ID of the BudgetAnalysis to copy from
+        analysis_id: ID of the owning BudgetAnalysis
+        runs: (first line, last line, offset) tuples of source line numbers
+        session: SQLAlchemy session (defaults to db.session)
+        
+    Returns:
+        int: Number of runs copied
+    """
+    session = session or db.session
+    if not len(runs):
+        return 0
+    
+    table = BudgetLineItem.__table__
+    copied = [column for column in table.columns if column.name not in ('id', 'analysis_id', 'line_number')]
+    statement = insert(table).from_select(
+        ['analysis_id', 'line_number'] + [column.name for column in copied],
+        select(bindparam('analysis_id'), table.c.line_number + bindparam('offset'), *copied).where(
+            table.c.analysis_id == bindparam('source_id'),
+            table.c.line_number.between(bindparam('first'), bindparam('last'))
+        )
+    )
+    connection = session.connection()
+    compiled = statement.compile(dialect=connection.dialect)
+    params = [
+        {'analysis_id': analysis_id, 'source_id': source_id, 'first': int(first), 'last': int(last), 'offset': int(offset)}
+        for first, last, offset in runs
+    ]
+    if compiled.positional:
+        params = [tuple(run[name] for name in compiled.positiontup) for run in params]
+    
+    started = time.perf_counter()
+    with indexing_line_items(session, analysis_id):
+        result = connection.exec_driver_sql(compiled.string, params)
+    add_line_items(session, result.rowcount)
+    logger.info('Copied line items of %s for %s in %d runs in %.3fs',
+                source_id, analysis_id, len(runs), time.perf_counter() - started)
+    return len(runs)
@@ -55,9 +55,15 @@ def optimize_budget(file_path, output_dir="data/output"):
         print(f"Error loading budget: {str(e)}")
         return False
 
-def find_optimizations(budget_df):
-    """Find potential cost optimization opportunities"""
-    total_budget = budget_df["Amount"].sum()
+def find_optimizations(budget_df, profile=None):
+    """
+    Find potential cost optimization opportunities
+    
+    Args:
+        budget_df: DataFrame with budget data
+        profile: optional BudgetProfile of budget_df (reuses its totals and masks)
+    """
+    total_budget = profile.total if profile is not None else budget_df["Amount"].sum()
     
     # Industry benchmarks (these would be refined with real data)
     benchmarks = {
@@ -85,7 +91,10 @@ def find_optimizations(budget_df):
     
     # 1. Check department allocations
     if "Department" in budget_df.columns:
-        dept_totals = budget_df.groupby("Department")["Amount"].sum()
+        if profile is not None:
+            dept_totals = profile.group("Department").series()
+        else:
+            dept_totals = budget_df.groupby("Department")["Amount"].sum()
         dept_percentages = dept_totals / total_budget
         
         for dept, benchmark_pct in benchmarks["departments"].items():
@@ -114,7 +123,10 @@ def find_optimizations(budget_df):
     
     # 2. Check for excessively high-cost items
     high_threshold = benchmarks["high_cost_threshold"] * total_budget
-    high_cost_items = budget_df[budget_df["Amount"] > high_threshold]
+    if profile is not None:
+        high_cost_items = budget_df[profile.above(benchmarks["high_cost_threshold"])]
+    else:
+        high_cost_items = budget_df[budget_df["Amount"] > high_threshold]
     
     for _, row in high_cost_items.iterrows():
         excess = row["Amount"] - high_threshold
@@ -130,7 +142,10 @@ def find_optimizations(budget_df):
         optimizations["potential_savings"] += excess
     
     # 3. Check contingency
-    contingency_items = budget_df[budget_df["Description"].str.contains("Contingency", case=False)]
+    if profile is not None:
+        contingency_items = budget_df[profile.contains("Description", "Contingency")]
+    else:
+        contingency_items = budget_df[budget_df["Description"].str.contains("Contingency", case=False)]
     
     if not contingency_items.empty:
         contingency_total = contingency_items["Amount"].sum()
@@ -0,0 +1,124 @@
+"""
+Budget Profile
+Shared statistics of one budget DataFrame, computed once per upload
+
+Risk analysis, optimizations, aggregates and charts all need the budget
+total, per-department/category/vendor sums, high-cost masks and the
+factorized text columns. BudgetProfile computes each of these at most once
+(lazily, with NumPy on factorized codes) so the consumers stop rescanning
+the same DataFrame.
+
+Usage:
+    profile = BudgetProfile(df)
+    risk_manager.analyze_risks(df, profile=profile)
+    find_optimizations(df, profile=profile)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class GroupTotals:
+    """Sum and count of Amount per distinct value of one column"""
+
+    def __init__(self, keys, sums, counts, missing_sum, missing_count):
+        self.keys = keys  # distinct values in order of first appearance
+        self.sums = sums
+        self.counts = counts
+        self.missing_sum = missing_sum  # rows with no value in the column
+        self.missing_count = missing_count
+
+    def series(self):
+        """Totals as a Series sorted by key, like df.groupby(column)['Amount'].sum()"""
+        return pd.Series(self.sums, index=pd.Index(self.keys)).sort_index()
+
+    def ranked(self, limit=None):
+        """Totals as a Series, largest first (ties by key)"""
+        ranked = self.series().sort_values(ascending=False, kind='stable')
+        return ranked.head(limit) if limit is not None else ranked
+
+
+class BudgetProfile:
+    """
+    Lazily computed, cached statistics of a budget DataFrame
+
+    The DataFrame must not be modified while the profile is in use.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.amounts = df['Amount'].to_numpy(dtype=float)
+        self.total = float(df['Amount'].sum())
+        self.row_count = len(df)
+        self._codes = {}
+        self._groups = {}
+        self._masks = {}
+        self._top = {}
+
+    def has(self, column):
+        return column in self.df.columns
+
+    def codes(self, column):
+        """
+        Factorized column: (int codes per row, list of distinct values)
+
+        Missing values get code -1.
+        """
+        if column not in self._codes:
+            codes, uniques = pd.factorize(self.df[column], use_na_sentinel=True)
+            self._codes[column] = (codes, uniques.tolist())
+        return self._codes[column]
+
+    def distinct_count(self, column, include_missing=False):
+        """Number of distinct values (missing values count as one more when include_missing)"""
+        codes, uniques = self.codes(column)
+        missing = include_missing and self.row_count and bool((codes < 0).any())
+        return len(uniques) + (1 if missing else 0)
+
+    def group(self, column):
+        """GroupTotals of Amount by a column"""
+        if column not in self._groups:
+            codes, uniques = self.codes(column)
+            present = codes >= 0
+            sums = np.bincount(codes[present], weights=self.amounts[present], minlength=len(uniques))
+            counts = np.bincount(codes[present], minlength=len(uniques))
+            missing = ~present
+            self._groups[column] = GroupTotals(
+                uniques, sums, counts,
+                float(self.amounts[missing].sum()), int(missing.sum())
+            )
+        return self._groups[column]
+
+    def above(self, share, inclusive=False):
+        """Boolean mask of rows with Amount > share * total (>= when inclusive)"""
+        key = (share, inclusive)
+        if key not in self._masks:
+            threshold = self.total * share
+            self._masks[key] = self.amounts >= threshold if inclusive else self.amounts > threshold
+        return self._masks[key]
+
+    def top(self, n):
+        """Row positions of the n largest amounts, like df.nlargest(n, 'Amount')"""
+        if n not in self._top:
+            self._top[n] = self.df['Amount'].reset_index(drop=True).nlargest(n).index.to_numpy()
+        return self._top[n]
+
+    def duplicate_mask(self, column):
+        """Rows whose value appears more than once, like df.duplicated(subset=[column], keep=False)"""
+        key = ('duplicates', column)
+        if key not in self._masks:
+            codes, uniques = self.codes(column)
+            # Shift so missing values (-1) form their own group, as duplicated() treats them as equal
+            counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+            self._masks[key] = counts[codes + 1] > 1
+        return self._masks[key]
+
+    def contains(self, column, text, case=False):
+        """Rows whose value contains text, evaluated once per distinct value (missing values never match)"""
+        codes, uniques = self.codes(column)
+        needle = text if case else text.lower()
+        flags = np.array(
+            [needle in (value if case else value.lower()) for value in map(str, uniques)] + [False],
+            dtype=bool
+        )
+        return flags[codes]
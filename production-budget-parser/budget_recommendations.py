@@ -0,0 +1,104 @@
+"""
+Budget Recommendations
+Optimization recommendations shown on an uploaded budget's analysis page
+
+find_optimizations works on a whole DataFrame (through a BudgetProfile);
+optimization_recommendations turns the few aggregates it needs into the
+recommendations, so the streaming and revision upload paths can build
+those aggregates their own way.
+
+Usage:
+    optimizations = find_optimizations(df, profile=profile)
+"""
+
+from budget_profile import BudgetProfile
+
+
+def find_optimizations(df, profile=None):
+    """
+    Find optimization opportunities in the budget
+    
+    Args:
+        df: pandas DataFrame with budget data
+        profile: optional BudgetProfile of df (shared with the other upload steps)
+        
+    Returns:
+        list: List of optimization recommendations
+    """
+    if profile is None:
+        profile = BudgetProfile(df)
+    high_cost = profile.above(0.10)
+    
+    return optimization_recommendations(
+        total=profile.total,
+        vendor_count=profile.distinct_count('Vendor') if profile.has('Vendor') else None,
+        high_cost_count=int(high_cost.sum()),
+        high_cost_amount=float(profile.amounts[high_cost].sum()),
+        duplicate_count=int(profile.duplicate_mask('Description').sum()) if profile.has('Description') else None,
+        department_totals=profile.group('Department').series() if profile.has('Department') else None
+    )
+
+
+def optimization_recommendations(total, vendor_count, high_cost_count, high_cost_amount,
+                                 duplicate_count, department_totals):
+    """
+    Optimization recommendations from budget aggregates
+    
+    Shared by find_optimizations and the streaming upload path, which
+    builds the same aggregates chunk by chunk.
+    
+    Args:
+        total: Budget total
+        vendor_count: Number of distinct vendors (None without a Vendor column)
+        high_cost_count: Items above 10% of the total
+        high_cost_amount: Sum of those items
+        duplicate_count: Rows whose Description appears more than once (None without a Description column)
+        department_totals: Series of Department -> amount, sorted by department (None without a Department column)
+        
+    Returns:
+        list: List of optimization recommendations
+    """
+    optimizations = []
+    
+    # Check for vendor consolidation opportunities
+    if vendor_count is not None and vendor_count > 10:
+        optimizations.append({
+            'category': 'Vendor Management',
+            'recommendation': f'Consider consolidating vendors. Currently working with {vendor_count} different vendors.',
+            'potential_savings': total * 0.05,  # Estimate 5% savings
+            'priority': 'MEDIUM'
+        })
+    
+    # Check for high-cost items
+    if high_cost_count > 0:
+        optimizations.append({
+            'category': 'Cost Review',
+            'recommendation': f'Review {high_cost_count} high-cost items that each represent >10% of total budget.',
+            'potential_savings': high_cost_amount * 0.10,  # Estimate 10% savings on high items
+            'priority': 'HIGH'
+        })
+    
+    # Check for duplicate descriptions
+    if duplicate_count:
+        optimizations.append({
+            'category': 'Budget Cleanup',
+            'recommendation': f'Found {duplicate_count} potentially duplicate line items to review.',
+            'potential_savings': 0,
+            'priority': 'LOW'
+        })
+    
+    # Department-specific recommendations
+    if department_totals is not None:
+        dept_totals = department_totals.sort_values(ascending=False)
+        if len(dept_totals) > 0:
+            top_dept = dept_totals.index[0]
+            top_amount = dept_totals.iloc[0]
+            if top_amount > total * 0.30:
+                optimizations.append({
+                    'category': 'Department Analysis',
+                    'recommendation': f'{top_dept} represents {(top_amount/total*100):.1f}% of total budget. Consider detailed review.',
+                    'potential_savings': top_amount * 0.08,
+                    'priority': 'MEDIUM'
+                })
+    
+    return optimizations
@@ -0,0 +1,257 @@
+"""
+Budget Revisions
+Incremental re-analysis of an upload against the analysis it revises
+
+Every in-memory analysis stores a row index: a 64-bit content hash and the
+risk keyword flags of each row. An upload that names a parent analysis is
+matched to the parent row by row through those hashes; unchanged rows keep
+the parent's keyword flags and have their line items copied inside the
+database, so only changed and added rows are scanned for risk keywords and
+written from Python. Totals, thresholds and the risk summary are then
+recomputed from the per-row flags and amounts, which is vectorized and
+cheap. Department/category/vendor totals and the optimization inputs start
+from the parent's stored aggregates and frame, and only the changed and
+removed rows are grouped (derive_totals).
+
+Usage:
+    hashes = row_hashes(df)
+    revision = load_revision(parent_id, df, hashes, risk_manager)
+    flags = revision.keyword_flags(df, risk_manager)
+    totals = revision.derive_totals(df, total_budget)
+    analysis.row_index_blob = RowIndex.build(df, risk_manager, flags, hashes).encode()
+"""
+
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import load_only
+
+from budget_aggregates import AggregateAccumulator, DIMENSIONS
+from database_models import AnalysisAggregate, BudgetAnalysis
+from frame_store import decode_frame
+
+logger = logging.getLogger(__name__)
+
+ROW_INDEX_VERSION = 1
+
+
+def row_hashes(df):
+    """
+    64-bit content hash per row
+
+    Amount is hashed as float so a revision read with integer amounts still
+    matches its parent. Column names are not part of the hash; RowIndex
+    keeps them so uploads with different columns are never diffed.
+    """
+    if 'Amount' in df.columns:
+        df = df.assign(Amount=df['Amount'].astype(float))
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+class RowIndex:
+    """Per-row hashes and keyword flags of one analysis, stored in BudgetAnalysis.row_index_blob"""
+
+    def __init__(self, columns, hashes, flags, signature):
+        self.columns = list(columns)
+        self.hashes = hashes
+        self.flags = flags  # RiskManager.keyword_flags(), rows x categories
+        self.signature = signature  # RiskManager.keyword_signature() the flags were computed with
+
+    @classmethod
+    def build(cls, df, risk_manager, flags=None, hashes=None):
+        """Row index of a budget DataFrame (flags and hashes are computed unless given)"""
+        return cls(
+            df.columns,
+            row_hashes(df) if hashes is None else hashes,
+            risk_manager.keyword_flags(df) if flags is None else flags,
+            risk_manager.keyword_signature()
+        )
+
+    def encode(self):
+        """Serialize to bytes (flags are bit-packed)"""
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            version=np.int64(ROW_INDEX_VERSION),
+            columns=np.asarray(self.columns, dtype=str),
+            hashes=self.hashes,
+            flags=np.packbits(self.flags, axis=1),
+            categories=np.int64(self.flags.shape[1]),
+            signature=np.int64(self.signature)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def decode(cls, blob):
+        """RowIndex from encode(); None for an unknown format version"""
+        with np.load(io.BytesIO(blob)) as archive:
+            if int(archive['version']) != ROW_INDEX_VERSION:
+                return None
+            categories = int(archive['categories'])
+            flags = np.unpackbits(archive['flags'], axis=1, count=categories).astype(bool)
+            return cls(archive['columns'].tolist(), archive['hashes'], flags, int(archive['signature']))
+
+
+def _occurrences(hashes):
+    """Stable sort order of hashes, the sorted hashes and each row's rank among equal hashes"""
+    order = np.argsort(hashes, kind='stable')
+    ordered = hashes[order]
+    positions = np.arange(len(hashes))
+    starts = np.r_[True, ordered[1:] != ordered[:-1]] if len(hashes) else np.zeros(0, dtype=bool)
+    first = np.maximum.accumulate(np.where(starts, positions, 0)) if len(hashes) else positions
+    ranks = np.empty(len(hashes), dtype=np.int64)
+    ranks[order] = positions - first
+    return order, ordered, ranks
+
+
+def match_rows(parent_hashes, hashes):
+    """
+    Parent row of each row with identical content, -1 for changed or added rows
+
+    Repeated rows are paired in order: the k-th copy in the revision matches
+    the k-th copy in the parent.
+    """
+    parent_order, parent_sorted, _ = _occurrences(parent_hashes)
+    _, _, ranks = _occurrences(hashes)
+
+    positions = np.searchsorted(parent_sorted, hashes, side='left') + ranks
+    found = positions < len(parent_sorted)
+    found[found] = parent_sorted[positions[found]] == hashes[found]
+
+    parent_rows = np.full(len(hashes), -1, dtype=np.int64)
+    parent_rows[found] = parent_order[positions[found]]
+    return parent_rows
+
+
+class BudgetRevision:
+    """An upload matched row by row to the analysis it revises"""
+
+    def __init__(self, parent_id, parent_index, hashes, signature=None):
+        self.parent_id = parent_id
+        self.parent_rows = match_rows(parent_index.hashes, hashes)
+        self.unchanged = np.flatnonzero(self.parent_rows >= 0)
+        self.changed = np.flatnonzero(self.parent_rows < 0)
+        self.parent_row_count = len(parent_index.hashes)
+        self.removed_count = self.parent_row_count - len(self.unchanged)
+        # Flags computed with other keyword rules can not be reused
+        self._parent_flags = parent_index.flags if signature is None or signature == parent_index.signature else None
+
+    def keyword_flags(self, df, risk_manager):
+        """Keyword flags of every row: the parent's for unchanged rows, scanned for the rest"""
+        if self._parent_flags is None:
+            return risk_manager.keyword_flags(df)
+        flags = np.zeros((len(df), self._parent_flags.shape[1]), dtype=bool)
+        flags[self.unchanged] = self._parent_flags[self.parent_rows[self.unchanged]]
+        if len(self.changed):
+            flags[self.changed] = risk_manager.keyword_flags(df.iloc[self.changed])
+        return flags
+
+    def removed_rows(self):
+        """Positions of the parent rows with no match in the upload"""
+        kept = np.zeros(self.parent_row_count, dtype=bool)
+        kept[self.parent_rows[self.unchanged]] = True
+        return np.flatnonzero(~kept)
+
+    def derive_totals(self, df, total_budget):
+        """
+        Aggregate rows and optimization inputs of the upload, from the parent's
+        stored aggregates and frame plus the changed and removed rows
+
+        Group totals are the parent's, with the removed rows taken out and
+        the changed and added rows put in. The amount bands and high-cost
+        items depend on the new total and the duplicate descriptions on every
+        row, so those come from one vectorized pass over the Amount and
+        Description columns (no grouping).
+
+        Returns:
+            RevisionTotals, or None when the parent has no stored aggregates
+            or frame; the caller then computes them from the whole upload
+        """
+        parent = BudgetAnalysis.query.options(
+            load_only(BudgetAnalysis.id, BudgetAnalysis.archive_refs)
+        ).filter_by(id=self.parent_id).first()
+        parent_rows = AnalysisAggregate.query.filter_by(analysis_id=self.parent_id).all() if parent is not None else []
+        blob = parent.payload('dataframe_blob') if parent_rows else None
+        if not blob:
+            logger.info('Parent analysis %s has no stored aggregates; computing them from the whole revision', self.parent_id)
+            return None
+
+        removed = self.removed_rows()
+        columns = [column for column in DIMENSIONS.values() if column in df.columns]
+        removed_df = decode_frame(blob, columns + ['Amount'], rows=removed)
+        changed_df = df.iloc[self.changed]
+
+        groups = AggregateAccumulator(df.columns, total_budget)
+        groups.add_rows(parent_rows)
+        groups.add_groups(removed_df, sign=-1)
+        groups.add_groups(changed_df)
+        amounts = df['Amount'].to_numpy(dtype=float)
+        groups.add_bands(amounts)
+
+        duplicate_count = int(df['Description'].duplicated(keep=False).sum()) if 'Description' in df.columns else None
+
+        high_cost = amounts > total_budget * 0.10
+        departments = groups.totals.get('department', {})
+        return RevisionTotals(groups.rows(len(df)), sum(1 for _, count in departments.values() if count), {
+            'total': total_budget,
+            'vendor_count': len(groups.series('vendor')) if 'vendor' in groups.totals else None,
+            'high_cost_count': int(high_cost.sum()),
+            'high_cost_amount': float(amounts[high_cost].sum()),
+            'duplicate_count': duplicate_count,
+            'department_totals': groups.series('department') if 'department' in groups.totals else None
+        })
+
+    def line_item_runs(self):
+        """
+        Unchanged rows as (first, last, offset) runs of parent line numbers
+
+        A run is a block of consecutive rows that were also consecutive in
+        the parent, so edits, insertions and deletions each start a new run
+        and the number of runs grows with the size of the change.
+        """
+        rows = self.unchanged
+        if not len(rows):
+            return []
+        parents = self.parent_rows[rows]
+        offsets = rows - parents
+        breaks = np.flatnonzero((np.diff(rows) != 1) | (np.diff(offsets) != 0)) + 1
+        starts = np.r_[0, breaks]
+        ends = np.r_[breaks, len(rows)] - 1
+        # Line numbers are 1-based row positions
+        return list(zip((parents[starts] + 1).tolist(), (parents[ends] + 1).tolist(), offsets[starts].tolist()))
+
+
+class RevisionTotals:
+    """Results of BudgetRevision.derive_totals"""
+
+    def __init__(self, aggregate_rows, department_count, optimization_inputs):
+        self.aggregate_rows = aggregate_rows  # analysis_aggregates rows
+        self.department_count = department_count  # distinct departments, missing counted as one
+        self.optimization_inputs = optimization_inputs  # keyword arguments for optimization_recommendations
+
+
+def load_revision(parent_id, df, hashes, risk_manager):
+    """
+    Match an upload to its parent analysis
+
+    Returns:
+        BudgetRevision, or None when the parent is missing, has no row
+        index (legacy and streamed analyses) or has different columns; the
+        upload is then analyzed in full
+    """
+    parent = BudgetAnalysis.query.options(
+        load_only(BudgetAnalysis.id, BudgetAnalysis.row_index_blob, BudgetAnalysis.archive_refs)
+    ).filter_by(id=parent_id).first()
+    row_index_blob = parent.payload('row_index_blob') if parent is not None else None
+    if not row_index_blob:
+        logger.info('Parent analysis %s has no row index; analyzing the revision in full', parent_id)
+        return None
+
+    parent_index = RowIndex.decode(row_index_blob)
+    if parent_index is None or parent_index.columns != list(df.columns):
+        logger.info('Parent analysis %s has a different layout; analyzing the revision in full', parent_id)
+        return None
+
+    return BudgetRevision(parent_id, parent_index, hashes, risk_manager.keyword_signature())
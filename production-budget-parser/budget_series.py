@@ -0,0 +1,213 @@
+"""
+Budget Series Comparison
+Aligns any number of budget versions (e.g. successive drafts) in one pass
+
+compare_budgets handles a pair of budgets; this module stacks N versions
+into one frame and builds every (group x version) pivot and the line-item
+presence matrix with NumPy on factorized codes, so the cost grows with the
+total number of rows rather than with the number of version pairs.
+
+Usage:
+    series = compare_budget_series([df1, df2, df3], ['Draft 1', 'Draft 2', 'Draft 3'])
+    series['dimensions']['department']['step_deltas']
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from budget_comparison import LINE_ITEM_KEY_COLUMNS
+
+# Series dimension -> budget column, and group keys left out (as in compare_budgets)
+SERIES_DIMENSIONS = {
+    'department': ('Department', ()),
+    'category': ('Category', ()),
+    'vendor': ('Vendor', ('', 'nan')),
+}
+
+# Largest series the web API accepts
+MAX_SERIES_LENGTH = 50
+
+# Added/removed line items listed per step (largest amounts first)
+TOP_ITEMS_PER_STEP = 10
+
+_TEXT_COLUMNS = ['Description', 'Department', 'Category', 'Vendor']
+
+
+class _TextColumn:
+    """
+    A text column as codes into its distinct values, normalized the way
+    normalize_dataframe does (missing -> '', stripped) but once per distinct
+    value instead of once per row
+    """
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        texts = pd.Index(['' if pd.isna(value) else str(value).strip() for value in uniques], dtype=object)
+        merged_codes, merged = pd.factorize(texts)  # stripping can merge values
+        self.codes = merged_codes[codes] if len(codes) else codes
+        self.texts = list(merged)
+
+    def values(self, rows):
+        return [self.texts[code] for code in self.codes[rows]]
+
+
+def _percent(change, base):
+    """Percent change, following _total_changes: 100 for growth from zero"""
+    return np.where(base > 0, change / np.where(base > 0, base, 1) * 100, np.where(change > 0, 100.0, 0.0))
+
+
+def _dimension_pivot(column: _TextColumn, skip, amounts: np.ndarray, versions: np.ndarray, n: int) -> Dict[str, Any]:
+    """Totals of one dimension per version, with step deltas and drift from the first version"""
+    keys = column.texts
+    amounts = np.bincount(column.codes * n + versions, weights=amounts,
+                          minlength=len(keys) * n).reshape(len(keys), n)
+
+    keep = np.array([key not in skip for key in keys], dtype=bool)
+    keys = [key for key, kept in zip(keys, keep) if kept]
+    amounts = amounts[keep]
+
+    # Largest in the latest version first, ties by name
+    order = sorted(range(len(keys)), key=lambda i: (-amounts[i, -1], keys[i]))
+    keys = [keys[i] for i in order]
+    amounts = amounts[order] if len(order) else amounts
+
+    steps = np.diff(amounts, axis=1)
+    drift = amounts - amounts[:, :1]
+    return {
+        'keys': keys,
+        'amounts': amounts.tolist(),
+        'step_deltas': steps.tolist(),
+        'step_percent': _percent(steps, amounts[:, :-1]).tolist(),
+        'cumulative_drift': drift.tolist(),
+        'drift_percent': _percent(drift, amounts[:, :1]).tolist(),
+    }
+
+
+def _item_records(columns: Dict[str, _TextColumn], rows: np.ndarray, amounts: np.ndarray) -> List[Dict[str, Any]]:
+    """Item dicts for representative rows, with the per-version amount of their key"""
+    order = np.argsort(-amounts, kind='stable')[:TOP_ITEMS_PER_STEP]
+    picked = rows[order]
+
+    def text(column):
+        return columns[column].values(picked) if column in columns else ['N/A'] * len(picked)
+
+    return [
+        {'description': description, 'department': department, 'category': category, 'vendor': vendor,
+         'amount': float(amount)}
+        for description, department, category, vendor, amount in zip(
+            text('Description'), text('Department'), text('Category'), text('Vendor'), amounts[order])
+    ]
+
+
+def _line_item_codes(columns: Dict[str, _TextColumn], row_count: int) -> np.ndarray:
+    """One integer per row identifying its (Description, Department, Category) line item key"""
+    key_codes = np.zeros(row_count, dtype=np.int64)
+    for column in LINE_ITEM_KEY_COLUMNS:
+        if column in columns:
+            combined = key_codes * len(columns[column].texts) + columns[column].codes
+            key_codes, _ = pd.factorize(combined)  # keep codes compact so they never overflow
+            key_codes = key_codes.astype(np.int64)
+    return key_codes
+
+
+def _line_item_changes(columns: Dict[str, _TextColumn], amounts: np.ndarray, versions: np.ndarray, n: int) -> Dict[str, Any]:
+    """
+    Line items added and removed at each step, plus first/last appearance counts
+
+    Every (item key, version) pair is encoded as key_code * n + version; an
+    item is added at step v when (key, v) exists and (key, v - 1) does not,
+    and removed when (key, v - 1) exists and (key, v) does not.
+    """
+    pair_codes = _line_item_codes(columns, len(amounts)) * n + versions
+    pairs, first_rows, inverse = np.unique(pair_codes, return_index=True, return_inverse=True)
+    pair_amounts = np.bincount(inverse, weights=amounts, minlength=len(pairs))
+    pair_versions = pairs % n
+
+    in_previous = np.isin(pairs - 1, pairs) & (pair_versions > 0)
+    in_next = np.isin(pairs + 1, pairs) & (pair_versions < n - 1)
+    added = (pair_versions > 0) & ~in_previous
+    removed = (pair_versions < n - 1) & ~in_next  # removed in the following version
+
+    steps = []
+    for version in range(1, n):
+        added_here = added & (pair_versions == version)
+        removed_here = removed & (pair_versions == version - 1)
+        steps.append({
+            'added_count': int(added_here.sum()),
+            'added_amount': float(pair_amounts[added_here].sum()),
+            'removed_count': int(removed_here.sum()),
+            'removed_amount': float(pair_amounts[removed_here].sum()),
+            'top_added': _item_records(columns, first_rows[added_here], pair_amounts[added_here]),
+            'top_removed': _item_records(columns, first_rows[removed_here], pair_amounts[removed_here]),
+        })
+
+    # Pairs are sorted by key then version, so each key's first and last pairs bound its lifetime
+    keys = pairs // n
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(pairs)] - 1
+    first_seen = np.bincount(pair_versions[starts], minlength=n)
+    last_seen = np.bincount(pair_versions[ends], minlength=n)
+    return {
+        'steps': steps,
+        'first_seen_counts': first_seen.tolist(),
+        'last_seen_counts': last_seen.tolist(),
+        'in_every_version': int(((ends - starts + 1) == n).sum()),
+        'distinct_items': int(len(starts)),
+    }
+
+
+def compare_budget_series(dfs: Sequence[pd.DataFrame], names: Sequence[str]) -> Dict[str, Any]:
+    """
+    Compare any number of budget versions in order
+
+    Args:
+        dfs: Budget DataFrames, oldest first
+        names: Label of each version (e.g. file names)
+
+    Returns:
+        Dictionary (JSON-serializable) with per-version totals, a pivot per
+        dimension (department, category, vendor; keys x versions) with step
+        deltas and cumulative drift from the first version, and the line
+        items added/removed at each step (matched on Description,
+        Department and Category, like compare_budgets)
+    """
+    if len(dfs) != len(names):
+        raise ValueError('dfs and names must have the same length')
+    if len(dfs) < 2:
+        raise ValueError('A budget series needs at least two versions')
+
+    n = len(dfs)
+    lengths = [len(df) for df in dfs]
+    versions = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+    # Stack the versions once; text columns are normalized per distinct value
+    combined = pd.concat(dfs, ignore_index=True)
+    amounts = pd.to_numeric(combined['Amount'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    columns = {column: _TextColumn(combined[column]) for column in _TEXT_COLUMNS if column in combined.columns}
+
+    totals = np.bincount(versions, weights=amounts, minlength=n)
+    total_steps = np.diff(totals)
+    total_drift = totals - totals[0]
+
+    dimensions = {
+        dimension: _dimension_pivot(columns[column], skip, amounts, versions, n)
+        for dimension, (column, skip) in SERIES_DIMENSIONS.items() if column in columns
+    }
+    line_items = _line_item_changes(columns, amounts, versions, n)
+    for step, version in zip(line_items['steps'], range(1, n)):
+        step['from'] = names[version - 1]
+        step['to'] = names[version]
+        step['total_delta'] = float(total_steps[version - 1])
+
+    return {
+        'versions': list(names),
+        'totals': totals.tolist(),
+        'items': lengths,
+        'total_step_deltas': total_steps.tolist(),
+        'total_drift': total_drift.tolist(),
+        'total_drift_percent': _percent(total_drift, np.full(n, totals[0])).tolist(),
+        'dimensions': dimensions,
+        'line_items': line_items,
+    }
@@ -0,0 +1,350 @@
+"""
+Budget Streaming
+Chunked analysis of budget CSVs that are too large to load at once
+
+The file is read twice in fixed-size row chunks. The first pass validates
+it, totals the Amount column and works out each column's type the way a
+whole-file pd.read_csv would. The second pass needs that total (for the
+high-cost thresholds) and feeds every chunk through the risk accumulator,
+the optimization aggregates, the group totals, the line-item writer and
+the stored-frame writer. Risk items, description hashes and frame columns
+are spilled to temporary files as they are produced, and the stored frame
+and risk analysis JSON are assembled on disk and copied into the analysis
+row from there, so working memory is one chunk plus the distinct vendors,
+departments and text values.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from budget_aggregates import AggregateAccumulator
+from budget_ingest import bulk_insert_line_items, DEFAULT_CHUNK_SIZE
+from frame_store import FrameWriter
+from risk_manager import RiskAccumulator
+
+logger = logging.getLogger(__name__)
+
+# Rows per pd.read_csv chunk in streaming mode
+DEFAULT_STREAM_CHUNK_ROWS = 50000
+
+# Description hashes are spilled to this many files, so counting holds 1/N of them at a time
+DUPLICATE_BUCKETS = 16
+
+
+class BudgetScan:
+    """First-pass results: columns, row count, Amount total and column types"""
+
+    def __init__(self):
+        self.columns = None
+        self.rows = 0
+        self.total_budget = 0.0
+        self.invalid_amounts = 0
+        self.dtypes = {}
+        self._numeric = {}
+        self._integral = {}
+        self._has_na = {}
+
+    def add(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            for column in self.columns:
+                self._numeric[column] = True
+                self._integral[column] = True
+                self._has_na[column] = False
+
+        for column in self.columns:
+            if column != 'Amount' and not self._numeric[column]:
+                continue  # Already known to be text
+            raw = chunk[column]
+            missing = raw.isna()
+            numbers = pd.to_numeric(raw, errors='coerce')
+            if column == 'Amount':
+                invalid = numbers.isna()
+                self.invalid_amounts += int(invalid.sum())
+                self.total_budget += float(numbers.fillna(0).sum())
+                missing = invalid
+            elif self._numeric[column] and (numbers.isna() & ~missing).any():
+                self._numeric[column] = False
+            self._has_na[column] |= bool(missing.any())
+            if numbers.dtype.kind not in 'iu':
+                self._integral[column] = False
+        self.rows += len(chunk)
+
+    def finish(self):
+        """Column dtypes matching pd.read_csv on the whole file (Amount after coercion)"""
+        for column in self.columns or []:
+            if column != 'Amount' and not self._numeric[column]:
+                self.dtypes[column] = None  # text
+            elif self._integral[column] and not self._has_na[column] and self.rows:
+                self.dtypes[column] = np.dtype(np.int64)
+            else:
+                self.dtypes[column] = np.dtype(np.float64)
+        return self
+
+
+class DuplicateCounter:
+    """
+    Number of rows whose value occurs more than once in a column
+
+    Each value is reduced to its 64-bit pandas hash (missing values share
+    one hash, as duplicated() treats them as equal) and appended to one of
+    DUPLICATE_BUCKETS files chosen by the hash, so equal values always land
+    in the same file. count() then reads the files one at a time.
+    """
+
+    def __init__(self, spill_dir):
+        self._files = [
+            open(os.path.join(spill_dir, f'duplicates-{i}.bin'), 'w+b')
+            for i in range(DUPLICATE_BUCKETS)
+        ]
+
+    def add(self, series):
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+        buckets = hashes % DUPLICATE_BUCKETS
+        for bucket, spill in enumerate(self._files):
+            spill.write(hashes[buckets == bucket].tobytes())
+
+    def count(self):
+        total = 0
+        for spill in self._files:
+            spill.seek(0)
+            _, counts = np.unique(np.frombuffer(spill.read(), dtype=np.uint64), return_counts=True)
+            total += int(counts[counts > 1].sum())
+        return total
+
+    def close(self):
+        for spill in self._files:
+            spill.close()
+
+
+class OptimizationAggregates:
+    """Running inputs for budget_recommendations.optimization_recommendations"""
+
+    def __init__(self, total_budget, columns, spill_dir):
+        self.total_budget = total_budget
+        self.high_cost_count = 0
+        self.high_cost_amount = 0.0
+        self.vendors = set() if 'Vendor' in columns else None
+        self.descriptions = DuplicateCounter(spill_dir) if 'Description' in columns else None
+        self.duplicate_count = None
+        self.department_totals = {} if 'Department' in columns else None
+        self.departments = set()
+
+    def add(self, chunk):
+        amounts = chunk['Amount']
+        high_cost = amounts[amounts > self.total_budget * 0.10]
+        self.high_cost_count += len(high_cost)
+        self.high_cost_amount += float(high_cost.sum())
+
+        if self.vendors is not None:
+            self.vendors.update(chunk['Vendor'].dropna().tolist())
+        if self.descriptions is not None:
+            self.descriptions.add(chunk['Description'])
+        if self.department_totals is not None:
+            self.departments.update(chunk['Department'])
+            for department, amount in chunk.groupby('Department')['Amount'].sum().items():
+                self.department_totals[department] = self.department_totals.get(department, 0) + amount
+
+    def finish(self):
+        """Count duplicate descriptions and release the spill files (call after the last chunk)"""
+        if self.descriptions is not None and self.duplicate_count is None:
+            self.duplicate_count = self.descriptions.count()
+        self.close()
+
+    def close(self):
+        if self.descriptions is not None:
+            self.descriptions.close()
+
+    def recommendation_inputs(self):
+        """Keyword arguments for optimization_recommendations (after finish())"""
+        return {
+            'total': self.total_budget,
+            'vendor_count': len(self.vendors) if self.vendors is not None else None,
+            'high_cost_count': self.high_cost_count,
+            'high_cost_amount': self.high_cost_amount,
+            'duplicate_count': self.duplicate_count,
+            'department_totals': pd.Series(self.department_totals, dtype=float).sort_index() if self.department_totals is not None else None
+        }
+
+
+class SpillingRiskAccumulator(RiskAccumulator):
+    """
+    RiskAccumulator that writes each category's risk items to a temporary
+    file as JSON instead of keeping the dicts
+
+    write_json() writes exactly json.dumps(result()) of the in-memory
+    accumulator to a file without loading the items back; result() still
+    returns the full dictionary, read back from the spill files.
+    """
+
+    def __init__(self, risk_manager, total_budget, spill_dir):
+        super().__init__(risk_manager, total_budget)
+        self._files = {
+            category: open(os.path.join(spill_dir, f'risk-{i}.json'), 'w+', encoding='utf-8')
+            for i, category in enumerate(self.counts)
+        }
+        self._written = dict.fromkeys(self.counts, False)
+
+    def _keep_items(self, category, items):
+        if not items:
+            return
+        spill = self._files[category]
+        if self._written[category]:
+            spill.write(', ')
+        spill.write(json.dumps(items)[1:-1])
+        self._written[category] = True
+
+    def result(self):
+        risk_metrics, risk_summary = self.metrics_and_summary()
+        risks = {}
+        for category, spill in self._files.items():
+            spill.seek(0)
+            risks[category] = json.loads(f'[{spill.read()}]')
+            spill.seek(0, os.SEEK_END)
+        return {
+            "risks": risks,
+            "metrics": risk_metrics,
+            "summary": risk_summary
+        }
+
+    def write_json(self, path):
+        """
+        Write the risk analysis JSON to a file
+
+        Returns:
+            {"metrics": ..., "summary": ...}
+        """
+        risk_metrics, risk_summary = self.metrics_and_summary()
+        with open(path, 'w', encoding='utf-8') as out:
+            out.write('{"risks": {')
+            for i, (category, spill) in enumerate(self._files.items()):
+                out.write(f'{", " if i else ""}{json.dumps(category)}: [')
+                spill.seek(0)
+                shutil.copyfileobj(spill, out)
+                spill.seek(0, os.SEEK_END)
+                out.write(']')
+            out.write(f'}}, "metrics": {json.dumps(risk_metrics)}, "summary": {json.dumps(risk_summary)}}}')
+        return {"metrics": risk_metrics, "summary": risk_summary}
+
+    def close(self):
+        for spill in self._files.values():
+            spill.close()
+
+
+class StreamedBudget:
+    """Second-pass results for one budget file (the payload columns are already stored)"""
+
+    def __init__(self, scan, risk_analysis, aggregates, aggregate_rows):
+        self.total_budget = scan.total_budget
+        self.line_items = scan.rows
+        self.num_departments = len(aggregates.departments) if aggregates.department_totals is not None else 0
+        self.risk_analysis = risk_analysis  # metrics and summary only
+        self.aggregates = aggregates
+        self.aggregate_rows = aggregate_rows  # analysis_aggregates rows
+
+
+def _read_chunks(filepath, chunk_rows):
+    # Text as read; types are applied from the first pass so every chunk agrees
+    return pd.read_csv(filepath, chunksize=chunk_rows, dtype=str)
+
+
+def scan_budget_csv(filepath, chunk_rows=DEFAULT_STREAM_CHUNK_ROWS, on_chunk=None):
+    """
+    First pass over a budget CSV
+
+    Args:
+        filepath: CSV path
+        chunk_rows: Rows per chunk
+        on_chunk: optional callback(rows_scanned) after each chunk
+
+    Returns:
+        BudgetScan
+    """
+    scan = BudgetScan()
+    with _read_chunks(filepath, chunk_rows) as reader:
+        for chunk in reader:
+            scan.add(chunk)
+            if on_chunk:
+                on_chunk(scan.rows)
+    return scan.finish()
+
+
+def _normalize(chunk, scan):
+    """Apply whole-file column types to a text chunk"""
+    for column, dtype in scan.dtypes.items():
+        if column == 'Amount':
+            amounts = pd.to_numeric(chunk[column], errors='coerce')
+            if scan.invalid_amounts:
+                amounts = amounts.fillna(0)
+            chunk[column] = amounts.astype(dtype)
+        elif dtype is not None:
+            chunk[column] = pd.to_numeric(chunk[column]).astype(dtype)
+    return chunk
+
+
+def stream_budget_csv(filepath, scan, analysis, risk_manager,
+                      chunk_rows=DEFAULT_STREAM_CHUNK_ROWS, line_item_chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """
+    Second pass: analyze a scanned budget CSV chunk by chunk
+
+    Line items are inserted into the current session as each chunk is read,
+    and the stored frame and risk analysis JSON are written to the analysis
+    row from temporary files (the caller commits).
+
+    Args:
+        filepath: CSV path
+        scan: BudgetScan from scan_budget_csv
+        analysis: BudgetAnalysis for the results; flushed, unless on_chunk
+            commits the line items (SQLite), where only its id is needed
+        risk_manager: RiskManager instance
+        chunk_rows: Rows per chunk
+        line_item_chunk_size: Rows per line-item insert batch
+        on_chunk: optional callback(rows_streamed) after each chunk's line
+            items are inserted
+
+    Returns:
+        StreamedBudget
+    """
+    start = time.perf_counter()
+    line_number = 1
+
+    with tempfile.TemporaryDirectory(prefix='budget-stream-') as spill_dir:
+        accumulator = SpillingRiskAccumulator(risk_manager, scan.total_budget, spill_dir)
+        aggregates = OptimizationAggregates(scan.total_budget, scan.columns, spill_dir)
+        group_totals = AggregateAccumulator(scan.columns, scan.total_budget)
+        try:
+            frame_path = os.path.join(spill_dir, 'frame.npz')
+            with FrameWriter(spill_dir) as frame_writer, _read_chunks(filepath, chunk_rows) as reader:
+                for chunk in reader:
+                    chunk = _normalize(chunk, scan)
+                    accumulator.add(chunk)
+                    aggregates.add(chunk)
+                    group_totals.add(chunk)
+                    line_number += bulk_insert_line_items(chunk, analysis.id, chunk_size=line_item_chunk_size, start_line=line_number)
+                    frame_writer.add(chunk)
+                    if on_chunk:
+                        on_chunk(line_number - 1)
+                frame_writer.finish(frame_path)
+            analysis.store_payload_file('dataframe_blob', frame_path)
+            os.unlink(frame_path)
+
+            risk_path = os.path.join(spill_dir, 'risk-analysis.json')
+            risk_analysis = accumulator.write_json(risk_path)
+            accumulator.close()
+            analysis.store_payload_file('risk_analysis_json', risk_path)
+            aggregates.finish()
+        finally:
+            accumulator.close()
+            aggregates.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info('Streamed %d rows for %s in %.3fs (%.0f rows/s, %d-row chunks)',
+                scan.rows, analysis.id, elapsed, scan.rows / elapsed if elapsed else 0, chunk_rows)
+    return StreamedBudget(scan, risk_analysis, aggregates, group_totals.rows(scan.rows))
@@ -10,27 +10,53 @@ Chart.js Implementation for Budget Analysis
 
 import json
 
-def prepare_chart_data(df):
+def prepare_chart_data(df, aggregates=None, profile=None):
     """
     Prepare all chart data for visualization
     
     Args:
         df: pandas DataFrame with budget data
+        aggregates: optional BudgetAggregates for the analysis; department,
+            category and risk charts are then read from it instead of
+            regrouping df
+        profile: optional BudgetProfile of df; used for whatever the
+            aggregates do not cover
         
     Returns:
         dict: Dictionary containing all chart data in JSON-ready format
     """
+    if aggregates is not None:
+        department_pie = prepare_department_pie_from_aggregates(aggregates)
+        category_breakdown = prepare_category_breakdown_from_aggregates(aggregates)
+        risk_distribution = prepare_risk_distribution_from_aggregates(aggregates)
+    elif profile is not None:
+        department_pie = prepare_department_pie_from_profile(profile)
+        category_breakdown = prepare_category_breakdown_from_profile(profile)
+        risk_distribution = prepare_risk_distribution_from_profile(profile)
+    else:
+        department_pie = prepare_department_pie(df)
+        category_breakdown = prepare_category_breakdown(df)
+        risk_distribution = prepare_risk_distribution(df)
+    
     chart_data = {
-        'department_pie': prepare_department_pie(df),
-        'top_items_bar': prepare_top_items_bar(df),
-        'category_breakdown': prepare_category_breakdown(df),
-        'risk_distribution': prepare_risk_distribution(df),
+        'department_pie': department_pie,
+        'top_items_bar': prepare_top_items_bar(df, profile),
+        'category_breakdown': category_breakdown,
+        'risk_distribution': risk_distribution,
         'spending_trend': prepare_spending_trend(df)
     }
     
     return chart_data
 
 
+# Color palette for the department pie
+DEPARTMENT_COLORS = [
+    '#3498db', '#e74c3c', '#2ecc71', '#f39c12', 
+    '#9b59b6', '#1abc9c', '#34495e', '#e67e22',
+    '#16a085', '#c0392b', '#27ae60', '#d35400'
+]
+
+
 def prepare_department_pie(df):
     """Prepare data for department allocation pie chart"""
     if 'Department' not in df.columns:
@@ -38,23 +64,44 @@ def prepare_department_pie(df):
     
     dept_totals = df.groupby('Department')['Amount'].sum().sort_values(ascending=False)
     
-    # Color palette
-    colors = [
-        '#3498db', '#e74c3c', '#2ecc71', '#f39c12', 
-        '#9b59b6', '#1abc9c', '#34495e', '#e67e22',
-        '#16a085', '#c0392b', '#27ae60', '#d35400'
-    ]
+    return {
+        'labels': dept_totals.index.tolist(),
+        'values': [float(v) for v in dept_totals.values],
+        'colors': DEPARTMENT_COLORS[:len(dept_totals)]
+    }
+
+
+def prepare_department_pie_from_aggregates(aggregates):
+    """Department pie chart data from stored aggregates"""
+    if not aggregates.has('department'):
+        return {'labels': [], 'values': [], 'colors': []}
+    
+    dept_totals = aggregates.ranked('department')
+    
+    return {
+        'labels': dept_totals['key'].tolist(),
+        'values': [float(v) for v in dept_totals['total']],
+        'colors': DEPARTMENT_COLORS[:len(dept_totals)]
+    }
+
+
+def prepare_department_pie_from_profile(profile):
+    """Department pie chart data from a BudgetProfile"""
+    if not profile.has('Department'):
+        return {'labels': [], 'values': [], 'colors': []}
+    
+    dept_totals = profile.group('Department').ranked()
     
     return {
         'labels': dept_totals.index.tolist(),
         'values': [float(v) for v in dept_totals.values],
-        'colors': colors[:len(dept_totals)]
+        'colors': DEPARTMENT_COLORS[:len(dept_totals)]
     }
 
 
-def prepare_top_items_bar(df):
+def prepare_top_items_bar(df, profile=None):
     """Prepare data for top budget items bar chart"""
-    top_items = df.nlargest(10, 'Amount')
+    top_items = df.iloc[profile.top(10)] if profile is not None else df.nlargest(10, 'Amount')
     
     # Truncate long descriptions
     labels = [desc[:40] + '...' if len(desc) > 40 else desc 
@@ -80,6 +127,32 @@ def prepare_category_breakdown(df):
     }
 
 
+def prepare_category_breakdown_from_aggregates(aggregates):
+    """Category breakdown chart data from stored aggregates"""
+    if not aggregates.has('category'):
+        return {'labels': [], 'values': []}
+    
+    category_totals = aggregates.ranked('category', limit=8)
+    
+    return {
+        'labels': category_totals['key'].tolist(),
+        'values': [float(v) for v in category_totals['total']]
+    }
+
+
+def prepare_category_breakdown_from_profile(profile):
+    """Category breakdown chart data from a BudgetProfile"""
+    if not profile.has('Category'):
+        return {'labels': [], 'values': []}
+    
+    category_totals = profile.group('Category').ranked(limit=8)
+    
+    return {
+        'labels': category_totals.index.tolist(),
+        'values': [float(v) for v in category_totals.values]
+    }
+
+
 def prepare_risk_distribution(df):
     """Prepare data for risk distribution doughnut chart"""
     # This is a simplified version - you can enhance with actual risk calculations
@@ -97,6 +170,29 @@ def prepare_risk_distribution(df):
     }
 
 
+def prepare_risk_distribution_from_aggregates(aggregates):
+    """Risk distribution chart data from the stored amount bands"""
+    return {
+        'labels': ['Low Risk', 'Medium Risk', 'High Risk'],
+        'values': [aggregates.band('low'), aggregates.band('medium'), aggregates.band('high')],
+        'colors': ['#2ecc71', '#f39c12', '#e74c3c']
+    }
+
+
+def prepare_risk_distribution_from_profile(profile):
+    """Risk distribution chart data from a BudgetProfile's threshold masks"""
+    high = profile.above(0.1)
+    medium = profile.above(0.02) & ~high
+    high_risk = float(profile.amounts[high].sum())
+    medium_risk = float(profile.amounts[medium].sum())
+    
+    return {
+        'labels': ['Low Risk', 'Medium Risk', 'High Risk'],
+        'values': [profile.total - high_risk - medium_risk, medium_risk, high_risk],
+        'colors': ['#2ecc71', '#f39c12', '#e74c3c']
+    }
+
+
 def prepare_spending_trend(df):
     """Prepare data for spending trend line chart (if dates available)"""
     # Placeholder - you can enhance this if your data has dates
@@ -0,0 +1,355 @@
+"""
+Cold Storage
+Tiering of old analyses' heavy payloads out of the database
+
+archive_analyses() moves the stored DataFrame, risk analysis,
+optimizations and row index of analyses older than N days into compressed
+files named by the SHA-256 of their content, and leaves the digests in
+BudgetAnalysis.archive_refs. Identical payloads (e.g. re-uploads of one
+budget) share a file. The hot table keeps only the summary columns, so its
+size and the pages recent queries touch stop growing with history.
+
+BudgetAnalysis.payload() reads archived columns back transparently through
+a per-process LRU of decompressed payloads. Files are written and synced
+before the row points at them; files no row points at any more (deleted
+analyses, interrupted runs) are removed by sweep_archive().
+
+The archive folder is ARCHIVE_FOLDER (default 'archive'); files are zstd-
+compressed when the zstandard package is installed, gzip otherwise.
+
+Usage:
+    report = archive_analyses(days_old=180)
+    df = analysis.get_dataframe()  # fetched from the archive if needed
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is used instead
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_FOLDER = 'archive'
+# Analyses older than this are archived by default
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+# Default bound on the decompressed payloads held by one process
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Analyses archived per transaction
+DEFAULT_BATCH_SIZE = 50
+# Unreferenced files younger than this may belong to a run that has not committed yet
+DEFAULT_SWEEP_GRACE_SECONDS = 3600
+
+_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+def default_compression():
+    """'zstd' when the zstandard package is installed, else 'gzip'"""
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def _compress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data, compression, path):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f'{os.path.basename(path)} is zstd-compressed; install the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PayloadCache:
+    """
+    Thread-safe LRU of decompressed payloads bounded by total size
+
+    A payload larger than a quarter of max_bytes is returned but not
+    stored, so one huge budget cannot flush every other entry.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def get(self, digest):
+        with self._lock:
+            data = self._payloads.get(digest)
+            if data is None:
+                self.misses += 1
+                return None
+            self._payloads.move_to_end(digest)
+            self.hits += 1
+            return data
+
+    def put(self, digest, data):
+        if len(data) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if digest in self._payloads:
+                return
+            self._payloads[digest] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._payloads.popitem(last=False)
+                self.size -= len(evicted)
+
+    def discard(self, digest):
+        with self._lock:
+            data = self._payloads.pop(digest, None)
+            if data is not None:
+                self.size -= len(data)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._payloads), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+class ColdStore:
+    """
+    Content-addressed folder of compressed payloads
+
+    Files live at <folder>/<first two hex digits>/<sha256><.zst|.gz>.
+    """
+
+    def __init__(self, folder=DEFAULT_ARCHIVE_FOLDER, compression=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.compression = compression or default_compression()
+        self.cache = PayloadCache(cache_max_bytes)
+
+    def _path(self, digest, compression):
+        return os.path.join(self.folder, digest[:2], digest + _EXTENSIONS[compression])
+
+    def _find(self, digest):
+        for compression in _EXTENSIONS:
+            path = self._path(digest, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None, None
+
+    def put(self, data):
+        """
+        Store one payload
+
+        Returns:
+            (digest, bytes written); 0 bytes when the content was already stored
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        existing, _ = self._find(digest)
+        if existing is not None:
+            # Newly referenced: keep sweep_archive() off it until the caller commits
+            os.utime(existing)
+            return digest, 0
+        path = self._path(digest, self.compression)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = _compress(data, self.compression)
+        fd, tmp_path = tempfile.mkstemp(prefix='.archive-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, len(compressed)
+
+    def get(self, digest):
+        """Decompressed payload (bytes); FileNotFoundError if it is not stored"""
+        data = self.cache.get(digest)
+        if data is not None:
+            return data
+        path, compression = self._find(digest)
+        if path is None:
+            raise FileNotFoundError(f'Archived payload {digest} not found in {self.folder}')
+        with open(path, 'rb') as f:
+            data = _decompress(f.read(), compression, path)
+        self.cache.put(digest, data)
+        return data
+
+    def files(self):
+        """(digest, path) of every stored payload"""
+        if not os.path.isdir(self.folder):
+            return
+        for prefix in sorted(os.listdir(self.folder)):
+            subfolder = os.path.join(self.folder, prefix)
+            if not os.path.isdir(subfolder):
+                continue
+            for name in sorted(os.listdir(subfolder)):
+                digest, ext = os.path.splitext(name)
+                if ext in _EXTENSIONS.values() and not name.startswith('.'):
+                    yield digest, os.path.join(subfolder, name)
+
+    def remove(self, digest):
+        path, _ = self._find(digest)
+        if path is not None:
+            os.remove(path)
+        self.cache.discard(digest)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide store, configured from ARCHIVE_FOLDER and ARCHIVE_CACHE_MAX_BYTES"""
+    global _store
+    with _store_lock:
+        folder = os.environ.get('ARCHIVE_FOLDER', DEFAULT_ARCHIVE_FOLDER)
+        if _store is None or _store.folder != folder:
+            _store = ColdStore(folder, cache_max_bytes=int(os.environ.get('ARCHIVE_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)))
+        return _store
+
+
+def read_payload(digest):
+    """Archived payload by digest, through the process-wide LRU"""
+    return get_store().get(digest)
+
+
+def _encode(value):
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def archive_analyses(days_old=DEFAULT_ARCHIVE_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE, store=None, session=None):
+    """
+    Move the payloads of analyses uploaded more than days_old days ago to cold storage
+
+    Runs in batches, one transaction each; an interrupted run keeps what
+    it finished. The rows are updated with Core statements, so
+    content_version (and the caches keyed by it) is unchanged: the
+    analysis reads the same as before.
+
+    Returns:
+        dict: analyses, payloads, files (newly written), stored_bytes
+        (compressed, new files only), freed_bytes (taken out of the
+        database) and seconds
+    """
+    from sqlalchemy import delete, select, update
+    from sqlalchemy.orm import load_only
+
+    from database_models import db, AnalysisPayload, BudgetAnalysis, ARCHIVED_COLUMNS
+
+    session = session or db.session
+    store = store or get_store()
+    cutoff = datetime.utcnow() - timedelta(days=days_old)
+    columns = [getattr(BudgetAnalysis, column) for column in ARCHIVED_COLUMNS]
+    report = {'analyses': 0, 'payloads': 0, 'files': 0, 'stored_bytes': 0, 'freed_bytes': 0}
+    started = time.perf_counter()
+
+    last_id = ''
+    while True:
+        # Keyset over ids; archived rows are skipped, so reruns only see new work
+        batch = session.scalars(
+            select(BudgetAnalysis).options(load_only(BudgetAnalysis.id, BudgetAnalysis.archive_refs, *columns))
+            .where(BudgetAnalysis.upload_date < cutoff, BudgetAnalysis.archived_at.is_(None), BudgetAnalysis.id > last_id)
+            .order_by(BudgetAnalysis.id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        # Payloads of streamed uploads live in analysis_payloads (see store_payload_file)
+        ids = [analysis.id for analysis in batch]
+        stored = set(session.execute(
+            select(AnalysisPayload.analysis_id, AnalysisPayload.name).where(AnalysisPayload.analysis_id.in_(ids))
+        ).all())
+
+        updates = []
+        for analysis in batch:
+            refs = json.loads(analysis.archive_refs or '{}')
+            for column in ARCHIVED_COLUMNS:
+                value = getattr(analysis, column)
+                if not value and (analysis.id, column) in stored:
+                    value = session.scalar(select(AnalysisPayload.data).where(
+                        AnalysisPayload.analysis_id == analysis.id, AnalysisPayload.name == column
+                    ))
+                if not value:
+                    continue
+                data = _encode(value)
+                refs[column], written = store.put(data)
+                report['payloads'] += 1
+                report['freed_bytes'] += len(data)
+                if written:
+                    report['files'] += 1
+                    report['stored_bytes'] += written
+            updates.append({'analysis_id': analysis.id, 'refs': json.dumps(refs)})
+
+        session.execute(
+            update(BudgetAnalysis.__table__)
+            .where(BudgetAnalysis.__table__.c.id == db.bindparam('analysis_id'))
+            .values(archive_refs=db.bindparam('refs'), archived_at=datetime.utcnow(), dataframe_blob=None,
+                    dataframe_json='', risk_analysis_json=None, optimizations_json=None, row_index_blob=None),
+            updates
+        )
+        if stored:
+            session.execute(delete(AnalysisPayload.__table__).where(AnalysisPayload.analysis_id.in_(ids)))
+        session.commit()
+        report['analyses'] += len(updates)
+
+    report['seconds'] = time.perf_counter() - started
+    logger.info(
+        'Archived %d analyses older than %d days (%d payloads, %d new files, %.1f MB out of the database, %.1f MB stored) in %.2fs',
+        report['analyses'], days_old, report['payloads'], report['files'],
+        report['freed_bytes'] / 1024 / 1024, report['stored_bytes'] / 1024 / 1024, report['seconds']
+    )
+    return report
+
+
+def referenced_digests(session=None):
+    """Digests every archived analysis points at"""
+    from database_models import db, BudgetAnalysis
+
+    session = session or db.session
+    digests = set()
+    for refs in session.scalars(db.select(BudgetAnalysis.archive_refs).where(BudgetAnalysis.archive_refs.isnot(None))):
+        digests.update(json.loads(refs).values())
+    return digests
+
+
+def sweep_archive(store=None, grace_seconds=DEFAULT_SWEEP_GRACE_SECONDS, session=None, now=None):
+    """
+    Delete archived files no analysis points at
+
+    Files younger than grace_seconds are kept: a running archive_analyses()
+    may not have committed the rows that point at them yet.
+
+    Returns:
+        (files removed, bytes freed)
+    """
+    store = store or get_store()
+    referenced = referenced_digests(session)
+    now = now if now is not None else time.time()
+    removed = freed = 0
+    for digest, path in list(store.files()):
+        if digest in referenced:
+            continue
+        stat = os.stat(path)
+        if now - stat.st_mtime < grace_seconds:
+            continue
+        store.remove(digest)
+        removed += 1
+        freed += stat.st_size
+    if removed:
+        logger.info('Removed %d unreferenced archive files (%.1f MB)', removed, freed / 1024 / 1024)
+    return removed, freed
@@ -350,11 +350,184 @@ def generate_all_comparison_charts(comparison_data: Dict[str, Any]) -> Dict[str,
     return charts
 
 
-def generate_comparison_chart_html(comparison_data: Dict[str, Any]) -> str:
+# Line colors for budget series trends (one per group)
+SERIES_COLORS = [
+    '59, 130, 246', '239, 68, 68', '34, 197, 94', '245, 158, 11',
+    '147, 51, 234', '20, 184, 166', '236, 72, 153', '100, 116, 139'
+]
+
+
+def generate_series_trend_chart(series_data: Dict[str, Any], dimension: str = 'department',
+                                limit: int = 8) -> Dict[str, Any]:
+    """
+    Generate line chart of group totals across a budget series
+    
+    Args:
+        series_data: Result of budget_series.compare_budget_series
+        dimension: 'department', 'category' or 'vendor'
+        limit: Number of groups plotted (largest in the latest version)
+    """
+    pivot = series_data.get('dimensions', {}).get(dimension)
+    
+    if not pivot or not pivot['keys']:
+        return None
+    
+    datasets = []
+    for i, (key, amounts) in enumerate(zip(pivot['keys'][:limit], pivot['amounts'][:limit])):
+        color = SERIES_COLORS[i % len(SERIES_COLORS)]
+        datasets.append({
+            'label': key or '(blank)',
+            'data': amounts,
+            'borderColor': f'rgba({color}, 1)',
+            'backgroundColor': f'rgba({color}, 0.2)',
+            'borderWidth': 2,
+            'tension': 0.2,
+            'fill': False
+        })
+    
+    chart_config = {
+        'type': 'line',
+        'data': {
+            'labels': series_data['versions'],
+            'datasets': datasets
+        },
+        'options': {
+            'responsive': True,
+            'maintainAspectRatio': False,
+            'plugins': {
+                'title': {
+                    'display': True,
+                    'text': f'{dimension.title()} Trend Across Versions',
+                    'color': '#2c3e50',
+                    'font': {
+                        'size': 15,
+                        'weight': 'bold'
+                    }
+                },
+                'legend': {
+                    'display': True,
+                    'position': 'top'
+                },
+                'tooltip': {
+                    'callbacks': {
+                        'label': 'function(context) { return context.dataset.label + \': $\' + context.parsed.y.toLocaleString(); }'
+                    }
+                }
+            },
+            'scales': {
+                'y': {
+                    'beginAtZero': True,
+                    'ticks': {
+                        'callback': 'function(value) { return \'$\' + value.toLocaleString(); }'
+                    }
+                }
+            }
+        }
+    }
+    
+    return chart_config
+
+
+def generate_series_drift_chart(series_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate chart of the total per version with the step change and
+    cumulative drift from the first version
+    """
+    totals = series_data.get('totals')
+    
+    if not totals:
+        return None
+    
+    steps = [0.0] + series_data['total_step_deltas']
+    colors = ['rgba(239, 68, 68, 0.7)' if step > 0 else 'rgba(34, 197, 94, 0.7)' for step in steps]
+    
+    chart_config = {
+        'type': 'bar',
+        'data': {
+            'labels': series_data['versions'],
+            'datasets': [
+                {
+                    'type': 'line',
+                    'label': 'Cumulative drift',
+                    'data': series_data['total_drift'],
+                    'borderColor': 'rgba(147, 51, 234, 1)',
+                    'backgroundColor': 'rgba(147, 51, 234, 0.2)',
+                    'borderWidth': 2,
+                    'yAxisID': 'y'
+                },
+                {
+                    'label': 'Change from previous version',
+                    'data': steps,
+                    'backgroundColor': colors,
+                    'borderWidth': 1,
+                    'yAxisID': 'y'
+                }
+            ]
+        },
+        'options': {
+            'responsive': True,
+            'maintainAspectRatio': False,
+            'plugins': {
+                'title': {
+                    'display': True,
+                    'text': 'Budget Drift Across Versions',
+                    'color': '#2c3e50',
+                    'font': {
+                        'size': 15,
+                        'weight': 'bold'
+                    }
+                },
+                'tooltip': {
+                    'callbacks': {
+                        'label': 'function(context) { return context.dataset.label + \': $\' + context.parsed.y.toLocaleString(); }'
+                    }
+                }
+            },
+            'scales': {
+                'y': {
+                    'ticks': {
+                        'callback': 'function(value) { return \'$\' + value.toLocaleString(); }'
+                    }
+                }
+            }
+        }
+    }
+    
+    return chart_config
+
+
+def generate_all_series_charts(series_data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Generate all budget series charts and return as JSON strings
+    
+    Returns:
+        Dictionary with chart names as keys and JSON config strings as values
+    """
+    charts = {}
+    
+    drift = generate_series_drift_chart(series_data)
+    if drift:
+        charts['seriesDriftChart'] = json.dumps(drift)
+    
+    for dimension in ('department', 'category', 'vendor'):
+        trend = generate_series_trend_chart(series_data, dimension)
+        if trend:
+            charts[f'series{dimension.title()}Chart'] = json.dumps(trend)
+    
+    return charts
+
+
+def generate_comparison_chart_html(comparison_data: Dict[str, Any], charts: Dict[str, str] = None) -> str:
     """
     Generate HTML for comparison charts section
+    
+    Args:
+        comparison_data: Result of compare_budgets
+        charts: Chart configs previously returned by generate_all_comparison_charts
+            (e.g. stored with the comparison); generated when not given
     """
-    charts = generate_all_comparison_charts(comparison_data)
+    if charts is None:
+        charts = generate_all_comparison_charts(comparison_data)
     
     html = """
     <div class="section fade-in">
@@ -0,0 +1,314 @@
+"""
+Dashboard Statistics
+Running totals for get_database_stats(), kept in the stats table
+
+The stats table holds the counters:
+
+    analyses, line_items, comparisons   row counts
+    total_budget                        sum of budget_analyses.total_budget
+    risk_level:<level>                  analyses per risk level
+
+Triggers on budget_analyses, budget_comparisons and budget_line_items add
+each insert, delete and update to the counters in the same transaction,
+so uploads, comparisons and deletes (ORM, retention purge or raw SQL) all
+keep them exact. Reading the statistics is one query over a few hundred
+rows at most, whatever the size of the tables.
+
+Each counter is split over STATS_SHARDS rows (name, shard) and its value
+is their sum. On PostgreSQL a transaction adds to the shard of its backend
+process, so concurrent uploads update different rows instead of queueing
+on the row lock of 'analyses' until the first one commits. SQLite allows
+one writer at a time anyway and always uses shard 0.
+
+SQLite uses row triggers, except for line item inserts: budget_ingest
+counts those once per load (add_line_items), as a per-row trigger would
+slow bulk ingestion, and line items added through the ORM are counted by
+a mapper event. PostgreSQL uses statement triggers over transition
+tables, which also cover COPY.
+
+The triggers are created with the tables (create_all); upgrade_schema()
+adds them to existing databases, adds the shard column to a stats table
+made before it, and counts the rows already there.
+
+Other modules keep counters of their own in the table with add_counters()
+(e.g. 'insights_cache:hits'); rebuild_stats() leaves those alone.
+
+Usage:
+    stats = read_stats()
+    stats['total_analyses'], stats['risk_distribution']
+"""
+
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.engine import Connection
+
+from database_models import db, BudgetAnalysis, BudgetComparison, BudgetLineItem, DashboardStat
+
+STATS_TABLE = DashboardStat.__tablename__
+
+RISK_PREFIX = 'risk_level:'
+
+# Rows per counter on PostgreSQL; concurrent writers collide on a shard with probability ~1/STATS_SHARDS
+STATS_SHARDS = 16
+
+# Counters derived from the tables (recounted by rebuild_stats)
+_TABLE_COUNTERS = ('analyses', 'line_items', 'comparisons', 'total_budget')
+
+# Counters added per row of each table: (name, value) SQL expressions over
+# the row, with {row} standing for new/old or a table alias
+_COUNTERS = {
+    BudgetAnalysis.__tablename__: (
+        ("'analyses'", '1'),
+        ("'total_budget'", 'coalesce({row}.total_budget, 0)'),
+        (f"'{RISK_PREFIX}' || coalesce({{row}}.risk_level, '')", '1'),
+    ),
+    BudgetComparison.__tablename__: (("'comparisons'", '1'),),
+    BudgetLineItem.__tablename__: (("'line_items'", '1'),),
+}
+
+# Columns whose updates change a counter
+_UPDATED_COLUMNS = {BudgetAnalysis.__tablename__: ('total_budget', 'risk_level')}
+
+_UPSERT = 'ON CONFLICT (name, shard) DO UPDATE SET value = {table}.value + excluded.value'.format(table=STATS_TABLE)
+
+
+def _shard(dialect):
+    """SQL expression for the shard a transaction writes to"""
+    return f'pg_backend_pid() % {STATS_SHARDS}' if dialect == 'postgresql' else '0'
+
+
+def _trigger_name(table, action):
+    return f'stats_{table}_{action}'
+
+
+def _row_values(table, row, sign):
+    return ', '.join(
+        f"({name.format(row=row)}, 0, {sign}{value.format(row=row)})" for name, value in _COUNTERS[table]
+    )
+
+
+def _trigger_actions(table, dialect):
+    actions = ['insert', 'delete']
+    if dialect == 'sqlite' and table == BudgetLineItem.__tablename__:
+        # Line item inserts are counted per load by add_line_items()
+        actions.remove('insert')
+    if table in _UPDATED_COLUMNS:
+        actions.append('update')
+    return actions
+
+
+def _sqlite_triggers(table):
+    """CREATE TRIGGER statements for one table (SQLite, per row)"""
+    upsert_new = f'INSERT INTO {STATS_TABLE} (name, shard, value) VALUES {_row_values(table, "new", "")} {_UPSERT};'
+    upsert_old = f'INSERT INTO {STATS_TABLE} (name, shard, value) VALUES {_row_values(table, "old", "-")} {_UPSERT};'
+    bodies = {
+        'insert': ('AFTER INSERT', upsert_new),
+        'delete': ('AFTER DELETE', upsert_old),
+        'update': (f'AFTER UPDATE OF {", ".join(_UPDATED_COLUMNS.get(table, ()))}', f'{upsert_old} {upsert_new}'),
+    }
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {_trigger_name(table, action)} {bodies[action][0]} ON {table} '
+        f'BEGIN {bodies[action][1]} END'
+        for action in _trigger_actions(table, 'sqlite')
+    ]
+
+
+def _delta_select(table, sources, shard='0'):
+    """SELECT of (name, shard, summed value) over (relation, sign) pairs"""
+    rows = ' UNION ALL '.join(
+        f'SELECT {name.format(row="r")} AS name, {sign}{value.format(row="r")} AS value FROM {relation} r'
+        for relation, sign in sources for name, value in _COUNTERS[table]
+    )
+    return f'SELECT name, {shard}, sum(value) FROM ({rows}) d GROUP BY name'
+
+
+def _postgres_triggers(table):
+    """Trigger functions and CREATE TRIGGER statements for one table (PostgreSQL, per statement)"""
+    transitions = {
+        'insert': ('REFERENCING NEW TABLE AS new_rows', [('new_rows', '')]),
+        'delete': ('REFERENCING OLD TABLE AS old_rows', [('old_rows', '-')]),
+        # Transition tables rule out UPDATE OF <columns>; unchanged rows cancel out
+        'update': ('REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows', [('old_rows', '-'), ('new_rows', '')]),
+    }
+    statements = []
+    for action in _trigger_actions(table, 'postgresql'):
+        name = _trigger_name(table, action)
+        referencing, sources = transitions[action]
+        statements += [
+            f'CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+            f'INSERT INTO {STATS_TABLE} (name, shard, value) {_delta_select(table, sources, _shard("postgresql"))} '
+            f'HAVING sum(value) <> 0 {_UPSERT}; '
+            f'RETURN NULL; END $$',
+            f'CREATE OR REPLACE TRIGGER {name} AFTER {action.upper()} ON {table} {referencing} '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION {name}()',
+        ]
+    return statements
+
+
+def _existing_triggers(connection):
+    if connection.dialect.name == 'postgresql':
+        return set(connection.exec_driver_sql('SELECT tgname FROM pg_trigger WHERE NOT tgisinternal').scalars())
+    return set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars())
+
+
+def create_stats_triggers(connection, table):
+    """
+    Add the triggers that keep the counters of one table current (idempotent)
+
+    Returns:
+        bool: Whether any trigger was missing
+    """
+    if table not in _COUNTERS or connection.dialect.name not in ('sqlite', 'postgresql'):
+        return False
+    dialect = connection.dialect.name
+    names = {_trigger_name(table, action) for action in _trigger_actions(table, dialect)}
+    missing = not names <= _existing_triggers(connection)
+    for statement in _postgres_triggers(table) if dialect == 'postgresql' else _sqlite_triggers(table):
+        connection.exec_driver_sql(statement)
+    return missing
+
+
+# Tables made by create_all() get their triggers right away (drop_all() drops them with the tables)
+for _table in _COUNTERS:
+    event.listen(db.metadata.tables[_table], 'after_create',
+                 lambda target, connection, **kw: create_stats_triggers(connection, target.name))
+
+
+def rebuild_stats(connection=None):
+    """
+    Recount every counter from the tables
+
+    Run in the same transaction that adds the triggers, or to repair
+    counters changed by hand. Scans the tables once and leaves each
+    counter in shard 0.
+    """
+    connection = connection or db.session.connection()
+    names = ', '.join(f"'{name}'" for name in _TABLE_COUNTERS)
+    connection.exec_driver_sql(f"DELETE FROM {STATS_TABLE} WHERE name IN ({names}) OR name LIKE '{RISK_PREFIX}%'")
+    for table in _COUNTERS:
+        connection.exec_driver_sql(f'INSERT INTO {STATS_TABLE} (name, shard, value) {_delta_select(table, [(table, "")])}')
+    # Counters of empty tables read as 0 rather than missing
+    names = ' UNION ALL '.join(f"SELECT '{name}' AS name" for name in _TABLE_COUNTERS)
+    connection.exec_driver_sql(
+        f"INSERT INTO {STATS_TABLE} (name, shard, value) SELECT name, 0, 0 FROM ({names}) d "
+        f"WHERE name NOT IN (SELECT name FROM {STATS_TABLE})"
+    )
+
+
+def _shard_stats_table(connection):
+    """
+    Give a stats table made before sharding its shard column (existing values go to shard 0)
+
+    The old triggers upsert on name alone, so they are dropped and
+    recreated by the caller.
+    """
+    if 'shard' in {column['name'] for column in inspect(connection).get_columns(STATS_TABLE)}:
+        return
+    for table in _COUNTERS:
+        for action in ('insert', 'delete', 'update'):
+            if connection.dialect.name == 'postgresql':
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {_trigger_name(table, action)} ON {table}')
+            else:
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {_trigger_name(table, action)}')
+
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'ALTER TABLE {STATS_TABLE} ADD COLUMN shard INTEGER NOT NULL DEFAULT 0')
+        connection.exec_driver_sql(f'ALTER TABLE {STATS_TABLE} DROP CONSTRAINT {STATS_TABLE}_pkey')
+        connection.exec_driver_sql(f'ALTER TABLE {STATS_TABLE} ADD PRIMARY KEY (name, shard)')
+    else:
+        # SQLite can not change a primary key in place
+        connection.exec_driver_sql(f'ALTER TABLE {STATS_TABLE} RENAME TO {STATS_TABLE}_unsharded')
+        DashboardStat.__table__.create(connection)
+        connection.exec_driver_sql(
+            f'INSERT INTO {STATS_TABLE} (name, shard, value) SELECT name, 0, value FROM {STATS_TABLE}_unsharded'
+        )
+        connection.exec_driver_sql(f'DROP TABLE {STATS_TABLE}_unsharded')
+
+
+def ensure_stats():
+    """Add the triggers to an existing database and count its rows (inside an app context)"""
+    with db.engine.begin() as connection:
+        DashboardStat.__table__.create(connection, checkfirst=True)
+        _shard_stats_table(connection)
+        missing = [create_stats_triggers(connection, table) for table in _COUNTERS]
+        if any(missing):
+            rebuild_stats(connection)
+
+
+def add_counters(session, counters):
+    """
+    Add {name: amount} to counters in the session's transaction
+
+    Counters start at 0, so this is safe from any number of processes; on
+    PostgreSQL the amounts go to the shard of the session's connection.
+    Also accepts a Connection (e.g. in mapper events).
+    """
+    counters = [{'name': name, 'value': value} for name, value in counters.items() if value]
+    if counters:
+        connection = session if isinstance(session, Connection) else session.connection()
+        shard = _shard(connection.dialect.name)
+        session.execute(text(
+            f"INSERT INTO {STATS_TABLE} (name, shard, value) VALUES (:name, {shard}, :value) {_UPSERT}"
+        ), counters)
+
+
+@event.listens_for(BudgetLineItem, 'after_insert')
+def _count_added_line_item(mapper, connection, target):
+    """Count a line item added through the ORM (SQLite; loads are counted by add_line_items)"""
+    # Only where the delete trigger will subtract it again
+    if connection.dialect.name == 'sqlite' and connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (_trigger_name(BudgetLineItem.__tablename__, 'delete'),)
+    ).first() is not None:
+        add_counters(connection, {'line_items': 1})
+
+
+def _summed(session, *where):
+    """(name, value summed over shards) of the counters matching where"""
+    return session.execute(
+        db.select(DashboardStat.name, func.sum(DashboardStat.value)).where(*where).group_by(DashboardStat.name)
+    ).all()
+
+
+def read_counters(prefix, session=None):
+    """Counters whose name starts with prefix, as {name without the prefix: value}"""
+    session = session or db.session
+    rows = _summed(session, DashboardStat.name.startswith(prefix, autoescape=True))
+    return {name[len(prefix):]: value for name, value in rows}
+
+
+def add_line_items(session, count):
+    """
+    Count line items inserted by one load (SQLite; PostgreSQL triggers count them)
+
+    Call in the transaction that inserted them.
+    """
+    if session.connection().dialect.name == 'sqlite':
+        add_counters(session, {'line_items': count})
+
+
+def read_stats(session=None):
+    """
+    Dashboard statistics from the running totals
+
+    Returns:
+        dict: total_analyses, total_line_items, total_comparisons,
+        total_budget_tracked, avg_budget and risk_distribution
+        ([(risk_level, count)], by level)
+    """
+    session = session or db.session
+    counters = dict(_summed(session))
+    analyses = int(round(counters.get('analyses', 0)))
+    # Running float sums drift by rounding; budgets are in cents
+    total_budget = round(counters.get('total_budget', 0.0), 2) if analyses else 0
+    risk_distribution = sorted((
+        (name[len(RISK_PREFIX):] or None, int(round(value)))
+        for name, value in counters.items() if name.startswith(RISK_PREFIX) and round(value) > 0
+    ), key=lambda item: item[0] or '')
+    return {
+        'total_analyses': analyses,
+        'total_line_items': int(round(counters.get('line_items', 0))),
+        'total_comparisons': int(round(counters.get('comparisons', 0))),
+        'total_budget_tracked': total_budget,
+        'avg_budget': total_budget / analyses if analyses else 0,
+        'risk_distribution': risk_distribution,
+    }
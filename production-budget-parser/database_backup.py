@@ -0,0 +1,434 @@
+"""
+Database Backups
+Online, compressed and incremental backups of the SQLite database
+
+A backup reads the pages of one consistent read snapshot. In WAL mode (the
+app's default, see configure_sqlite) the app keeps reading and writing
+while it runs; in rollback journal mode writers wait for the backup. The
+pages are read straight from the database file when the snapshot is all in
+it (WAL checkpointed); otherwise the snapshot is first copied to a
+temporary file with SQLite's online backup API, a few thousand pages per
+step. The pages are stored as one of:
+
+    budget_analysis_<timestamp>.db.zst / .db.gz     full: the compressed database file
+    budget_analysis_<timestamp>.inc.zst / .inc.gz   incremental: only the pages that
+                                                    changed since the previous backup
+
+Each backup has a <file>.json manifest with its parent, page size and a
+digest of every page, which the next incremental backup diffs against.
+Backups are written under a temporary name and renamed into place only
+once they and their manifest are on disk, so a backup interrupted by a
+crash is never listed or restored.
+Restores rebuild the chain (full backup + increments) in a temporary file,
+check it, and copy it into the live database with the same online API, so
+open connections and the WAL stay consistent.
+
+zstd is used when the zstandard package is installed, gzip otherwise.
+Plain .db copies made by older versions can still be listed and restored.
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is used instead
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Pages copied per online backup step (4096 pages of 4KB = 16MB)
+DEFAULT_STEP_PAGES = 4096
+# Rotation: full backups (with their increments) to keep, and their maximum age
+DEFAULT_KEEP = 10
+DEFAULT_MAX_AGE_DAYS = 30
+# Increments after which an incremental backup starts a new full one
+MAX_CHAIN_LENGTH = 20
+
+BACKUP_PREFIX = 'budget_analysis_'
+_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+_INCREMENT_MAGIC = b'BUDGETINC1\n'
+_DIGEST_SIZE = 8
+_BLOCK_SIZE = 1024 * 1024
+
+
+def default_compression():
+    """'zstd' when the zstandard package is installed, else 'gzip'"""
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def _open_compressed(path, mode):
+    """Binary file object that (de)compresses by the file's extension"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f'{os.path.basename(path)} is zstd-compressed; install the zstandard package')
+        if mode == 'rb':
+            # Buffered so read(n) returns n bytes until the end, like gzip
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=3) if mode == 'wb' else gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _online_copy(source_path, target_path, step_pages):
+    """
+    Copy a SQLite database page by page with the online backup API
+    
+    The source is read inside one read transaction. Otherwise every commit
+    by another connection would restart the copy, and a busy app would keep
+    it from ever finishing; in WAL mode the transaction does not block
+    writers.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.execute('BEGIN')
+        source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=step_pages, sleep=0.01)
+        source.rollback()
+    finally:
+        target.close()
+        source.close()
+
+
+def _checkpointed(db_path):
+    """
+    Whether every frame in the WAL of a database is also in its file
+
+    Called while a read transaction is open: checkpoints never copy frames
+    newer than an open snapshot, so when this holds the file is exactly
+    that snapshot until the transaction ends.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        busy, log, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    finally:
+        conn.close()
+    return busy == 0 and log == checkpointed
+
+
+@contextmanager
+def _read_snapshot(db_path, step_pages):
+    """
+    A consistent snapshot of a live database: (page size, page count, blocks)
+
+    The pages are read from the database file itself inside one read
+    transaction. In WAL mode, when the snapshot still has frames that are
+    not checkpointed into the file, it is copied to a temporary file with
+    the online backup API instead.
+    """
+    source = sqlite3.connect(db_path)
+    copy = None
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        source.execute('BEGIN')
+        source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        page_size = source.execute('PRAGMA page_size').fetchone()[0]
+        page_count = source.execute('PRAGMA page_count').fetchone()[0]
+        path = db_path
+        if wal and not _checkpointed(db_path):
+            fd, copy = tempfile.mkstemp(prefix='.snapshot-', suffix='.db', dir=os.path.dirname(os.path.abspath(db_path)))
+            os.close(fd)
+            target = sqlite3.connect(copy)
+            try:
+                source.backup(target, pages=step_pages, sleep=0.01)
+            finally:
+                target.close()
+            path = copy
+        yield page_size, page_count, _blocks(path, page_size, page_count)
+    finally:
+        source.close()
+        if copy is not None:
+            for path in (copy, copy + '-journal', copy + '-wal', copy + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _blocks(path, page_size, page_count, pages_per_block=256):
+    """(first page number, bytes) of the first page_count pages of a database file, in blocks of whole pages"""
+    with open(path, 'rb') as f:
+        first = 0
+        while first < page_count:
+            block = f.read(page_size * min(pages_per_block, page_count - first))
+            if not block:
+                return
+            yield first, block
+            first += len(block) // page_size
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _digest(page):
+    return hashlib.blake2b(page, digest_size=_DIGEST_SIZE).digest()
+
+
+def _manifest_path(backup_path):
+    return backup_path + '.json'
+
+
+def read_manifest(backup_path):
+    """Manifest of a backup; legacy plain .db copies get a minimal full-backup manifest"""
+    path = _manifest_path(backup_path)
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = {'kind': 'full', 'parent': None, 'created': datetime.fromtimestamp(os.path.getmtime(backup_path)).isoformat()}
+    manifest['file'] = os.path.basename(backup_path)
+    manifest['path'] = backup_path
+    return manifest
+
+
+def list_backups(backup_dir):
+    """Manifests of all backups in a folder, oldest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = [
+        read_manifest(os.path.join(backup_dir, name)) for name in os.listdir(backup_dir)
+        if name.startswith(BACKUP_PREFIX) and not name.endswith('.json')
+        and (name.endswith('.db') or any(name.endswith(ext) for ext in _EXTENSIONS.values()))
+    ]
+    return sorted(backups, key=lambda manifest: (manifest['created'], manifest['file']))
+
+
+def _chain_length(backups, manifest):
+    by_file = {backup['file']: backup for backup in backups}
+    length = 0
+    while manifest is not None and manifest['kind'] == 'incremental':
+        length += 1
+        manifest = by_file.get(manifest['parent'])
+    return length
+
+
+def _throughput(num_bytes, seconds):
+    return num_bytes / 1024 / 1024 / seconds if seconds > 0 else 0.0
+
+
+def create_backup(db_path, backup_dir, incremental=False, compression=None, step_pages=DEFAULT_STEP_PAGES):
+    """
+    Back up a live SQLite database
+
+    Args:
+        db_path: SQLite database file
+        backup_dir: Folder for backups and their manifests
+        incremental: store only the pages changed since the latest backup in
+            backup_dir (falls back to a full backup when there is none, it has
+            no page digests, the page size changed, or its chain already has
+            MAX_CHAIN_LENGTH increments)
+        compression: 'zstd' or 'gzip' (default_compression() by default)
+        step_pages: Pages copied per online backup step
+
+    Returns:
+        dict: the new backup's manifest plus seconds and mb_per_s (database
+        bytes read per second)
+    """
+    compression = compression or default_compression()
+    os.makedirs(backup_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    partial = manifest_path = None
+    try:
+        with _read_snapshot(db_path, step_pages) as (page_size, page_count, blocks):
+            digests = bytearray()
+
+            parent = None
+            if incremental:
+                backups = list_backups(backup_dir)
+                latest = backups[-1] if backups else None
+                if (latest is not None and latest.get('digests') and latest.get('page_size') == page_size
+                        and _chain_length(backups, latest) < MAX_CHAIN_LENGTH):
+                    parent = latest
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            kind = 'incremental' if parent else 'full'
+            backup_path = os.path.join(
+                backup_dir, f"{BACKUP_PREFIX}{timestamp}{'.inc' if parent else '.db'}{_EXTENSIONS[compression]}"
+            )
+            # Not listed under this name (see list_backups); same extension for _open_compressed
+            fd, partial = tempfile.mkstemp(prefix='.backup-', suffix='-' + os.path.basename(backup_path), dir=backup_dir)
+            os.close(fd)
+            changed = 0
+            with _open_compressed(partial, 'wb') as out:
+                if parent:
+                    previous = base64.b64decode(parent['digests'])
+                    out.write(_INCREMENT_MAGIC)
+                    out.write(json.dumps({'page_size': page_size, 'page_count': page_count}).encode() + b'\n')
+                for first, block in blocks:
+                    if not parent:
+                        out.write(block)
+                    for offset in range(0, len(block), page_size):
+                        page = block[offset:offset + page_size]
+                        digest = _digest(page)
+                        digests += digest
+                        number = first + offset // page_size
+                        if parent and previous[number * _DIGEST_SIZE:(number + 1) * _DIGEST_SIZE] != digest:
+                            out.write(struct.pack('>I', number))
+                            out.write(page)
+                            changed += 1
+        _fsync(partial)
+
+        manifest = {
+            'kind': kind,
+            'parent': parent['file'] if parent else None,
+            'created': datetime.now().isoformat(),
+            'compression': compression,
+            'page_size': page_size,
+            'page_count': page_count,
+            'changed_pages': changed if parent else page_count,
+            'database_bytes': page_size * page_count,
+            'digests': base64.b64encode(bytes(digests)).decode('ascii'),
+        }
+        # Manifest first: a manifest without its backup is never listed, while a
+        # backup without its manifest would be taken for a legacy full copy
+        manifest_partial = partial + '.json'
+        with open(manifest_partial, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        manifest_path = _manifest_path(backup_path)
+        os.replace(manifest_partial, manifest_path)
+        os.replace(partial, backup_path)
+        partial = None
+        _fsync(backup_dir)
+    finally:
+        if partial is not None:
+            for path in (partial, partial + '.json', manifest_path):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+
+    seconds = time.perf_counter() - started
+    manifest.update(
+        file=os.path.basename(backup_path), path=backup_path, backup_bytes=os.path.getsize(backup_path),
+        seconds=seconds, mb_per_s=_throughput(manifest['database_bytes'], seconds)
+    )
+    logger.info('%s backup %s: %d of %d pages, %.1f MB/s',
+                kind, manifest['file'], manifest['changed_pages'], page_count, manifest['mb_per_s'])
+    return manifest
+
+
+def backup_chain(backup_path):
+    """Manifests from the full backup to backup_path, in the order they are applied"""
+    chain = [read_manifest(backup_path)]
+    backup_dir = os.path.dirname(backup_path)
+    while chain[0]['kind'] == 'incremental':
+        parent = os.path.join(backup_dir, chain[0]['parent'])
+        if not os.path.exists(parent):
+            raise FileNotFoundError(f"{chain[0]['file']} needs {chain[0]['parent']}, which is missing")
+        chain.insert(0, read_manifest(parent))
+    return chain
+
+
+def _apply_increment(manifest, target):
+    with _open_compressed(manifest['path'], 'rb') as increment:
+        if increment.read(len(_INCREMENT_MAGIC)) != _INCREMENT_MAGIC:
+            raise ValueError(f"{manifest['file']} is not an incremental backup")
+        header = b''
+        while not header.endswith(b'\n'):
+            header += increment.read(1)
+        layout = json.loads(header)
+        page_size = layout['page_size']
+        target.truncate(page_size * layout['page_count'])
+        while True:
+            number = increment.read(4)
+            if not number:
+                break
+            target.seek(struct.unpack('>I', number)[0] * page_size)
+            target.write(increment.read(page_size))
+
+
+def restore_backup(backup_path, db_path, step_pages=DEFAULT_STEP_PAGES):
+    """
+    Restore a database from a full or incremental backup
+
+    The database is rebuilt in a temporary file and checked with
+    PRAGMA quick_check before the live database is touched.
+
+    Returns:
+        dict: backup (file name), chain (number of files applied),
+        database_bytes, seconds and mb_per_s
+    """
+    started = time.perf_counter()
+    chain = backup_chain(backup_path)
+    fd, rebuilt = tempfile.mkstemp(prefix='.restore-', suffix='.db', dir=os.path.dirname(os.path.abspath(db_path)))
+    try:
+        with os.fdopen(fd, 'r+b') as target:
+            with _open_compressed(chain[0]['path'], 'rb') as full:
+                while True:
+                    block = full.read(_BLOCK_SIZE)
+                    if not block:
+                        break
+                    target.write(block)
+            for manifest in chain[1:]:
+                _apply_increment(manifest, target)
+
+        with sqlite3.connect(rebuilt) as conn:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        if result != 'ok':
+            raise ValueError(f'Restored database failed its integrity check: {result}')
+        database_bytes = os.path.getsize(rebuilt)
+        _online_copy(rebuilt, db_path, step_pages)
+    finally:
+        for path in (rebuilt, rebuilt + '-journal', rebuilt + '-wal', rebuilt + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    seconds = time.perf_counter() - started
+    return {
+        'backup': os.path.basename(backup_path), 'chain': len(chain), 'database_bytes': database_bytes,
+        'seconds': seconds, 'mb_per_s': _throughput(database_bytes, seconds)
+    }
+
+
+def rotate_backups(backup_dir, keep=DEFAULT_KEEP, max_age_days=DEFAULT_MAX_AGE_DAYS, now=None):
+    """
+    Delete old backups
+
+    Backups are rotated per chain (a full backup and the increments built
+    on it), so an increment never outlives the backups it needs. The newest
+    `keep` chains are kept unless every backup in them is older than
+    max_age_days; the newest chain is always kept.
+
+    Returns:
+        list of deleted backup file names
+    """
+    backups = list_backups(backup_dir)
+    chains = {}
+    for manifest in backups:
+        root = manifest
+        while root['kind'] == 'incremental':
+            root = next((b for b in backups if b['file'] == root['parent']), None)
+            if root is None:
+                break
+        chains.setdefault(root['file'] if root else None, []).append(manifest)
+
+    cutoff = ((now or datetime.now()) - timedelta(days=max_age_days)).isoformat() if max_age_days else None
+    ordered = sorted(chains.values(), key=lambda members: members[-1]['created'], reverse=True)
+    removed = []
+    for position, members in enumerate(ordered):
+        expired = cutoff is not None and members[-1]['created'] < cutoff
+        if position == 0 or (position < keep and not expired):
+            continue
+        for manifest in members:
+            for path in (manifest['path'], _manifest_path(manifest['path'])):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(manifest['file'])
+    return removed
@@ -5,15 +5,58 @@ SQLAlchemy ORM models for persistent storage
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import base64
+import binascii
+import io
 import json
+import os
+
+import pandas as pd
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import load_only
+
+from frame_store import encode_frame, decode_frame
 
 db = SQLAlchemy()
 
+# Used when DATABASE_URL is not set
+DEFAULT_DATABASE_URL = 'sqlite:///budget_analysis.db'
+
+# Connection pool for server databases (PostgreSQL); each setting can be overridden from the environment
+DEFAULT_POOL_OPTIONS = {
+    'pool_size': 5,  # DB_POOL_SIZE: connections kept open per process
+    'max_overflow': 10,  # DB_MAX_OVERFLOW: extra connections allowed under load
+    'pool_timeout': 30,  # DB_POOL_TIMEOUT: seconds to wait for a free connection
+    'pool_recycle': 1800,  # DB_POOL_RECYCLE: seconds before a connection is replaced
+}
+
+# PRAGMAs applied to every new SQLite connection (see configure_sqlite)
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers no longer block the writer (persists in the file)
+    'synchronous': 'NORMAL',  # fsync at checkpoints only; safe with WAL
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative = KiB, i.e. ~64MB of page cache per connection
+    'busy_timeout': 5000,  # ms to wait for a lock before "database is locked"
+}
+
+# Heavy BudgetAnalysis columns that cold storage can move out of the table
+ARCHIVED_COLUMNS = ('dataframe_blob', 'dataframe_json', 'risk_analysis_json', 'optimizations_json', 'row_index_blob')
+
+# Bytes per write when copying a payload file into a SQLite row (see BudgetAnalysis.store_payload_file)
+PAYLOAD_COPY_CHUNK = 1024 * 1024
+
+
 class BudgetAnalysis(db.Model):
     """
     Main table for storing budget analysis results
     """
     __tablename__ = 'budget_analyses'
+    __table_args__ = (
+        # Newest-first listings and keyset pagination (see list_analyses_page)
+        db.Index('ix_budget_analyses_upload_date_id', 'upload_date', 'id'),
+        # search_analyses(risk_level=...) and the risk distribution, newest first
+        db.Index('ix_budget_analyses_risk_level_upload_date', 'risk_level', 'upload_date'),
+    )
     
     # Primary Key
     id = db.Column(db.String(36), primary_key=True)  # UUID
@@ -31,19 +74,36 @@ class BudgetAnalysis(db.Model):
     risk_level = db.Column(db.String(20), default='MODERATE')  # LOW, MODERATE, HIGH, CRITICAL
     risk_score = db.Column(db.Float, default=0.0)
     
-    # Data Storage (JSON)
-    dataframe_json = db.Column(db.Text, nullable=False)  # Stores DataFrame as JSON
+    # Data Storage
+    dataframe_blob = db.Column(db.LargeBinary)  # Columnar DataFrame (frame_store format)
+    dataframe_json = db.Column(db.Text, nullable=False, default='')  # Legacy JSON DataFrame, emptied once migrated
     risk_analysis_json = db.Column(db.Text)  # Risk analysis details
     optimizations_json = db.Column(db.Text)  # Optimization recommendations
     ai_insights_json = db.Column(db.Text)  # Claude AI narrative insights
+    insights_requested_at = db.Column(db.DateTime)  # Claim of the insights call in flight (see ai_insights.py)
+    insights_error = db.Column(db.Text)  # Why the last insights call failed
+    row_index_blob = db.Column(db.LargeBinary)  # Per-row content hashes and risk keyword flags (see budget_revision)
+    
+    # Cold storage: digests of payload columns moved out of the table (see cold_storage.py)
+    archive_refs = db.Column(db.Text)  # JSON {column: sha256}
+    archived_at = db.Column(db.DateTime)
+    
+    # Revisions: the analysis this upload was diffed against
+    parent_id = db.Column(db.String(36))
     
     # Metadata
     analysis_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
     tags = db.Column(db.String(500))  # Comma-separated tags
     
+    # Cache validation: bumped on every change to a stored analysis (see _bump_content_version)
+    content_version = db.Column(db.Integer, default=1, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    
     # Relationships
     line_items_data = db.relationship('BudgetLineItem', backref='analysis', lazy='dynamic', cascade='all, delete-orphan')
+    aggregates = db.relationship('AnalysisAggregate', backref='analysis', lazy='dynamic', cascade='all, delete-orphan')
+    stored_payloads = db.relationship('AnalysisPayload', lazy='dynamic', cascade='all, delete-orphan')
     comparisons = db.relationship('BudgetComparison', 
                                    foreign_keys='BudgetComparison.analysis1_id',
                                    backref='analysis1', 
@@ -64,35 +124,131 @@ class BudgetAnalysis(db.Model):
             'risk_level': self.risk_level,
             'risk_score': self.risk_score,
             'analysis_timestamp': self.analysis_timestamp.isoformat(),
+            'parent_id': self.parent_id,
             'notes': self.notes,
             'tags': self.tags.split(',') if self.tags else []
         }
     
+    def payload(self, column):
+        """
+        Value of one of ARCHIVED_COLUMNS, read from cold storage or
+        analysis_payloads if it is not in the row
+        
+        A value stored in the row itself (e.g. set after archiving) wins.
+        """
+        value = getattr(self, column)
+        if value:
+            return value
+        digest = json.loads(self.archive_refs).get(column) if self.archive_refs else None
+        if digest is not None:
+            from cold_storage import read_payload
+            data = read_payload(digest)
+        else:
+            data = db.session.scalar(
+                select(AnalysisPayload.data).where(AnalysisPayload.analysis_id == self.id, AnalysisPayload.name == column)
+            )
+            if data is None:
+                return value
+        return data.decode('utf-8') if column.endswith('_json') else data
+    
+    def set_dataframe(self, df):
+        """Store DataFrame in the columnar format"""
+        self.dataframe_blob = encode_frame(df)
+        self.dataframe_json = ''
+    
+    def store_payload_file(self, column, path):
+        """
+        Store a file's contents as one of ARCHIVED_COLUMNS of this (flushed) analysis
+        
+        On SQLite the value goes to analysis_payloads: a zero-filled blob of
+        the file's size is inserted and overwritten in place with incremental
+        blob I/O, so it is never held in memory. Other databases bind it to
+        the column as one parameter. Meant for analyses still being created,
+        so content_version is not bumped.
+        """
+        if column not in ARCHIVED_COLUMNS:
+            raise ValueError(f'Not a payload column: {column}')
+        size = os.path.getsize(path)
+        connection = db.session.connection()
+        
+        if connection.dialect.name == 'sqlite' and size:
+            result = connection.execute(insert(AnalysisPayload.__table__).values(
+                analysis_id=self.id, name=column, data=func.zeroblob(size)
+            ))
+            blob = connection.connection.driver_connection.blobopen(AnalysisPayload.__tablename__, 'data', result.lastrowid)
+            with open(path, 'rb') as f, blob:
+                for chunk in iter(lambda: f.read(PAYLOAD_COPY_CHUNK), b''):
+                    blob.write(chunk)
+            return
+        
+        with open(path, 'rb') as f:
+            value = f.read()
+        setattr(self, column, value.decode('utf-8') if column.endswith('_json') else value)
+    
+    def get_dataframe(self, columns=None):
+        """
+        Get stored DataFrame
+        
+        Args:
+            columns: optional list of columns to load (missing ones are skipped)
+        """
+        dataframe_blob = self.payload('dataframe_blob')
+        if dataframe_blob:
+            return decode_frame(dataframe_blob, columns)
+        dataframe_json = self.payload('dataframe_json')
+        if dataframe_json:
+            df = pd.read_json(io.StringIO(dataframe_json))
+            if columns is not None:
+                df = df[[c for c in columns if c in df.columns]]
+            return df
+        return pd.DataFrame()
+    
     def get_dataframe_dict(self):
         """Get DataFrame as dictionary"""
-        if self.dataframe_json:
-            return json.loads(self.dataframe_json)
+        if self.payload('dataframe_blob'):
+            return json.loads(self.get_dataframe().to_json(orient='records'))
+        dataframe_json = self.payload('dataframe_json')
+        if dataframe_json:
+            return json.loads(dataframe_json)
         return {}
     
     def get_risk_analysis(self):
         """Get risk analysis as dictionary"""
-        if self.risk_analysis_json:
-            return json.loads(self.risk_analysis_json)
+        risk_analysis_json = self.payload('risk_analysis_json')
+        if risk_analysis_json:
+            return json.loads(risk_analysis_json)
         return {}
     
     def get_optimizations(self):
         """Get optimizations as list"""
-        if self.optimizations_json:
-            return json.loads(self.optimizations_json)
+        optimizations_json = self.payload('optimizations_json')
+        if optimizations_json:
+            return json.loads(optimizations_json)
         return []
 
 
+@event.listens_for(BudgetAnalysis, 'before_update')
+def _bump_content_version(mapper, connection, target):
+    """
+    Give changed analyses a new content_version so cached pages keyed by the
+    old version stop matching. Core UPDATE statements bypass this and must
+    bump content_version themselves.
+    """
+    if db.session.is_modified(target, include_collections=False):
+        target.content_version = (target.content_version or 1) + 1
+        target.updated_at = datetime.utcnow()
+
+
 class BudgetLineItem(db.Model):
     """
     Individual line items from budget files
     Allows for detailed querying and analysis
     """
     __tablename__ = 'budget_line_items'
+    __table_args__ = (
+        # Line-number ranges of one analysis, copied for budget revisions (see copy_line_items)
+        db.Index('ix_budget_line_items_analysis_line', 'analysis_id', 'line_number'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     analysis_id = db.Column(db.String(36), db.ForeignKey('budget_analyses.id'), nullable=False)
@@ -101,6 +257,7 @@ class BudgetLineItem(db.Model):
     category = db.Column(db.String(100))
     department = db.Column(db.String(100))
     description = db.Column(db.String(500))
+    vendor = db.Column(db.String(200))
     amount = db.Column(db.Float, nullable=False)
     
     # Risk Flags
@@ -120,6 +277,7 @@ class BudgetLineItem(db.Model):
             'category': self.category,
             'department': self.department,
             'description': self.description,
+            'vendor': self.vendor,
             'amount': self.amount,
             'risk_category': self.risk_category,
             'is_flagged': self.is_flagged,
@@ -127,11 +285,65 @@ class BudgetLineItem(db.Model):
         }
 
 
+class AnalysisAggregate(db.Model):
+    """
+    Precomputed totals per department, category, vendor and amount band
+    Written once at upload (see budget_aggregates)
+    """
+    __tablename__ = 'analysis_aggregates'
+    __table_args__ = (
+        db.Index('ix_analysis_aggregates_analysis_dimension', 'analysis_id', 'dimension'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    analysis_id = db.Column(db.String(36), db.ForeignKey('budget_analyses.id'), nullable=False)
+    
+    dimension = db.Column(db.String(20), nullable=False)  # department, category, vendor, amount_band
+    key = db.Column(db.String(500))  # NULL for rows with no value in that column
+    total = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    share = db.Column(db.Float)  # Fraction of the budget total
+    
+    def __repr__(self):
+        return f'<AnalysisAggregate {self.dimension}={self.key}: ${self.total:,.2f}>'
+
+
+class AnalysisPayload(db.Model):
+    """
+    Large payload column of an analysis, kept outside its budget_analyses row
+    
+    SQLite only writes a zeroblob() without building it in memory when it is
+    the last field of the row, which a payload column of budget_analyses
+    never is; here it is. Written by BudgetAnalysis.store_payload_file and
+    read through BudgetAnalysis.payload().
+    """
+    __tablename__ = 'analysis_payloads'
+    __table_args__ = (
+        db.UniqueConstraint('analysis_id', 'name', name='uq_analysis_payloads_analysis_name'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # rowid for incremental blob I/O
+    analysis_id = db.Column(db.String(36), db.ForeignKey('budget_analyses.id'), nullable=False)
+    name = db.Column(db.String(40), nullable=False)  # one of ARCHIVED_COLUMNS
+    data = db.Column(db.LargeBinary)  # keep last
+    
+    def __repr__(self):
+        return f'<AnalysisPayload {self.analysis_id} {self.name}>'
+
+
 class BudgetComparison(db.Model):
     """
     Stores budget comparison results
+    
+    One row per (analysis1, analysis2, algorithm version); repeat comparisons
+    of the same pair read it back instead of recomputing.
     """
     __tablename__ = 'budget_comparisons'
+    __table_args__ = (
+        # Also serves lookups by analysis1_id alone (leading column)
+        db.Index('uq_budget_comparisons_pair', 'analysis1_id', 'analysis2_id', 'algorithm_version', unique=True),
+        db.Index('ix_budget_comparisons_analysis2_id', 'analysis2_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     
@@ -139,8 +351,16 @@ class BudgetComparison(db.Model):
     analysis1_id = db.Column(db.String(36), db.ForeignKey('budget_analyses.id'), nullable=False)
     analysis2_id = db.Column(db.String(36), db.ForeignKey('budget_analyses.id'), nullable=False)
     
+    # budget_comparison.COMPARISON_ALGORITHM_VERSION that produced the results
+    # (0 for rows saved before comparisons were reused)
+    algorithm_version = db.Column(db.Integer, nullable=False, default=0)
+    # content_version of each analysis when compared; a mismatch means the result is stale
+    analysis1_version = db.Column(db.Integer)
+    analysis2_version = db.Column(db.Integer)
+    
     # Comparison Results (JSON)
     comparison_data_json = db.Column(db.Text, nullable=False)
+    charts_json = db.Column(db.Text)  # Chart.js configs from generate_all_comparison_charts
     
     # Metadata
     comparison_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -157,6 +377,12 @@ class BudgetComparison(db.Model):
         if self.comparison_data_json:
             return json.loads(self.comparison_data_json)
         return {}
+    
+    def get_charts(self):
+        """Get stored chart configs as dictionary (None if not stored)"""
+        if self.charts_json:
+            return json.loads(self.charts_json)
+        return None
 
 
 class UserActivity(db.Model):
@@ -198,6 +424,103 @@ class AppSettings(db.Model):
         return f'<Setting {self.key}={self.value}>'
 
 
+class AnalysisJob(db.Model):
+    """
+    Background analysis jobs for uploaded budgets
+    The job id becomes the BudgetAnalysis id once the job finishes
+    """
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    filename = db.Column(db.String(255), nullable=False)
+    filepath = db.Column(db.String(500), nullable=False)
+    mode = db.Column(db.String(20), default='memory')  # memory, stream (chunked CSV reading)
+    parent_id = db.Column(db.String(36))  # Analysis this upload revises, if any
+    
+    # Progress
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, done, failed
+    owner = db.Column(db.String(36))  # Token of the claim that is running the job
+    stage = db.Column(db.String(50), default='queued')
+    percent = db.Column(db.Integer, default=0)
+    timings_json = db.Column(db.Text)  # Seconds spent per stage
+    error_message = db.Column(db.Text)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime)  # Last sign of life from the worker running the job
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.status} {self.stage} {self.percent}%>'
+    
+    def get_timings(self):
+        """Get stage timings as dictionary"""
+        if self.timings_json:
+            return json.loads(self.timings_json)
+        return {}
+    
+    def to_dict(self):
+        """Convert to dictionary for JSON responses"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'mode': self.mode,
+            'parent_id': self.parent_id,
+            'status': self.status,
+            'stage': self.stage,
+            'percent': self.percent,
+            'timings': self.get_timings(),
+            'error': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class DashboardStat(db.Model):
+    """
+    Running totals behind get_database_stats()
+    
+    One row per counter ('analyses', 'line_items', 'comparisons',
+    'total_budget', 'risk_level:<level>') and shard, kept current by
+    database triggers (see dashboard_stats.py) so statistics are read
+    without scanning tables. A counter's value is the sum over its shards.
+    """
+    __tablename__ = 'stats'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0, autoincrement=False)
+    value = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DashboardStat {self.name}[{self.shard}]={self.value}>'
+
+
+class InsightCacheEntry(db.Model):
+    """
+    AI insights keyed by a fingerprint of the prompt inputs
+
+    Shared by every analysis whose prompt would be the same (re-uploads,
+    unchanged drafts), so they are generated once (see insight_cache.py).
+    """
+    __tablename__ = 'insight_cache'
+
+    fingerprint = db.Column(db.String(64), primary_key=True)  # SHA-256 of inputs, prompt version and model
+    model = db.Column(db.String(100), nullable=False)
+    prompt_version = db.Column(db.Integer, nullable=False)
+    insights_json = db.Column(db.Text, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    generation_seconds = db.Column(db.Float, default=0)  # Model call time each hit saves
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<InsightCacheEntry {self.fingerprint[:12]} {self.model} hits={self.hits}>'
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -217,6 +540,152 @@ def init_db(app):
         print("✅ Database initialized successfully")
 
 
+def database_url(environ=None):
+    """
+    Database URL from DATABASE_URL (SQLite file by default)
+    
+    postgres:// URLs (as issued by some hosting providers) are rewritten to
+    the postgresql:// scheme SQLAlchemy expects.
+    """
+    environ = os.environ if environ is None else environ
+    url = environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url, environ=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a database URL
+    
+    Server databases get a QueuePool sized by DEFAULT_POOL_OPTIONS (or the
+    DB_POOL_* environment variables) with pre-ping, so connections dropped
+    by the server or a proxy are replaced instead of failing a request.
+    SQLite keeps Flask-SQLAlchemy's defaults.
+    """
+    if url.startswith('sqlite'):
+        return {}
+    environ = os.environ if environ is None else environ
+    options = {
+        name: int(environ.get(f'DB_{name.upper()}', default))
+        for name, default in DEFAULT_POOL_OPTIONS.items()
+    }
+    options['pool_pre_ping'] = True
+    return options
+
+
+def configure_sqlite(engine, pragmas=None):
+    """
+    Apply PRAGMAs to every new connection of a SQLite engine
+    
+    No-op for other databases. Call before the engine's first connection
+    (inside an app context for db.engine), so pooled connections all get
+    the same settings.
+    
+    Args:
+        engine: SQLAlchemy Engine
+        pragmas: {name: value}; defaults to DEFAULT_SQLITE_PRAGMAS, {} keeps SQLite's defaults
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = DEFAULT_SQLITE_PRAGMAS if pragmas is None else dict(pragmas)
+    if not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def upgrade_schema():
+    """
+    Add columns introduced after a database was created (idempotent)
+    
+    create_all() only creates missing tables, so existing databases get new
+    columns here. Call inside an app context after db.create_all().
+    """
+    from sqlalchemy import inspect, text
+    
+    # Types compiled for the connected database (e.g. BLOB/BYTEA, DATETIME/TIMESTAMP)
+    binary_type = db.LargeBinary().compile(dialect=db.engine.dialect)
+    datetime_type = db.DateTime().compile(dialect=db.engine.dialect)
+    new_columns = [
+        ('budget_analyses', 'ai_insights_json', 'TEXT'),
+        ('budget_analyses', 'dataframe_blob', binary_type),
+        ('analysis_jobs', 'mode', 'VARCHAR(20)'),
+        ('budget_analyses', 'content_version', 'INTEGER NOT NULL DEFAULT 1'),
+        ('budget_analyses', 'updated_at', datetime_type),
+        ('budget_comparisons', 'algorithm_version', 'INTEGER NOT NULL DEFAULT 0'),
+        ('budget_comparisons', 'analysis1_version', 'INTEGER'),
+        ('budget_comparisons', 'analysis2_version', 'INTEGER'),
+        ('budget_comparisons', 'charts_json', 'TEXT'),
+        ('budget_analyses', 'row_index_blob', binary_type),
+        ('budget_analyses', 'parent_id', 'VARCHAR(36)'),
+        ('budget_analyses', 'archive_refs', 'TEXT'),
+        ('budget_analyses', 'archived_at', datetime_type),
+        ('budget_analyses', 'insights_requested_at', datetime_type),
+        ('budget_analyses', 'insights_error', 'TEXT'),
+        ('analysis_jobs', 'parent_id', 'VARCHAR(36)'),
+        ('budget_line_items', 'vendor', 'VARCHAR(200)'),
+        ('analysis_jobs', 'owner', 'VARCHAR(36)'),
+        ('analysis_jobs', 'heartbeat_at', datetime_type),
+    ]
+    inspector = inspect(db.engine)
+    existing_columns = {
+        table: {column['name'] for column in inspector.get_columns(table)}
+        for table in {table for table, _, _ in new_columns} if inspector.has_table(table)
+    }
+    for table, column, column_type in new_columns:
+        if column in existing_columns.get(table, {column}):
+            continue
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+        except Exception:
+            pass  # Added meanwhile by another process
+    
+    new_indexes = [
+        ('ix_budget_analyses_upload_date_id', 'budget_analyses', 'upload_date, id'),
+        ('ix_budget_line_items_analysis_line', 'budget_line_items', 'analysis_id, line_number'),
+        ('ix_budget_analyses_risk_level_upload_date', 'budget_analyses', 'risk_level, upload_date'),
+        ('ix_budget_comparisons_analysis2_id', 'budget_comparisons', 'analysis2_id'),
+    ]
+    with db.engine.begin() as conn:
+        for name, table, columns in new_indexes:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+    
+    # Full-text search over analyses and line items (see search_index.py)
+    from search_index import ensure_search_index
+    ensure_search_index()
+    
+    # Running totals for get_database_stats() (see dashboard_stats.py)
+    from dashboard_stats import ensure_stats
+    ensure_stats()
+    
+    # AI insights shared by analyses with the same prompt inputs (see insight_cache.py)
+    InsightCacheEntry.__table__.create(db.engine, checkfirst=True)
+    
+    # Payloads of streamed uploads (see BudgetAnalysis.store_payload_file)
+    AnalysisPayload.__table__.create(db.engine, checkfirst=True)
+    
+    # Older databases may hold repeated comparisons of the same pair; keep the
+    # newest of each before adding the unique index
+    existing_indexes = {index['name'] for index in inspector.get_indexes('budget_comparisons')}
+    if 'uq_budget_comparisons_pair' not in existing_indexes:
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                'DELETE FROM budget_comparisons WHERE id NOT IN ('
+                'SELECT MAX(id) FROM budget_comparisons GROUP BY analysis1_id, analysis2_id, algorithm_version)'
+            ))
+            conn.execute(text(
+                'CREATE UNIQUE INDEX uq_budget_comparisons_pair '
+                'ON budget_comparisons (analysis1_id, analysis2_id, algorithm_version)'
+            ))
+
+
 def get_recent_analyses(limit=10):
     """Get most recent budget analyses"""
     return BudgetAnalysis.query.order_by(
@@ -234,15 +703,22 @@ def search_analyses(query_text=None, start_date=None, end_date=None, risk_level=
     Search for budget analyses with filters
     
     Args:
-        query_text: Search in filename
+        query_text: Words to find in filename, tags or notes
         start_date: Filter by date range (start)
         end_date: Filter by date range (end)
         risk_level: Filter by risk level
     """
+    from search_index import matching_analysis_ids
+    
     query = BudgetAnalysis.query
     
     if query_text:
-        query = query.filter(BudgetAnalysis.filename.contains(query_text))
+        # Full-text index over filename, tags and notes where available
+        matches = matching_analysis_ids(query_text)
+        if matches is not None:
+            query = query.filter(BudgetAnalysis.id.in_(matches))
+        else:
+            query = query.filter(BudgetAnalysis.filename.contains(query_text))
     
     if start_date:
         query = query.filter(BudgetAnalysis.upload_date >= start_date)
@@ -256,38 +732,118 @@ def search_analyses(query_text=None, start_date=None, end_date=None, risk_level=
     return query.order_by(BudgetAnalysis.upload_date.desc()).all()
 
 
+def encode_page_cursor(upload_date, analysis_id):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    raw = f'{upload_date.isoformat()}|{analysis_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_page_cursor(cursor):
+    """(upload_date, id) from encode_page_cursor; ValueError if malformed"""
+    try:
+        upload_date, analysis_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+        return datetime.fromisoformat(upload_date), analysis_id
+    except (UnicodeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def list_analyses_page(query_text=None, limit=20, cursor=None, exclude_id=None):
+    """
+    One page of analyses, newest first, for pickers and search
+    
+    Uses keyset pagination over (upload_date, id), served by the
+    ix_budget_analyses_upload_date_id index, and loads only the summary
+    columns, never the stored DataFrame or JSON payloads.
+    
+    Args:
+        query_text: Filter on filename (case-insensitive substring)
+        limit: Page size
+        cursor: next_cursor of the previous page
+        exclude_id: Analysis to leave out (e.g. the one being compared)
+    
+    Returns:
+        (list of BudgetAnalysis with id, filename, total_budget and
+        upload_date loaded, next_cursor or None on the last page)
+    """
+    query = BudgetAnalysis.query.options(load_only(
+        BudgetAnalysis.id, BudgetAnalysis.filename, BudgetAnalysis.total_budget, BudgetAnalysis.upload_date
+    ))
+    
+    if query_text:
+        # autoescape: % and _ typed by the user match themselves, not any text
+        query = query.filter(BudgetAnalysis.filename.icontains(query_text, autoescape=True))
+    
+    if exclude_id:
+        query = query.filter(BudgetAnalysis.id != exclude_id)
+    
+    if cursor:
+        upload_date, analysis_id = decode_page_cursor(cursor)
+        query = query.filter(db.or_(
+            BudgetAnalysis.upload_date < upload_date,
+            db.and_(BudgetAnalysis.upload_date == upload_date, BudgetAnalysis.id < analysis_id)
+        ))
+    
+    rows = query.order_by(BudgetAnalysis.upload_date.desc(), BudgetAnalysis.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_page_cursor(rows[-1].upload_date, rows[-1].id)
+    return rows, next_cursor
+
+
 def get_database_stats():
-    """Get database statistics"""
-    return {
-        'total_analyses': BudgetAnalysis.query.count(),
-        'total_line_items': BudgetLineItem.query.count(),
-        'total_comparisons': BudgetComparison.query.count(),
-        'total_budget_tracked': db.session.query(
-            db.func.sum(BudgetAnalysis.total_budget)
-        ).scalar() or 0,
-        'avg_budget': db.session.query(
-            db.func.avg(BudgetAnalysis.total_budget)
-        ).scalar() or 0,
-        'risk_distribution': db.session.query(
-            BudgetAnalysis.risk_level,
-            db.func.count(BudgetAnalysis.id)
-        ).group_by(BudgetAnalysis.risk_level).all()
-    }
+    """
+    Get database statistics
+    
+    Read from the stats table (see dashboard_stats.py): one small query,
+    whatever the size of the other tables.
+    """
+    from dashboard_stats import read_stats
+    
+    return read_stats()
 
 
-def cleanup_old_analyses(days_old=90):
-    """Delete analyses older than specified days"""
+def cleanup_old_analyses(days_old=90, dry_run=False):
+    """
+    Delete analyses older than specified days
+    
+    Runs the batched purge in retention.py (line items, aggregates,
+    comparisons and jobs go with their analyses).
+    
+    Returns:
+        Number of analyses deleted (or that would be, with dry_run)
+    """
+    from retention import purge_analyses
+    
     cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-    old_analyses = BudgetAnalysis.query.filter(
-        BudgetAnalysis.upload_date < cutoff_date
-    ).all()
+    return purge_analyses(cutoff_date, dry_run=dry_run)['analyses']
+
+
+def migrate_dataframe_storage(batch_size=50):
+    """
+    Convert legacy dataframe_json rows to the columnar dataframe_blob format
     
-    count = len(old_analyses)
-    for analysis in old_analyses:
-        db.session.delete(analysis)
+    Args:
+        batch_size: analyses converted per commit
     
-    db.session.commit()
-    return count
+    Returns:
+        Number of analyses migrated
+    """
+    migrated = 0
+    while True:
+        batch = BudgetAnalysis.query.filter(
+            BudgetAnalysis.dataframe_blob.is_(None),
+            BudgetAnalysis.dataframe_json != ''
+        ).limit(batch_size).all()
+        if not batch:
+            break
+        
+        for analysis in batch:
+            analysis.set_dataframe(pd.read_json(io.StringIO(analysis.dataframe_json)))
+        db.session.commit()
+        migrated += len(batch)
+    
+    return migrated
 
 
 # For backward compatibility
@@ -301,15 +857,24 @@ if __name__ == '__main__':
     Tables:
     - budget_analyses: Main analysis storage
     - budget_line_items: Individual line items
+    - analysis_aggregates: Department/category/vendor totals per analysis
     - budget_comparisons: Comparison results
     - user_activity: Activity tracking
     - app_settings: Application settings
+    - analysis_jobs: Background analysis job state
+    - stats: Running totals for dashboard statistics
     
     Helper Functions:
     - init_db(app): Initialize database
+    - database_url() / engine_options(url): DATABASE_URL and connection pool settings
+    - configure_sqlite(engine): WAL and other connection PRAGMAs
+    - upgrade_schema(): Add newer columns and indexes to existing databases
     - get_recent_analyses(limit): Get recent analyses
     - get_analysis_by_id(id): Get specific analysis
-    - search_analyses(...): Search with filters
-    - get_database_stats(): Get statistics
+    - search_analyses(...): Search with filters (full-text index, see search_index.py)
+    - list_analyses_page(...): Keyset-paginated analysis listing
+    - get_database_stats(): Get statistics (stats table, see dashboard_stats.py)
     - cleanup_old_analyses(days): Delete old data
+    - BudgetAnalysis.payload(column): Payload columns, read from cold storage once archived (see cold_storage.py)
+    - migrate_dataframe_storage(): Convert JSON DataFrames to columnar blobs
     """)
\ No newline at end of file
@@ -7,33 +7,59 @@ import os
 import sys
 from datetime import datetime, timedelta
 from flask import Flask
-from database_models import db, BudgetAnalysis, BudgetLineItem, BudgetComparison, UserActivity, get_database_stats
+from sqlalchemy.orm import load_only
+from database_backup import (
+    create_backup, list_backups as list_backup_files, restore_backup as restore_database_backup, rotate_backups,
+    DEFAULT_STEP_PAGES as DEFAULT_BACKUP_STEP_PAGES, DEFAULT_KEEP as DEFAULT_BACKUP_KEEP,
+    DEFAULT_MAX_AGE_DAYS as DEFAULT_BACKUP_MAX_AGE_DAYS
+)
+from cold_storage import archive_analyses, get_store, sweep_archive, DEFAULT_ARCHIVE_AFTER_DAYS
+from budget_aggregates import backfill_aggregates
+from dashboard_stats import ensure_stats, rebuild_stats
+from insight_cache import InsightCache, DEFAULT_MAX_BYTES as DEFAULT_INSIGHTS_CACHE_BYTES, DEFAULT_TTL_SECONDS as DEFAULT_INSIGHTS_CACHE_TTL
+from retention import count_old_rows, purge_analyses, DEFAULT_BATCH_SIZE as DEFAULT_PURGE_BATCH_SIZE, DEFAULT_PAUSE_SECONDS as DEFAULT_PURGE_PAUSE_SECONDS
+from export_cache import ExportCache, DEFAULT_MAX_BYTES as DEFAULT_EXPORT_CACHE_BYTES, DEFAULT_MAX_AGE_SECONDS as DEFAULT_EXPORT_MAX_AGE
+from database_models import db, BudgetAnalysis, BudgetLineItem, BudgetComparison, UserActivity, get_database_stats, upgrade_schema, migrate_dataframe_storage, configure_sqlite, database_url, engine_options
 
 def create_app():
     """Create minimal Flask app for utilities"""
     app = Flask(__name__)
     # Use instance folder path (same as Flask app)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///budget_analysis.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine)
     return app
 
-def backup_database(backup_dir='backups'):
+def _database_path():
+    """Path of the SQLite database file, or None if it doesn't exist"""
+    # Check both possible locations
+    for path in ('instance/budget_analysis.db', 'budget_analysis.db'):
+        if os.path.exists(path):
+            return path
+    return None
+
+def _rotation_settings():
+    return {
+        'keep': int(os.environ.get('BACKUP_KEEP', DEFAULT_BACKUP_KEEP)),
+        'max_age_days': int(os.environ.get('BACKUP_MAX_AGE_DAYS', DEFAULT_BACKUP_MAX_AGE_DAYS)),
+    }
+
+def backup_database(backup_dir='backups', incremental=False):
     """
     Create a backup of the database
     
+    Uses SQLite's online backup API, so the app can keep running. Old
+    backups are rotated by BACKUP_KEEP (full backups with their increments)
+    and BACKUP_MAX_AGE_DAYS.
+    
     Args:
         backup_dir: Directory to store backups
+        incremental: Only store the pages changed since the last backup
     """
-    import shutil
-    
-    # Check both possible locations
-    db_path = None
-    if os.path.exists('instance/budget_analysis.db'):
-        db_path = 'instance/budget_analysis.db'
-    elif os.path.exists('budget_analysis.db'):
-        db_path = 'budget_analysis.db'
-    
+    db_path = _database_path()
     if not db_path:
         print("❌ Database not found!")
         print("   Checked:")
@@ -41,19 +67,22 @@ def backup_database(backup_dir='backups'):
         print("   - budget_analysis.db")
         return False
     
-    # Create backup directory
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    # Create backup filename with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_file = os.path.join(backup_dir, f'budget_analysis_{timestamp}.db')
-    
     try:
-        shutil.copy2(db_path, backup_file)
-        size = os.path.getsize(backup_file) / 1024 / 1024  # Size in MB
-        print(f"✅ Backup created: {backup_file}")
+        backup = create_backup(
+            db_path, backup_dir, incremental=incremental,
+            compression=os.environ.get('BACKUP_COMPRESSION') or None,
+            step_pages=int(os.environ.get('BACKUP_STEP_PAGES', DEFAULT_BACKUP_STEP_PAGES))
+        )
+        print(f"✅ Backup created: {backup['path']}")
         print(f"   Source: {db_path}")
-        print(f"   Size: {size:.2f} MB")
+        print(f"   Type: {backup['kind']} ({backup['changed_pages']:,} of {backup['page_count']:,} pages, {backup['compression']})")
+        print(f"   Size: {backup['backup_bytes'] / 1024 / 1024:.2f} MB "
+              f"(database {backup['database_bytes'] / 1024 / 1024:.2f} MB)")
+        print(f"   Throughput: {backup['mb_per_s']:.1f} MB/s ({backup['seconds']:.2f}s)")
+        
+        removed = rotate_backups(backup_dir, **_rotation_settings())
+        if removed:
+            print(f"   Rotated out {len(removed)} old backup(s)")
         return True
     except Exception as e:
         print(f"❌ Backup failed: {e}")
@@ -64,6 +93,7 @@ def show_stats():
     app = create_app()
     
     with app.app_context():
+        ensure_stats()
         stats = get_database_stats()
         
         print("\n" + "=" * 80)
@@ -91,36 +121,46 @@ def show_stats():
             print(f"   • {analysis.filename} - ${analysis.total_budget:,.2f} ({analysis.upload_date.strftime('%Y-%m-%d')})")
         print()
 
-def cleanup_old_data(days_old=90, dry_run=True):
+def cleanup_old_data(days_old=90, dry_run=True, preview=50):
     """
     Remove analyses older than specified days
     
+    Deletes in batches with set-based DELETEs (see retention.py), so the
+    app keeps working while a large purge runs.
+    
     Args:
         days_old: Delete data older than this many days
         dry_run: If True, only show what would be deleted
+        preview: Number of old analyses to list
     """
     app = create_app()
     
     with app.app_context():
         cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-        old_analyses = BudgetAnalysis.query.filter(
-            BudgetAnalysis.upload_date < cutoff_date
-        ).all()
+        counts = count_old_rows(cutoff_date)
         
-        if not old_analyses:
+        if not counts['analyses']:
             print(f"✅ No analyses older than {days_old} days found")
             return
         
-        print(f"\n{'DRY RUN - ' if dry_run else ''}Found {len(old_analyses)} analyses older than {days_old} days:")
+        print(f"\n{'DRY RUN - ' if dry_run else ''}Found {counts['analyses']} analyses older than {days_old} days:")
         print()
         
-        total_budget = 0
+        old_analyses = BudgetAnalysis.query.options(load_only(
+            BudgetAnalysis.filename, BudgetAnalysis.upload_date, BudgetAnalysis.total_budget
+        )).filter(BudgetAnalysis.upload_date < cutoff_date).order_by(BudgetAnalysis.upload_date).limit(preview)
         for analysis in old_analyses:
             print(f"   • {analysis.filename} - {analysis.upload_date.strftime('%Y-%m-%d')} - ${analysis.total_budget:,.2f}")
-            total_budget += analysis.total_budget
+        if counts['analyses'] > preview:
+            print(f"   … and {counts['analyses'] - preview} more")
         
+        total_budget = db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(BudgetAnalysis.total_budget), 0.0)).where(BudgetAnalysis.upload_date < cutoff_date)
+        )
         print()
         print(f"   Total budget in old data: ${total_budget:,.2f}")
+        print(f"   Rows: {counts['line_items']:,} line items, {counts['aggregates']:,} aggregates, "
+              f"{counts['comparisons']:,} comparisons, {counts['jobs']:,} jobs")
         print()
         
         if dry_run:
@@ -129,10 +169,13 @@ def cleanup_old_data(days_old=90, dry_run=True):
         else:
             response = input("⚠️  Are you sure you want to delete this data? (yes/no): ")
             if response.lower() == 'yes':
-                for analysis in old_analyses:
-                    db.session.delete(analysis)
-                db.session.commit()
-                print(f"✅ Deleted {len(old_analyses)} old analyses")
+                report = purge_analyses(
+                    cutoff_date,
+                    batch_size=int(os.environ.get('PURGE_BATCH_SIZE', DEFAULT_PURGE_BATCH_SIZE)),
+                    pause=float(os.environ.get('PURGE_PAUSE_SECONDS', DEFAULT_PURGE_PAUSE_SECONDS))
+                )
+                print(f"✅ Deleted {report['analyses']} old analyses ({report['rows']:,} rows in {report['batches']} batches)")
+                print(f"   Throughput: {report['rows_per_s']:,.0f} rows/s ({report['seconds']:.2f}s)")
             else:
                 print("❌ Deletion cancelled")
 
@@ -227,13 +270,126 @@ def vacuum_database():
         except Exception as e:
             print(f"❌ Optimization failed: {e}")
 
+def migrate_frames():
+    """Convert stored DataFrames from JSON to the columnar format"""
+    app = create_app()
+    
+    with app.app_context():
+        upgrade_schema()
+        pending = BudgetAnalysis.query.filter(
+            BudgetAnalysis.dataframe_blob.is_(None),
+            BudgetAnalysis.dataframe_json != ''
+        ).count()
+        
+        if pending == 0:
+            print("✅ All analyses already use columnar storage")
+            return
+        
+        print(f"🔄 Migrating {pending} analyses to columnar storage...")
+        migrated = migrate_dataframe_storage()
+        print(f"✅ Migrated {migrated} analyses")
+        print("   Run 'vacuum' afterwards to reclaim the space used by the JSON copies")
+
+def build_aggregates():
+    """Store the department/category/vendor totals of analyses saved before they existed"""
+    app = create_app()
+    
+    with app.app_context():
+        upgrade_schema()
+        print("🔄 Building aggregates of older analyses...")
+        built = backfill_aggregates()
+        if built == 0:
+            print("✅ All analyses already have aggregates")
+            return
+        print(f"✅ Built aggregates for {built} analyses")
+
+def archive_old_payloads(days_old=None):
+    """Move payloads of old analyses to cold storage (ARCHIVE_FOLDER)"""
+    if days_old is None:
+        days_old = int(os.environ.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS))
+    app = create_app()
+    
+    with app.app_context():
+        upgrade_schema()
+        store = get_store()
+        print(f"🧊 Archiving payloads of analyses older than {days_old} days to {store.folder} ({store.compression})...")
+        report = archive_analyses(days_old, store=store)
+        if not report['analyses']:
+            print("✅ Nothing to archive")
+            return
+        print(f"✅ Archived {report['analyses']} analyses: {report['payloads']} payloads, {report['files']} new files")
+        print(f"   {report['freed_bytes'] / 1024 / 1024:.1f} MB moved out of the database, "
+              f"{report['stored_bytes'] / 1024 / 1024:.1f} MB stored ({report['seconds']:.2f}s)")
+        print("   Run 'vacuum' afterwards to shrink the database file")
+
+def sweep_archive_files():
+    """Delete archived payload files no analysis points at"""
+    app = create_app()
+    
+    with app.app_context():
+        upgrade_schema()
+        store = get_store()
+        removed, freed = sweep_archive(store)
+        print(f"✅ Removed {removed} unreferenced archive files ({freed / 1024 / 1024:.1f} MB) from {store.folder}")
+
+def recount_stats():
+    """Recount the running totals behind the statistics from the tables"""
+    app = create_app()
+    
+    with app.app_context():
+        ensure_stats()
+        before = get_database_stats()
+        rebuild_stats()
+        db.session.commit()
+        after = get_database_stats()
+        
+        drift = {key: after[key] - before[key] for key in ('total_analyses', 'total_line_items', 'total_comparisons')
+                 if after[key] != before[key]}
+        if drift:
+            print(f"⚠️  Corrected counters: {', '.join(f'{key} {change:+,}' for key, change in drift.items())}")
+        print(f"✅ Recounted statistics: {after['total_analyses']:,} analyses, {after['total_line_items']:,} line items, "
+              f"{after['total_comparisons']:,} comparisons")
+
+def insights_cache(clear=False):
+    """Show (or clear) the AI insight cache shared by analyses with the same inputs"""
+    app = create_app()
+    
+    with app.app_context():
+        upgrade_schema()
+        cache = InsightCache(
+            ttl_seconds=int(os.environ.get('INSIGHTS_CACHE_TTL', DEFAULT_INSIGHTS_CACHE_TTL)),
+            max_bytes=int(os.environ.get('INSIGHTS_CACHE_MAX_BYTES', DEFAULT_INSIGHTS_CACHE_BYTES))
+        )
+        if clear:
+            print(f"✅ Cleared {cache.clear()} cached insights")
+            return
+        removed = cache.evict()
+        stats = cache.stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else 'n/a'
+        print(f"🧠 AI insight cache: {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KB "
+              f"of {stats['max_bytes'] / 1024 / 1024:.0f} MB (TTL {stats['ttl_seconds'] // 86400} days)")
+        print(f"   Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {hit_rate}")
+        print(f"   Model time saved: {stats['saved_seconds']:.1f}s  Evictions: {stats['evictions']}"
+              + (f" ({removed} just now)" if removed else ""))
+
+def sweep_exports():
+    """Apply the export cache size and age budget to the outputs folder"""
+    output_folder = os.environ.get('OUTPUT_FOLDER', 'outputs')
+    cache = ExportCache(
+        output_folder,
+        max_bytes=int(os.environ.get('EXPORT_CACHE_MAX_BYTES', DEFAULT_EXPORT_CACHE_BYTES)),
+        max_age_seconds=int(os.environ.get('EXPORT_CACHE_MAX_AGE', DEFAULT_EXPORT_MAX_AGE))
+    )
+    removed_files, removed_bytes = cache.sweep()
+    print(f"✅ Removed {removed_files} export files ({removed_bytes / 1024 / 1024:.2f} MB) from {output_folder}/")
+
 def list_backups(backup_dir='backups'):
     """List all available backups"""
     if not os.path.exists(backup_dir):
         print(f"❌ Backup directory not found: {backup_dir}")
         return
     
-    backups = [f for f in os.listdir(backup_dir) if f.endswith('.db')]
+    backups = list_backup_files(backup_dir)
     
     if not backups:
         print(f"❌ No backups found in {backup_dir}")
@@ -242,19 +398,17 @@ def list_backups(backup_dir='backups'):
     print(f"\n📦 Found {len(backups)} backup(s) in {backup_dir}:")
     print()
     
-    for backup in sorted(backups, reverse=True):
-        path = os.path.join(backup_dir, backup)
-        size = os.path.getsize(path) / 1024 / 1024
-        modified = datetime.fromtimestamp(os.path.getmtime(path))
-        print(f"   • {backup}")
+    for backup in reversed(backups):
+        size = os.path.getsize(backup['path']) / 1024 / 1024
+        created = datetime.fromisoformat(backup['created'])
+        print(f"   • {backup['file']}")
+        print(f"     Type: {backup['kind']}" + (f" of {backup['parent']}" if backup['parent'] else ''))
         print(f"     Size: {size:.2f} MB")
-        print(f"     Date: {modified.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"     Date: {created.strftime('%Y-%m-%d %H:%M:%S')}")
         print()
 
 def restore_backup(backup_file):
-    """Restore database from backup"""
-    import shutil
-    
+    """Restore database from backup (full or incremental)"""
     if not os.path.exists(backup_file):
         print(f"❌ Backup file not found: {backup_file}")
         return False
@@ -274,14 +428,24 @@ def restore_backup(backup_file):
         if 'instance' in restore_path:
             os.makedirs('instance', exist_ok=True)
         
-        shutil.copy2(backup_file, restore_path)
+        restored = restore_database_backup(
+            backup_file, restore_path,
+            step_pages=int(os.environ.get('BACKUP_STEP_PAGES', DEFAULT_BACKUP_STEP_PAGES))
+        )
         print(f"✅ Database restored from: {backup_file}")
         print(f"   Restored to: {restore_path}")
+        print(f"   Backups applied: {restored['chain']}")
+        print(f"   Throughput: {restored['mb_per_s']:.1f} MB/s ({restored['seconds']:.2f}s)")
         return True
     except Exception as e:
         print(f"❌ Restore failed: {e}")
         return False
 
+def rotate_old_backups(backup_dir='backups'):
+    """Apply BACKUP_KEEP / BACKUP_MAX_AGE_DAYS to the backup folder"""
+    removed = rotate_backups(backup_dir, **_rotation_settings())
+    print(f"✅ Removed {len(removed)} old backup(s) from {backup_dir}/")
+
 # ============================================================================
 # COMMAND LINE INTERFACE
 # ============================================================================
@@ -300,14 +464,24 @@ def show_help():
     
     COMMANDS:
         stats               Show database statistics
-        backup              Create database backup
+        backup              Create database backup (online, compressed)
+        backup --incremental     Only store pages changed since the last backup
         cleanup DAYS        Delete data older than DAYS (dry run)
         cleanup DAYS --execute   Actually delete old data
         search QUERY        Search budgets by filename
         export [FILE]       Export all data to CSV
         vacuum              Optimize database
+        migrate-frames      Convert stored DataFrames from JSON to columnar storage
+        build-aggregates    Store totals of analyses saved before aggregates existed
+        recount-stats       Recount the running totals behind 'stats'
+        archive [DAYS]      Move payloads of analyses older than DAYS to cold storage
+        sweep-archive       Delete archived files no analysis points at
+        sweep-exports       Delete old Excel/PDF exports beyond the cache budget
+        insights-cache      Show AI insight cache size, hit rate and time saved
+        insights-cache --clear   Empty the AI insight cache
         list-backups        List all backups
-        restore FILE        Restore from backup
+        rotate-backups      Delete backups beyond BACKUP_KEEP / BACKUP_MAX_AGE_DAYS
+        restore FILE        Restore from backup (full or incremental)
     
     EXAMPLES:
         # View statistics
@@ -316,6 +490,9 @@ def show_help():
         # Create backup
         python database_utils.py backup
         
+        # Back up only what changed since the last backup
+        python database_utils.py backup --incremental
+        
         # See what would be deleted (90+ days old)
         python database_utils.py cleanup 90
         
@@ -331,11 +508,20 @@ def show_help():
         # Optimize database
         python database_utils.py vacuum
         
+        # Move existing analyses to columnar storage
+        python database_utils.py migrate-frames
+        
+        # Move DataFrames and reports of analyses older than 180 days to archive/
+        python database_utils.py archive 180
+        
+        # Trim outputs/ to EXPORT_CACHE_MAX_BYTES / EXPORT_CACHE_MAX_AGE
+        python database_utils.py sweep-exports
+        
         # List backups
         python database_utils.py list-backups
         
         # Restore backup
-        python database_utils.py restore backups/budget_analysis_20240101_120000.db
+        python database_utils.py restore backups/budget_analysis_20240101_120000_000000.db.gz
     
     ============================================================================
     """)
@@ -354,7 +540,7 @@ if __name__ == '__main__':
             show_stats()
         
         elif command == 'backup':
-            backup_database()
+            backup_database(incremental='--incremental' in sys.argv)
         
         elif command == 'cleanup':
             if len(sys.argv) < 3:
@@ -381,9 +567,33 @@ if __name__ == '__main__':
         elif command == 'vacuum':
             vacuum_database()
         
+        elif command == 'migrate-frames':
+            migrate_frames()
+        
+        elif command == 'build-aggregates':
+            build_aggregates()
+        
+        elif command == 'archive':
+            archive_old_payloads(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        
+        elif command == 'sweep-archive':
+            sweep_archive_files()
+        
+        elif command == 'recount-stats':
+            recount_stats()
+        
+        elif command == 'sweep-exports':
+            sweep_exports()
+        
+        elif command == 'insights-cache':
+            insights_cache(clear='--clear' in sys.argv)
+        
         elif command == 'list-backups':
             list_backups()
         
+        elif command == 'rotate-backups':
+            rotate_old_backups()
+        
         elif command == 'restore':
             if len(sys.argv) < 3:
                 print("❌ Error: Please specify backup file")
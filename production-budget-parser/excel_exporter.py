@@ -5,19 +5,47 @@ Professional Excel Export with Formatting
 ================================================================================
 """
 
+from copy import copy
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import PieChart, BarChart, Reference
 from datetime import datetime
 import pandas as pd
 
+# Bump when the workbook layout changes so cached exports are regenerated
+EXPORTER_VERSION = 1
+
+
+# Detail sheet columns: (header, DataFrame column)
+DETAIL_COLUMNS = [
+    ('Description', 'Description'),
+    ('Department', 'Department'),
+    ('Category', 'Category'),
+    ('Vendor', 'Vendor'),
+    ('Amount', 'Amount'),
+    ('Notes', 'Notes'),
+]
+
 
 class ExcelExporter:
-    """Export budget analysis to formatted Excel file"""
+    """
+    Export budget analysis to formatted Excel file
+    
+    With write_only=True the workbook is written with openpyxl's write-only
+    mode: line items are streamed row by row from the DataFrame columns with
+    shared named styles instead of being held as styled cells in memory. The
+    summary sheets are built by the same code as the regular mode and then
+    streamed into the workbook, so they are unchanged.
+    """
     
-    def __init__(self, output_path):
+    def __init__(self, output_path, write_only=False):
         self.output_path = output_path
+        self.write_only = write_only
+        # In write-only mode this workbook only holds the small summary sheets
         self.wb = Workbook()
         
         # Color scheme
@@ -58,7 +86,7 @@ class ExcelExporter:
         self.border = Border(left=thin_border, right=thin_border, 
                            top=thin_border, bottom=thin_border)
     
-    def export_budget_analysis(self, df, budget_data, risk_data, optimizations):
+    def export_budget_analysis(self, df, budget_data, risk_data, optimizations, aggregates=None):
         """
         Export complete budget analysis to Excel
         
@@ -67,15 +95,19 @@ class ExcelExporter:
             budget_data: Dictionary with budget summary
             risk_data: Dictionary with risk analysis
             optimizations: List of optimization recommendations
+            aggregates: optional BudgetAggregates for the department sheet
         """
         # Remove default sheet
         if 'Sheet' in self.wb.sheetnames:
             self.wb.remove(self.wb['Sheet'])
         
+        if self.write_only:
+            return self._export_write_only(df, budget_data, risk_data, optimizations, aggregates)
+        
         # Create sheets
         self._create_overview_sheet(budget_data, risk_data)
         self._create_detail_sheet(df)
-        self._create_department_sheet(df)
+        self._create_department_sheet(df, aggregates)
         self._create_risk_sheet(df, risk_data)
         self._create_recommendations_sheet(optimizations)
         
@@ -83,6 +115,110 @@ class ExcelExporter:
         self.wb.save(self.output_path)
         return self.output_path
     
+    def _export_write_only(self, df, budget_data, risk_data, optimizations, aggregates):
+        """Build the summary sheets in memory, then stream every sheet to a write-only workbook"""
+        self._create_overview_sheet(budget_data, risk_data)
+        self._create_department_sheet(df, aggregates)
+        self._create_risk_sheet(df, risk_data)
+        self._create_recommendations_sheet(optimizations)
+        
+        streamed = Workbook(write_only=True)
+        summary_sheets = self.wb.worksheets
+        self._copy_sheet(summary_sheets[0], streamed.create_sheet(summary_sheets[0].title))
+        self._stream_detail_sheet(streamed, df)
+        for source in summary_sheets[1:]:
+            self._copy_sheet(source, streamed.create_sheet(source.title))
+        
+        streamed.save(self.output_path)
+        return self.output_path
+    
+    @staticmethod
+    def _copy_sheet(source, target):
+        """Stream a regular worksheet into a write-only one with its styles and layout"""
+        for key, dimension in source.column_dimensions.items():
+            target.column_dimensions[key].width = dimension.width
+        target.freeze_panes = source.freeze_panes
+        for merged in source.merged_cells.ranges:
+            target.merged_cells.add(merged.coord)
+        
+        for source_row in source.iter_rows():
+            row = []
+            for cell in source_row:
+                new_cell = WriteOnlyCell(target, value=cell.value)
+                if cell.has_style:
+                    new_cell.font = copy(cell.font)
+                    new_cell.fill = copy(cell.fill)
+                    new_cell.border = copy(cell.border)
+                    new_cell.alignment = copy(cell.alignment)
+                    new_cell.number_format = cell.number_format
+                row.append(new_cell)
+            target.append(row)
+    
+    def _stream_detail_sheet(self, wb, df):
+        """Write-only version of _create_detail_sheet"""
+        ws = wb.create_sheet('Budget Details')
+        
+        # Layout has to be set before the first row is written
+        for letter, width in zip('ABCDEF', [40, 20, 20, 25, 15, 30]):
+            ws.column_dimensions[letter].width = width
+        ws.freeze_panes = 'A4'
+        ws.merged_cells.add('A1:F1')
+        
+        text_style = NamedStyle(name='budget_detail_text', font=copy(DEFAULT_FONT), border=self.border)
+        amount_style = NamedStyle(name='budget_detail_amount', font=copy(DEFAULT_FONT), border=self.border, number_format='$#,##0.00')
+        wb.add_named_style(text_style)
+        wb.add_named_style(amount_style)
+        
+        # Title
+        title = WriteOnlyCell(ws, value='BUDGET LINE ITEMS')
+        title.font = self.title_font
+        ws.append([title])
+        ws.append([])
+        
+        # Headers
+        headers = []
+        for header, _ in DETAIL_COLUMNS:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = self.header_font
+            cell.fill = self.header_fill
+            cell.alignment = self.center_alignment
+            cell.border = self.border
+            headers.append(cell)
+        ws.append(headers)
+        
+        # Data: one styled cell per column, reused for every row (each row is
+        # serialized as soon as it is appended)
+        row_cells = []
+        for header, _ in DETAIL_COLUMNS:
+            cell = WriteOnlyCell(ws)
+            cell.style = amount_style.name if header == 'Amount' else text_style.name
+            row_cells.append(cell)
+        
+        n_rows = len(df)
+        columns = []
+        for header, column in DETAIL_COLUMNS:
+            if column == 'Amount':
+                values = df['Amount'].astype(float).tolist() if 'Amount' in df.columns else [0.0] * n_rows
+            elif column in df.columns:
+                values = df[column].astype(object).where(df[column].notna(), None).tolist()
+            else:
+                values = [''] * n_rows
+            columns.append(values)
+        
+        for values in zip(*columns):
+            for cell, value in zip(row_cells, values):
+                cell.value = value
+            ws.append(row_cells)
+        
+        # Total row
+        total_label = WriteOnlyCell(ws, value='TOTAL')
+        total_label.font = self.bold_font
+        total_amount = WriteOnlyCell(ws, value=df['Amount'].sum())
+        total_amount.number_format = '$#,##0.00'
+        total_amount.font = self.bold_font
+        total_amount.fill = self.light_fill
+        ws.append([total_label, None, None, None, total_amount])
+    
     def _create_overview_sheet(self, budget_data, risk_data):
         """Create executive overview sheet"""
         ws = self.wb.create_sheet('Overview', 0)
@@ -223,7 +359,7 @@ class ExcelExporter:
         # Freeze panes
         ws.freeze_panes = 'A4'
     
-    def _create_department_sheet(self, df):
+    def _create_department_sheet(self, df, aggregates=None):
         """Create department summary sheet"""
         if 'Department' not in df.columns:
             return
@@ -245,22 +381,27 @@ class ExcelExporter:
             cell.alignment = self.center_alignment
             cell.border = self.border
         
-        # Calculate department totals
-        dept_summary = df.groupby('Department').agg({
-            'Amount': ['sum', 'count', 'mean']
-        }).round(2)
+        # Department totals, sorted by amount descending
+        if aggregates is not None and aggregates.has('department'):
+            dept_summary = [
+                (dept, round(amount, 2), count, round(amount / count, 2) if count else 0.0)
+                for dept, amount, count in zip(*(aggregates.ranked('department')[c].tolist() for c in ('key', 'total', 'count')))
+            ]
+        else:
+            grouped = df.groupby('Department').agg({
+                'Amount': ['sum', 'count', 'mean']
+            }).round(2)
+            grouped = grouped.sort_values(('Amount', 'sum'), ascending=False)
+            dept_summary = [
+                (dept, grouped.loc[dept, ('Amount', 'sum')], grouped.loc[dept, ('Amount', 'count')], grouped.loc[dept, ('Amount', 'mean')])
+                for dept in grouped.index
+            ]
         
         total_budget = df['Amount'].sum()
         
-        # Sort by amount descending
-        dept_summary = dept_summary.sort_values(('Amount', 'sum'), ascending=False)
-        
         # Data
         row = 4
-        for dept in dept_summary.index:
-            amount = dept_summary.loc[dept, ('Amount', 'sum')]
-            count = dept_summary.loc[dept, ('Amount', 'count')]
-            avg = dept_summary.loc[dept, ('Amount', 'mean')]
+        for dept, amount, count, avg in dept_summary:
             percentage = (amount / total_budget * 100) if total_budget > 0 else 0
             
             ws.cell(row=row, column=1, value=dept)
@@ -392,7 +533,7 @@ class ExcelExporter:
         ws.column_dimensions['D'].width = 15
 
 
-def export_to_excel(df, budget_data, risk_data, optimizations, output_path):
+def export_to_excel(df, budget_data, risk_data, optimizations, output_path, aggregates=None, write_only=False):
     """
     Export budget analysis to Excel file
     
@@ -402,12 +543,14 @@ def export_to_excel(df, budget_data, risk_data, optimizations, output_path):
         risk_data: Dictionary with risk analysis
         optimizations: List of optimization recommendations
         output_path: Path where Excel file should be saved
+        aggregates: optional BudgetAggregates (department totals)
+        write_only: stream the workbook (for large budgets, see ExcelExporter)
         
     Returns:
         Path to generated Excel file
     """
-    exporter = ExcelExporter(output_path)
-    return exporter.export_budget_analysis(df, budget_data, risk_data, optimizations)
+    exporter = ExcelExporter(output_path, write_only=write_only)
+    return exporter.export_budget_analysis(df, budget_data, risk_data, optimizations, aggregates)
 
 
 # Example usage in Flask route:
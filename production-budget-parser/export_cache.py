@@ -0,0 +1,183 @@
+"""
+Export Cache
+Content-addressed cache for generated Excel workbooks and PDF reports
+
+An artifact's file name is derived from (analysis id, content version,
+exporter version), so a file that exists is always current: a changed
+analysis or a new exporter release produces a different name and the old
+file is left for the janitor. Files are written to a temporary name and
+renamed into place, so concurrent requests never serve a partial file.
+
+The janitor keeps the export files in the outputs folder within an age and
+total-size budget. It only touches export artifacts (budget_analysis_*.xlsx
+and budget_report_*.pdf); anything else in the folder is left alone.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from keyed_locks import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+# Artifact kinds: file name prefix and extension
+EXPORT_KINDS = {
+    'excel': ('budget_analysis_', '.xlsx'),
+    'pdf': ('budget_report_', '.pdf'),
+}
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600
+# Minimum seconds between janitor runs triggered by new artifacts
+DEFAULT_SWEEP_INTERVAL = 300
+
+_TMP_PREFIX = '.export-'
+
+
+class ExportCache:
+    """
+    Usage:
+        path = exports.get_or_create('excel', analysis.id, analysis.content_version,
+                                     EXCEL_EXPORTER_VERSION, lambda path: export_to_excel(..., path))
+        return send_file(path, ...)
+
+    Counters are per process; see stats().
+    """
+
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._counters = {kind: {'hits': 0, 'misses': 0, 'generation_seconds': 0.0} for kind in EXPORT_KINDS}
+        self._key_locks = KeyedLocks()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def path_for(self, kind, analysis_id, content_version, exporter_version):
+        """Cache file path for one artifact"""
+        prefix, extension = EXPORT_KINDS[kind]
+        digest = hashlib.sha256(f'{analysis_id}:{content_version}:{exporter_version}'.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.folder, f'{prefix}{analysis_id}_{digest}{extension}')
+
+    def get_or_create(self, kind, analysis_id, content_version, exporter_version, build):
+        """
+        Path of a current artifact, generating it on a miss
+
+        Args:
+            kind: 'excel' or 'pdf'
+            analysis_id, content_version: identify the analysis data
+            exporter_version: version of the code that lays out the file
+            build: callable(path) that writes the artifact to path
+
+        Returns:
+            Path to the artifact
+        """
+        path = self.path_for(kind, analysis_id, content_version, exporter_version)
+
+        # One build per artifact at a time; later callers wait and then hit
+        with self._key_locks.hold(path):
+            if os.path.exists(path):
+                os.utime(path)  # The janitor ages files by last use
+                self._count(kind, 'hits')
+                return path
+
+            tmp_path = os.path.join(self.folder, f'{_TMP_PREFIX}{os.getpid()}-{threading.get_ident()}-{os.path.basename(path)}')
+            start = time.perf_counter()
+            try:
+                build(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            elapsed = time.perf_counter() - start
+            self._count(kind, 'misses', elapsed)
+            logger.info('Generated %s export for %s in %.2fs', kind, analysis_id, elapsed)
+
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+        return path
+
+    def _count(self, kind, counter, elapsed=None):
+        with self._lock:
+            self._counters[kind][counter] += 1
+            if elapsed is not None:
+                self._counters[kind]['generation_seconds'] += elapsed
+
+    def stats(self):
+        """
+        Hit/miss counters per kind, with the generation time hits saved
+        (estimated from the average generation time of misses)
+        """
+        with self._lock:
+            stats = {}
+            for kind, counters in self._counters.items():
+                average = counters['generation_seconds'] / counters['misses'] if counters['misses'] else 0.0
+                stats[kind] = {
+                    'hits': counters['hits'],
+                    'misses': counters['misses'],
+                    'generation_seconds': round(counters['generation_seconds'], 3),
+                    'estimated_seconds_saved': round(counters['hits'] * average, 3)
+                }
+            return stats
+
+    def _artifacts(self):
+        """(path, size, mtime, is_tmp) of every export and temporary file in the folder"""
+        artifacts = []
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return artifacts
+        for entry in entries:
+            name = entry.name
+            is_export = any(name.startswith(prefix) and name.endswith(extension) for prefix, extension in EXPORT_KINDS.values())
+            is_tmp = name.startswith(_TMP_PREFIX)
+            if not (is_export or is_tmp) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            artifacts.append((entry.path, stat.st_size, stat.st_mtime, is_tmp))
+        return artifacts
+
+    def sweep(self):
+        """
+        Delete export files unused for longer than max_age_seconds, then the
+        least recently used ones until the total fits in max_bytes
+
+        Returns:
+            (files removed, bytes removed)
+        """
+        with self._lock:
+            self._last_sweep = time.time()
+        now = time.time()
+        removed_files = removed_bytes = 0
+
+        keep = []
+        for path, size, mtime, is_tmp in self._artifacts():
+            # Temporary files are only removed once they are clearly abandoned
+            if now - mtime > self.max_age_seconds or (is_tmp and now - mtime > 3600):
+                removed_files, removed_bytes = self._remove(path, size, removed_files, removed_bytes)
+            elif not is_tmp:
+                keep.append((mtime, path, size))
+
+        total = sum(size for _, _, size in keep)
+        for mtime, path, size in sorted(keep):
+            if total <= self.max_bytes:
+                break
+            removed_files, removed_bytes = self._remove(path, size, removed_files, removed_bytes)
+            total -= size
+
+        if removed_files:
+            logger.info('Export janitor removed %d files (%.1f MB)', removed_files, removed_bytes / 1024 / 1024)
+        return removed_files, removed_bytes
+
+    @staticmethod
+    def _remove(path, size, removed_files, removed_bytes):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return removed_files, removed_bytes
+        return removed_files + 1, removed_bytes + size
@@ -0,0 +1,247 @@
+"""
+Frame Store
+Compact columnar storage for analyzed budget DataFrames
+
+Frames are saved as a compressed NumPy archive (.npz) with one member per
+column. Numeric, boolean and datetime columns keep their dtype; text columns
+are dictionary-encoded (int32 codes plus the distinct values), which suits
+budgets where Category/Department/Vendor repeat on most rows. Members are
+decompressed on access, so a reader that needs two columns never inflates
+the rest.
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+_META_KEY = '__meta__'
+
+
+def _encode_column(series, key):
+    """Return (column meta, {member name: array}) for one column"""
+    values = series.to_numpy()
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        if values.dtype.kind in 'biuf':
+            return {'kind': 'array'}, {key: values}
+
+    if pd.api.types.is_datetime64_any_dtype(series) and getattr(series.dt, 'tz', None) is None:
+        return {'kind': 'datetime', 'dtype': str(series.dtype)}, {key: values.view('int64')}
+
+    # The str dtype guarantees text values; object columns are checked value by value
+    if isinstance(series.dtype, pd.StringDtype) or all(isinstance(value, str) for value in series.dropna().tolist()):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        uniques = np.asarray(uniques.tolist(), dtype=str) if len(uniques) else np.array([], dtype='U1')
+        return {'kind': 'text'}, {key: codes.astype(np.int32), key + '.values': uniques}
+
+    # Mixed or unusual columns: keep them readable without pickling
+    payload = series.to_json(orient='values', date_format='iso')
+    return {'kind': 'json'}, {key: np.frombuffer(payload.encode('utf-8'), dtype=np.uint8)}
+
+
+def _decode_column(archive, key, meta, rows=None):
+    kind = meta['kind']
+    if kind == 'array':
+        return archive[key] if rows is None else archive[key][rows]
+    if kind == 'datetime':
+        values = archive[key] if rows is None else archive[key][rows]
+        return values.view(meta['dtype'])
+    if kind == 'text':
+        codes = archive[key] if rows is None else archive[key][rows]
+        uniques = archive[key + '.values']
+        values = np.empty(len(codes), dtype=object)
+        present = codes >= 0
+        values[present] = uniques[codes[present]].astype(object)
+        values[~present] = np.nan
+        return pd.array(values, dtype='str')
+    if kind == 'json':
+        values = pd.read_json(io.StringIO(archive[key].tobytes().decode('utf-8')), typ='series', orient='values').to_numpy()
+        return values if rows is None else values[rows]
+    raise ValueError(f'Unknown column encoding: {kind}')
+
+
+def encode_frame(df):
+    """
+    Serialize a DataFrame to the compressed columnar format
+
+    Args:
+        df: pandas DataFrame with a default RangeIndex
+
+    Returns:
+        bytes suitable for BudgetAnalysis.dataframe_blob
+    """
+    meta = {'version': FORMAT_VERSION, 'rows': len(df), 'columns': []}
+    arrays = {}
+
+    for i, column in enumerate(df.columns):
+        column_meta, column_arrays = _encode_column(df[column], f'c{i}')
+        column_meta['name'] = str(column)
+        meta['columns'].append(column_meta)
+        arrays.update(column_arrays)
+
+    arrays[_META_KEY] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def read_meta(blob):
+    """Column names and row count of a stored frame, without decoding any column"""
+    with np.load(io.BytesIO(blob), allow_pickle=False) as archive:
+        return json.loads(archive[_META_KEY].tobytes().decode('utf-8'))
+
+
+def _open(blob):
+    try:
+        archive = np.load(io.BytesIO(blob), allow_pickle=False)
+    except (zipfile.BadZipFile, ValueError, OSError) as e:
+        raise ValueError(f'Not a stored budget frame: {e}') from e
+    meta = json.loads(archive[_META_KEY].tobytes().decode('utf-8'))
+    if meta.get('version') != FORMAT_VERSION:
+        archive.close()
+        raise ValueError(f"Unsupported frame format version: {meta.get('version')}")
+    return archive, meta
+
+
+def decode_frame(blob, columns=None, rows=None):
+    """
+    Load a DataFrame written by encode_frame
+
+    Args:
+        blob: bytes from encode_frame
+        columns: optional list of column names to load; names that are not
+            stored are skipped, so callers can ask for optional columns
+        rows: optional array of row positions to load, in that order (the
+            result gets a fresh RangeIndex)
+
+    Returns:
+        pandas DataFrame
+    """
+    archive, meta = _open(blob)
+    with archive:
+        wanted = None if columns is None else set(columns)
+        data = {}
+        for i, column_meta in enumerate(meta['columns']):
+            name = column_meta['name']
+            if wanted is not None and name not in wanted:
+                continue
+            data[name] = _decode_column(archive, f'c{i}', column_meta, rows)
+
+    if columns is not None:
+        data = {name: data[name] for name in columns if name in data}
+    return pd.DataFrame(data, index=pd.RangeIndex(meta['rows'] if rows is None else len(rows)))
+
+
+class FrameWriter:
+    """
+    Build a stored frame from row chunks without holding the whole frame
+
+    Each column is spilled to a temporary file as chunks arrive (text columns
+    as int32 codes against a running dictionary of distinct values), and
+    finish() streams those files into the archive. Memory use is one chunk
+    plus the distinct text values. Column types are taken from the first
+    chunk; later chunks are cast to match.
+
+    Usage:
+        with FrameWriter() as writer:
+            for chunk in chunks:
+                writer.add(chunk)
+            blob = writer.finish()  # or writer.finish(path) to write the archive to a file
+    """
+
+    def __init__(self, spill_dir=None):
+        self._tmp = tempfile.TemporaryDirectory(prefix='frame-', dir=spill_dir)
+        self._columns = None
+        self._files = []
+        self._dictionaries = []
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for spill in self._files:
+            spill.close()
+        self._tmp.cleanup()
+
+    def _start(self, df):
+        self._columns = []
+        for i, column in enumerate(df.columns):
+            series = df[column]
+            if series.dtype.kind in 'biuf':
+                column_meta = {'name': str(column), 'kind': 'array', 'dtype': series.dtype}
+                self._dictionaries.append(None)
+            else:
+                column_meta = {'name': str(column), 'kind': 'text', 'dtype': np.dtype(np.int32)}
+                self._dictionaries.append({})
+            self._columns.append(column_meta)
+            self._files.append(open(os.path.join(self._tmp.name, f'c{i}'), 'wb'))
+
+    def add(self, df):
+        """Append a chunk of rows (same columns as the first chunk)"""
+        if self._columns is None:
+            self._start(df)
+        elif [str(c) for c in df.columns] != [c['name'] for c in self._columns]:
+            raise ValueError('Chunk columns do not match the first chunk')
+
+        for column_meta, dictionary, spill, column in zip(self._columns, self._dictionaries, self._files, df.columns):
+            series = df[column]
+            if dictionary is None:
+                values = series.to_numpy().astype(column_meta['dtype'], copy=False)
+            else:
+                local_codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                mapping = np.array(
+                    [dictionary.setdefault(str(value), len(dictionary)) for value in uniques.tolist()] + [-1],
+                    dtype=np.int32
+                )
+                values = mapping[local_codes]
+            spill.write(np.ascontiguousarray(values).tobytes())
+        self.rows += len(df)
+
+    def finish(self, out=None):
+        """
+        Assemble the stored frame (same format as encode_frame)
+
+        Args:
+            out: optional path or binary file object to write the archive to;
+                without it the archive is built in memory
+
+        Returns:
+            the stored-frame bytes, or None when out is given
+        """
+        if self._columns is None:
+            raise ValueError('No chunks were added')
+
+        meta = {'version': FORMAT_VERSION, 'rows': self.rows, 'columns': [
+            {'name': c['name'], 'kind': c['kind']} for c in self._columns
+        ]}
+        buffer = io.BytesIO() if out is None else out
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for i, (column_meta, dictionary, spill) in enumerate(zip(self._columns, self._dictionaries, self._files)):
+                spill.close()
+                with archive.open(f'c{i}.npy', 'w', force_zip64=True) as member, open(spill.name, 'rb') as source:
+                    np.lib.format.write_array_header_2_0(member, {
+                        'descr': np.lib.format.dtype_to_descr(column_meta['dtype']),
+                        'fortran_order': False,
+                        'shape': (self.rows,)
+                    })
+                    shutil.copyfileobj(source, member, 1024 * 1024)
+                if dictionary is not None:
+                    uniques = np.asarray(list(dictionary), dtype=str) if dictionary else np.array([], dtype='U1')
+                    with archive.open(f'c{i}.values.npy', 'w', force_zip64=True) as member:
+                        np.lib.format.write_array(member, uniques, allow_pickle=False)
+            with archive.open(f'{_META_KEY}.npy', 'w') as member:
+                np.lib.format.write_array(member, np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8))
+        return buffer.getvalue() if out is None else None
@@ -1,10 +1,10 @@
 """
 Initialize Fresh Database
-Creates empty SQLite database with all tables
+Creates an empty database (SQLite, or DATABASE_URL) with all tables
 """
 
 from flask import Flask
-from database_models import db, init_db, get_database_stats
+from database_models import db, init_db, get_database_stats, database_url, engine_options
 
 def create_database():
     """Create fresh database with all tables"""
@@ -15,7 +15,8 @@ def create_database():
     
     # Create Flask app
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///budget_analysis.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     print("🗄️  Initializing database...")
@@ -35,7 +36,7 @@ def create_database():
         print(f"   Total Line Items: {stats['total_line_items']}")
         print(f"   Total Comparisons: {stats['total_comparisons']}")
         print()
-        print("Database file: budget_analysis.db")
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
         print()
         print("Tables created:")
         print("  ✅ budget_analyses")
@@ -0,0 +1,185 @@
+"""
+Insight Cache
+AI insights shared by analyses whose prompts would be the same
+
+The model only sees an analysis' summary metrics, risk flags
+(items_by_category) and optimizations (ai_insights.prompt_inputs), so
+analyses that agree on those, such as a re-uploaded CSV or a draft saved
+without changes, get the same insights. Results are stored in the
+insight_cache table under a SHA-256 fingerprint of those normalized inputs,
+the prompt template version and the model; a new template or model misses
+and generates afresh.
+
+Entries expire INSIGHTS_CACHE_TTL seconds after they were generated, and the
+least recently used go first once the stored insights exceed
+INSIGHTS_CACHE_MAX_BYTES. Hits, misses, evictions and the model time hits
+saved are counted in the stats table, shared by all processes (stats()).
+
+Usage:
+    cache = InsightCache(ttl_seconds, max_bytes)
+    key = fingerprint(inputs, model, PROMPT_VERSION)
+    insights = cache.get(key)
+    if insights is None:
+        insights = ...  # model call
+        cache.put(key, insights, model, PROMPT_VERSION, seconds)
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from dashboard_stats import add_counters, read_counters
+from database_models import db, DashboardStat, InsightCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# Counter names in the stats table
+METRICS_PREFIX = 'insights_cache:'
+# Entries deleted per statement when evicting
+_DELETE_CHUNK = 500
+
+
+def fingerprint(inputs, model, prompt_version):
+    """Cache key: SHA-256 of the canonical JSON of the prompt inputs, prompt version and model"""
+    canonical = json.dumps({'inputs': inputs, 'model': model, 'prompt_version': prompt_version},
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InsightCache:
+    """
+    Insights by fingerprint in the insight_cache table
+
+    Holds no state of its own, so any number of instances and processes
+    can share one database.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES, session=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.session = session or db.session
+
+    def _count(self, **counters):
+        add_counters(self.session, {METRICS_PREFIX + name: value for name, value in counters.items()})
+
+    def get(self, key, record_miss=True, now=None):
+        """
+        Cached insights for a fingerprint, or None
+
+        Args:
+            record_miss: Count a miss; pass False for a lookup that is
+                followed by another one (the second records the outcome)
+        """
+        now = now or datetime.utcnow()
+        table = InsightCacheEntry.__table__
+        row = self.session.execute(
+            select(table.c.insights_json, table.c.generation_seconds, table.c.created_at)
+            .where(table.c.fingerprint == key)
+        ).first()
+        if row is not None and row.created_at < now - timedelta(seconds=self.ttl_seconds):
+            self.session.execute(delete(table).where(table.c.fingerprint == key))
+            self._count(evictions=1)
+            row = None
+        if row is None:
+            if record_miss:
+                self._count(misses=1)
+            self.session.commit()
+            return None
+        self.session.execute(update(table).where(table.c.fingerprint == key)
+                             .values(hits=table.c.hits + 1, last_used_at=now))
+        self._count(hits=1, saved_seconds=row.generation_seconds or 0)
+        self.session.commit()
+        return json.loads(row.insights_json)
+
+    def put(self, key, insights, model, prompt_version, generation_seconds, now=None):
+        """Store the insights generated for a fingerprint, then apply the TTL and size bound"""
+        now = now or datetime.utcnow()
+        data = json.dumps(insights)
+        try:
+            self.session.execute(insert(InsightCacheEntry.__table__).values(
+                fingerprint=key, model=model, prompt_version=prompt_version, insights_json=data,
+                size_bytes=len(data.encode('utf-8')), generation_seconds=generation_seconds, hits=0,
+                created_at=now, last_used_at=now
+            ))
+            self.session.commit()
+        except IntegrityError:
+            # Another process stored the same inputs meanwhile; keep theirs
+            self.session.rollback()
+        self.evict(now)
+
+    def evict(self, now=None):
+        """
+        Delete expired entries, then the least recently used ones until the
+        insights stored fit in max_bytes
+
+        Returns:
+            int: Entries deleted
+        """
+        now = now or datetime.utcnow()
+        table = InsightCacheEntry.__table__
+        removed = self.session.execute(
+            delete(table).where(table.c.created_at < now - timedelta(seconds=self.ttl_seconds))
+        ).rowcount
+        total = self.session.scalar(select(func.coalesce(func.sum(table.c.size_bytes), 0)))
+        if total > self.max_bytes:
+            victims = []
+            for key, size in self.session.execute(
+                select(table.c.fingerprint, table.c.size_bytes).order_by(table.c.last_used_at, table.c.fingerprint)
+            ):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+            for start in range(0, len(victims), _DELETE_CHUNK):
+                self.session.execute(delete(table).where(table.c.fingerprint.in_(victims[start:start + _DELETE_CHUNK])))
+            removed += len(victims)
+        self._count(evictions=removed)
+        self.session.commit()
+        if removed:
+            logger.info('Evicted %d AI insight cache entries', removed)
+        return removed
+
+    def clear(self):
+        """Delete every entry and reset the counters; returns the entries deleted"""
+        removed = self.session.execute(delete(InsightCacheEntry.__table__)).rowcount
+        self.session.execute(delete(DashboardStat.__table__).where(
+            DashboardStat.name.startswith(METRICS_PREFIX, autoescape=True)
+        ))
+        self.session.commit()
+        return removed
+
+    def stats(self):
+        """
+        Cache metrics across all processes
+
+        Returns:
+            dict: entries, bytes, max_bytes, ttl_seconds, hits, misses,
+            hit_rate (None before the first lookup), evictions,
+            saved_seconds (model time hits avoided) and
+            avg_generation_seconds (of the entries stored)
+        """
+        table = InsightCacheEntry.__table__
+        entries, size, generation = self.session.execute(
+            select(func.count(), func.coalesce(func.sum(table.c.size_bytes), 0), func.avg(table.c.generation_seconds))
+        ).one()
+        counters = read_counters(METRICS_PREFIX, self.session)
+        hits = int(round(counters.get('hits', 0)))
+        misses = int(round(counters.get('misses', 0)))
+        return {
+            'entries': entries,
+            'bytes': int(size),
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'evictions': int(round(counters.get('evictions', 0))),
+            'saved_seconds': round(counters.get('saved_seconds', 0), 2),
+            'avg_generation_seconds': round(generation, 2) if generation is not None else None,
+        }
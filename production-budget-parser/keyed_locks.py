@@ -0,0 +1,46 @@
+"""
+Keyed Locks
+One lock per key, held only while some thread uses the key
+
+Threads that want the same key (e.g. one cache entry) take turns; threads
+with different keys do not wait for each other. A key's lock is dropped
+when its last user releases it, so the map holds only the keys in use
+rather than every key ever seen.
+
+Usage:
+    locks = KeyedLocks()
+    with locks.hold(key):
+        ...
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class KeyedLocks:
+    """Reference-counted map of key -> threading.Lock"""
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, users]
+        self._guard = threading.Lock()
+
+    def __len__(self):
+        with self._guard:
+            return len(self._locks)
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock of a key for the duration of the block"""
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
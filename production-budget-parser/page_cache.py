@@ -0,0 +1,98 @@
+"""
+Page Cache
+In-process LRU cache for rendered analysis pages
+
+Pages are keyed by (analysis id, content version). BudgetAnalysis bumps its
+content_version whenever a stored analysis changes (insights, notes, ...),
+so a changed analysis simply stops matching its old entries, in every
+process, and the stale pages age out. The cache is bounded by the total
+size of the stored pages.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Default bound on the bytes held by one process's page cache
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CachedPage:
+    """Rendered page body with its strong ETag"""
+
+    __slots__ = ('body', 'etag', 'last_modified')
+
+    def __init__(self, body, last_modified=None):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = last_modified
+
+
+class PageCache:
+    """
+    Thread-safe LRU cache of rendered pages bounded by total size
+
+    Usage:
+        page = pages.get((analysis.id, analysis.content_version))
+        if page is None:
+            page = pages.put((analysis.id, analysis.content_version), html, last_modified)
+
+    A page larger than a quarter of max_bytes is returned but not stored,
+    so one huge budget cannot flush every other entry.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, body, last_modified=None):
+        """
+        Store a rendered page and return it as a CachedPage
+
+        Older versions of the same resource (keys sharing key[0]) are dropped.
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        page = CachedPage(body, last_modified)
+
+        with self._lock:
+            for old_key in [k for k in self._pages if k[0] == key[0]]:
+                self._remove(old_key)
+            if len(body) > self.max_bytes // 4:
+                return page
+            self._pages[key] = page
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+        return page
+
+    def invalidate(self, resource_id):
+        """Drop every cached version of one resource"""
+        with self._lock:
+            for key in [k for k in self._pages if k[0] == resource_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        self.size -= len(self._pages.pop(key).body)
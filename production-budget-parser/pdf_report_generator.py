@@ -20,6 +20,9 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
 import os
 
+# Bump when the report layout changes so cached reports are regenerated
+EXPORTER_VERSION = 1
+
 
 def generate_pdf_report(budget_data, risk_data, optimizations, output_path, visualizations=None):
     """
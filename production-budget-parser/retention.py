@@ -0,0 +1,138 @@
+"""
+Retention
+Batched purge of analyses older than a cutoff date
+
+Old analyses are removed a batch at a time with set-based DELETEs keyed by
+analysis id: line items (in bounded chunks, since one analysis can hold
+millions), aggregates, stored payloads, comparisons on either side,
+finished jobs, and then the analyses themselves. Nothing is loaded through
+the ORM, so no JSON payloads or cascades are read. Each chunk is its own transaction, followed
+by a short pause, so web requests get the database between chunks.
+
+Usage:
+    report = purge_analyses(datetime.utcnow() - timedelta(days=90))
+    report = purge_analyses(cutoff, dry_run=True)  # counts only
+"""
+
+import logging
+import time
+
+from sqlalchemy import delete, func, select
+
+from database_models import db, AnalysisAggregate, AnalysisJob, AnalysisPayload, BudgetAnalysis, BudgetComparison, BudgetLineItem
+
+logger = logging.getLogger(__name__)
+
+# Analyses removed per batch
+DEFAULT_BATCH_SIZE = 100
+# Line items deleted per statement (and transaction)
+DEFAULT_LINE_ITEM_CHUNK = 20000
+# Seconds to sleep after each transaction, leaving the database to the app
+DEFAULT_PAUSE_SECONDS = 0.05
+
+_TABLES = ('line_items', 'aggregates', 'payloads', 'comparisons', 'jobs', 'analyses')
+
+
+def _old_analysis_ids(cutoff):
+    return select(BudgetAnalysis.id).where(BudgetAnalysis.upload_date < cutoff)
+
+
+def count_old_rows(cutoff, session=None):
+    """Rows purge_analyses() would delete, per table (nothing is deleted)"""
+    session = session or db.session
+    old_ids = _old_analysis_ids(cutoff)
+    return {
+        'line_items': session.scalar(select(func.count()).where(BudgetLineItem.analysis_id.in_(old_ids))),
+        'aggregates': session.scalar(select(func.count()).where(AnalysisAggregate.analysis_id.in_(old_ids))),
+        'payloads': session.scalar(select(func.count()).where(AnalysisPayload.analysis_id.in_(old_ids))),
+        'comparisons': session.scalar(select(func.count()).where(db.or_(
+            BudgetComparison.analysis1_id.in_(old_ids), BudgetComparison.analysis2_id.in_(old_ids)
+        ))),
+        'jobs': session.scalar(select(func.count()).where(AnalysisJob.id.in_(old_ids))),
+        'analyses': session.scalar(select(func.count()).where(BudgetAnalysis.upload_date < cutoff)),
+    }
+
+
+def purge_analyses(cutoff, batch_size=DEFAULT_BATCH_SIZE, line_item_chunk=DEFAULT_LINE_ITEM_CHUNK,
+                   pause=DEFAULT_PAUSE_SECONDS, dry_run=False, session=None):
+    """
+    Delete analyses uploaded before cutoff, with everything that refers to them
+
+    Comparisons are removed when either of their analyses is. Each batch
+    commits, so an interrupted purge keeps what it finished and the next
+    run picks up the rest.
+
+    Args:
+        cutoff: datetime; analyses with an older upload_date are deleted
+        batch_size: Analyses per batch
+        line_item_chunk: Line items per DELETE statement
+        pause: Seconds to sleep after each commit
+        dry_run: Only count the rows that would be deleted
+        session: SQLAlchemy session (defaults to db.session)
+
+    Returns:
+        dict: rows per table ('line_items', 'aggregates', 'payloads',
+        'comparisons', 'jobs', 'analyses'), plus 'rows', 'batches', 'seconds',
+        'rows_per_s' and 'dry_run'
+    """
+    session = session or db.session
+    started = time.perf_counter()
+    if dry_run:
+        counts = count_old_rows(cutoff, session)
+        batches = 0
+    else:
+        counts = dict.fromkeys(_TABLES, 0)
+        batches = 0
+        while True:
+            ids = session.scalars(
+                _old_analysis_ids(cutoff).order_by(BudgetAnalysis.upload_date).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            _purge_batch(session, ids, counts, line_item_chunk, pause)
+            batches += 1
+
+    seconds = time.perf_counter() - started
+    rows = sum(counts.values())
+    report = {
+        **counts, 'rows': rows, 'batches': batches, 'seconds': seconds,
+        'rows_per_s': rows / seconds if seconds > 0 else 0.0, 'dry_run': dry_run
+    }
+    logger.info(
+        '%s %d analyses (%d rows) older than %s in %d batches, %.2fs (%.0f rows/s)',
+        'Would purge' if dry_run else 'Purged', counts['analyses'], rows, cutoff, batches, seconds, report['rows_per_s']
+    )
+    return report
+
+
+def _commit(session, pause):
+    session.commit()
+    if pause:
+        time.sleep(pause)
+
+
+def _purge_batch(session, ids, counts, line_item_chunk, pause):
+    """Delete one batch of analyses, children first"""
+    line_items = BudgetLineItem.__table__
+    while True:
+        chunk = select(line_items.c.id).where(line_items.c.analysis_id.in_(ids)).limit(line_item_chunk)
+        deleted = session.execute(delete(line_items).where(line_items.c.id.in_(chunk))).rowcount
+        _commit(session, pause)
+        counts['line_items'] += deleted
+        if deleted < line_item_chunk:
+            break
+
+    counts['aggregates'] += session.execute(
+        delete(AnalysisAggregate.__table__).where(AnalysisAggregate.analysis_id.in_(ids))
+    ).rowcount
+    counts['payloads'] += session.execute(
+        delete(AnalysisPayload.__table__).where(AnalysisPayload.analysis_id.in_(ids))
+    ).rowcount
+    counts['comparisons'] += session.execute(delete(BudgetComparison.__table__).where(db.or_(
+        BudgetComparison.analysis1_id.in_(ids), BudgetComparison.analysis2_id.in_(ids)
+    ))).rowcount
+    counts['jobs'] += session.execute(delete(AnalysisJob.__table__).where(AnalysisJob.id.in_(ids))).rowcount
+    counts['analyses'] += session.execute(
+        delete(BudgetAnalysis.__table__).where(BudgetAnalysis.id.in_(ids))
+    ).rowcount
+    _commit(session, pause)
@@ -37,8 +37,66 @@ import pandas as pd
 import numpy as np
 import json
 import os
+import re
+import zlib
 from datetime import datetime
 
+
+class _DistinctText:
+    """
+    Distinct strings of one column, joined into a single buffer.
+    
+    Scanning one NUL-joined buffer for a literal is much cheaper than testing
+    each string separately; match offsets are mapped back to the string they
+    fall in. Keywords never contain NUL, so a match can not straddle two
+    strings.
+    """
+    
+    def __init__(self, texts):
+        self.count = len(texts)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=self.count)
+        self.starts = np.zeros(self.count, dtype=np.int64)
+        np.cumsum(lengths[:-1] + 1, out=self.starts[1:])
+        self.buffer = "\x00" + "\x00".join(texts) + "\x00"
+        # Anchored prefix/suffix scans rely on NUL only appearing as a separator
+        self._separators_only = self.buffer.count("\x00") == self.count + 1
+        self._texts = texts
+        self._cache = {}
+    
+    def _flags(self, pattern, shift):
+        """Mark each string containing a match of pattern (offset shifted into the string)"""
+        flags = np.zeros(self.count, dtype=bool)
+        if self.count:
+            offsets = np.fromiter((match.start() for match in re.finditer(pattern, self.buffer)), dtype=np.int64)
+            flags[np.searchsorted(self.starts, offsets - 1 + shift, side="right") - 1] = True
+        return flags
+    
+    def contains(self, literal):
+        """Boolean array: does each string contain literal"""
+        key = ("contains", literal)
+        if key not in self._cache:
+            self._cache[key] = self._flags(re.escape(literal), 0)
+        return self._cache[key]
+    
+    def startswith(self, prefix):
+        key = ("startswith", prefix)
+        if key not in self._cache:
+            if self._separators_only:
+                self._cache[key] = self._flags("\x00" + re.escape(prefix), 1)
+            else:
+                self._cache[key] = np.array([text.startswith(prefix) for text in self._texts], dtype=bool)
+        return self._cache[key]
+    
+    def endswith(self, suffix):
+        key = ("endswith", suffix)
+        if key not in self._cache:
+            if self._separators_only:
+                self._cache[key] = self._flags(re.escape(suffix) + "\x00", 0)
+            else:
+                self._cache[key] = np.array([text.endswith(suffix) for text in self._texts], dtype=bool)
+        return self._cache[key]
+
+
 class RiskManager:
     def __init__(self):
         """Initialize the risk manager"""
@@ -88,93 +146,194 @@ class RiskManager:
         
         # High cost threshold (percentage of total budget)
         self.high_cost_threshold = 0.05  # 5%
+        
+        # Columns whose text is scanned for risk keywords
+        self.text_columns = ["Description", "Notes", "Department"]
+        
+        # Number of top risk items kept in the summary
+        self.top_items_limit = 10
+        
+        # Multi-word keywords split at the space, for matches across columns
+        self._spanning_keywords = {
+            category: [tuple(keyword.split(" ", 1)) for keyword in data["keywords"] if " " in keyword]
+            for category, data in self.risk_categories.items()
+        }
     
-    def analyze_risks(self, budget_df):
+    def analyze_risks(self, budget_df, profile=None, keyword_flags=None):
         """
         Analyze budget data for production risks.
         
+        Works column-wise: category keywords are matched against the distinct
+        values of each text column to produce one boolean mask per category,
+        and category totals come straight from the masks. Risk item dicts are only built
+        for flagged rows (once per row, shared across categories).
+        
         Args:
             budget_df: DataFrame with budget data
+            profile: optional BudgetProfile of budget_df; its total and
+                factorized text columns are reused
+            keyword_flags: optional keyword_flags() of budget_df, e.g. with
+                unchanged rows copied from an earlier revision; the text
+                columns are then not scanned
             
         Returns:
             Dictionary of risk analysis results
         """
-        total_budget = budget_df["Amount"].sum()
-        high_cost_threshold = total_budget * self.high_cost_threshold
-        
-        # Initialize risks dictionary
-        risks = {category: [] for category in self.risk_categories.keys()}
-        risks["high_cost"] = []
-        
-        # Analyze each budget item
-        for _, row in budget_df.iterrows():
-            # Check for high cost items
-            if row["Amount"] >= high_cost_threshold:
-                risks["high_cost"].append(self._create_risk_item(row, total_budget))
+        total_budget = profile.total if profile is not None else budget_df["Amount"].sum()
+        accumulator = self.risk_accumulator(total_budget)
+        accumulator.add(budget_df, profile=profile, keyword_flags=keyword_flags)
+        return accumulator.result()
+    
+    def keyword_flags(self, budget_df, profile=None):
+        """
+        Keyword hits per row as a boolean (rows x categories) array.
+        
+        Columns follow the order of risk_categories. A row's flags depend on
+        its own text only, so they can be stored and reused for rows that do
+        not change between budget revisions.
+        """
+        masks = self._category_masks(budget_df, profile)
+        return np.column_stack(list(masks.values())) if len(budget_df) else np.zeros((0, len(masks)), dtype=bool)
+    
+    def keyword_signature(self):
+        """Checksum of the keyword rules; stored flags are only valid for the same signature"""
+        rules = json.dumps([self.text_columns, {
+            category: data["keywords"] for category, data in self.risk_categories.items()
+        }], sort_keys=True)
+        return zlib.crc32(rules.encode("utf-8"))
+    
+    def risk_accumulator(self, total_budget):
+        """
+        Start an incremental analysis of a budget read in row chunks.
+        
+        Args:
+            total_budget: Total of the Amount column over the whole budget
             
-            # Check for keyword-based risks
-            item_text = ""
-            for col in ["Description", "Notes", "Department"]:
-                if col in row and pd.notna(row[col]):
-                    item_text += str(row[col]).lower() + " "
+        Returns:
+            RiskAccumulator; add() each chunk in file order, then result()
+        """
+        return RiskAccumulator(self, total_budget)
+    
+    def _category_masks(self, budget_df, profile=None):
+        """
+        Return {category: boolean ndarray} of keyword hits per row.
+        
+        Equivalent to searching the lowercase "Description Notes Department "
+        text of each row, but each column is matched on its distinct values
+        only. Multi-word keywords that straddle two columns (e.g. "visual" at
+        the end of a description and "effects" at the start of the notes)
+        are caught by the head/tail check on neighbouring columns.
+        
+        With a BudgetProfile the columns are not factorized again: its codes
+        are reused and only the distinct values are lowercased.
+        """
+        n_rows = len(budget_df)
+        masks = {category: np.zeros(n_rows, dtype=bool) for category in self.risk_categories}
+        heads = {head for pairs in self._spanning_keywords.values() for head, _ in pairs}
+        # Does the last non-empty column so far end with the keyword head?
+        prev_ends = {head: np.zeros(n_rows, dtype=bool) for head in heads}
+        
+        for col in self.text_columns:
+            if col not in budget_df.columns:
+                continue
+            if profile is not None:
+                codes, uniques = profile.codes(col)
+                present = codes >= 0
+                distinct = _DistinctText([str(value).lower() for value in uniques])
+            else:
+                values = budget_df[col]
+                present = values.notna().to_numpy()
+                codes, uniques = pd.factorize(values.astype(str).str.lower())
+                distinct = _DistinctText(uniques.tolist())
             
-            for risk_type, data in self.risk_categories.items():
-                if any(keyword in item_text for keyword in data["keywords"]):
-                    risks[risk_type].append(self._create_risk_item(row, total_budget))
+            def per_row(unique_flags):
+                # Code -1 marks a missing value: point it at an appended False
+                padded = np.append(unique_flags, False)
+                return padded[np.where(codes >= 0, codes, len(unique_flags))]
+            
+            for category, data in self.risk_categories.items():
+                masks[category] |= per_row(np.logical_or.reduce(
+                    [distinct.contains(keyword) for keyword in data["keywords"]]
+                ))
+                for head, tail in self._spanning_keywords[category]:
+                    masks[category] |= prev_ends[head] & per_row(distinct.startswith(tail))
+            
+            for head in heads:
+                prev_ends[head] = np.where(present, per_row(distinct.endswith(head)), prev_ends[head])
         
-        # Calculate risk metrics
-        risk_metrics = self._calculate_risk_metrics(risks, total_budget)
+        return masks
+    
+    def _materialize_risks(self, budget_df, masks, total_budget):
+        """Build the per-category risk item lists from the category masks"""
+        flagged = np.zeros(len(budget_df), dtype=bool)
+        for mask in masks.values():
+            flagged |= mask
         
-        # Generate risk summary
-        risk_summary = {
-            "overall_risk_score": risk_metrics["overall_risk_score"],
-            "risk_level": self._determine_risk_level(risk_metrics["overall_risk_score"]),
-            "total_budget": float(total_budget),
-            "risk_categories": {
-                category: {
-                    "count": len(items),
-                    "amount": sum(item["amount"] for item in items),
-                    "percentage": sum(item["amount"] for item in items) / total_budget * 100 if items else 0,
-                    "description": self.risk_categories[category]["description"] if category in self.risk_categories else "High cost items"
-                }
-                for category, items in risks.items() if category != "high_cost" or items
-            },
-            "high_risk_items": sorted(
-                [item for sublist in risks.values() for item in sublist],
-                key=lambda x: x["amount"],
-                reverse=True
-            )[:10],  # Top 10 risk items by amount
-            "timestamp": datetime.now().isoformat()
-        }
+        rows = np.flatnonzero(flagged)
+        amounts = budget_df["Amount"].to_numpy()[rows]
+        
+        def column_values(name, default):
+            if name in budget_df.columns:
+                return budget_df[name].to_numpy()[rows].tolist()
+            return [default] * len(rows)
+        
+        items = dict(zip(rows.tolist(), (
+            {
+                "description": description,
+                "department": department,
+                "amount": float(amount),
+                "percentage": float(amount / total_budget * 100),
+                "notes": notes
+            }
+            for description, department, amount, notes in zip(
+                column_values("Description", "Unknown"),
+                column_values("Department", "Unknown"),
+                amounts,
+                column_values("Notes", "")
+            )
+        )))
         
         return {
-            "risks": risks,
-            "metrics": risk_metrics,
-            "summary": risk_summary
+            category: [items[row] for row in np.flatnonzero(mask).tolist()]
+            for category, mask in masks.items()
         }
     
-    def _create_risk_item(self, row, total_budget):
-        """Create a standardized risk item from a budget row"""
-        return {
-            "description": row.get("Description", "Unknown"),
-            "department": row.get("Department", "Unknown"),
-            "amount": float(row["Amount"]),
-            "percentage": float(row["Amount"] / total_budget * 100),
-            "notes": row.get("Notes", "")
-        }
+    def _top_risk_items(self, category_candidates):
+        """
+        Top risk items by amount across all categories.
+        
+        Ties keep the order of the flattened category lists (category order,
+        then row order), matching a stable sort over every risk item.
+        
+        Args:
+            category_candidates: Dictionary of category -> (-amount, list index, item)
+                tuples; each category's best top_items_limit are enough
+        """
+        candidates = [
+            (neg_amount, position, index, item)
+            for position, category_list in enumerate(category_candidates.values())
+            for neg_amount, index, item in category_list
+        ]
+        candidates.sort(key=lambda candidate: candidate[:3])
+        return [candidate[3] for candidate in candidates[:self.top_items_limit]]
     
-    def _calculate_risk_metrics(self, risks, total_budget):
-        """Calculate risk metrics from identified risks"""
+    def _calculate_risk_metrics(self, category_totals, total_budget):
+        """
+        Calculate risk metrics from identified risks
+        
+        Args:
+            category_totals: Dictionary of category -> (item count, amount at risk)
+            total_budget: Total budget amount
+        """
         # Calculate weighted risk score
         risk_score = 0
         risk_amount = 0
         risk_weights = {k: v["weight"] for k, v in self.risk_categories.items()}
         risk_weights["high_cost"] = 1.0  # Weight for high cost items
         
-        for risk_type, items in risks.items():
-            if items:
-                # Calculate amount at risk for this category
-                type_amount = sum(item["amount"] for item in items)
+        for risk_type, (count, type_amount) in category_totals.items():
+            if count:
+                # Amount at risk for this category
                 risk_amount += type_amount
                 
                 # Apply weighting
@@ -238,6 +397,108 @@ class RiskManager:
         
         return report_path
 
+
+class RiskAccumulator:
+    """
+    RiskManager.analyze_risks over a budget delivered in row chunks.
+    
+    Keyword hits are per row, so each chunk is scanned on its own; only the
+    high-cost threshold depends on the whole budget, which is why the total
+    is passed in up front. Adding every chunk in file order gives the same
+    result as analyze_risks on the full DataFrame.
+    """
+    
+    def __init__(self, risk_manager, total_budget):
+        self.risk_manager = risk_manager
+        self.total_budget = total_budget
+        self.high_cost_threshold = total_budget * risk_manager.high_cost_threshold
+        categories = list(risk_manager.risk_categories) + ["high_cost"]
+        self.counts = dict.fromkeys(categories, 0)
+        self.amounts = dict.fromkeys(categories, 0.0)
+        self.risks = {category: [] for category in categories}
+        # Best (-amount, list index, item) per category for the high risk summary
+        self._top = {category: [] for category in categories}
+    
+    def add(self, budget_df, profile=None, keyword_flags=None):
+        """
+        Scan one chunk of rows
+        
+        Args:
+            budget_df: DataFrame with the chunk's rows
+            profile: optional BudgetProfile of this chunk
+            keyword_flags: optional RiskManager.keyword_flags() of this chunk
+        """
+        amounts = profile.amounts if profile is not None else budget_df["Amount"].to_numpy(dtype=float)
+        
+        # Boolean mask per category, in the same order as the risks dictionary
+        if keyword_flags is None:
+            masks = self.risk_manager._category_masks(budget_df, profile)
+        else:
+            masks = dict(zip(self.risk_manager.risk_categories, keyword_flags.T))
+        masks["high_cost"] = amounts >= self.high_cost_threshold
+        
+        risks = self.risk_manager._materialize_risks(budget_df, masks, self.total_budget)
+        limit = self.risk_manager.top_items_limit
+        for category, mask in masks.items():
+            item_amounts = amounts[mask]
+            offset = self.counts[category]
+            top = self._top[category] + [
+                (-item_amounts[i], offset + int(i), risks[category][i])
+                for i in np.argsort(-item_amounts, kind="stable")[:limit]
+            ]
+            top.sort(key=lambda candidate: candidate[:2])
+            self._top[category] = top[:limit]
+            
+            self.counts[category] += len(item_amounts)
+            self.amounts[category] += float(item_amounts.sum())
+            self._keep_items(category, risks[category])
+    
+    def _keep_items(self, category, items):
+        """Store a chunk's risk items for one category"""
+        self.risks[category].extend(items)
+    
+    def result(self):
+        """Risk analysis results for all rows added so far"""
+        risk_metrics, risk_summary = self.metrics_and_summary()
+        return {
+            "risks": self.risks,
+            "metrics": risk_metrics,
+            "summary": risk_summary
+        }
+    
+    def metrics_and_summary(self):
+        """The "metrics" and "summary" parts of result(), without the item lists"""
+        risk_manager = self.risk_manager
+        total_budget = self.total_budget
+        category_totals = {
+            category: (self.counts[category], self.amounts[category])
+            for category in self.counts
+        }
+        
+        # Calculate risk metrics
+        risk_metrics = risk_manager._calculate_risk_metrics(category_totals, total_budget)
+        
+        # Generate risk summary
+        risk_summary = {
+            "overall_risk_score": risk_metrics["overall_risk_score"],
+            "risk_level": risk_manager._determine_risk_level(risk_metrics["overall_risk_score"]),
+            "total_budget": float(total_budget),
+            "risk_categories": {
+                category: {
+                    "count": count,
+                    "amount": amount if count else 0,
+                    "percentage": amount / total_budget * 100 if count else 0,
+                    "description": risk_manager.risk_categories[category]["description"] if category in risk_manager.risk_categories else "High cost items"
+                }
+                for category, (count, amount) in category_totals.items() if category != "high_cost" or count
+            },
+            "high_risk_items": risk_manager._top_risk_items(self._top),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        return risk_metrics, risk_summary
+
+
 # Example usage
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,356 @@
+"""
+Search Index
+Ranked full-text search over analyses and line items
+
+SQLite keeps two FTS5 tables:
+
+    budget_analyses_fts     filename, tags, notes of budget_analyses
+    budget_line_items_fts   description, department, vendor of budget_line_items
+                            (external content: indexes the rows in place, so
+                            line item text is not stored twice)
+
+Triggers on the base tables keep them in sync with updates and deletes,
+and with inserts of analyses. Line items have no insert trigger: they are
+indexed once per load instead (indexing_line_items), with one INSERT ...
+SELECT that keeps bulk ingestion ~5x faster than a per-row trigger. That
+makes budget_ingest the one way line items enter the database; the ORM
+(session.add) indexes its rows too, through a mapper event. Rows inserted
+behind both (raw SQL) are not searchable until the index is rebuilt, and
+the delete and update triggers only remove rows the index holds, so they
+can not corrupt it. On PostgreSQL both tables get a generated tsvector
+column with a GIN index instead.
+
+The index is created with the tables (create_all) and added to existing
+databases by upgrade_schema().
+
+Usage:
+    results = search('catering quality', limit=20)
+    results['analyses'], results['line_items']
+"""
+
+import html
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import bindparam, event, text
+
+from database_models import db, BudgetAnalysis, BudgetLineItem
+
+ANALYSES_FTS = 'budget_analyses_fts'
+LINE_ITEMS_FTS = 'budget_line_items_fts'
+
+# Indexed text columns per base table
+_COLUMNS = {
+    BudgetAnalysis.__tablename__: ('filename', 'tags', 'notes'),
+    BudgetLineItem.__tablename__: ('description', 'department', 'vendor'),
+}
+
+# Marks around matched terms inside snippets, replaced by <mark> after escaping
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+
+SNIPPET_TOKENS = 12
+
+_TOKENIZE = "tokenize='unicode61 remove_diacritics 2'"
+
+
+def _sqlite_has_fts5(connection):
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def _sqlite_index_ddl(table):
+    """(FTS table, CREATE statements, statement indexing existing rows) for one base table"""
+    columns = _COLUMNS[table]
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    
+    if table == BudgetLineItem.__tablename__:
+        # External content keyed by the INTEGER PRIMARY KEY, which VACUUM never renumbers.
+        # No insert trigger: new rows are indexed per load by indexing_line_items().
+        # An external-content 'delete' of a row the index does not hold corrupts it,
+        # so deletes are limited to indexed rows (the docsize shadow table has one per row)
+        fts = LINE_ITEMS_FTS
+        indexed = f"EXISTS (SELECT 1 FROM {fts}_docsize WHERE id = old.id)"
+        delete = f"INSERT INTO {fts}({fts}, rowid, {names}) SELECT 'delete', old.id, {old_values} WHERE {indexed};"
+        return fts, [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', content_rowid='id', {_TOKENIZE})",
+            # Recreated so databases indexed before the guard get it
+            f"DROP TRIGGER IF EXISTS {fts}_delete",
+            f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+            f"DROP TRIGGER IF EXISTS {fts}_update",
+            f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN {delete} "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        ], f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+    
+    # budget_analyses has a text primary key and an implicit rowid that VACUUM may
+    # renumber, so its (small) index keeps its own copy of the text keyed by id
+    fts = ANALYSES_FTS
+    assignments = ', '.join(f'{column} = new.{column}' for column in columns)
+    return fts, [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(id UNINDEXED, {names}, {_TOKENIZE})",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(id, {names}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE id = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"UPDATE {fts} SET {assignments} WHERE id = old.id; END",
+    ], f"INSERT INTO {fts}(id, {names}) SELECT id, {names} FROM {table}"
+
+
+def _table_exists(connection, name):
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).first() is not None
+
+
+def _postgres_document(columns):
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+def _create_postgres_index(connection, table):
+    """Generated tsvector column and GIN index for one base table"""
+    connection.exec_driver_sql(
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {_postgres_document(_COLUMNS[table])})) STORED"
+    )
+    connection.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin (search_vector)')
+
+
+def create_search_index(connection, table, index_rows=False):
+    """
+    Add the search index of one base table (idempotent)
+    
+    SQLite without FTS5 gets no index; search() then falls back to
+    substring matching. PostgreSQL computes the tsvector of existing rows
+    itself.
+    
+    Args:
+        connection: SQLAlchemy Connection
+        table: budget_analyses or budget_line_items
+        index_rows: index rows already in a SQLite table when its FTS table is new
+    """
+    if table not in _COLUMNS:
+        return
+    if connection.dialect.name == 'postgresql':
+        _create_postgres_index(connection, table)
+    elif connection.dialect.name == 'sqlite' and _sqlite_has_fts5(connection):
+        fts, statements, populate = _sqlite_index_ddl(table)
+        is_new = not _table_exists(connection, fts)
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if is_new and index_rows:
+            connection.exec_driver_sql(populate)
+
+
+def _drop_search_index(connection, table):
+    if connection.dialect.name == 'sqlite' and table in _COLUMNS:
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {_sqlite_index_ddl(table)[0]}')
+
+
+# Tables made by create_all() get their index right away; drop_all() drops it with them
+for _table in (BudgetAnalysis.__table__, BudgetLineItem.__table__):
+    event.listen(_table, 'after_create', lambda target, connection, **kw: create_search_index(connection, target.name))
+    event.listen(_table, 'after_drop', lambda target, connection, **kw: _drop_search_index(connection, target.name))
+
+
+@event.listens_for(BudgetLineItem, 'after_insert')
+def _index_added_line_item(mapper, connection, target):
+    """Index a line item added through the ORM (loads go through indexing_line_items)"""
+    if connection.dialect.name == 'sqlite' and _table_exists(connection, LINE_ITEMS_FTS):
+        names = _COLUMNS[BudgetLineItem.__tablename__]
+        connection.exec_driver_sql(
+            f"INSERT INTO {LINE_ITEMS_FTS}(rowid, {', '.join(names)}) VALUES (?, {', '.join('?' * len(names))})",
+            (target.id, *(getattr(target, name) for name in names))
+        )
+
+
+def ensure_search_index():
+    """Add the search index to an existing database and index its rows (inside an app context)"""
+    with db.engine.begin() as connection:
+        for table in _COLUMNS:
+            create_search_index(connection, table, index_rows=True)
+
+
+@contextmanager
+def indexing_line_items(session, analysis_id):
+    """
+    Index the line items of an analysis inserted inside the block
+    
+    Rows are picked up by id, so the block may insert any number of rows
+    in any number of statements. No-op on PostgreSQL (generated column) and
+    without an FTS5 index.
+    """
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite' or not _table_exists(connection, LINE_ITEMS_FTS):
+        yield
+        return
+    
+    last_id = connection.exec_driver_sql('SELECT coalesce(max(id), 0) FROM budget_line_items').scalar()
+    yield
+    names = ', '.join(_COLUMNS[BudgetLineItem.__tablename__])
+    connection.exec_driver_sql(
+        f'INSERT INTO {LINE_ITEMS_FTS}(rowid, {names}) SELECT id, {names} FROM budget_line_items '
+        f'WHERE id > ? AND analysis_id = ?', (last_id, analysis_id)
+    )
+
+
+def has_search_index(connection=None):
+    """Whether the connected database has a full-text index (SQLite FTS5 or PostgreSQL tsvector)"""
+    connection = connection or db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        return _table_exists(connection, LINE_ITEMS_FTS) and _table_exists(connection, ANALYSES_FTS)
+    return connection.dialect.name == 'postgresql'
+
+
+def query_terms(query_text):
+    """Words of a user query; a trailing * makes a word match as a prefix (other operators are dropped)"""
+    return re.findall(r'\w+\*?', query_text or '')
+
+
+def _fts5_query(terms):
+    # Every term must match; quoting keeps words from being read as FTS5 syntax
+    return ' '.join(f'"{term[:-1]}"*' if term.endswith('*') else f'"{term}"' for term in terms)
+
+
+def _tsquery(terms):
+    return ' & '.join(f'{term[:-1]}:*' if term.endswith('*') else term for term in terms)
+
+
+def _without_id(row):
+    row.pop('id')
+    return row
+
+
+def _snippet_html(snippet):
+    """Escape a snippet and turn the match marks into <mark> tags"""
+    return html.escape(snippet or '').replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+def _sqlite_search(session, terms, limit):
+    match = _fts5_query(terms)
+    marks = f"'{_MATCH_START}', '{_MATCH_END}', '…', {SNIPPET_TOKENS}"
+    analyses = session.execute(text(
+        f"SELECT a.id, a.filename, a.upload_date, a.total_budget, a.risk_level, "
+        f"snippet({ANALYSES_FTS}, -1, {marks}) AS snippet, bm25({ANALYSES_FTS}) AS rank "
+        f"FROM {ANALYSES_FTS} JOIN budget_analyses a ON a.id = {ANALYSES_FTS}.id "
+        f"WHERE {ANALYSES_FTS} MATCH :match ORDER BY rank LIMIT :limit"
+    ).columns(upload_date=db.DateTime), {'match': match, 'limit': limit}).mappings().all()
+    # bm25 over every match; snippets only for the rows returned
+    top = session.execute(text(
+        f"SELECT rowid AS id, bm25({LINE_ITEMS_FTS}) AS rank FROM {LINE_ITEMS_FTS} "
+        f"WHERE {LINE_ITEMS_FTS} MATCH :match ORDER BY rank LIMIT :limit"
+    ), {'match': match, 'limit': limit}).all()
+    if not top:
+        return analyses, []
+    ranks = dict(top)
+    rows = session.execute(text(
+        f"SELECT li.id, li.analysis_id, a.filename, li.line_number, li.description, li.department, li.vendor, li.amount, "
+        f"snippet({LINE_ITEMS_FTS}, -1, {marks}) AS snippet "
+        f"FROM {LINE_ITEMS_FTS} JOIN budget_line_items li ON li.id = {LINE_ITEMS_FTS}.rowid "
+        f"JOIN budget_analyses a ON a.id = li.analysis_id "
+        f"WHERE {LINE_ITEMS_FTS} MATCH :match AND {LINE_ITEMS_FTS}.rowid IN :ids"
+    ).bindparams(bindparam('ids', expanding=True)), {'match': match, 'ids': list(ranks)}).mappings().all()
+    line_items = sorted(({**row, 'rank': ranks[row['id']]} for row in rows), key=lambda row: row['rank'])
+    return analyses, [_without_id(row) for row in line_items]
+
+
+def _postgres_search(session, terms, limit):
+    query = "to_tsquery('simple', :match)"
+    marks = f"'StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxWords={SNIPPET_TOKENS}, MinWords=3'"
+    analyses = session.execute(text(
+        f"SELECT a.id, a.filename, a.upload_date, a.total_budget, a.risk_level, "
+        f"ts_headline('simple', {_postgres_document(_COLUMNS[BudgetAnalysis.__tablename__])}, {query}, {marks}) AS snippet, "
+        f"-ts_rank(a.search_vector, {query}) AS rank "
+        f"FROM budget_analyses a WHERE a.search_vector @@ {query} ORDER BY rank LIMIT :limit"
+    ).columns(upload_date=db.DateTime), {'match': _tsquery(terms), 'limit': limit}).mappings().all()
+    # ts_rank over every match; headlines only for the rows returned
+    line_items = session.execute(text(
+        f"SELECT li.analysis_id, a.filename, li.line_number, li.description, li.department, li.vendor, li.amount, "
+        f"ts_headline('simple', {_postgres_document(_COLUMNS[BudgetLineItem.__tablename__])}, {query}, {marks}) AS snippet, li.rank "
+        f"FROM (SELECT *, -ts_rank(search_vector, {query}) AS rank FROM budget_line_items "
+        f"WHERE search_vector @@ {query} ORDER BY rank LIMIT :limit) li "
+        f"JOIN budget_analyses a ON a.id = li.analysis_id ORDER BY li.rank"
+    ), {'match': _tsquery(terms), 'limit': limit}).mappings().all()
+    return analyses, line_items
+
+
+def _substring_search(session, terms, limit):
+    """Unindexed fallback (SQLite builds without FTS5): every term as a substring of any column"""
+    def matches(*columns):
+        return [db.or_(*[column.ilike(f'%{term.rstrip("*")}%') for column in columns]) for term in terms]
+    
+    analyses = BudgetAnalysis.query.filter(
+        *matches(BudgetAnalysis.filename, BudgetAnalysis.tags, BudgetAnalysis.notes)
+    ).order_by(BudgetAnalysis.upload_date.desc()).limit(limit).all()
+    line_items = session.query(BudgetLineItem, BudgetAnalysis.filename).join(
+        BudgetAnalysis, BudgetAnalysis.id == BudgetLineItem.analysis_id
+    ).filter(
+        *matches(BudgetLineItem.description, BudgetLineItem.department, BudgetLineItem.vendor)
+    ).limit(limit).all()
+    return (
+        [{'id': a.id, 'filename': a.filename, 'upload_date': a.upload_date, 'total_budget': a.total_budget,
+          'risk_level': a.risk_level, 'snippet': a.filename, 'rank': 0.0} for a in analyses],
+        [{'analysis_id': item.analysis_id, 'filename': filename, 'line_number': item.line_number,
+          'description': item.description, 'department': item.department, 'vendor': item.vendor,
+          'amount': item.amount, 'snippet': item.description, 'rank': 0.0} for item, filename in line_items]
+    )
+
+
+def search(query_text, limit=20, session=None):
+    """
+    Best matching analyses and line items for a free-text query
+
+    Every word must match in any indexed column ("cater*" matches as a
+    prefix). Results are ordered by relevance (bm25 on SQLite, ts_rank on
+    PostgreSQL) over every match.
+
+    Args:
+        query_text: Free text, e.g. "quality catering"
+        limit: Maximum results of each kind
+        session: SQLAlchemy session (defaults to db.session)
+
+    Returns:
+        dict: {'analyses': [...], 'line_items': [...]}, each result with
+        an HTML-safe 'snippet' whose matched terms are wrapped in <mark>
+    """
+    session = session or db.session
+    terms = query_terms(query_text)
+    if not terms:
+        return {'analyses': [], 'line_items': []}
+
+    connection = session.connection()
+    if not has_search_index(connection):
+        analyses, line_items = _substring_search(session, terms, limit)
+    elif connection.dialect.name == 'postgresql':
+        analyses, line_items = _postgres_search(session, terms, limit)
+    else:
+        analyses, line_items = _sqlite_search(session, terms, limit)
+
+    def result(row):
+        row = dict(row)
+        row['snippet'] = _snippet_html(row['snippet'])
+        return row
+
+    return {'analyses': [result(row) for row in analyses], 'line_items': [result(row) for row in line_items]}
+
+
+def matching_analysis_ids(query_text, session=None):
+    """
+    Select of the ids of analyses whose filename, tags or notes match every word
+
+    None when the query has no words or there is no index (callers filter
+    by substring instead).
+    """
+    session = session or db.session
+    terms = query_terms(query_text)
+    connection = session.connection()
+    if not terms or not has_search_index(connection):
+        return None
+    if connection.dialect.name == 'postgresql':
+        return text("SELECT id FROM budget_analyses WHERE search_vector @@ to_tsquery('simple', :match)").bindparams(
+            match=_tsquery(terms)
+        ).columns(id=db.String)
+    return text(
+        f"SELECT a.id FROM {ANALYSES_FTS} JOIN budget_analyses a ON a.id = {ANALYSES_FTS}.id "
+        f"WHERE {ANALYSES_FTS} MATCH :match"
+    ).bindparams(match=_fts5_query(terms)).columns(id=db.String)
@@ -0,0 +1,61 @@
+"""
+Shared fixtures for the budget parser test suite.
+Run with: pytest tests/ -v
+"""
+
+import io
+import os
+import tempfile
+
+import dotenv
+import pytest
+
+# Point the app at a throwaway database and folders before web_app is imported.
+# web_app calls load_dotenv(override=True), which would let a developer's .env
+# redirect the tests to the real database — disable it for the test session.
+_TMP_DIR = tempfile.mkdtemp(prefix='budget-parser-tests-')
+os.environ['SECRET_KEY'] = 'test-secret-key'
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP_DIR, 'test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(_TMP_DIR, 'uploads')
+os.environ['OUTPUT_FOLDER'] = os.path.join(_TMP_DIR, 'outputs')
+os.environ['ARCHIVE_FOLDER'] = os.path.join(_TMP_DIR, 'archive')
+dotenv.load_dotenv = lambda *args, **kwargs: False
+
+SAMPLE_CSV = (
+    "Category,Department,Description,Vendor,Amount\n"
+    "Camera,Camera,Camera package rental,Panavision,45000\n"
+    "Cast,Cast,Principal cast fees,Talent Agency Plus,120000\n"
+    "Locations,Locations,Exterior night location permit,Location Partners,18000\n"
+    "Post,Post-Production,VFX compositing,Design Hub,60000\n"
+    "Catering,Production,Catering,Quality Catering,9500\n"
+    "Catering,Production,Catering,Quality Catering,9500\n"
+    "Insurance,Legal,Insurance liability,Elite Consulting,12000\n"
+)
+
+
+@pytest.fixture
+def app():
+    from web_app import app as flask_app, limiter
+    from database_models import db
+
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    flask_app.config['ANALYSIS_JOBS_EAGER'] = True
+    limiter.enabled = False
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def upload_csv(client, csv_text=SAMPLE_CSV, filename='budget.csv', url='/upload', **form):
+    """POST a CSV to /upload and return the response."""
+    data = {'file': (io.BytesIO(csv_text.encode()), filename), **form}
+    return client.post(url, data=data, content_type='multipart/form-data')
@@ -0,0 +1,162 @@
+"""
+AI insights — background generation, single-flight per analysis, poll and SSE
+Run with: pytest tests/ -v
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import ai_insights
+import flask_auth
+import web_app
+from database_models import db, BudgetAnalysis
+from tests.conftest import upload_csv
+
+INSIGHTS = {'executive_summary': 'Healthy', 'key_concerns': [], 'top_recommendations': [],
+            'budget_health_score': 80, 'outlook': 'POSITIVE'}
+HEADERS = {'X-API-Key': 'test-key'}
+
+
+class FakeClient:
+    """Stands in for anthropic.Anthropic; create() blocks until release is set"""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+        self.messages = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('overloaded')
+        return SimpleNamespace(content=[SimpleNamespace(text='```json\n' + json.dumps(INSIGHTS) + '\n```')])
+
+
+@pytest.fixture
+def model(app, monkeypatch):
+    client = FakeClient()
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'sk-test')
+    monkeypatch.setattr(ai_insights, 'get_client', lambda api_key: client)
+    monkeypatch.setattr(flask_auth, 'verify_api_key', lambda key: key == 'test-key')
+    return client
+
+
+def _upload(client):
+    return upload_csv(client).headers['Location'].rsplit('/', 1)[-1]
+
+
+# ── Generation ────────────────────────────────────────────────────────────────
+
+def test_insights_are_generated_once_and_cached(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    analysis_id = _upload(client)
+    version = db.session.get(BudgetAnalysis, analysis_id).content_version
+
+    resp = client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS)
+    assert resp.status_code == 200 and resp.get_json()['insights'] == INSIGHTS
+    cached = client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS).get_json()
+    assert cached == {'success': True, 'insights': INSIGHTS, 'cached': True}
+    assert model.calls == 1
+
+    db.session.expire_all()
+    assert db.session.get(BudgetAnalysis, analysis_id).content_version == version + 1
+    assert client.post('/api/ai-insights/missing', headers=HEADERS).status_code == 404
+
+
+def test_concurrent_requests_share_one_call(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', False)
+    analysis_id = _upload(client)
+    model.release.clear()
+
+    responses = [client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS) for _ in range(5)]
+    assert [resp.status_code for resp in responses] == [202] * 5
+    assert responses[0].headers['Location'] == f'/api/ai-insights/{analysis_id}'
+    assert client.get(f'/api/ai-insights/{analysis_id}', headers=HEADERS).status_code == 202
+
+    model.release.set()
+    web_app.insights_worker.wait(analysis_id, 5)
+    assert model.calls == 1
+
+    poll = client.get(f'/api/ai-insights/{analysis_id}', headers=HEADERS)
+    assert poll.status_code == 200 and poll.get_json()['insights'] == INSIGHTS
+    events = client.get(f'/api/ai-insights/{analysis_id}/events', headers=HEADERS)
+    assert events.mimetype == 'text/event-stream'
+    assert events.get_data(as_text=True) == f"event: done\ndata: {json.dumps({'status': 'done', 'insights': INSIGHTS})}\n\n"
+
+
+def test_events_stream_until_the_call_finishes(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', False)
+    analysis_id = _upload(client)
+    model.release.clear()
+    client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS)
+    threading.Timer(0.3, model.release.set).start()
+
+    body = client.get(f'/api/ai-insights/{analysis_id}/events', headers=HEADERS).get_data(as_text=True)
+    assert body.startswith(': pending\n\n')
+    assert body.endswith('\n\n') and 'event: done\n' in body
+
+
+def test_failures_are_reported_and_retried(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    analysis_id = _upload(client)
+    model.fail = True
+    resp = client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS)
+    assert resp.status_code == 200 and resp.get_json()['status'] == 'failed'
+    poll = client.get(f'/api/ai-insights/{analysis_id}', headers=HEADERS)
+    assert poll.status_code == 200
+    assert poll.get_json() == {'status': 'failed', 'error': 'Unable to generate insights. Please try again.'}
+
+    model.fail = False
+    assert client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS).status_code == 200
+    assert model.calls == 2
+
+
+def test_claims_by_other_processes_are_respected_until_stale(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    analysis_id = _upload(client)
+    analysis = db.session.get(BudgetAnalysis, analysis_id)
+    assert client.get(f'/api/ai-insights/{analysis_id}', headers=HEADERS).status_code == 404
+
+    analysis.insights_requested_at = datetime.utcnow()
+    db.session.commit()
+    assert client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS).status_code == 202
+    assert model.calls == 0
+
+    analysis.insights_requested_at = datetime.utcnow() - timedelta(seconds=app.config['INSIGHTS_CLAIM_SECONDS'] + 1)
+    db.session.commit()
+    assert client.post(f'/api/ai-insights/{analysis_id}', headers=HEADERS).status_code == 200
+    assert model.calls == 1
+    assert web_app.insights_worker._inflight == {}
+
+
+def test_claim_commits_outside_the_worker_lock(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    analysis_id = _upload(client)
+    worker = web_app.insights_worker
+    claim = worker._claim
+    held = []
+
+    def checked_claim(analysis_id):
+        held.append(worker._lock.locked())
+        # Another request for the analysis joins the reserved future instead of claiming again
+        assert worker.request(analysis_id) is worker._inflight[analysis_id]
+        return claim(analysis_id)
+
+    monkeypatch.setattr(worker, '_claim', checked_claim)
+    assert worker.request(analysis_id).result(timeout=5) == INSIGHTS
+    assert held == [False]
+    assert model.calls == 1 and worker._inflight == {}
+
+
+def test_client_is_shared_per_api_key(monkeypatch):
+    monkeypatch.setattr(ai_insights, '_client', None)
+    first = ai_insights.get_client('sk-one')
+    assert ai_insights.get_client('sk-one') is first
+    assert ai_insights.get_client('sk-two') is not first
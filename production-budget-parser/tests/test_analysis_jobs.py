@@ -0,0 +1,226 @@
+"""
+Background analysis jobs — queueing, progress and restart recovery
+Run with: pytest tests/ -v
+"""
+
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+from database_models import db, AnalysisJob, BudgetAnalysis
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _job_id(resp):
+    return resp.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+
+
+def _queued_job(app, status='queued', updated_at=None):
+    job_id = str(uuid.uuid4())
+    path = f"{app.config['UPLOAD_FOLDER']}/{job_id}_budget.csv"
+    with open(path, 'w') as f:
+        f.write(SAMPLE_CSV)
+    job = AnalysisJob(id=job_id, filename='budget.csv', filepath=path, status=status,
+                      updated_at=updated_at or datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    return job_id
+
+
+# ── Upload → job ──────────────────────────────────────────────────────────────
+
+def test_upload_returns_job_and_redirects_to_analysis(client):
+    resp = upload_csv(client)
+    assert resp.status_code == 302
+    assert '/jobs/' in resp.headers['Location']
+    job_id = _job_id(resp)
+
+    status = client.get(f'/jobs/{job_id}?format=json').get_json()
+    assert status['status'] == 'done'
+    assert status['percent'] == 100
+    assert set(status['timings']) == {'parsing', 'risk_analysis', 'optimizations', 'saving'}
+    assert status['analysis_url'] == f'/analysis/{job_id}'
+
+    resp = client.get(f'/jobs/{job_id}')
+    assert resp.status_code == 302
+    assert resp.headers['Location'].endswith(f'/analysis/{job_id}')
+    assert db.session.get(BudgetAnalysis, job_id) is not None
+
+
+def test_failed_job_reports_reason(client):
+    job_id = _job_id(upload_csv(client, 'Description,Amount\nCamera,100\n'))
+
+    status = client.get(f'/jobs/{job_id}', headers={'Accept': 'application/json'}).get_json()
+    assert status['status'] == 'failed'
+    assert status['error'] == 'Missing required columns: Category'
+
+    resp = client.get(f'/jobs/{job_id}')
+    assert resp.status_code == 302
+    assert db.session.get(BudgetAnalysis, job_id) is None
+
+
+def test_pending_job_shows_progress_page(app, client):
+    job_id = _queued_job(app)
+    resp = client.get(f'/jobs/{job_id}')
+    assert resp.status_code == 200
+    assert b'http-equiv="refresh"' in resp.data
+
+
+def test_unknown_job(client):
+    assert client.get('/jobs/missing?format=json').status_code == 404
+
+
+# ── Worker pool ───────────────────────────────────────────────────────────────
+
+def test_threaded_worker_completes_job(app, client):
+    from web_app import analysis_jobs
+
+    app.config['ANALYSIS_JOBS_EAGER'] = False
+    try:
+        job_id = _job_id(upload_csv(client))
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            status = client.get(f'/jobs/{job_id}?format=json').get_json()
+            if status['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+    finally:
+        analysis_jobs.shutdown()
+        app.config['ANALYSIS_JOBS_EAGER'] = True
+
+    assert status['status'] == 'done'
+
+
+def test_resume_requeues_pending_and_stale_jobs(app):
+    from web_app import analysis_jobs
+
+    queued = _queued_job(app)
+    stale = _queued_job(app, status='running', updated_at=datetime.utcnow() - timedelta(hours=1))
+    live = _queued_job(app, status='running')
+
+    assert analysis_jobs.resume_pending() == 2
+    db.session.expire_all()
+    assert db.session.get(AnalysisJob, queued).status == 'done'
+    assert db.session.get(AnalysisJob, stale).status == 'done'
+    assert db.session.get(AnalysisJob, live).status == 'running'
+
+
+def test_job_is_claimed_once(app):
+    from web_app import analysis_jobs
+
+    job_id = _queued_job(app)
+    analysis_jobs.submit(job_id)
+    analysis_jobs.submit(job_id)
+    assert BudgetAnalysis.query.filter_by(id=job_id).count() == 1
+
+
+def test_heartbeat_keeps_a_long_job_from_being_requeued(app, monkeypatch):
+    from web_app import analysis_jobs
+
+    job_id = _queued_job(app)
+    runner = analysis_jobs.runner
+    seen = {}
+
+    def slow_runner(job, progress):
+        time.sleep(0.3)
+        with db.engine.connect() as conn:
+            seen['heartbeat_at'], seen['owner'] = conn.execute(
+                db.select(AnalysisJob.heartbeat_at, AnalysisJob.owner).where(AnalysisJob.id == job.id)
+            ).one()
+        runner(job, progress)
+
+    monkeypatch.setattr(analysis_jobs, 'runner', slow_runner)
+    monkeypatch.setitem(app.config, 'ANALYSIS_JOB_HEARTBEAT_SECONDS', 0.05)
+    analysis_jobs.submit(job_id)
+
+    job = db.session.get(AnalysisJob, job_id)
+    assert job.status == 'done'
+    assert seen['owner'] == job.owner
+    assert seen['heartbeat_at'] > job.started_at + timedelta(seconds=0.1)
+
+
+def _take_over(job_id):
+    """What a second worker does with a job it found stale: re-queue it and claim it"""
+    with db.engine.begin() as conn:
+        conn.execute(db.update(AnalysisJob).where(AnalysisJob.id == job_id).values(owner='other-worker'))
+
+
+def test_job_taken_over_by_another_worker_is_not_finished_twice(app, monkeypatch):
+    from web_app import analysis_jobs
+
+    def overtaken_runner(job, progress):
+        _take_over(job.id)  # after the last progress update, before the final status write
+
+    job_id = _queued_job(app)
+    monkeypatch.setattr(analysis_jobs, 'runner', overtaken_runner)
+    analysis_jobs.submit(job_id)
+
+    db.session.expire_all()
+    job = db.session.get(AnalysisJob, job_id)
+    assert (job.status, job.owner, job.finished_at) == ('running', 'other-worker', None)
+
+
+def test_job_taken_over_mid_run_stops_at_the_next_progress_update(app, monkeypatch):
+    from web_app import analysis_jobs
+
+    runner = analysis_jobs.runner
+
+    def overtaken_runner(job, progress):
+        _take_over(job.id)
+        runner(job, progress)
+
+    job_id = _queued_job(app)
+    monkeypatch.setattr(analysis_jobs, 'runner', overtaken_runner)
+    analysis_jobs.submit(job_id)
+
+    db.session.expire_all()
+    job = db.session.get(AnalysisJob, job_id)
+    assert (job.status, job.stage, job.owner) == ('running', 'starting', 'other-worker')
+    assert db.session.get(BudgetAnalysis, job_id) is None
+
+
+def test_resume_uses_the_heartbeat_not_the_last_progress_update(app):
+    from web_app import analysis_jobs
+
+    hour_ago = datetime.utcnow() - timedelta(hours=1)
+    beating = _queued_job(app, status='running', updated_at=hour_ago)
+    job = db.session.get(AnalysisJob, beating)
+    job.heartbeat_at, job.owner = datetime.utcnow(), 'live-worker'
+    db.session.commit()
+
+    assert analysis_jobs.resume_pending() == 0
+    assert db.session.get(AnalysisJob, beating).owner == 'live-worker'
+
+
+def test_job_of_a_worker_killed_after_startup_is_swept(app, client, monkeypatch):
+    from web_app import analysis_jobs
+
+    # Claimed by a worker that died after this process started: its heartbeat goes stale later
+    job_id = _queued_job(app, status='running')
+    job = db.session.get(AnalysisJob, job_id)
+    job.owner = 'killed-worker'
+    db.session.commit()
+    recent = _queued_job(app)
+    monkeypatch.setitem(app.config, 'ANALYSIS_JOB_SWEEP_SECONDS', 0)
+    monkeypatch.setattr(analysis_jobs, '_next_sweep', 0.0)
+
+    assert client.get(f'/jobs/{job_id}?format=json').get_json()['status'] == 'running'
+
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=app.config['ANALYSIS_JOB_STALE_SECONDS'] + 1)
+    db.session.commit()
+    status = client.get(f'/jobs/{job_id}?format=json').get_json()
+    assert status['status'] == 'done' and status['analysis_url'] == f'/analysis/{job_id}'
+    # A job queued moments ago belongs to its own process's pool
+    assert db.session.get(AnalysisJob, recent).status == 'queued'
+
+
+def test_sweeps_are_throttled(app, monkeypatch):
+    from web_app import analysis_jobs
+
+    monkeypatch.setitem(app.config, 'ANALYSIS_JOB_SWEEP_SECONDS', 60)
+    monkeypatch.setattr(analysis_jobs, '_next_sweep', 0.0)
+    analysis_jobs.sweep()
+    stale = _queued_job(app, status='running', updated_at=datetime.utcnow() - timedelta(hours=1))
+    assert analysis_jobs.sweep() == 0
+    assert db.session.get(AnalysisJob, stale).status == 'running'
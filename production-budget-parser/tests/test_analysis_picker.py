@@ -0,0 +1,71 @@
+"""
+Analysis picker — keyset-paginated search for the compare page
+Run with: pytest tests/ -v
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+from database_models import db, BudgetAnalysis, list_analyses_page
+
+
+def _seed(count=25):
+    """Analyses with two per upload date, so pages must break ties by id"""
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        db.session.add(BudgetAnalysis(
+            id=f'analysis-{i:03d}', filename=f'{"draft" if i % 2 else "final"}-{i}.csv',
+            upload_date=start + timedelta(days=i // 2), total_budget=1000.0 * i, line_items=1,
+            dataframe_json='{"heavy": true}', risk_analysis_json='{}', optimizations_json='[]'
+        ))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def test_keyset_pages_cover_every_analysis_once(app):
+    _seed()
+    expected = [a.id for a in BudgetAnalysis.query.order_by(BudgetAnalysis.upload_date.desc(), BudgetAnalysis.id.desc())]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = list_analyses_page(limit=10, cursor=cursor)
+        seen += [a.id for a in page]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_page_loads_only_summary_columns(app):
+    _seed(3)
+    page, _ = list_analyses_page()
+    assert {'dataframe_json', 'risk_analysis_json', 'dataframe_blob'}.isdisjoint(inspect(page[0]).dict)
+
+
+def test_search_api_filters_and_pages(client):
+    _seed()
+    first = client.get('/api/analyses?q=DRAFT&limit=5&exclude=analysis-023').get_json()
+    assert [a['filename'] for a in first['analyses']] == ['draft-21.csv', 'draft-19.csv', 'draft-17.csv', 'draft-15.csv', 'draft-13.csv']
+
+    second = client.get(f'/api/analyses?q=DRAFT&limit=5&exclude=analysis-023&cursor={first["next_cursor"]}').get_json()
+    assert second['analyses'][0]['filename'] == 'draft-11.csv'
+    assert client.get('/api/analyses?cursor=not-a-cursor').status_code == 400
+
+
+def test_search_wildcards_match_literally(app):
+    _seed(3)
+    db.session.add(BudgetAnalysis(id='analysis-pct', filename='100%_final.csv', total_budget=1.0, line_items=1,
+                                  dataframe_json='{}', risk_analysis_json='{}', optimizations_json='[]'))
+    db.session.commit()
+    for query_text in ('%', '_', '0%_F'):
+        page, _ = list_analyses_page(query_text)
+        assert [a.id for a in page] == ['analysis-pct']
+
+
+def test_compare_page_renders_first_page_with_typeahead(client, app):
+    _seed(30)
+    html = client.get('/compare/analysis-000').get_data(as_text=True)
+    assert html.count('<option value="analysis-') == 20
+    assert 'value="analysis-000"' not in html
+    assert 'id="budget_search"' in html and '/api/analyses' in html
+    assert 'controller.abort()' in html
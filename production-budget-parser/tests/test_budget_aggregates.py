@@ -0,0 +1,151 @@
+"""
+Precomputed aggregates — stored totals must match regrouping the line items
+Run with: pytest tests/ -v
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_budget
+from budget_aggregates import backfill_aggregates, compute_aggregates, get_aggregates, BudgetAggregates, AggregateAccumulator
+from budget_comparison import compare_budgets
+from charts_data import prepare_chart_data
+from database_models import db, AnalysisAggregate, AnalysisJob, BudgetAnalysis
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+class _Row:
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+def _aggregates(df):
+    return BudgetAggregates([_Row(**row) for row in compute_aggregates(df)])
+
+
+def _budget(n_rows=800):
+    df = make_budget(n_rows, unique_suffix=False)
+    df.loc[4, 'Department'] = None
+    df.loc[9, 'Vendor'] = None
+    return df
+
+
+def _upload(client, csv_text=SAMPLE_CSV, url='/upload'):
+    resp = upload_csv(client, csv_text, url=url)
+    job_id = resp.headers['Location'].rsplit('/', 1)[-1]
+    assert db.session.get(AnalysisJob, job_id).status == 'done'
+    return db.session.get(BudgetAnalysis, job_id)
+
+
+# ── Aggregate rows ────────────────────────────────────────────────────────────
+
+def test_aggregates_match_groupby():
+    df = _budget()
+    aggregates = _aggregates(df)
+    total = df['Amount'].sum()
+
+    for dimension, column in (('department', 'Department'), ('category', 'Category'), ('vendor', 'Vendor')):
+        expected = df.groupby(column)['Amount'].agg(['sum', 'size'])
+        frame = aggregates.frame(dimension)
+        assert frame['key'].tolist() == sorted(expected.index)
+        assert frame['total'].tolist() == pytest.approx(expected['sum'].tolist())
+        assert frame['count'].tolist() == expected['size'].tolist()
+        assert frame['share'].tolist() == pytest.approx((expected['sum'] / total).tolist())
+
+    missing = aggregates.frame('department', include_missing=True).iloc[-1]
+    assert pd.isna(missing['key'])
+    assert missing['total'] == pytest.approx(df.loc[4, 'Amount'])
+
+
+def test_chunked_accumulator_matches_whole_frame():
+    df = _budget()
+    accumulator = AggregateAccumulator(df.columns, df['Amount'].sum())
+    for start in range(0, len(df), 150):
+        accumulator.add(df.iloc[start:start + 150])
+    chunked = accumulator.rows(len(df))
+    whole = compute_aggregates(df)
+
+    assert [(r['dimension'], r['key'], r['count']) for r in chunked] == [(r['dimension'], r['key'], r['count']) for r in whole]
+    assert [r['total'] for r in chunked] == pytest.approx([r['total'] for r in whole])
+
+
+def test_chart_data_from_aggregates_matches_dataframe():
+    df = _budget()
+    from_df = prepare_chart_data(df)
+    from_aggregates = prepare_chart_data(df, _aggregates(df))
+
+    for chart in ('department_pie', 'category_breakdown', 'risk_distribution'):
+        assert from_aggregates[chart]['labels'] == from_df[chart]['labels'], chart
+        assert from_aggregates[chart]['values'] == pytest.approx(from_df[chart]['values']), chart
+    assert from_aggregates['department_pie']['colors'] == from_df['department_pie']['colors']
+
+
+def test_comparison_from_aggregates_matches_dataframe():
+    df1 = _budget()
+    df2 = make_budget(600, seed=7, unique_suffix=False)
+    df2.loc[2, 'Category'] = '  ' + df2.loc[2, 'Category']
+
+    expected = compare_budgets(df1, df2)
+    actual = compare_budgets(df1, df2, aggregates1=_aggregates(df1), aggregates2=_aggregates(df2))
+
+    for changes in ('department_changes', 'category_changes', 'vendor_changes'):
+        assert set(actual[changes]) == set(expected[changes]), changes
+        for key, values in expected[changes].items():
+            assert actual[changes][key]['status'] == values['status']
+            assert actual[changes][key]['budget2_amount'] == pytest.approx(values['budget2_amount'])
+            assert actual[changes][key]['percent_change'] == pytest.approx(values['percent_change'])
+    assert actual['insights'] == expected['insights']
+
+
+# ── Upload and read routes ────────────────────────────────────────────────────
+
+def test_upload_stores_aggregates_in_both_modes(app, client):
+    csv_text = make_budget(300, unique_suffix=False).to_csv(index=False)
+    app.config['STREAM_CHUNK_ROWS'] = 70
+    memory = _upload(client, csv_text)
+    stream = _upload(client, csv_text, url='/upload?mode=stream')
+
+    def stored(analysis):
+        rows = AnalysisAggregate.query.filter_by(analysis_id=analysis.id).order_by(AnalysisAggregate.id).all()
+        return [(r.dimension, r.key, r.count) for r in rows], [r.total for r in rows]
+
+    memory_keys, memory_totals = stored(memory)
+    stream_keys, stream_totals = stored(stream)
+    assert memory_keys and stream_keys == memory_keys
+    assert stream_totals == pytest.approx(memory_totals)
+
+
+def test_legacy_analysis_is_read_without_writes_and_backfilled(client):
+    analysis = _upload(client)
+    stored = [(r.dimension, r.key, r.total, r.count) for r in AnalysisAggregate.query.filter_by(analysis_id=analysis.id)]
+    AnalysisAggregate.query.filter_by(analysis_id=analysis.id).delete()
+    db.session.commit()
+
+    aggregates = get_aggregates(analysis)
+    assert aggregates.ranked('department')['key'].tolist()[0] == 'Cast'
+    assert client.get(f'/analysis/{analysis.id}').status_code == 200
+    assert AnalysisAggregate.query.filter_by(analysis_id=analysis.id).count() == 0
+
+    assert backfill_aggregates(batch_size=1) == 1
+    assert backfill_aggregates() == 0
+    rebuilt = [(r.dimension, r.key, r.total, r.count) for r in AnalysisAggregate.query.filter_by(analysis_id=analysis.id)]
+    assert sorted(rebuilt, key=str) == pytest.approx(sorted(stored, key=str))
+
+
+def test_read_routes_use_aggregates(client):
+    first = _upload(client)
+    second = _upload(client, SAMPLE_CSV.replace('Production', 'Post'))
+
+    for url in (f'/analysis/{first.id}', f'/generate-pdf/{first.id}', f'/export-excel/{first.id}'):
+        assert client.get(url).status_code == 200, url
+
+    resp = client.post(f'/compare/{first.id}', data={'compare_id': second.id})
+    assert resp.status_code == 200
+    assert b'Post' in resp.data
+
+
+def test_deleting_analysis_removes_aggregates(client):
+    analysis = _upload(client)
+    db.session.delete(analysis)
+    db.session.commit()
+    assert AnalysisAggregate.query.count() == 0
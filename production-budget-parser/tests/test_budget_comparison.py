@@ -0,0 +1,251 @@
+"""
+Budget comparison — line-item matching between two budget revisions
+Run with: pytest tests/ -v
+"""
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from benchmarks.synthetic import make_budget
+from budget_comparison import (
+    compare_budgets, fuzzy_match_items, identify_new_items, identify_removed_items,
+    line_item_keys, match_line_items, normalize_dataframe, COMPARISON_ALGORITHM_VERSION
+)
+from database_models import db, BudgetAnalysis, BudgetComparison, upgrade_schema
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _revisions(n_rows=400):
+    """Two revisions sharing half their line items, with repeated keys and a blank"""
+    before = make_budget(n_rows, seed=1)
+    after = make_budget(n_rows, seed=2)
+    after.iloc[:n_rows // 2] = before.iloc[:n_rows // 2].to_numpy()
+    before = pd.concat([before, before.iloc[[3, 4]]], ignore_index=True)
+    before.loc[7, 'Department'] = None
+    return before, after
+
+
+def match_line_items_per_key(df1, df2):
+    """
+    Reference implementation of match_line_items: row-wise keys and one
+    full scan per unmatched key.
+
+    Used by the parity test and benchmarks.bench_budget_comparison; slow on large budgets.
+    """
+    def keys(df):
+        return df.apply(lambda x: f"{x.get('Description', '')}_{x.get('Department', '')}_{x.get('Category', '')}", axis=1)
+
+    def records(df, df_keys, wanted):
+        items = []
+        for key in wanted:
+            item = df[df_keys == key].iloc[0]
+            items.append({
+                'description': str(item.get('Description', 'N/A')),
+                'department': str(item.get('Department', 'N/A')),
+                'category': str(item.get('Category', 'N/A')),
+                'vendor': str(item.get('Vendor', 'N/A')),
+                'amount': float(item.get('Amount', 0))
+            })
+        return sorted(items, key=lambda x: x['amount'], reverse=True)
+
+    keys1, keys2 = keys(df1), keys(df2)
+    set1, set2 = set(keys1), set(keys2)
+    return {
+        'new_items': records(df2, keys2, set2 - set1),
+        'removed_items': records(df1, keys1, set1 - set2)
+    }
+
+
+def _sorted(items):
+    return sorted(tuple(item.values()) for item in items)
+
+
+# ── Matching ──────────────────────────────────────────────────────────────────
+
+def test_matching_agrees_with_per_key_reference():
+    for df1, df2 in (_revisions(), tuple(map(normalize_dataframe, _revisions()))):
+        expected = match_line_items_per_key(df1, df2)
+        actual = match_line_items(df1, df2)
+
+        for side in ('new_items', 'removed_items'):
+            assert _sorted(actual[side]) == _sorted(expected[side]), side
+            amounts = [item['amount'] for item in actual[side]]
+            assert amounts == sorted(amounts, reverse=True)
+
+
+def test_matched_rows_point_at_first_occurrence():
+    df1, df2 = _revisions()
+    matched = match_line_items(df1, df2)['matched']
+
+    keys1, keys2 = line_item_keys(df1), line_item_keys(df2)
+    assert set(matched['key']) == set(keys1) & set(keys2)
+    for key, row1, row2 in matched.itertuples(index=False):
+        assert keys1.tolist().index(key) == row1
+        assert keys2.tolist().index(key) == row2
+
+
+def test_matching_leaves_inputs_untouched():
+    df1, df2 = _revisions()
+    columns1, columns2 = list(df1.columns), list(df2.columns)
+
+    identify_new_items(df1, df2)
+    identify_removed_items(df1, df2)
+    compare_budgets(df1, df2)
+
+    assert list(df1.columns) == columns1
+    assert list(df2.columns) == columns2
+
+
+def test_missing_key_columns_match_on_remaining_columns():
+    df1 = pd.DataFrame({'Description': ['Crane', 'Catering'], 'Amount': [10.0, 20.0]})
+    df2 = pd.DataFrame({'Description': ['Crane', 'Drone'], 'Amount': [12.0, 5.0]})
+
+    result = match_line_items(df1, df2)
+    assert result['new_items'] == [{'description': 'Drone', 'department': 'N/A', 'category': 'N/A',
+                                    'vendor': 'N/A', 'amount': 5.0}]
+    assert [item['description'] for item in result['removed_items']] == ['Catering']
+    assert result['matched'][['row1', 'row2']].values.tolist() == [[0, 0]]
+
+
+# ── Stored comparisons ────────────────────────────────────────────────────────
+
+@pytest.fixture
+def pair(client):
+    ids = [upload_csv(client, csv).headers['Location'].rsplit('/', 1)[-1]
+           for csv in (SAMPLE_CSV, SAMPLE_CSV.replace('Production', 'Post'))]
+    return [db.session.get(BudgetAnalysis, analysis_id) for analysis_id in ids]
+
+
+@pytest.fixture
+def compare_calls(monkeypatch):
+    import web_app
+
+    calls = []
+    original = web_app.compare_budgets
+    monkeypatch.setattr(web_app, 'compare_budgets', lambda *args, **kwargs: calls.append(args) or original(*args, **kwargs))
+    return calls
+
+
+def test_repeat_comparison_reuses_stored_result(client, pair, compare_calls):
+    first, second = pair
+    post = client.post(f'/compare/{first.id}', data={'compare_id': second.id})
+    link = client.get(f'/compare/{first.id}/{second.id}')
+
+    assert post.status_code == link.status_code == 200
+    assert link.data == post.data
+    assert len(compare_calls) == 1
+
+    comparison = BudgetComparison.query.one()
+    assert comparison.algorithm_version == COMPARISON_ALGORITHM_VERSION
+    assert set(comparison.get_charts()) >= {'sideBySideChart', 'changeChart'}
+
+
+def test_stored_comparison_serves_charts_without_recomputing(client, pair, compare_calls):
+    import web_app
+
+    first, second = pair
+    client.get(f'/compare/{first.id}/{second.id}')
+    web_app.analysis_pages.clear()  # e.g. another worker process
+
+    resp = client.get(f'/compare/{first.id}/{second.id}')
+    assert resp.status_code == 200
+    assert b'sideBySideChart' in resp.data
+    assert len(compare_calls) == 1
+
+
+def test_comparison_link_answers_conditional_request(client, pair):
+    first, second = pair
+    resp = client.get(f'/compare/{first.id}/{second.id}')
+    again = client.get(f'/compare/{first.id}/{second.id}', headers={'If-None-Match': resp.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_changed_analysis_recomputes_in_place(client, pair, compare_calls):
+    first, second = pair
+    client.get(f'/compare/{first.id}/{second.id}')
+    second.filename = 'revised.csv'
+    db.session.commit()
+
+    resp = client.get(f'/compare/{first.id}/{second.id}')
+    assert b'revised.csv' in resp.data
+    assert len(compare_calls) == 2
+    assert BudgetComparison.query.count() == 1
+    assert BudgetComparison.query.one().analysis2_version == second.content_version
+
+
+def test_upgrade_keeps_newest_duplicate_and_adds_unique_index(client, pair):
+    first, second = pair
+    db.session.execute(text('DROP INDEX uq_budget_comparisons_pair'))
+    for payload in ('{"old": 1}', '{"old": 2}'):
+        db.session.add(BudgetComparison(analysis1_id=first.id, analysis2_id=second.id, comparison_data_json=payload))
+    db.session.commit()
+
+    upgrade_schema()
+
+    assert [c.comparison_data_json for c in BudgetComparison.query.all()] == ['{"old": 2}']
+    indexes = {index['name']: index for index in db.inspect(db.engine).get_indexes('budget_comparisons')}
+    assert indexes['uq_budget_comparisons_pair']['unique']
+
+
+# ── Fuzzy matching ────────────────────────────────────────────────────────────
+
+def _item(description, department='Camera', amount=100.0, category='Equipment'):
+    return {'description': description, 'department': department, 'category': category,
+            'vendor': 'Panavision', 'amount': amount}
+
+
+def test_renamed_item_is_reported_as_modified():
+    df1 = pd.DataFrame({'Description': ['Camera rental - Production', 'Catering'], 'Department': ['Camera', 'Production'],
+                        'Category': ['Equipment', 'Other'], 'Amount': [45000.0, 9500.0]})
+    df2 = pd.DataFrame({'Description': ['Camera package rental', 'Catering', 'Drone aerial unit'],
+                        'Department': ['Camera', 'Production', 'Camera'],
+                        'Category': ['Equipment', 'Other', 'Equipment'], 'Amount': [48000.0, 9500.0, 7000.0]})
+
+    exact = compare_budgets(df1, df2)
+    assert (exact['total_new_items'], exact['total_removed_items'], exact['total_modified_items']) == (2, 1, 0)
+
+    result = compare_budgets(df1, df2, fuzzy=True)
+    assert (result['total_new_items'], result['total_removed_items'], result['total_modified_items']) == (1, 0, 1)
+    modified = result['modified_items'][0]
+    assert (modified['previous_description'], modified['description']) == ('Camera rental - Production', 'Camera package rental')
+    assert modified['amount_change'] == 3000.0
+    assert 0.6 <= modified['similarity'] < 1
+    assert any('renamed' in insight for insight in result['insights'])
+
+
+def test_fuzzy_matching_blocks_by_department_and_pairs_once():
+    removed = [_item('Crane operator'), _item('Crane operator', department='Grip'), _item('Sound mix')]
+    new = [_item('Crane operator OT'), _item('Crane operators OT'), _item('Color grade')]
+
+    modified, removed_left, new_left = fuzzy_match_items(removed, new)
+
+    assert [(m['previous_description'], m['description'], m['department']) for m in modified] == \
+        [('Crane operator', 'Crane operator OT', 'Camera')]
+    assert [(i['description'], i['department']) for i in removed_left] == [('Crane operator', 'Grip'), ('Sound mix', 'Camera')]
+    assert [i['description'] for i in new_left] == ['Crane operators OT', 'Color grade']
+
+
+def test_fuzzy_matching_scores_only_blocked_candidates(monkeypatch):
+    import budget_comparison
+
+    scored = []
+    original = budget_comparison.description_similarity
+    monkeypatch.setattr(budget_comparison, 'description_similarity', lambda a, b: scored.append(1) or original(a, b))
+
+    removed = [_item(f'Set build {i} stage') for i in range(2000)]
+    new = [_item(f'Set build {i} stage revised') for i in range(2000)]
+    modified, _, _ = fuzzy_match_items(removed, new)
+
+    assert len(modified) == 2000
+    assert all(m['previous_description'] + ' revised' == m['description'] for m in modified)
+    assert len(scored) < 10 * len(removed)  # "set", "build", "stage" are too common to pair on
+
+
+def test_comparison_page_lists_renamed_items(client):
+    ids = [upload_csv(client, csv).headers['Location'].rsplit('/', 1)[-1]
+           for csv in (SAMPLE_CSV, SAMPLE_CSV.replace('Camera package rental', 'Camera package rentals'))]
+
+    resp = client.get(f'/compare/{ids[0]}/{ids[1]}')
+    assert b'Renamed Line Items (1)' in resp.data
+    assert BudgetComparison.query.one().get_comparison_data()['total_new_items'] == 0
@@ -0,0 +1,107 @@
+"""
+Budget profile — consumers must give the same results with a shared profile
+Run with: pytest tests/ -v
+"""
+
+import numpy as np
+import pytest
+
+import budget_optimizer
+from benchmarks.synthetic import make_budget
+from budget_aggregates import compute_aggregates
+from budget_profile import BudgetProfile
+from charts_data import prepare_chart_data
+from risk_manager import RiskManager
+from budget_recommendations import find_optimizations
+
+
+def _budget(n_rows=600):
+    df = make_budget(n_rows, unique_suffix=False)
+    df.loc[3, 'Department'] = None
+    df.loc[5, 'Description'] = None
+    df.loc[6, 'Description'] = None
+    df.loc[8, 'Vendor'] = None
+    df.loc[11, 'Notes'] = None
+    df.loc[0, 'Amount'] = df['Amount'].sum()  # one item above every share threshold
+    return df
+
+
+# ── Profile statistics ────────────────────────────────────────────────────────
+
+def test_profile_matches_pandas():
+    df = _budget()
+    profile = BudgetProfile(df)
+
+    assert profile.total == pytest.approx(df['Amount'].sum())
+    assert profile.distinct_count('Vendor') == df['Vendor'].nunique()
+    assert profile.distinct_count('Department', include_missing=True) == df['Department'].nunique(dropna=False)
+
+    expected = df.groupby('Department')['Amount'].sum()
+    series = profile.group('Department').series()
+    assert series.index.tolist() == expected.index.tolist()
+    assert series.tolist() == pytest.approx(expected.tolist())
+    assert profile.group('Department').missing_sum == pytest.approx(df.loc[3, 'Amount'])
+
+    assert np.array_equal(profile.above(0.02), (df['Amount'] > df['Amount'].sum() * 0.02).to_numpy())
+    assert np.array_equal(profile.duplicate_mask('Description'), df.duplicated(subset=['Description'], keep=False).to_numpy())
+    assert np.array_equal(profile.contains('Description', 'contingency'),
+                          df['Description'].str.contains('Contingency', case=False, na=False).to_numpy())
+    assert df.iloc[profile.top(10)].index.tolist() == df.nlargest(10, 'Amount').index.tolist()
+
+
+# ── Consumers ─────────────────────────────────────────────────────────────────
+
+def test_risk_analysis_with_profile_matches():
+    df = _budget()
+    risk_manager = RiskManager()
+    expected = risk_manager.analyze_risks(df)
+    actual = risk_manager.analyze_risks(df, profile=BudgetProfile(df))
+    for result in (expected, actual):
+        del result['summary']['timestamp']
+    assert actual == expected
+
+
+def test_aggregates_with_profile_match():
+    df = _budget()
+    expected = compute_aggregates(df)
+    actual = compute_aggregates(df, profile=BudgetProfile(df))
+
+    assert [(r['dimension'], r['key'], r['count']) for r in actual] == \
+        [(r['dimension'], r['key'], r['count']) for r in expected]
+    assert [r['total'] for r in actual] == pytest.approx([r['total'] for r in expected])
+
+
+def test_optimizer_with_profile_matches():
+    df = _budget()
+    df.loc[5, 'Description'] = 'Contingency reserve'  # the pandas path cannot match on missing descriptions
+    df.loc[6, 'Description'] = 'Contingency'
+    expected = budget_optimizer.find_optimizations(df)
+    actual = budget_optimizer.find_optimizations(df, profile=BudgetProfile(df))
+
+    assert actual['potential_savings'] == pytest.approx(expected['potential_savings'])
+    assert actual['contingency_check'] == pytest.approx(expected['contingency_check'])
+    for key in ('department_adjustments', 'high_cost_items'):
+        assert len(actual[key]) == len(expected[key]), key
+        for a, e in zip(actual[key], expected[key]):
+            assert a == pytest.approx(e), key
+
+
+def test_charts_with_profile_match():
+    df = _budget()
+    expected = prepare_chart_data(df)
+    actual = prepare_chart_data(df, profile=BudgetProfile(df))
+
+    for chart in ('department_pie', 'category_breakdown', 'top_items_bar'):
+        assert actual[chart]['labels'] == expected[chart]['labels'], chart
+        assert actual[chart]['values'] == pytest.approx(expected[chart]['values']), chart
+    assert actual['risk_distribution']['values'] == pytest.approx(expected['risk_distribution']['values'])
+
+
+def test_web_optimizations_use_profile_counts():
+    df = _budget()
+    profile = BudgetProfile(df)
+    recommendations = find_optimizations(df, profile=profile)
+    assert recommendations == find_optimizations(df)
+
+    duplicates = next(r for r in recommendations if 'duplicate' in r['recommendation'].lower())
+    assert str(int(df.duplicated(subset=['Description'], keep=False).sum())) in duplicates['recommendation']
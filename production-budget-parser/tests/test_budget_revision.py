@@ -0,0 +1,139 @@
+"""
+Budget revisions — incremental re-analysis must match a full analysis
+Run with: pytest tests/ -v
+"""
+
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_budget
+from budget_revision import BudgetRevision, RowIndex, match_rows, row_hashes
+from database_models import db, AnalysisAggregate, AnalysisJob, BudgetAnalysis, BudgetLineItem
+from risk_manager import RiskManager
+from tests.conftest import SAMPLE_CSV, upload_csv
+from tests.test_budget_stream import _assert_same, _without_timestamp
+
+
+def _revise(df):
+    """An edited copy of a budget: re-priced, reworded, inserted, deleted and duplicated rows"""
+    revised = df.copy()
+    revised.loc[10, 'Amount'] += 500
+    revised.loc[20, 'Description'] = 'Stunt rigging'
+    revised.loc[30, 'Notes'] = 'night exterior'
+    revised = revised.drop(index=[40, 41, 300])
+    inserted = pd.DataFrame([{'Category': 'Post', 'Department': 'VFX', 'Description': 'Green screen stage',
+                              'Vendor': 'Design Hub', 'Amount': 25000.0, 'Notes': 'weather dependent'}])
+    return pd.concat([revised.iloc[:100], inserted, revised.iloc[100:], revised.iloc[[5]]], ignore_index=True)
+
+
+def _upload(client, df, **form):
+    resp = upload_csv(client, df.to_csv(index=False), **form)
+    analysis_id = resp.headers['Location'].rsplit('/', 1)[-1]
+    assert db.session.get(AnalysisJob, analysis_id).status == 'done'
+    return db.session.get(BudgetAnalysis, analysis_id)
+
+
+def _line_items(analysis):
+    items = BudgetLineItem.query.filter_by(analysis_id=analysis.id).order_by(BudgetLineItem.line_number)
+    return [(i.line_number, i.category, i.department, i.description, i.amount) for i in items]
+
+
+def _aggregates(analysis):
+    rows = AnalysisAggregate.query.filter_by(analysis_id=analysis.id).order_by(AnalysisAggregate.id)
+    return [(r.dimension, r.key, round(r.total, 6), r.count) for r in rows]
+
+
+# ── Row matching ──────────────────────────────────────────────────────────────
+
+def test_match_rows_pairs_repeated_rows_in_order():
+    parent = np.array([7, 3, 7, 9], dtype=np.uint64)
+    revised = np.array([3, 7, 5, 7, 7], dtype=np.uint64)
+    assert match_rows(parent, revised).tolist() == [1, 0, -1, 2, -1]
+
+
+def test_line_item_runs_follow_the_change():
+    df = make_budget(1000)
+    revised = _revise(df)
+    revision = BudgetRevision('parent', RowIndex.build(df, RiskManager()), row_hashes(revised))
+
+    assert len(revision.changed) == 5  # re-priced, reworded, re-noted, inserted, repeated
+    assert revision.removed_count == 6
+    runs = revision.line_item_runs()
+    assert len(runs) <= 8
+    assert sum(last - first + 1 for first, last, _ in runs) == len(revision.unchanged)
+
+
+def test_row_index_round_trip_and_stale_flags():
+    df = make_budget(200)
+    risk_manager = RiskManager()
+    index = RowIndex.decode(RowIndex.build(df, risk_manager).encode())
+    assert index.columns == list(df.columns)
+    assert (index.hashes == row_hashes(df)).all()
+    assert (index.flags == risk_manager.keyword_flags(df)).all()
+
+    # Flags from other keyword rules are rescanned, not copied
+    index.flags[:] = True
+    revision = BudgetRevision('parent', index, row_hashes(df), risk_manager.keyword_signature() + 1)
+    assert (revision.keyword_flags(df, risk_manager) == risk_manager.keyword_flags(df)).all()
+
+
+# ── Uploads ───────────────────────────────────────────────────────────────────
+
+def test_revision_upload_matches_full_analysis(client, caplog):
+    df = make_budget(1500)
+    parent = _upload(client, df)
+    revised = _revise(df)
+    with caplog.at_level('INFO'):
+        incremental = _upload(client, revised, parent_id=parent.id)
+    full = _upload(client, revised)
+
+    assert '1494 unchanged, 5 changed or added, 6 removed rows' in caplog.text
+    assert 'no stored aggregates' not in caplog.text
+    assert incremental.parent_id == parent.id
+    assert (incremental.line_items, incremental.risk_level) == (full.line_items, full.risk_level)
+    assert incremental.total_budget == full.total_budget
+    _assert_same(_without_timestamp(full.risk_analysis_json), _without_timestamp(incremental.risk_analysis_json))
+    _assert_same(json.loads(full.optimizations_json), json.loads(incremental.optimizations_json))
+    assert _line_items(incremental) == _line_items(full)
+    assert _aggregates(incremental) == _aggregates(full)
+
+    # Revisions of revisions keep working
+    again = revised.drop(index=[0])
+    assert _line_items(_upload(client, again, parent_id=incremental.id)) == _line_items(_upload(client, again))
+
+
+def test_revision_totals_with_missing_values_and_new_groups(client):
+    df = make_budget(600, unique_suffix=False)
+    df.loc[[3, 4], 'Description'] = None
+    df.loc[7, 'Department'] = None
+    parent = _upload(client, df)
+
+    revised = df.drop(index=[4, 7, 8]).copy()
+    revised.loc[9, 'Description'] = None
+    revised.loc[11, 'Department'] = 'Brand New Dept'
+    revised.loc[12, 'Vendor'] = 'Brand New Vendor'
+    revised.loc[13, 'Description'] = revised.loc[14, 'Description'] = 'Only in the revision'
+    incremental = _upload(client, revised, parent_id=parent.id)
+    full = _upload(client, revised)
+
+    assert incremental.num_departments == full.num_departments
+    _assert_same(json.loads(full.optimizations_json), json.loads(incremental.optimizations_json))
+    assert _aggregates(incremental) == _aggregates(full)
+
+
+def test_revision_with_new_columns_is_analyzed_in_full(client):
+    parent = _upload(client, pd.read_csv(io.StringIO(SAMPLE_CSV)))
+    revised = pd.read_csv(io.StringIO(SAMPLE_CSV)).assign(Notes='remote location')
+    analysis = _upload(client, revised, parent_id=parent.id)
+    assert analysis.parent_id == parent.id
+    assert json.loads(analysis.risk_analysis_json)['summary']['risk_categories']['location_risks']['count'] == 7
+    assert len(_line_items(analysis)) == 7
+
+
+def test_unknown_parent_is_rejected(client):
+    resp = upload_csv(client, parent_id='missing')
+    assert resp.status_code == 302
+    assert AnalysisJob.query.count() == 0
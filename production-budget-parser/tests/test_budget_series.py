@@ -0,0 +1,93 @@
+"""
+Budget series — N-way comparison must agree with pairwise compare_budgets
+Run with: pytest tests/ -v
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.bench_budget_series import drafts
+from budget_comparison import compare_budgets
+from budget_series import compare_budget_series
+from comparison_charts import generate_all_series_charts
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _items(*rows):
+    return pd.DataFrame(rows, columns=['Description', 'Department', 'Category', 'Vendor', 'Amount'])
+
+
+# ── Engine ────────────────────────────────────────────────────────────────────
+
+def test_each_step_matches_pairwise_comparison():
+    dfs = drafts(4, 600)
+    dfs[2].loc[dfs[2].index[:3], 'Vendor'] = None
+    series = compare_budget_series(dfs, ['A', 'B', 'C', 'D'])
+
+    for step, (df1, df2) in enumerate(zip(dfs, dfs[1:])):
+        pair = compare_budgets(df1, df2)
+        assert series['total_step_deltas'][step] == pytest.approx(pair['total_change'])
+
+        for dimension in ('department', 'category', 'vendor'):
+            pivot = series['dimensions'][dimension]
+            deltas = {key: pivot['step_deltas'][i][step] for i, key in enumerate(pivot['keys'])
+                      if pivot['amounts'][i][step] or pivot['amounts'][i][step + 1]}
+            expected = {key: change['difference'] for key, change in pair[f'{dimension}_changes'].items()}
+            assert deltas == pytest.approx(expected), dimension
+
+        changes = series['line_items']['steps'][step]
+        assert (changes['added_count'], changes['removed_count']) == (pair['total_new_items'], pair['total_removed_items'])
+        assert [item['amount'] for item in changes['top_added']] == \
+            pytest.approx([item['amount'] for item in pair['new_items']])
+
+
+def test_line_item_lifetimes_and_drift():
+    v1 = _items(('Crane', 'Camera', 'Equipment', 'Cinelease', 100.0), ('Catering', 'Production', 'Other', 'QC', 50.0))
+    v2 = _items(('Crane', 'Camera', 'Equipment', 'Cinelease', 120.0), ('Drone', 'Camera', 'Equipment', None, 30.0))
+    v3 = _items(('Crane ', 'Camera', 'Equipment', 'Cinelease', 90.0), ('Catering', 'Production', 'Other', 'QC', 60.0))
+
+    series = compare_budget_series([v1, v2, v3], ['v1', 'v2', 'v3'])
+
+    assert series['totals'] == [150.0, 150.0, 150.0]
+    camera = series['dimensions']['department']['keys'].index('Camera')
+    assert series['dimensions']['department']['amounts'][camera] == [100.0, 150.0, 90.0]
+    assert series['dimensions']['department']['cumulative_drift'][camera] == [0.0, 50.0, -10.0]
+    assert series['dimensions']['vendor']['keys'] == ['Cinelease', 'QC']  # blank vendor skipped
+
+    step1, step2 = series['line_items']['steps']
+    assert (step1['from'], step1['to']) == ('v1', 'v2')
+    assert [item['description'] for item in step1['top_added']] == ['Drone']
+    assert [item['description'] for item in step1['top_removed']] == ['Catering']
+    assert [item['description'] for item in step2['top_added']] == ['Catering']  # reappears
+    assert [item['vendor'] for item in step2['top_removed']] == ['']
+    assert series['line_items']['first_seen_counts'] == [2, 1, 0]
+    assert series['line_items']['last_seen_counts'] == [0, 1, 2]
+    assert series['line_items']['in_every_version'] == 1  # "Crane " is stripped like compare_budgets
+
+
+def test_series_charts():
+    series = compare_budget_series(drafts(3, 200), ['A', 'B', 'C'])
+    charts = generate_all_series_charts(series)
+    assert set(charts) == {'seriesDriftChart', 'seriesDepartmentChart', 'seriesCategoryChart', 'seriesVendorChart'}
+
+
+def test_series_needs_two_versions():
+    with pytest.raises(ValueError):
+        compare_budget_series(drafts(1, 10), ['A'])
+
+
+# ── API ───────────────────────────────────────────────────────────────────────
+
+def test_series_api(client):
+    ids = [upload_csv(client, SAMPLE_CSV.replace('45000', str(45000 + step * 1000)), filename=f'draft{step}.csv')
+           .headers['Location'].rsplit('/', 1)[-1] for step in range(3)]
+
+    resp = client.get(f'/api/comparisons/series?ids={",".join(ids)}')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['series']['versions'] == ['draft0.csv', 'draft1.csv', 'draft2.csv']
+    assert body['series']['total_step_deltas'] == [1000.0, 1000.0]
+    assert 'seriesDriftChart' in body['charts']
+
+    assert client.get(f'/api/comparisons/series?ids={ids[0]}').status_code == 400
+    assert client.get(f'/api/comparisons/series?ids={ids[0]},missing').status_code == 404
@@ -0,0 +1,193 @@
+"""
+Streaming uploads — chunked analysis must match the in-memory path
+Run with: pytest tests/ -v
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, update
+
+import budget_stream
+from benchmarks.synthetic import make_budget
+from budget_stream import SpillingRiskAccumulator
+from dashboard_stats import read_stats
+from database_models import db, AnalysisJob, BudgetAnalysis, BudgetLineItem
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _budget_csv(n_rows):
+    df = make_budget(n_rows, unique_suffix=False)
+    df['Amount'] = df['Amount'].astype(object)
+    df.loc[3, 'Amount'] = 'TBD'
+    df.loc[5, 'Description'] = None
+    df.loc[8, 'Department'] = None
+    df['Qty'] = np.arange(n_rows) % 7
+    return df.to_csv(index=False)
+
+
+def _upload_both(app, client, csv_text, chunk_rows):
+    app.config['STREAM_CHUNK_ROWS'] = chunk_rows
+    ids = {}
+    for mode, url in (('memory', '/upload'), ('stream', '/upload?mode=stream')):
+        resp = upload_csv(client, csv_text, url=url)
+        ids[mode] = resp.headers['Location'].rsplit('/', 1)[-1]
+        assert db.session.get(AnalysisJob, ids[mode]).status == 'done'
+    return db.session.get(BudgetAnalysis, ids['memory']), db.session.get(BudgetAnalysis, ids['stream'])
+
+
+def _without_timestamp(risk_analysis):
+    risk_analysis = json.loads(risk_analysis)
+    del risk_analysis['summary']['timestamp']
+    return risk_analysis
+
+
+def _assert_same(expected, actual, path='$'):
+    if isinstance(expected, dict):
+        assert list(expected) == list(actual), path
+        for key in expected:
+            _assert_same(expected[key], actual[key], f'{path}.{key}')
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), path
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            _assert_same(a, b, f'{path}[{i}]')
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, nan_ok=True), path
+    else:
+        assert expected == actual, path
+
+
+# ── Parity ────────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('n_rows,chunk_rows', [(7, 3), (1500, 200), (1500, 5000)])
+def test_stream_matches_in_memory_analysis(app, client, n_rows, chunk_rows):
+    csv_text = SAMPLE_CSV if n_rows == 7 else _budget_csv(n_rows)
+    memory, stream = _upload_both(app, client, csv_text, chunk_rows)
+
+    assert stream.line_items == memory.line_items
+    assert stream.num_departments == memory.num_departments
+    assert stream.total_budget == pytest.approx(memory.total_budget)
+    assert stream.risk_level == memory.risk_level
+    _assert_same(_without_timestamp(memory.payload('risk_analysis_json')), _without_timestamp(stream.payload('risk_analysis_json')))
+    _assert_same(json.loads(memory.optimizations_json), json.loads(stream.optimizations_json))
+
+    memory_df, stream_df = memory.get_dataframe(), stream.get_dataframe()
+    assert list(stream_df.columns) == list(memory_df.columns)
+    assert dict(stream_df.dtypes) == dict(memory_df.dtypes)
+    assert stream_df.astype(str).equals(memory_df.astype(str))
+
+
+def test_stream_payloads_are_kept_out_of_the_row(app, client):
+    _, stream = _upload_both(app, client, _budget_csv(300), chunk_rows=100)
+    assert stream.risk_analysis_json is None and stream.dataframe_blob is None
+    assert {payload.name for payload in stream.stored_payloads} == {'risk_analysis_json', 'dataframe_blob'}
+    assert stream.get_risk_analysis()['summary']['risk_categories']
+    assert len(stream.get_dataframe()) == 300
+
+
+def test_spilled_risk_json_matches_json_dumps(tmp_path):
+    from risk_manager import RiskManager
+
+    df = make_budget(3000)
+    risk_manager = RiskManager()
+    expected = risk_manager.analyze_risks(df)
+
+    accumulator = SpillingRiskAccumulator(risk_manager, df['Amount'].sum(), str(tmp_path))
+    for start in range(0, len(df), 700):
+        accumulator.add(df.iloc[start:start + 700])
+    summary = accumulator.write_json(str(tmp_path / 'risk.json'))
+    risk_json = (tmp_path / 'risk.json').read_text(encoding='utf-8')
+
+    # Item lists are byte-identical; category totals differ only by summation order
+    risks_part = risk_json.split(', "metrics": ')[0]
+    assert risks_part == json.dumps(expected).split(', "metrics": ')[0]
+    _assert_same(_without_timestamp(json.dumps(expected)), _without_timestamp(risk_json))
+    assert json.loads(risk_json)['summary'] == summary['summary']
+
+    # result() keeps the base accumulator's contract
+    _assert_same(_without_timestamp(json.dumps(expected)), _without_timestamp(json.dumps(accumulator.result())))
+    accumulator.close()
+
+
+def test_duplicate_counter_matches_duplicated(tmp_path):
+    from budget_stream import DuplicateCounter
+
+    values = pd.Series(['a', 'b', None, 'a', 'c', np.nan, 'd', 'b', 'a'], dtype='str')
+    counter = DuplicateCounter(str(tmp_path))
+    for start in range(0, len(values), 4):
+        counter.add(values.iloc[start:start + 4])
+    assert counter.count() == int(values.duplicated(keep=False).sum()) == 7
+    counter.close()
+
+
+def test_stream_writes_line_items_in_order(app, client):
+    _, stream = _upload_both(app, client, _budget_csv(500), chunk_rows=64)
+    items = BudgetLineItem.query.filter_by(analysis_id=stream.id).order_by(BudgetLineItem.line_number).all()
+    assert [item.line_number for item in items] == list(range(1, 501))
+    assert items[5].description == 'nan'
+    assert items[3].amount == 0.0
+
+
+# ── Validation and size cap ───────────────────────────────────────────────────
+
+def test_stream_commits_per_chunk_so_heartbeats_get_through(app, client, monkeypatch):
+    app.config['STREAM_CHUNK_ROWS'] = 100
+    insert = budget_stream.bulk_insert_line_items
+    seen = []
+
+    def observed_insert(chunk, analysis_id, **kwargs):
+        # Between chunks nothing holds the write lock, and nothing half-written is listed
+        with db.engine.begin() as conn:
+            conn.execute(update(AnalysisJob).where(AnalysisJob.id == analysis_id).values(heartbeat_at=func.now()))
+            seen.append((
+                conn.execute(select(func.count()).select_from(BudgetLineItem).where(BudgetLineItem.analysis_id == analysis_id)).scalar(),
+                conn.execute(select(func.count()).select_from(BudgetAnalysis).where(BudgetAnalysis.id == analysis_id)).scalar(),
+            ))
+        return insert(chunk, analysis_id, **kwargs)
+
+    monkeypatch.setattr(budget_stream, 'bulk_insert_line_items', observed_insert)
+    resp = upload_csv(client, _budget_csv(450), url='/upload?mode=stream')
+    analysis_id = resp.headers['Location'].rsplit('/', 1)[-1]
+    assert db.session.get(AnalysisJob, analysis_id).status == 'done'
+    assert seen == [(0, 0), (100, 0), (200, 0), (300, 0), (400, 0)]
+    assert BudgetLineItem.query.filter_by(analysis_id=analysis_id).count() == 450
+
+
+def test_failed_stream_leaves_no_line_items(app, client, monkeypatch):
+    app.config['STREAM_CHUNK_ROWS'] = 100
+    insert = budget_stream.bulk_insert_line_items
+    calls = []
+
+    def failing_insert(chunk, analysis_id, **kwargs):
+        calls.append(analysis_id)
+        if len(calls) == 3:
+            raise RuntimeError('disk full')
+        return insert(chunk, analysis_id, **kwargs)
+
+    monkeypatch.setattr(budget_stream, 'bulk_insert_line_items', failing_insert)
+    resp = upload_csv(client, _budget_csv(450), url='/upload?mode=stream')
+    analysis_id = resp.headers['Location'].rsplit('/', 1)[-1]
+    assert db.session.get(AnalysisJob, analysis_id).status == 'failed'
+    assert db.session.get(BudgetAnalysis, analysis_id) is None
+    assert BudgetLineItem.query.filter_by(analysis_id=analysis_id).count() == 0
+    assert read_stats()['total_line_items'] == 0
+
+
+def test_stream_rejects_missing_columns(client):
+    resp = upload_csv(client, 'Description,Amount\nCamera,100\n', url='/upload?mode=stream')
+    job = db.session.get(AnalysisJob, resp.headers['Location'].rsplit('/', 1)[-1])
+    assert job.status == 'failed'
+    assert job.error_message == 'Missing required columns: Category'
+
+
+def test_stream_mode_raises_upload_cap(app, client):
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    try:
+        big_csv = _budget_csv(200)
+        assert upload_csv(client, big_csv).status_code == 413
+        resp = upload_csv(client, big_csv, url='/upload?mode=stream')
+        assert resp.status_code == 302
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
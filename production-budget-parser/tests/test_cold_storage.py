@@ -0,0 +1,126 @@
+"""
+Cold storage — archiving old payloads, transparent reads, sweeping
+Run with: pytest tests/ -v
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_budget
+from cold_storage import PayloadCache, archive_analyses, get_store, sweep_archive
+from database_models import db, ARCHIVED_COLUMNS, BudgetAnalysis, BudgetLineItem
+from retention import purge_analyses
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _upload(client, csv_text=SAMPLE_CSV, days_old=0, **form):
+    resp = upload_csv(client, csv_text, **form)
+    analysis = db.session.get(BudgetAnalysis, resp.headers['Location'].rsplit('/', 1)[-1])
+    analysis.upload_date = datetime.utcnow() - timedelta(days=days_old)
+    db.session.commit()
+    return analysis
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv('ARCHIVE_FOLDER', str(tmp_path / 'archive'))
+    return get_store()
+
+
+def _payloads(analysis):
+    return analysis.get_dataframe(), analysis.get_risk_analysis(), analysis.get_optimizations(), analysis.payload('row_index_blob')
+
+
+# ── Archiving ─────────────────────────────────────────────────────────────────
+
+def test_archived_payloads_read_back_transparently(client, store):
+    old, new = _upload(client, days_old=400), _upload(client, SAMPLE_CSV.replace('45000', '47000'))
+    before = _payloads(old)
+    version = old.content_version
+
+    report = archive_analyses(days_old=180, store=store)
+    assert report['analyses'] == 1 and report['files'] == 4
+    assert 0 < report['stored_bytes'] < report['freed_bytes']
+    assert archive_analyses(days_old=180, store=store)['analyses'] == 0
+
+    stored = db.session.execute(db.select(*[getattr(BudgetAnalysis.__table__.c, c) for c in ARCHIVED_COLUMNS])
+                                .where(BudgetAnalysis.id == old.id)).one()
+    assert list(stored) == [None, '', None, None, None]
+    assert new.dataframe_blob and new.archived_at is None
+
+    old = db.session.get(BudgetAnalysis, old.id)
+    assert old.content_version == version and old.archived_at is not None
+    df, risk, optimizations, row_index = _payloads(old)
+    pd.testing.assert_frame_equal(df, before[0])
+    assert (risk, optimizations, row_index) == before[1:]
+    assert store.cache.stats()['misses'] == 4
+    old.get_risk_analysis()
+    assert store.cache.stats()['hits'] == 1
+
+
+def test_streamed_payloads_move_to_the_archive(client, store):
+    analysis = _upload(client, url='/upload?mode=stream', days_old=400)
+    before = analysis.get_dataframe(), analysis.get_risk_analysis()
+
+    report = archive_analyses(days_old=180)
+    assert report['analyses'] == 1 and report['payloads'] == 3
+    assert analysis.stored_payloads.count() == 0
+
+    analysis = db.session.get(BudgetAnalysis, analysis.id)
+    pd.testing.assert_frame_equal(analysis.get_dataframe(), before[0])
+    assert analysis.get_risk_analysis() == before[1]
+
+
+def test_identical_payloads_share_files_and_views_render(client, store):
+    first, second = _upload(client, days_old=400), _upload(client, days_old=400)
+    report = archive_analyses(days_old=180)
+    assert report['payloads'] == 8 and report['files'] < 8
+
+    assert client.get(f'/analysis/{first.id}').status_code == 200
+    assert client.get(f'/analysis/{second.id}').status_code == 200
+
+
+def test_revision_of_an_archived_parent_copies_unchanged_rows(client, store, caplog):
+    df = make_budget(300)
+    parent = _upload(client, df.to_csv(index=False), days_old=400)
+    archive_analyses(days_old=180)
+
+    with caplog.at_level('INFO'):
+        revision = _upload(client, df.drop(index=[5]).to_csv(index=False), parent_id=parent.id)
+    assert '299 unchanged' in caplog.text
+    assert BudgetLineItem.query.filter_by(analysis_id=revision.id).count() == 299
+
+
+# ── Sweeping ──────────────────────────────────────────────────────────────────
+
+def test_sweep_removes_only_unreferenced_files(client, store):
+    kept = _upload(client, days_old=400)
+    purged = _upload(client, SAMPLE_CSV.replace('45000', '47000'), days_old=800)
+    archive_analyses(days_old=180, store=store)
+    files = dict(store.files())
+    assert len(files) == 8
+
+    assert sweep_archive(store) == (0, 0)  # every file is referenced
+    purge_analyses(datetime.utcnow() - timedelta(days=600), pause=0)
+    assert sweep_archive(store)[0] == 0  # unreferenced, but inside the grace period
+    removed, freed = sweep_archive(store, grace_seconds=0)
+    assert removed == 4 and freed > 0
+    assert len(dict(store.files())) == 4
+
+    store.cache = PayloadCache()
+    kept = db.session.get(BudgetAnalysis, kept.id)
+    assert len(kept.get_dataframe()) == 7
+
+
+def test_payload_cache_is_bounded_lru():
+    cache = PayloadCache(max_bytes=100)
+    cache.put('a', b'x' * 20)
+    cache.put('b', b'x' * 20)
+    cache.put('huge', b'x' * 30)  # over a quarter of the bound: not kept
+    assert cache.get('a') is not None and cache.get('huge') is None
+    for key in 'cdef':
+        cache.put(key, b'x' * 20)
+    assert cache.get('b') is None and cache.get('a') is not None
+    assert cache.stats()['bytes'] <= 100
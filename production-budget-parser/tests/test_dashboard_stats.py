@@ -0,0 +1,146 @@
+"""
+Dashboard statistics — running totals kept by triggers, health endpoints
+Run with: pytest tests/ -v
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from dashboard_stats import RISK_PREFIX, STATS_TABLE, add_counters, ensure_stats, read_counters, read_stats
+from database_models import db, BudgetAnalysis, BudgetComparison, BudgetLineItem, DashboardStat, get_database_stats
+from retention import purge_analyses
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _upload(client, csv_text=SAMPLE_CSV, **form):
+    resp = upload_csv(client, csv_text, **form)
+    return db.session.get(BudgetAnalysis, resp.headers['Location'].rsplit('/', 1)[-1])
+
+
+def _counted():
+    """Statistics from full-table aggregates (what get_database_stats used to run)"""
+    analyses = BudgetAnalysis.query.count()
+    total = db.session.query(db.func.sum(BudgetAnalysis.total_budget)).scalar() or 0
+    return {
+        'total_analyses': analyses,
+        'total_line_items': BudgetLineItem.query.count(),
+        'total_comparisons': BudgetComparison.query.count(),
+        'total_budget_tracked': round(total, 2),
+        'avg_budget': round(total, 2) / analyses if analyses else 0,
+        'risk_distribution': sorted(
+            db.session.query(BudgetAnalysis.risk_level, db.func.count(BudgetAnalysis.id)).group_by(BudgetAnalysis.risk_level).all(),
+            key=lambda item: item[0] or ''
+        ),
+    }
+
+
+# ── Running totals ────────────────────────────────────────────────────────────
+
+def test_totals_follow_uploads_compares_edits_and_deletes(client):
+    assert get_database_stats()['total_analyses'] == 0
+    first = _upload(client)
+    second = _upload(client, SAMPLE_CSV.replace('45000', '52000'), parent_id=first.id)
+    third = _upload(client, SAMPLE_CSV + 'Art,Art,Set dressing,Prop House,3000\n')
+    assert get_database_stats() == _counted()
+    assert get_database_stats()['total_line_items'] == 22
+
+    client.post(f'/compare/{first.id}', data={'compare_id': second.id})
+    client.post(f'/compare/{second.id}', data={'compare_id': third.id})
+    assert get_database_stats()['total_comparisons'] == 2
+
+    third.risk_level, third.total_budget = 'CRITICAL', 1.5
+    db.session.commit()
+    assert get_database_stats() == _counted()
+
+    db.session.execute(db.delete(BudgetComparison.__table__).where(db.or_(
+        BudgetComparison.analysis1_id == second.id, BudgetComparison.analysis2_id == second.id
+    )))
+    db.session.delete(second)  # cascades to its line items
+    db.session.commit()
+    assert get_database_stats() == _counted()
+
+    first.upload_date = datetime.utcnow() - timedelta(days=365)
+    db.session.commit()
+    purge_analyses(datetime.utcnow() - timedelta(days=90), pause=0)
+    stats = get_database_stats()
+    assert stats == _counted()
+    assert stats['total_analyses'] == 1 and stats['total_comparisons'] == 0
+    assert stats['risk_distribution'] == [('CRITICAL', 1)]
+
+
+def test_line_items_added_through_the_orm_are_counted(client):
+    analysis = _upload(client)
+    item = BudgetLineItem(analysis_id=analysis.id, line_number=99, category='Art', description='Props', amount=10.0)
+    db.session.add(item)
+    db.session.commit()
+    assert get_database_stats() == _counted()
+    assert get_database_stats()['total_line_items'] == 8
+
+    db.session.delete(item)
+    db.session.commit()
+    assert get_database_stats()['total_line_items'] == 7
+
+
+def test_upgrade_counts_existing_rows(client):
+    _upload(client)
+    _upload(client)
+    db.session.execute(db.text(f'DELETE FROM {STATS_TABLE}'))
+    for trigger in db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stats_%'")).scalars().all():
+        db.session.execute(db.text(f'DROP TRIGGER {trigger}'))
+    db.session.commit()
+    assert read_stats()['total_analyses'] == 0
+
+    ensure_stats()
+    assert read_stats() == _counted()
+    _upload(client)
+    assert read_stats() == _counted()
+
+
+def test_counters_are_summed_over_shards(client):
+    _upload(client)
+    db.session.add(DashboardStat(name='analyses', shard=5, value=2))
+    db.session.add(DashboardStat(name=f'{RISK_PREFIX}LOW', shard=9, value=1))
+    db.session.commit()
+    stats = read_stats()
+    assert stats['total_analyses'] == 3
+    assert ('LOW', 1) in stats['risk_distribution']
+
+
+def test_upgrade_shards_an_old_stats_table(client):
+    _upload(client)
+    add_counters(db.session, {'insights_cache:hits': 4})
+    db.session.commit()
+    db.session.execute(db.text(f'DROP TABLE {STATS_TABLE}'))
+    db.session.execute(db.text(f'CREATE TABLE {STATS_TABLE} (name VARCHAR(64) PRIMARY KEY, value FLOAT NOT NULL)'))
+    db.session.execute(db.text(f"INSERT INTO {STATS_TABLE} VALUES ('insights_cache:hits', 4), ('analyses', 1)"))
+    db.session.commit()
+
+    ensure_stats()
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns(STATS_TABLE)}
+    assert 'shard' in columns
+    assert read_counters('insights_cache:') == {'hits': 4}
+    _upload(client)
+    assert read_stats() == _counted()
+
+
+# ── Health ────────────────────────────────────────────────────────────────────
+
+def test_liveness_skips_the_database_and_deep_health_reads_totals(client):
+    _upload(client)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        body = client.get('/api/health').get_json()
+        assert body['status'] == 'ok' and statements == []
+
+        deep = client.get('/api/health/deep')
+        assert deep.status_code == 200
+        assert deep.get_json()['analyses'] == 1 and deep.get_json()['line_items'] == 7
+        assert not any('count(' in statement.lower() for statement in statements)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
@@ -0,0 +1,176 @@
+"""
+Database backups — online snapshots, increments, restore and rotation
+Run with: pytest tests/ -v
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import database_backup
+from database_backup import create_backup, list_backups, restore_backup, rotate_backups
+
+
+def _database(path, rows=5000):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, description TEXT, amount REAL)')
+    conn.executemany('INSERT INTO items (description, amount) VALUES (?, ?)',
+                     [(f'Line item {i} ' + 'x' * 100, float(i)) for i in range(rows)])
+    conn.commit()
+    return conn
+
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT id, description, amount FROM items ORDER BY id').fetchall()
+
+
+# ── Backups ───────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_incremental_backups_restore_each_state(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    conn = _database(db_path)
+
+    full = create_backup(db_path, backup_dir, incremental=True, compression=compression)
+    original = _rows(db_path)
+    conn.execute('UPDATE items SET amount = amount * 2 WHERE id <= 10')
+    conn.execute("INSERT INTO items (description, amount) VALUES ('Added', 1.0)")
+    conn.commit()
+    increment = create_backup(db_path, backup_dir, incremental=True, compression=compression)
+    edited = _rows(db_path)
+
+    assert full['kind'] == 'full' and increment['kind'] == 'incremental'
+    assert increment['parent'] == full['file']
+    assert 0 < increment['changed_pages'] < increment['page_count'] // 10
+    assert increment['backup_bytes'] < full['backup_bytes']
+    assert full['mb_per_s'] > 0
+
+    restored = str(tmp_path / 'restored.db')
+    result = restore_backup(increment['path'], restored)
+    assert result['chain'] == 2 and result['mb_per_s'] > 0
+    assert _rows(restored) == edited
+    restore_backup(full['path'], restored)
+    assert _rows(restored) == original
+
+    # Restoring over the live database while a connection is open
+    restore_backup(full['path'], db_path)
+    assert conn.execute('SELECT count(*) FROM items').fetchone()[0] == len(original)
+    conn.close()
+
+
+def test_backup_while_the_database_is_written(tmp_path):
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    _database(db_path, rows=20000).close()
+    stop = threading.Event()
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=5)
+        while not stop.is_set():
+            conn.execute("INSERT INTO items (description, amount) VALUES ('concurrent', 1.0)")
+            conn.commit()
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        backup = create_backup(db_path, backup_dir, compression='gzip', step_pages=16)
+    finally:
+        stop.set()
+        thread.join()
+
+    restored = str(tmp_path / 'restored.db')
+    restore_backup(backup['path'], restored)
+    assert len(_rows(restored)) >= 20000
+
+
+def test_checkpointed_databases_are_read_without_a_copy(tmp_path, monkeypatch):
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    conn = _database(db_path)
+    copies = []
+    mkstemp = database_backup.tempfile.mkstemp
+    monkeypatch.setattr(database_backup.tempfile, 'mkstemp',
+                        lambda prefix, **kwargs: copies.append(prefix) or mkstemp(prefix=prefix, **kwargs))
+
+    create_backup(db_path, backup_dir, compression='gzip')
+    assert '.snapshot-' not in copies
+
+    # A reader on an older snapshot keeps the new frames out of the file
+    reader = sqlite3.connect(db_path)
+    reader.execute('BEGIN')
+    reader.execute('SELECT count(*) FROM items').fetchone()
+    conn.execute("INSERT INTO items (description, amount) VALUES ('Added', 1.0)")
+    conn.commit()
+    increment = create_backup(db_path, backup_dir, incremental=True, compression='gzip')
+    reader.close()
+    assert '.snapshot-' in copies
+    assert increment['kind'] == 'incremental' and increment['changed_pages'] > 0
+
+    restored = str(tmp_path / 'restored.db')
+    restore_backup(increment['path'], restored)
+    assert _rows(restored) == _rows(db_path)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.snapshot-')]
+    conn.close()
+
+
+@pytest.mark.parametrize('failing', ['manifest', 'rename'])
+def test_interrupted_backups_are_never_listed(tmp_path, monkeypatch, failing):
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    _database(db_path).close()
+    full = create_backup(db_path, backup_dir, compression='gzip')
+
+    def crash(*args, **kwargs):
+        raise OSError('disk full')
+
+    if failing == 'manifest':
+        monkeypatch.setattr(database_backup.json, 'dump', crash)
+    else:
+        replace = database_backup.os.replace
+        monkeypatch.setattr(database_backup.os, 'replace',
+                            lambda src, dst: crash() if not dst.endswith('.json') else replace(src, dst))
+    with pytest.raises(OSError):
+        create_backup(db_path, backup_dir, incremental=True, compression='gzip')
+    assert sorted(os.listdir(backup_dir)) == [full['file'], full['file'] + '.json']
+
+
+def test_restore_needs_the_whole_chain_and_accepts_legacy_copies(tmp_path):
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    _database(db_path).close()
+    full = create_backup(db_path, backup_dir, compression='gzip')
+    increment = create_backup(db_path, backup_dir, incremental=True, compression='gzip')
+    os.remove(full['path'])
+    with pytest.raises(FileNotFoundError):
+        restore_backup(increment['path'], str(tmp_path / 'restored.db'))
+
+    legacy = os.path.join(backup_dir, 'budget_analysis_20240101_120000.db')
+    shutil.copy2(db_path, legacy)
+    assert any(backup['file'] == os.path.basename(legacy) for backup in list_backups(backup_dir))
+    restore_backup(legacy, str(tmp_path / 'restored.db'))
+    assert _rows(str(tmp_path / 'restored.db')) == _rows(db_path)
+
+
+# ── Rotation ──────────────────────────────────────────────────────────────────
+
+def test_rotation_keeps_whole_chains(tmp_path):
+    db_path, backup_dir = str(tmp_path / 'live.db'), str(tmp_path / 'backups')
+    _database(db_path, rows=100).close()
+    first = [create_backup(db_path, backup_dir, compression='gzip'),
+             create_backup(db_path, backup_dir, incremental=True, compression='gzip')]
+    second = create_backup(db_path, backup_dir, compression='gzip')
+    third = create_backup(db_path, backup_dir, incremental=True, compression='gzip')
+    assert third['parent'] == second['file']
+
+    assert rotate_backups(backup_dir, keep=2) == []
+    assert rotate_backups(backup_dir, keep=1) == [first[0]['file'], first[1]['file']]
+    assert [b['file'] for b in list_backups(backup_dir)] == [second['file'], third['file']]
+    assert not os.path.exists(first[0]['path'] + '.json')
+
+    # The newest chain survives any age limit
+    assert rotate_backups(backup_dir, max_age_days=1, now=datetime.now() + timedelta(days=30)) == []
@@ -0,0 +1,68 @@
+"""
+Excel export — the write-only workbook must match the regular one
+Run with: pytest tests/ -v
+"""
+
+import pytest
+from openpyxl import load_workbook
+
+from benchmarks.synthetic import make_budget
+from database_models import db, BudgetAnalysis
+from excel_exporter import export_to_excel
+from tests.conftest import upload_csv
+
+
+def _export(df, path, write_only):
+    budget_data = {'filename': 'budget.csv', 'total_budget': float(df['Amount'].sum()),
+                   'line_items': len(df), 'num_departments': df['Department'].nunique()}
+    risk_data = {'risk_level': 'HIGH', 'overall_risk_score': 61.5}
+    optimizations = [
+        {'recommendation': 'Consolidate vendors', 'potential_savings': 1200.0, 'priority': 'HIGH'},
+        {'recommendation': 'Review duplicates', 'potential_savings': 300.0, 'priority': 'MEDIUM'},
+    ]
+    return export_to_excel(df, budget_data, risk_data, optimizations, str(path), write_only=write_only)
+
+
+def _style(cell):
+    return tuple(repr(part) for part in (cell.font, cell.fill, cell.border, cell.alignment)) + (cell.number_format,)
+
+
+def test_write_only_workbook_matches_regular(tmp_path):
+    df = make_budget(300)
+    df.loc[7, 'Vendor'] = None
+
+    regular = load_workbook(_export(df, tmp_path / 'regular.xlsx', write_only=False))
+    streamed = load_workbook(_export(df, tmp_path / 'streamed.xlsx', write_only=True))
+
+    assert streamed.sheetnames == regular.sheetnames
+    for name in regular.sheetnames:
+        expected, actual = regular[name], streamed[name]
+        assert actual.max_row == expected.max_row, name
+        assert set(map(str, actual.merged_cells.ranges)) == set(map(str, expected.merged_cells.ranges)), name
+        assert actual.freeze_panes == expected.freeze_panes, name
+        assert {k: d.width for k, d in actual.column_dimensions.items()} == \
+            {k: d.width for k, d in expected.column_dimensions.items()}, name
+        for expected_row, actual_row in zip(expected.iter_rows(), actual.iter_rows()):
+            for e, a in zip(expected_row, actual_row):
+                if isinstance(e.value, float) and e.value != e.value:
+                    assert a.value is None, e.coordinate  # NaN is written as an empty cell
+                else:
+                    assert a.value == pytest.approx(e.value) if isinstance(e.value, float) else a.value == e.value, e.coordinate
+                assert _style(a) == _style(e), f'{name}!{e.coordinate}'
+
+
+def test_large_export_route_uses_write_only(app, client, monkeypatch):
+    import excel_exporter
+
+    resp = upload_csv(client)
+    analysis = db.session.get(BudgetAnalysis, resp.headers['Location'].rsplit('/', 1)[-1])
+
+    calls = []
+    original = excel_exporter.ExcelExporter._export_write_only
+    monkeypatch.setattr(excel_exporter.ExcelExporter, '_export_write_only',
+                        lambda self, *args: calls.append(len(args[0])) or original(self, *args))
+    monkeypatch.setitem(app.config, 'EXCEL_WRITE_ONLY_ROWS', 5)
+
+    resp = client.get(f'/export-excel/{analysis.id}')
+    assert resp.status_code == 200
+    assert calls == [7]
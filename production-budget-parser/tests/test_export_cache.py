@@ -0,0 +1,117 @@
+"""
+Export cache — Excel/PDF artifacts are generated once per analysis version
+Run with: pytest tests/ -v
+"""
+
+import os
+import time
+
+import pytest
+
+from database_models import db, BudgetAnalysis
+from export_cache import ExportCache
+from tests.conftest import upload_csv
+
+
+@pytest.fixture
+def analysis(client):
+    resp = upload_csv(client)
+    return db.session.get(BudgetAnalysis, resp.headers['Location'].rsplit('/', 1)[-1])
+
+
+@pytest.fixture
+def exports(monkeypatch, tmp_path):
+    import web_app
+
+    cache = ExportCache(str(tmp_path))
+    monkeypatch.setattr(web_app, 'export_cache', cache)
+    return cache
+
+
+def _write(path, size, age=0):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+
+
+# ── Routes ────────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('url,kind', [('/export-excel/{}', 'excel'), ('/generate-pdf/{}', 'pdf')])
+def test_second_download_is_a_cache_hit(client, analysis, exports, url, kind):
+    first = client.get(url.format(analysis.id))
+    assert first.status_code == 200
+    second = client.get(url.format(analysis.id))
+    assert second.status_code == 200
+    assert second.data == first.data
+
+    stats = exports.stats()[kind]
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['estimated_seconds_saved'] > 0
+    assert len(os.listdir(exports.folder)) == 1
+
+
+def test_cached_export_answers_conditional_request(client, analysis, exports):
+    first = client.get(f'/export-excel/{analysis.id}')
+    resp = client.get(f'/export-excel/{analysis.id}', headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 304
+
+
+def test_new_content_version_regenerates(client, analysis, exports):
+    client.get(f'/generate-pdf/{analysis.id}')
+    analysis.notes = 'Approved'
+    db.session.commit()
+    client.get(f'/generate-pdf/{analysis.id}')
+
+    assert exports.stats()['pdf']['misses'] == 2
+    assert exports.path_for('pdf', analysis.id, analysis.content_version, 1) != \
+        exports.path_for('pdf', analysis.id, analysis.content_version - 1, 1)
+
+
+def test_failed_build_leaves_no_file(exports):
+    def build(path):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        raise RuntimeError('exporter failed')
+
+    with pytest.raises(RuntimeError):
+        exports.get_or_create('excel', 'abc', 1, 1, build)
+    assert os.listdir(exports.folder) == []
+    assert len(exports._key_locks) == 0
+
+
+def test_artifact_locks_do_not_accumulate(exports):
+    for analysis_id in range(50):
+        exports.get_or_create('pdf', str(analysis_id), 1, 1, lambda path: open(path, 'wb').close())
+    assert len(exports._key_locks) == 0
+
+
+def test_health_reports_export_counters(client, exports):
+    body = client.get('/api/health').get_json()
+    assert body['export_cache']['excel'] == {'hits': 0, 'misses': 0, 'generation_seconds': 0.0, 'estimated_seconds_saved': 0.0}
+
+
+# ── Janitor ───────────────────────────────────────────────────────────────────
+
+def test_janitor_enforces_age_and_size(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=250, max_age_seconds=3600)
+    _write(tmp_path / 'budget_report_old.pdf', 10, age=7200)
+    _write(tmp_path / 'budget_analysis_a.xlsx', 100, age=300)
+    _write(tmp_path / 'budget_analysis_b.xlsx', 100, age=200)
+    _write(tmp_path / 'budget_report_c.pdf', 100, age=100)
+    _write(tmp_path / '.export-123-budget_report_d.pdf', 50, age=5000)
+    _write(tmp_path / 'app.py', 5000, age=99999)
+
+    assert cache.sweep() == (3, 160)
+    assert sorted(os.listdir(tmp_path)) == ['app.py', 'budget_analysis_b.xlsx', 'budget_report_c.pdf']
+
+
+def test_hits_refresh_janitor_age(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=150, max_age_seconds=3600)
+    path = cache.path_for('excel', 'abc', 1, 1)
+    _write(path, 100, age=3000)
+    _write(tmp_path / 'budget_report_newer.pdf', 100, age=10)
+
+    assert cache.get_or_create('excel', 'abc', 1, 1, build=None) == path
+    cache.sweep()
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
@@ -0,0 +1,90 @@
+"""
+Frame store — columnar DataFrame storage
+Run with: pytest tests/ -v
+"""
+
+import glob
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_budget
+from frame_store import encode_frame, decode_frame, read_meta
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'samples', 'csv')
+
+
+# ── Round trip ────────────────────────────────────────────────────────────────
+
+def test_round_trip_preserves_values_and_dtypes():
+    df = pd.DataFrame({
+        'Category': ['Camera', None, 'Cast', 'Camera'],
+        'Amount': [100.5, 2000.0, np.nan, 3.25],
+        'Qty': [1, 2, 3, 4],
+        'Approved': [True, False, True, True],
+        'Date': pd.to_datetime(['2024-01-01', None, '2024-03-01', '2024-04-01']),
+    })
+    result = decode_frame(encode_frame(df))
+
+    assert list(result.columns) == list(df.columns)
+    assert result['Qty'].dtype == np.int64
+    assert result['Approved'].dtype == bool
+    assert result['Date'].dtype == df['Date'].dtype
+    pd.testing.assert_frame_equal(result, df, check_dtype=False)
+    assert result['Category'].isna().tolist() == [False, True, False, False]
+
+
+def test_mixed_object_column_round_trips():
+    df = pd.DataFrame({'Notes': pd.Series(['a', 1, None], dtype=object), 'Amount': [1.0, 2.0, 3.0]})
+    result = decode_frame(encode_frame(df))
+    assert result['Notes'].tolist()[:2] == ['a', 1]
+    assert result['Amount'].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_empty_frame():
+    df = pd.DataFrame({'Category': pd.Series([], dtype=str), 'Amount': pd.Series([], dtype=float)})
+    result = decode_frame(encode_frame(df))
+    assert len(result) == 0
+    assert list(result.columns) == ['Category', 'Amount']
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(SAMPLE_DIR, '*.csv'))))
+def test_sample_budgets_match_json_storage(path):
+    df = pd.read_csv(path)
+    from_json = pd.read_json(io.StringIO(df.to_json(orient='records')))
+    result = decode_frame(encode_frame(df))
+
+    assert list(result.columns) == list(from_json.columns)
+    assert result['Amount'].tolist() == pytest.approx(from_json['Amount'].tolist())
+    for column in ('Category', 'Description'):
+        if column in df.columns:
+            assert result[column].tolist() == from_json[column].tolist()
+
+
+# ── Column selection ──────────────────────────────────────────────────────────
+
+def test_load_selected_columns_in_requested_order():
+    df = make_budget(200)
+    result = decode_frame(encode_frame(df), ['Amount', 'Category', 'Month'])
+    assert list(result.columns) == ['Amount', 'Category']
+    assert result['Amount'].tolist() == df['Amount'].tolist()
+
+
+def test_meta_lists_columns_without_decoding():
+    df = make_budget(50)
+    meta = read_meta(encode_frame(df))
+    assert meta['rows'] == 50
+    assert [c['name'] for c in meta['columns']] == list(df.columns)
+
+
+def test_smaller_than_json():
+    df = make_budget(5000, unique_suffix=False)
+    assert len(encode_frame(df)) < len(df.to_json(orient='records').encode()) / 4
+
+
+def test_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_frame(b'not a frame')
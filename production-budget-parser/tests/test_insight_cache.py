@@ -0,0 +1,111 @@
+"""
+Insight cache — AI insights shared by analyses with the same prompt inputs
+Run with: pytest tests/ -v
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import ai_insights
+import flask_auth
+import web_app
+from dashboard_stats import rebuild_stats
+from database_models import db, InsightCacheEntry
+from insight_cache import InsightCache, fingerprint
+from tests.conftest import SAMPLE_CSV, upload_csv
+from tests.test_ai_insights import FakeClient, HEADERS, INSIGHTS
+
+
+@pytest.fixture
+def model(app, monkeypatch):
+    client = FakeClient()
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'sk-test')
+    monkeypatch.setattr(ai_insights, 'get_client', lambda api_key: client)
+    monkeypatch.setattr(flask_auth, 'verify_api_key', lambda key: key == 'test-key')
+    return client
+
+
+def _upload(client, csv_text=SAMPLE_CSV, filename='budget.csv'):
+    return upload_csv(client, csv_text, filename).headers['Location'].rsplit('/', 1)[-1]
+
+
+# ── Sharing across analyses ───────────────────────────────────────────────────
+
+def test_reupload_gets_insights_without_a_model_call(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    first = _upload(client)
+    second = _upload(client, filename='budget (copy).csv')
+
+    assert client.post(f'/api/ai-insights/{first}', headers=HEADERS).status_code == 200
+    resp = client.post(f'/api/ai-insights/{second}', headers=HEADERS)
+    assert resp.status_code == 200 and resp.get_json()['insights'] == INSIGHTS
+    assert model.calls == 1
+
+    assert len(web_app.insights_worker._key_locks) == 0  # per-key locks go with their last user
+    stats = client.get('/api/admin/insights-cache', headers=HEADERS).get_json()
+    assert stats['entries'] == 1 and stats['bytes'] > 0
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+    assert stats['saved_seconds'] >= 0
+
+
+def test_cache_hits_are_answered_without_queueing(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', False)
+    first = _upload(client)
+    second = _upload(client)
+    assert client.post(f'/api/ai-insights/{first}', headers=HEADERS).status_code == 202
+    web_app.insights_worker.wait(first, 5)
+
+    resp = client.post(f'/api/ai-insights/{second}', headers=HEADERS)
+    assert resp.status_code == 200 and resp.get_json()['status'] == 'done'
+    assert model.calls == 1
+
+
+def test_changed_inputs_model_or_prompt_version_miss(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    first = _upload(client)
+    changed = _upload(client, SAMPLE_CSV + 'Art,Art,Set dressing,Prop House,7500\n')
+    other_model = _upload(client)
+    client.post(f'/api/ai-insights/{first}', headers=HEADERS)
+    client.post(f'/api/ai-insights/{changed}', headers=HEADERS)
+    monkeypatch.setitem(app.config, 'INSIGHTS_MODEL', 'claude-other')
+    client.post(f'/api/ai-insights/{other_model}', headers=HEADERS)
+    assert model.calls == 3
+
+    inputs = {'total_budget': 100.0, 'risk_flags': '{}'}
+    key = fingerprint(inputs, 'claude-sonnet-4-6', 2)
+    assert fingerprint(dict(reversed(list(inputs.items()))), 'claude-sonnet-4-6', 2) == key
+    assert fingerprint(inputs, 'claude-sonnet-4-6', 3) != key
+
+
+# ── Expiry and eviction ───────────────────────────────────────────────────────
+
+def test_entries_expire_and_least_recently_used_are_evicted(app):
+    cache = InsightCache(ttl_seconds=3600, max_bytes=2 * len('{"n": 0}'))
+    start = datetime(2026, 1, 1)
+    for n in range(2):
+        cache.put(f'key{n}', {'n': n}, 'model', 1, 1.5, now=start + timedelta(seconds=n))
+    assert cache.get('key0', now=start + timedelta(seconds=10)) == {'n': 0}
+
+    cache.put('key2', {'n': 2}, 'model', 1, 1.5, now=start + timedelta(seconds=20))
+    assert {entry.fingerprint for entry in InsightCacheEntry.query} == {'key0', 'key2'}
+    assert cache.get('key0', now=start + timedelta(hours=2)) is None
+
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1, 2)
+    assert stats['saved_seconds'] == 1.5
+
+    # Recounting the dashboard totals keeps the cache metrics
+    rebuild_stats()
+    db.session.commit()
+    assert cache.stats()['hits'] == 1
+
+
+def test_admin_endpoint_requires_key_and_clears(app, client, model, monkeypatch):
+    monkeypatch.setitem(app.config, 'INSIGHTS_EAGER', True)
+    client.post(f'/api/ai-insights/{_upload(client)}', headers=HEADERS)
+    assert client.get('/api/admin/insights-cache').status_code == 401
+
+    assert client.delete('/api/admin/insights-cache', headers=HEADERS).get_json() == {'success': True, 'removed': 1}
+    stats = client.get('/api/admin/insights-cache', headers=HEADERS).get_json()
+    assert (stats['entries'], stats['misses'], stats['hit_rate']) == (0, 0, None)
@@ -0,0 +1,46 @@
+"""
+Keyed locks — one lock per key in use, dropped with its last user
+Run with: pytest tests/ -v
+"""
+
+import threading
+import time
+
+from keyed_locks import KeyedLocks
+
+
+def test_same_key_waits_other_keys_do_not():
+    locks = KeyedLocks()
+    events = []
+    holding = threading.Event()
+
+    def slow():
+        with locks.hold('a'):
+            holding.set()
+            time.sleep(0.1)
+            events.append('slow done')
+
+    thread = threading.Thread(target=slow)
+    thread.start()
+    holding.wait()
+    with locks.hold('b'):
+        events.append('other key')
+    with locks.hold('a'):
+        events.append('same key')
+    thread.join()
+    assert events == ['other key', 'slow done', 'same key']
+
+
+def test_locks_are_dropped_with_their_last_user():
+    locks = KeyedLocks()
+    for i in range(1000):
+        with locks.hold(f'key-{i}'):
+            assert len(locks) == 1
+    assert len(locks) == 0
+
+    try:
+        with locks.hold('failing'):
+            raise ValueError
+    except ValueError:
+        pass
+    assert len(locks) == 0
@@ -0,0 +1,138 @@
+"""
+Rendered-page cache and HTTP validators for /analysis/<file_id>
+Run with: pytest tests/ -v
+"""
+
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import pytest
+
+from database_models import db, BudgetAnalysis
+from page_cache import PageCache
+from tests.conftest import upload_csv
+
+
+@pytest.fixture
+def analysis(client):
+    resp = upload_csv(client)
+    return db.session.get(BudgetAnalysis, resp.headers['Location'].rsplit('/', 1)[-1])
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    import web_app
+
+    cache = PageCache(web_app.app.config['PAGE_CACHE_MAX_BYTES'])
+    monkeypatch.setattr(web_app, 'analysis_pages', cache)
+    return cache
+
+
+# ── LRU ───────────────────────────────────────────────────────────────────────
+
+def test_lru_evicts_by_size():
+    cache = PageCache(max_bytes=400)
+    cache.put(('a', 1), 'x' * 100)
+    cache.put(('b', 1), 'x' * 100)
+    cache.put(('c', 1), 'x' * 100)
+    assert cache.get(('a', 1)) is not None  # a is now most recent
+    cache.put(('d', 1), 'x' * 100)
+    cache.put(('e', 1), 'x' * 100)
+
+    assert cache.get(('b', 1)) is None
+    assert cache.get(('a', 1)) is not None
+    assert cache.size == 400 and len(cache) == 4
+
+
+def test_new_version_replaces_old_and_large_pages_are_not_stored():
+    cache = PageCache(max_bytes=400)
+    first = cache.put(('a', 1), 'old page')
+    second = cache.put(('a', 2), 'new page')
+    assert cache.get(('a', 1)) is None
+    assert cache.get(('a', 2)) is second
+    assert first.etag != second.etag
+
+    big = cache.put(('b', 1), 'x' * 101)
+    assert big.body == b'x' * 101
+    assert cache.get(('b', 1)) is None
+
+
+# ── /analysis responses ───────────────────────────────────────────────────────
+
+def test_repeat_view_is_served_from_cache(client, analysis, pages, monkeypatch):
+    import web_app
+
+    first = client.get(f'/analysis/{analysis.id}')
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('"') and not first.headers['ETag'].startswith('W/')
+    assert 'Last-Modified' in first.headers
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('page was rebuilt')
+
+    monkeypatch.setattr(web_app, 'prepare_chart_data', fail)
+    second = client.get(f'/analysis/{analysis.id}')
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert pages.hits == 1
+
+
+def test_conditional_requests_get_304(client, analysis, pages):
+    first = client.get(f'/analysis/{analysis.id}')
+
+    resp = client.get(f'/analysis/{analysis.id}', headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 304
+    assert resp.data == b''
+    assert resp.headers['ETag'] == first.headers['ETag']
+
+    resp = client.get(f'/analysis/{analysis.id}', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert resp.status_code == 304
+
+    resp = client.get(f'/analysis/{analysis.id}', headers={'If-None-Match': '"something-else"'})
+    assert resp.status_code == 200
+
+
+def test_last_modified_is_utc_whatever_the_server_time_zone(client, analysis, pages, monkeypatch):
+    import web_app
+
+    # Stored as the server's local time (UTC+9), 3h after the last UTC update
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    time.tzset()
+    try:
+        analysis.updated_at = datetime(2024, 5, 1, 9, 0)
+        analysis.analysis_timestamp = datetime(2024, 5, 1, 21, 0)
+        assert web_app.last_modified(analysis) == datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+        analysis.analysis_timestamp = datetime(2024, 5, 1, 15, 0)
+        db.session.commit()  # updated_at is now
+        resp = client.get(f'/analysis/{analysis.id}')
+    finally:
+        monkeypatch.delenv('TZ')
+        time.tzset()
+    assert parsedate_to_datetime(resp.headers['Last-Modified']) == analysis.updated_at.replace(
+        microsecond=0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('field,value', [('ai_insights_json', '{"outlook": "POSITIVE"}'), ('notes', 'Reviewed')])
+def test_changing_analysis_invalidates_page(client, analysis, pages, field, value):
+    first = client.get(f'/analysis/{analysis.id}')
+    version = analysis.content_version
+
+    setattr(analysis, field, value)
+    db.session.commit()
+    assert analysis.content_version == version + 1
+    assert analysis.updated_at is not None
+
+    resp = client.get(f'/analysis/{analysis.id}', headers={'If-None-Match': first.headers['ETag']})
+    assert pages.misses == 2
+    assert len(pages) == 1
+    # The page body does not show these fields, so the revalidated copy still matches
+    assert resp.status_code == 304
+
+
+def test_missing_analysis_is_not_cached(client, pages):
+    resp = client.get('/analysis/does-not-exist')
+    assert resp.status_code == 302
+    assert len(pages) == 0
@@ -0,0 +1,157 @@
+"""
+PostgreSQL backend — schema, pooling and COPY ingestion against a real server
+Run with: pytest tests/ -v
+
+Uses POSTGRES_TEST_URL when set; otherwise starts a throwaway cluster with
+initdb/pg_ctl from PATH. Skipped when neither a server nor a psycopg driver
+is available.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+import pytest
+from flask import Flask
+from sqlalchemy import inspect
+
+from benchmarks.synthetic import make_budget
+from budget_ingest import bulk_insert_line_items, copy_line_items
+from database_models import (
+    db, BudgetAnalysis, BudgetLineItem, database_url, engine_options, get_database_stats, list_analyses_page, upgrade_schema
+)
+
+
+def _driver():
+    for module, name in (('psycopg', 'psycopg'), ('psycopg2', 'psycopg2')):
+        try:
+            __import__(module)
+            return name
+        except ImportError:
+            continue
+    pytest.skip('no PostgreSQL driver (psycopg or psycopg2) installed')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def postgres_url():
+    driver = _driver()
+    url = os.environ.get('POSTGRES_TEST_URL')
+    if url:
+        yield database_url({'DATABASE_URL': url})
+        return
+
+    if not (shutil.which('initdb') and shutil.which('pg_ctl')):
+        pytest.skip('no PostgreSQL server: set POSTGRES_TEST_URL or put initdb/pg_ctl on PATH')
+    tmp = tempfile.mkdtemp(prefix='budget-parser-pg-')
+    data_dir, port = os.path.join(tmp, 'data'), _free_port()
+    subprocess.run(['initdb', '-D', data_dir, '-U', 'postgres', '-A', 'trust'], check=True, capture_output=True)
+    subprocess.run(
+        ['pg_ctl', '-D', data_dir, '-w', '-l', os.path.join(tmp, 'server.log'),
+         '-o', f'-p {port} -k {tmp} -c listen_addresses=127.0.0.1', 'start'],
+        check=True, capture_output=True
+    )
+    try:
+        yield f'postgresql+{driver}://postgres@127.0.0.1:{port}/postgres'
+    finally:
+        subprocess.run(['pg_ctl', '-D', data_dir, '-m', 'fast', 'stop'], capture_output=True)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@pytest.fixture
+def pg_app(postgres_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = postgres_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(postgres_url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        upgrade_schema()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _analysis(analysis_id):
+    db.session.add(BudgetAnalysis(id=analysis_id, filename=f'{analysis_id}.csv', total_budget=0.0, line_items=0))
+    db.session.flush()
+
+
+# ── Configuration ─────────────────────────────────────────────────────────────
+
+def test_database_url_and_pool_options():
+    assert database_url({}) == 'sqlite:///budget_analysis.db'
+    assert database_url({'DATABASE_URL': 'postgres://u@db/budget'}) == 'postgresql://u@db/budget'
+    assert engine_options('sqlite:///budget_analysis.db') == {}
+
+    options = engine_options('postgresql://u@db/budget', {'DB_POOL_SIZE': '20'})
+    assert options == {'pool_size': 20, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': 1800, 'pool_pre_ping': True}
+
+
+# ── Server ────────────────────────────────────────────────────────────────────
+
+def test_schema_upgrade_is_idempotent(pg_app):
+    upgrade_schema()
+    indexes = {index['name'] for index in inspect(db.engine).get_indexes('budget_line_items')}
+    assert 'ix_budget_line_items_analysis_line' in indexes
+    assert db.engine.pool.size() == 5
+
+
+def test_copy_ingest_and_revision_copy(pg_app):
+    df = make_budget(2000)
+    df.loc[0, 'Description'] = 'x' * 600
+    df.loc[1, 'Category'] = ''
+    _analysis('parent')
+    assert bulk_insert_line_items(df, 'parent', chunk_size=300) == 2000
+    _analysis('revision')
+    copy_line_items('parent', 'revision', [(1, 1000, 0), (1501, 2000, -500)])
+    db.session.commit()
+
+    items = BudgetLineItem.query.filter_by(analysis_id='parent').order_by(BudgetLineItem.line_number).all()
+    assert [i.line_number for i in items] == list(range(1, 2001))
+    assert len(items[0].description) == 500
+    assert items[1].category == ''
+    assert items[2].amount == pytest.approx(float(df.loc[2, 'Amount']))
+    assert BudgetLineItem.query.filter_by(analysis_id='revision').count() == 1500
+    # COPY and INSERT ... SELECT are counted by the statement triggers
+    stats = get_database_stats()
+    assert (stats['total_analyses'], stats['total_line_items']) == (2, 3500)
+
+    page, _ = list_analyses_page(limit=1)
+    assert [a.id for a in page] == ['revision']
+
+
+def test_concurrent_uploads_do_not_wait_on_the_counters(pg_app):
+    from dashboard_stats import STATS_SHARDS
+
+    first = db.engine.connect()
+    # Another connection whose counters go to a different shard
+    others = []
+    while True:
+        other = db.engine.connect()
+        if other.exec_driver_sql('SELECT pg_backend_pid()').scalar() % STATS_SHARDS != \
+                first.exec_driver_sql('SELECT pg_backend_pid()').scalar() % STATS_SHARDS:
+            break
+        others.append(other)
+    table = BudgetAnalysis.__table__
+    try:
+        first.execute(table.insert().values(id='first', filename='a.csv', total_budget=1.0, line_items=0))
+        other.exec_driver_sql("SET lock_timeout = '2s'")
+        other.execute(table.insert().values(id='other', filename='b.csv', total_budget=2.0, line_items=0))
+        other.commit()  # would time out behind the uncommitted upload with one row per counter
+        first.commit()
+    finally:
+        for connection in [first, other] + others:
+            connection.close()
+
+    stats = get_database_stats()
+    assert (stats['total_analyses'], stats['total_budget_tracked']) == (2, 3.0)
@@ -0,0 +1,77 @@
+"""
+Retention — batched purge of old analyses and everything that refers to them
+Run with: pytest tests/ -v
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from database_models import (
+    db, AnalysisAggregate, BudgetAnalysis, BudgetComparison, BudgetLineItem, cleanup_old_analyses
+)
+from retention import count_old_rows, purge_analyses
+from search_index import LINE_ITEMS_FTS, search
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _upload(client, days_old, filename='budget.csv'):
+    resp = upload_csv(client, SAMPLE_CSV, filename=filename)
+    analysis_id = resp.headers['Location'].rsplit('/', 1)[-1]
+    analysis = db.session.get(BudgetAnalysis, analysis_id)
+    analysis.upload_date = datetime.utcnow() - timedelta(days=days_old)
+    db.session.commit()
+    return analysis_id
+
+
+def _compare(first, second):
+    db.session.add(BudgetComparison(analysis1_id=first, analysis2_id=second, comparison_data_json='{}'))
+    db.session.commit()
+
+
+def _cutoff(days=90):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+# ── Purge ─────────────────────────────────────────────────────────────────────
+
+def test_purge_removes_old_analyses_with_their_rows(client):
+    old = [_upload(client, 200, f'old-{i}.csv') for i in range(3)]
+    new = _upload(client, 1, 'new.csv')
+    _compare(old[0], new)
+    _compare(new, old[1])
+    _compare(new, new)
+
+    report = purge_analyses(_cutoff(), batch_size=2, line_item_chunk=5, pause=0)
+
+    assert report['analyses'] == 3 and report['line_items'] == 21 and report['comparisons'] == 2
+    assert report['batches'] == 2
+    assert report['rows'] == sum(report[table] for table in ('line_items', 'aggregates', 'payloads', 'comparisons', 'jobs', 'analyses'))
+    assert [a.id for a in BudgetAnalysis.query.all()] == [new]
+    assert {item.analysis_id for item in BudgetLineItem.query.all()} == {new}
+    assert {agg.analysis_id for agg in AnalysisAggregate.query.all()} <= {new}
+    assert BudgetComparison.query.count() == 1
+    assert {item['analysis_id'] for item in search('panavision')['line_items']} == {new}
+    db.session.execute(text(f"INSERT INTO {LINE_ITEMS_FTS}({LINE_ITEMS_FTS}) VALUES ('integrity-check')"))
+
+
+def test_dry_run_only_counts(client):
+    old = _upload(client, 200)
+    _compare(old, _upload(client, 1))
+    expected = count_old_rows(_cutoff())
+
+    report = purge_analyses(_cutoff(), dry_run=True)
+
+    assert report['dry_run'] and report['batches'] == 0
+    assert report['analyses'] == 1 and report['line_items'] == 7 and report['comparisons'] == 1
+    assert {table: report[table] for table in expected} == expected
+    assert BudgetAnalysis.query.count() == 2 and BudgetComparison.query.count() == 1
+
+
+def test_cleanup_old_analyses_returns_deleted_count(client):
+    _upload(client, 120)
+    _upload(client, 10)
+    assert cleanup_old_analyses(days_old=90, dry_run=True) == 1
+    assert cleanup_old_analyses(days_old=90) == 1
+    assert cleanup_old_analyses(days_old=90) == 0
+    assert BudgetAnalysis.query.count() == 1
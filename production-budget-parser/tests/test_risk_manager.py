@@ -0,0 +1,160 @@
+"""
+RiskManager — column-wise engine parity with the row-by-row reference
+Run with: pytest tests/ -v
+"""
+
+import glob
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from risk_manager import RiskManager
+from benchmarks.synthetic import make_budget
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'samples', 'csv')
+
+
+def _risk_item(row, total_budget):
+    return {
+        "description": row.get("Description", "Unknown"),
+        "department": row.get("Department", "Unknown"),
+        "amount": float(row["Amount"]),
+        "percentage": float(row["Amount"] / total_budget * 100),
+        "notes": row.get("Notes", "")
+    }
+
+
+def analyze_risks_rowwise(risk_manager, budget_df):
+    """
+    Reference row-by-row implementation of RiskManager.analyze_risks.
+
+    Used by the parity tests and benchmarks.bench_risk_manager; slow on large budgets.
+    """
+    total_budget = budget_df["Amount"].sum()
+    high_cost_threshold = total_budget * risk_manager.high_cost_threshold
+
+    risks = {category: [] for category in risk_manager.risk_categories.keys()}
+    risks["high_cost"] = []
+
+    for _, row in budget_df.iterrows():
+        if row["Amount"] >= high_cost_threshold:
+            risks["high_cost"].append(_risk_item(row, total_budget))
+
+        item_text = ""
+        for col in risk_manager.text_columns:
+            if col in row and pd.notna(row[col]):
+                item_text += str(row[col]).lower() + " "
+
+        for risk_type, data in risk_manager.risk_categories.items():
+            if any(keyword in item_text for keyword in data["keywords"]):
+                risks[risk_type].append(_risk_item(row, total_budget))
+
+    category_totals = {
+        category: (len(items), sum(item["amount"] for item in items))
+        for category, items in risks.items()
+    }
+    risk_metrics = risk_manager._calculate_risk_metrics(category_totals, total_budget)
+
+    risk_summary = {
+        "overall_risk_score": risk_metrics["overall_risk_score"],
+        "risk_level": risk_manager._determine_risk_level(risk_metrics["overall_risk_score"]),
+        "total_budget": float(total_budget),
+        "risk_categories": {
+            category: {
+                "count": len(items),
+                "amount": sum(item["amount"] for item in items),
+                "percentage": sum(item["amount"] for item in items) / total_budget * 100 if items else 0,
+                "description": risk_manager.risk_categories[category]["description"] if category in risk_manager.risk_categories else "High cost items"
+            }
+            for category, items in risks.items() if category != "high_cost" or items
+        },
+        "high_risk_items": sorted(
+            [item for sublist in risks.values() for item in sublist],
+            key=lambda x: x["amount"],
+            reverse=True
+        )[:risk_manager.top_items_limit],
+        "timestamp": datetime.now().isoformat()
+    }
+
+    return {
+        "risks": risks,
+        "metrics": risk_metrics,
+        "summary": risk_summary
+    }
+
+
+def _comparable(result):
+    """Round-trip through JSON (as the app stores it) and drop the timestamp."""
+    result = json.loads(json.dumps(result))
+    result['summary'].pop('timestamp')
+    return result
+
+
+def assert_parity(df):
+    risk_manager = RiskManager()
+    fast = _comparable(risk_manager.analyze_risks(df))
+    reference = _comparable(analyze_risks_rowwise(risk_manager, df))
+
+    assert fast['risks'] == reference['risks']
+    assert fast['summary']['high_risk_items'] == reference['summary']['high_risk_items']
+    assert fast['summary']['risk_level'] == reference['summary']['risk_level']
+    assert fast['summary']['total_budget'] == reference['summary']['total_budget']
+    # Category sums are vectorized, so allow for float summation order
+    assert list(fast['summary']['risk_categories']) == list(reference['summary']['risk_categories'])
+    for key, expected in reference['summary']['risk_categories'].items():
+        actual = fast['summary']['risk_categories'][key]
+        assert actual['count'] == expected['count']
+        assert actual['description'] == expected['description']
+        assert actual['amount'] == pytest.approx(expected['amount'])
+        assert actual['percentage'] == pytest.approx(expected['percentage'])
+        assert type(actual['amount']) is type(expected['amount'])
+    assert fast['metrics'] == pytest.approx(reference['metrics'])
+
+
+# ── Parity ────────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.csv'))))
+def test_parity_sample_budgets(path):
+    assert_parity(pd.read_csv(path))
+
+
+@pytest.mark.parametrize('n_rows', [1, 250, 5000])
+def test_parity_synthetic_budgets(n_rows):
+    assert_parity(make_budget(n_rows, seed=n_rows))
+
+
+def test_parity_keywords_spanning_columns():
+    df = pd.DataFrame({
+        'Description': ['Shot with visual', 'Green', 'Practical', 'Misc', None, 'EXT. Day', 'Plain'],
+        'Notes': ['effects pass', None, None, 'x', 'special', np.nan, 'b'],
+        'Department': ['Post', 'screen team', 'effects crew', 'effects', 'effects', 'Art', 'Art'],
+        'Amount': [100.0, 100.0, 50.0, 5.0, 5.0, 1000.0, 1.0],
+    })
+    assert_parity(df)
+
+    risks = RiskManager().analyze_risks(df)['risks']
+    assert [item['description'] for item in risks['vfx_heavy']] == ['Shot with visual', 'Green']
+    assert [item['department'] for item in risks['stunts_action']] == ['effects crew', 'effects']
+
+
+def test_parity_ties_and_missing_columns():
+    df = pd.DataFrame({
+        'Description': ['Camera rental', 'Crane rental', 'Cast fees', 'Permit', 'Catering'],
+        'Amount': [500.0, 500.0, 500.0, 500.0, 10.0],
+    })
+    assert_parity(df)
+
+
+# ── Structure ─────────────────────────────────────────────────────────────────
+
+def test_result_structure():
+    result = RiskManager().analyze_risks(make_budget(500))
+    assert set(result) == {'risks', 'metrics', 'summary'}
+    assert set(result['risks']) == set(RiskManager().risk_categories) | {'high_cost'}
+    assert len(result['summary']['high_risk_items']) == 10
+    amounts = [item['amount'] for item in result['summary']['high_risk_items']]
+    assert amounts == sorted(amounts, reverse=True)
@@ -0,0 +1,127 @@
+"""
+Full-text search — index sync on upload, edit and delete, ranked API results
+Run with: pytest tests/ -v
+"""
+
+from sqlalchemy import text
+
+from database_models import db, BudgetAnalysis, BudgetLineItem, search_analyses, upgrade_schema
+from search_index import ANALYSES_FTS, LINE_ITEMS_FTS, has_search_index, search
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _upload(client, csv_text=SAMPLE_CSV, filename='budget.csv'):
+    resp = upload_csv(client, csv_text, filename=filename)
+    return resp.headers['Location'].rsplit('/', 1)[-1]
+
+
+def _integrity_check(content=False):
+    """FTS5 integrity check; with content, the index must also hold exactly the rows of budget_line_items"""
+    db.session.execute(text(
+        f"INSERT INTO {LINE_ITEMS_FTS}({LINE_ITEMS_FTS}, rank) VALUES ('integrity-check', :content)"
+    ), {'content': int(content)})
+
+
+# ── Index sync ────────────────────────────────────────────────────────────────
+
+def test_uploads_are_indexed_and_ranked(client):
+    assert has_search_index()
+    first = _upload(client, filename='feature-draft.csv')
+    _upload(client, SAMPLE_CSV.replace('Quality Catering', 'Crafty Kitchen'), filename='pilot.csv')
+
+    assert search('quality cater')['line_items'] == []
+    results = search('quality cater*')
+    assert [(item['analysis_id'], item['line_number']) for item in results['line_items']] == [(first, 5), (first, 6)]
+    assert results['line_items'][0]['vendor'] == 'Quality Catering'
+    assert '<mark>Catering</mark>' in results['line_items'][0]['snippet']
+
+    assert [a['id'] for a in search('feature')['analyses']] == [first]
+    assert search('panavision')['line_items'][0]['department'] == 'Camera'
+    assert search('"*) OR') == {'analyses': [], 'line_items': []}
+    _integrity_check()
+
+
+def test_edits_and_deletes_keep_the_index_in_sync(client):
+    analysis = db.session.get(BudgetAnalysis, _upload(client))
+    analysis.tags = 'pilot, season two'
+    analysis.notes = 'Approved by the studio'
+    db.session.commit()
+    assert [a['id'] for a in search('studio season')['analyses']] == [analysis.id]
+    assert [a.id for a in search_analyses('approved')] == [analysis.id]
+
+    db.session.delete(analysis)
+    db.session.commit()
+    assert search('studio') == {'analyses': [], 'line_items': []}
+    assert search('panavision')['line_items'] == []
+    _integrity_check()
+
+
+def test_every_insert_path_keeps_the_index_exact(client):
+    parent = _upload(client)
+    upload_csv(client, SAMPLE_CSV.replace('45000', '52000'), parent_id=parent)  # copy_line_items
+    upload_csv(client, SAMPLE_CSV, url='/upload?mode=stream')
+    db.session.add(BudgetLineItem(analysis_id=parent, line_number=8, description='Drone aerial unit',
+                                  department='Camera', vendor='Sky Cam', amount=7000.0))
+    db.session.commit()
+    _integrity_check(content=True)
+    assert search('sky cam')['line_items'][0]['line_number'] == 8
+
+    db.session.delete(db.session.get(BudgetAnalysis, parent))
+    db.session.commit()
+    _integrity_check(content=True)
+
+
+def test_rows_inserted_behind_the_index_can_not_corrupt_it(client):
+    analysis_id = _upload(client)
+    db.session.execute(text(
+        "INSERT INTO budget_line_items (analysis_id, line_number, description, amount) "
+        "VALUES (:id, 8, 'Unindexed row', 1.0)"
+    ), {'id': analysis_id})
+    db.session.commit()
+    assert search('unindexed')['line_items'] == []
+
+    db.session.execute(text("UPDATE budget_line_items SET description = 'Indexed now' WHERE line_number = 8"))
+    db.session.commit()
+    assert len(search('indexed')['line_items']) == 1
+
+    db.session.delete(db.session.get(BudgetAnalysis, analysis_id))
+    db.session.commit()
+    _integrity_check(content=True)
+
+
+def test_upgrade_indexes_existing_rows(client):
+    analysis_id = _upload(client)
+    for table in (ANALYSES_FTS, LINE_ITEMS_FTS):
+        db.session.execute(text(f'DROP TABLE {table}'))
+        for trigger in ('insert', 'delete', 'update'):
+            db.session.execute(text(f'DROP TRIGGER IF EXISTS {table}_{trigger}'))
+    db.session.commit()
+    assert not has_search_index()
+
+    upgrade_schema()
+    assert len(search('catering')['line_items']) == 2
+    assert search('budget')['analyses'][0]['id'] == analysis_id
+    _integrity_check()
+
+
+def test_line_items_are_ranked_over_all_matches(client):
+    rows = ['Catering,Production,Catering,Quality Catering,100']
+    rows += ['Catering,Production,Catering service for the extended night shoot crew,Quality Catering,100'] * 1500
+    oldest = _upload(client, 'Category,Department,Description,Vendor,Amount\n' + '\n'.join(rows) + '\n')
+    _upload(client, SAMPLE_CSV.replace('Quality Catering', 'Crafty Kitchen'))  # newer, weaker matches
+
+    best = search('catering', limit=1)['line_items']
+    assert [(item['analysis_id'], item['line_number']) for item in best] == [(oldest, 1)]
+
+
+# ── API ───────────────────────────────────────────────────────────────────────
+
+def test_search_api_returns_escaped_snippets(client):
+    analysis_id = _upload(client, SAMPLE_CSV + 'Art,Art,<b>Prop</b> rental,Prop House,3000\n')
+    data = client.get('/api/search?q=prop&limit=5').get_json()
+    assert data['line_items'][0]['snippet'] == '&lt;b&gt;<mark>Prop</mark>&lt;/b&gt; rental'
+    assert data['line_items'][0]['url'] == f'/analysis/{analysis_id}'
+    assert data['analyses'] == []
+
+    assert client.get('/api/search?q=').status_code == 400
+    assert client.get('/api/search?q=prop&limit=x').status_code == 400
@@ -0,0 +1,120 @@
+"""
+Budget web app — upload and analysis routes
+Run with: pytest tests/ -v
+"""
+
+import logging
+import uuid
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from database_models import db, BudgetAnalysis, BudgetLineItem, migrate_dataframe_storage, upgrade_schema
+from tests.conftest import SAMPLE_CSV, upload_csv
+
+
+def _latest_analysis():
+    return BudgetAnalysis.query.order_by(BudgetAnalysis.upload_date.desc()).first()
+
+
+# ── Upload ────────────────────────────────────────────────────────────────────
+
+def test_upload_stores_line_items(client):
+    resp = upload_csv(client)
+    assert resp.status_code == 302
+
+    analysis = _latest_analysis()
+    assert analysis is not None
+    assert analysis.line_items == 7
+
+    items = BudgetLineItem.query.filter_by(analysis_id=analysis.id).order_by(BudgetLineItem.line_number).all()
+    assert [item.line_number for item in items] == list(range(1, 8))
+    assert items[0].category == 'Camera'
+    assert items[0].description == 'Camera package rental'
+    assert items[1].amount == 120000.0
+    assert items[0].is_flagged is False
+
+
+def test_upload_line_items_in_small_chunks(app, client, caplog):
+    app.config['LINE_ITEM_CHUNK_SIZE'] = 3
+    with caplog.at_level(logging.INFO, logger='budget_ingest'):
+        upload_csv(client)
+    app.config['LINE_ITEM_CHUNK_SIZE'] = 5000
+
+    analysis = _latest_analysis()
+    assert BudgetLineItem.query.filter_by(analysis_id=analysis.id).count() == 7
+    assert any('rows/s' in message for message in caplog.messages)
+
+
+def test_upload_rejects_missing_columns(client):
+    resp = upload_csv(client, 'Description,Amount\nCamera,100\n')
+    assert resp.status_code == 302
+    assert BudgetAnalysis.query.count() == 0
+
+
+# ── Stored DataFrames ─────────────────────────────────────────────────────────
+
+def test_upload_stores_columnar_frame(client):
+    upload_csv(client)
+    analysis = _latest_analysis()
+    assert analysis.dataframe_blob
+    assert analysis.dataframe_json == ''
+
+    df = analysis.get_dataframe(['Amount', 'Vendor'])
+    assert list(df.columns) == ['Amount', 'Vendor']
+    assert df['Amount'].sum() == analysis.total_budget
+
+
+def test_analysis_pages_render_from_stored_frame(client):
+    upload_csv(client)
+    analysis_id = _latest_analysis().id
+
+    resp = client.get(f'/analysis/{analysis_id}')
+    assert resp.status_code == 200
+    assert b'Principal cast fees' in resp.data
+
+    resp = client.get(f'/export-excel/{analysis_id}')
+    assert resp.status_code == 200
+    assert resp.mimetype.endswith('spreadsheetml.sheet')
+
+
+def test_legacy_json_rows_are_read_and_migrated(app):
+    df = pd.DataFrame({'Category': ['Camera', 'Cast'], 'Amount': [100.0, 250.0]})
+    legacy = BudgetAnalysis(
+        id=str(uuid.uuid4()), filename='legacy.csv', total_budget=350.0, line_items=2,
+        dataframe_json=df.to_json(orient='records')
+    )
+    db.session.add(legacy)
+    db.session.commit()
+
+    assert legacy.get_dataframe(['Amount'])['Amount'].tolist() == [100.0, 250.0]
+    assert migrate_dataframe_storage() == 1
+    assert migrate_dataframe_storage() == 0
+
+    migrated = db.session.get(BudgetAnalysis, legacy.id)
+    assert migrated.dataframe_json == ''
+    assert migrated.get_dataframe()['Category'].tolist() == ['Camera', 'Cast']
+    assert migrated.get_dataframe_dict() == [{'Category': 'Camera', 'Amount': 100.0}, {'Category': 'Cast', 'Amount': 250.0}]
+
+
+# ── Database ──────────────────────────────────────────────────────────────────
+
+def test_sqlite_connections_are_tuned(app):
+    def pragma(name):
+        return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('busy_timeout') == 5000
+    assert pragma('cache_size') == -64000
+
+
+def test_upgrade_schema_adds_lookup_indexes(app):
+    for name in ('ix_budget_analyses_risk_level_upload_date', 'ix_budget_comparisons_analysis2_id'):
+        db.session.execute(text(f'DROP INDEX {name}'))
+    db.session.commit()
+
+    upgrade_schema()
+
+    assert 'ix_budget_analyses_risk_level_upload_date' in {i['name'] for i in inspect(db.engine).get_indexes('budget_analyses')}
+    assert 'ix_budget_comparisons_analysis2_id' in {i['name'] for i in inspect(db.engine).get_indexes('budget_comparisons')}
@@ -6,24 +6,26 @@ Enhanced with PATH A Features: Interactive Charts, Modern UI, Excel Export
 ================================================================================
 """
 
-from flask import Flask, request, render_template_string, redirect, url_for, send_file, flash, jsonify, get_flashed_messages
+from flask import Flask, Response, request, render_template_string, redirect, url_for, send_file, flash, jsonify, get_flashed_messages, stream_with_context
 import pandas as pd
-import io
 import os
 import json
 import uuid
 import html as html_lib
 import logging
+import time
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
 )
 logger = logging.getLogger(__name__)
-from datetime import datetime
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
 from dotenv import load_dotenv
-import anthropic
 
 load_dotenv(override=True)
 
@@ -34,18 +36,32 @@ from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 
 # Import database
-from database_models import db, BudgetAnalysis, BudgetLineItem, BudgetComparison, get_recent_analyses
+from database_models import db, BudgetAnalysis, BudgetComparison, AnalysisJob, get_database_stats, get_recent_analyses, list_analyses_page, upgrade_schema, configure_sqlite, database_url, engine_options, DEFAULT_SQLITE_PRAGMAS
+from analysis_jobs import AnalysisJobQueue, JobError, JobLost
+from ai_insights import InsightsWorker
+from budget_ingest import bulk_insert_line_items, copy_line_items, delete_line_items, DEFAULT_CHUNK_SIZE
+from budget_revision import RowIndex, load_revision, row_hashes
+from search_index import search as search_index
+from cold_storage import get_store
+from insight_cache import DEFAULT_MAX_BYTES as DEFAULT_INSIGHTS_CACHE_BYTES, DEFAULT_TTL_SECONDS as DEFAULT_INSIGHTS_CACHE_TTL
+from budget_stream import scan_budget_csv, stream_budget_csv, DEFAULT_STREAM_CHUNK_ROWS
+from budget_aggregates import compute_aggregates, save_aggregates, get_aggregates
+from budget_profile import BudgetProfile
+from budget_recommendations import find_optimizations, optimization_recommendations
+from page_cache import PageCache, DEFAULT_MAX_BYTES as DEFAULT_PAGE_CACHE_BYTES
 
 # Import your existing modules
 from risk_manager import RiskManager
 
 # Import PATH A modules
 from charts_data import prepare_chart_data, generate_chart_html
-from excel_exporter import export_to_excel
+from excel_exporter import export_to_excel, EXPORTER_VERSION as EXCEL_EXPORTER_VERSION
+from export_cache import ExportCache, DEFAULT_MAX_BYTES as DEFAULT_EXPORT_CACHE_BYTES, DEFAULT_MAX_AGE_SECONDS as DEFAULT_EXPORT_MAX_AGE
 
 # Import COMPARISON modules
-from budget_comparison import compare_budgets
-from comparison_charts import generate_comparison_chart_html
+from budget_comparison import compare_budgets, COMPARISON_ALGORITHM_VERSION
+from budget_series import compare_budget_series, MAX_SERIES_LENGTH
+from comparison_charts import generate_all_comparison_charts, generate_all_series_charts, generate_comparison_chart_html
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -70,17 +86,55 @@ limiter = Limiter(
 )
 
 # Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///budget_analysis.db'
+# DATABASE_URL selects the backend (SQLite by default, or postgresql://...); server databases
+# get a pooled engine sized by DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite connection PRAGMAs (WAL, synchronous=NORMAL, mmap, cache, busy timeout); SQLITE_TUNING=0 keeps SQLite's defaults
+app.config['SQLITE_PRAGMAS'] = DEFAULT_SQLITE_PRAGMAS if os.environ.get('SQLITE_TUNING', '1') != '0' else {}
+
+# Rows per batch when writing budget_line_items on upload
+app.config['LINE_ITEM_CHUNK_SIZE'] = int(os.environ.get('LINE_ITEM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+
+# Background analysis threads per process (uploads are analyzed off the request)
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 2))
+
+# AI insights: model calls in flight per process, and how long /events streams wait (seconds)
+app.config['INSIGHTS_WORKERS'] = int(os.environ.get('INSIGHTS_WORKERS', 4))
+app.config['INSIGHTS_SSE_TIMEOUT'] = int(os.environ.get('INSIGHTS_SSE_TIMEOUT', 60))
+app.config['INSIGHTS_SSE_INTERVAL'] = 1
+# Insights shared by analyses with the same prompt inputs: lifetime (seconds) and total size (bytes)
+app.config['INSIGHTS_CACHE_TTL'] = int(os.environ.get('INSIGHTS_CACHE_TTL', DEFAULT_INSIGHTS_CACHE_TTL))
+app.config['INSIGHTS_CACHE_MAX_BYTES'] = int(os.environ.get('INSIGHTS_CACHE_MAX_BYTES', DEFAULT_INSIGHTS_CACHE_BYTES))
+
+# Streaming uploads (/upload?mode=stream): CSV rows per chunk and the larger size cap
+app.config['STREAM_CHUNK_ROWS'] = int(os.environ.get('STREAM_CHUNK_ROWS', DEFAULT_STREAM_CHUNK_ROWS))
+app.config['STREAM_MAX_CONTENT_LENGTH'] = int(os.environ.get('STREAM_MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))  # 1GB
+
+# Rendered /analysis pages kept in memory per process (bytes)
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.environ.get('PAGE_CACHE_MAX_BYTES', DEFAULT_PAGE_CACHE_BYTES))
+
+# Generated Excel/PDF files kept in OUTPUT_FOLDER: total size (bytes) and age since last download (seconds)
+app.config['EXPORT_CACHE_MAX_BYTES'] = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', DEFAULT_EXPORT_CACHE_BYTES))
+app.config['EXPORT_CACHE_MAX_AGE'] = int(os.environ.get('EXPORT_CACHE_MAX_AGE', DEFAULT_EXPORT_MAX_AGE))
+
+# Excel exports of budgets with at least this many line items use the streaming (write-only) workbook
+app.config['EXCEL_WRITE_ONLY_ROWS'] = int(os.environ.get('EXCEL_WRITE_ONLY_ROWS', 20000))
+
 # Initialize database
 db.init_app(app)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
-OUTPUT_FOLDER = 'outputs'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+OUTPUT_FOLDER = os.environ.get('OUTPUT_FOLDER', 'outputs')
 ALLOWED_EXTENSIONS = {'csv'}
 
+# Stored DataFrame columns each route reads (missing columns are skipped on load)
+VIEW_COLUMNS = ['Category', 'Department', 'Description', 'Vendor', 'Amount', 'Date', 'Month']
+COMPARE_COLUMNS = ['Category', 'Department', 'Description', 'Vendor', 'Amount']
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -89,17 +143,15 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+# Excel/PDF exports, reused until the analysis or the exporter changes
+export_cache = ExportCache(OUTPUT_FOLDER, app.config['EXPORT_CACHE_MAX_BYTES'], app.config['EXPORT_CACHE_MAX_AGE'])
+
 # Create database tables
 with app.app_context():
+    configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
     db.create_all()
-    # Add ai_insights_json column to existing databases (idempotent)
-    try:
-        from sqlalchemy import text
-        with db.engine.connect() as conn:
-            conn.execute(text('ALTER TABLE budget_analyses ADD COLUMN ai_insights_json TEXT'))
-            conn.commit()
-    except Exception:
-        pass  # Column already exists
+    # Add newer columns (ai_insights_json, dataframe_blob) to existing databases
+    upgrade_schema()
 
 
 def allowed_file(filename):
@@ -107,69 +159,6 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def find_optimizations(df):
-    """
-    Find optimization opportunities in the budget
-    
-    Args:
-        df: pandas DataFrame with budget data
-        
-    Returns:
-        list: List of optimization recommendations
-    """
-    optimizations = []
-    
-    # Check for vendor consolidation opportunities
-    if 'Vendor' in df.columns:
-        vendor_counts = df['Vendor'].value_counts()
-        if len(vendor_counts) > 10:
-            optimizations.append({
-                'category': 'Vendor Management',
-                'recommendation': f'Consider consolidating vendors. Currently working with {len(vendor_counts)} different vendors.',
-                'potential_savings': df['Amount'].sum() * 0.05,  # Estimate 5% savings
-                'priority': 'MEDIUM'
-            })
-    
-    # Check for high-cost items
-    total = df['Amount'].sum()
-    high_cost_items = df[df['Amount'] > total * 0.10]
-    
-    if len(high_cost_items) > 0:
-        optimizations.append({
-            'category': 'Cost Review',
-            'recommendation': f'Review {len(high_cost_items)} high-cost items that each represent >10% of total budget.',
-            'potential_savings': high_cost_items['Amount'].sum() * 0.10,  # Estimate 10% savings on high items
-            'priority': 'HIGH'
-        })
-    
-    # Check for duplicate descriptions
-    if 'Description' in df.columns:
-        duplicates = df[df.duplicated(subset=['Description'], keep=False)]
-        if len(duplicates) > 0:
-            optimizations.append({
-                'category': 'Budget Cleanup',
-                'recommendation': f'Found {len(duplicates)} potentially duplicate line items to review.',
-                'potential_savings': 0,
-                'priority': 'LOW'
-            })
-    
-    # Department-specific recommendations
-    if 'Department' in df.columns:
-        dept_totals = df.groupby('Department')['Amount'].sum().sort_values(ascending=False)
-        if len(dept_totals) > 0:
-            top_dept = dept_totals.index[0]
-            top_amount = dept_totals.iloc[0]
-            if top_amount > total * 0.30:
-                optimizations.append({
-                    'category': 'Department Analysis',
-                    'recommendation': f'{top_dept} represents {(top_amount/total*100):.1f}% of total budget. Consider detailed review.',
-                    'potential_savings': top_amount * 0.08,
-                    'priority': 'MEDIUM'
-                })
-    
-    return optimizations
-
-
 def generate_recent_analyses():
     """
     Generate HTML for recent analyses sidebar FROM DATABASE
@@ -223,6 +212,13 @@ def index():
     """Homepage with upload form and recent analyses"""
     recent_analyses_html = generate_recent_analyses()
     csrf_token = generate_csrf()
+    
+    # Earlier uploads an upload can revise (newest first)
+    parents, _ = list_analyses_page(limit=PICKER_PAGE_SIZE)
+    parent_options = ''.join(
+        f'<option value="{a.id}">{html_lib.escape(a.filename)} ({a.upload_date.strftime("%Y-%m-%d %H:%M")})</option>'
+        for a in parents
+    )
 
     # Build flash messages HTML
     messages = get_flashed_messages(with_categories=True)
@@ -261,6 +257,19 @@ def index():
                         <label for="file">Choose CSV File:</label>
                         <input type="file" name="file" id="file" accept=".csv" required>
                     </div>
+                    <div class="form-group">
+                        <label for="parent_id">Revision of (optional):</label>
+                        <select name="parent_id" id="parent_id">
+                            <option value="">— new budget —</option>
+                            {parent_options}
+                        </select>
+                    </div>
+                    <div class="form-group">
+                        <label style="font-weight: normal;">
+                            <input type="checkbox" onchange="this.form.action = this.checked ? '/upload?mode=stream' : '/upload'">
+                            Large file — stream in chunks (up to {app.config['STREAM_MAX_CONTENT_LENGTH'] // (1024 * 1024):,} MB)
+                        </label>
+                    </div>
                     <button type="submit" class="btn btn-primary">
                         📊 Analyze Budget
                     </button>
@@ -311,10 +320,211 @@ def index():
     return html
 
 
+def run_budget_analysis(job, progress):
+    """
+    Analysis pipeline for an uploaded CSV (runs on the job queue)
+    
+    Raises JobError for problems with the file itself; the message is shown
+    to the user. Database writes are committed by the queue.
+    """
+    if job.mode == 'stream':
+        return run_streaming_budget_analysis(job, progress)
+    
+    progress.stage('parsing', 10)
+    df = pd.read_csv(job.filepath)
+    
+    # Validate required columns
+    required_cols = ['Category', 'Amount']
+    missing_cols = [col for col in required_cols if col not in df.columns]
+    if missing_cols:
+        raise JobError(f'Missing required columns: {", ".join(missing_cols)}')
+
+    # Validate Amount column is numeric
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+    invalid_rows = df['Amount'].isna().sum()
+    if invalid_rows == len(df):
+        raise JobError('Amount column contains no valid numbers. Please check your CSV file.')
+    if invalid_rows > 0:
+        logger.warning('CSV %s has %d non-numeric Amount values — they will be treated as 0.', job.filename, invalid_rows)
+        df['Amount'] = df['Amount'].fillna(0)
+    
+    # Totals, group sums, thresholds and factorized columns shared by the steps below
+    profile = BudgetProfile(df)
+    risk_manager = RiskManager()
+    hashes = row_hashes(df)
+    
+    # Revisions are matched to their parent; unchanged rows reuse its keyword flags and line items
+    revision = None
+    if job.parent_id:
+        progress.stage('diffing', 20)
+        revision = load_revision(job.parent_id, df, hashes, risk_manager)
+        if revision:
+            logger.info('Revision %s of %s: %d unchanged, %d changed or added, %d removed rows',
+                        job.id, job.parent_id, len(revision.unchanged), len(revision.changed), revision.removed_count)
+    
+    # Perform risk analysis
+    progress.stage('risk_analysis', 30)
+    if revision:
+        keyword_flags = revision.keyword_flags(df, risk_manager)
+    else:
+        keyword_flags = risk_manager.keyword_flags(df, profile=profile)
+    risk_analysis = risk_manager.analyze_risks(df, profile=profile, keyword_flags=keyword_flags)
+    
+    # Find optimizations; a revision derives group totals from its parent and the changed rows
+    progress.stage('optimizations', 60)
+    totals = revision.derive_totals(df, profile.total) if revision else None
+    if totals:
+        optimizations = optimization_recommendations(**totals.optimization_inputs)
+    else:
+        optimizations = find_optimizations(df, profile=profile)
+    
+    # Calculate metrics
+    total_budget = profile.total
+    line_items = len(df)
+    if totals:
+        num_departments = totals.department_count
+    else:
+        num_departments = profile.distinct_count('Department', include_missing=True) if 'Department' in df.columns else 0
+    
+    # Determine overall risk level
+    risk_level = risk_analysis.get('overall_risk', 'MODERATE')
+    risk_score = risk_analysis.get('risk_score', 0.0)
+    
+    # CREATE DATABASE RECORD
+    progress.stage('saving', 80)
+    analysis = BudgetAnalysis(
+        id=job.id,
+        filename=job.filename,
+        total_budget=total_budget,
+        line_items=line_items,
+        num_departments=num_departments,
+        risk_level=risk_level,
+        risk_score=risk_score,
+        risk_analysis_json=json.dumps(risk_analysis),
+        optimizations_json=json.dumps(optimizations),
+        parent_id=job.parent_id,
+        upload_date=datetime.now(),
+        analysis_timestamp=datetime.now()
+    )
+    analysis.set_dataframe(df)
+    analysis.row_index_blob = RowIndex.build(df, risk_manager, keyword_flags, hashes).encode()
+    
+    db.session.add(analysis)
+    db.session.flush()
+    
+    # Add individual line items (batched inserts, same transaction); a
+    # revision copies its unchanged rows from the parent inside the database
+    if revision:
+        copy_line_items(job.parent_id, job.id, revision.line_item_runs())
+        bulk_insert_line_items(df.iloc[revision.changed], job.id, chunk_size=app.config['LINE_ITEM_CHUNK_SIZE'],
+                               line_numbers=revision.changed + 1)
+    else:
+        bulk_insert_line_items(df, job.id, chunk_size=app.config['LINE_ITEM_CHUNK_SIZE'])
+    
+    # Department/category/vendor totals for the read routes
+    save_aggregates(job.id, totals.aggregate_rows if totals else compute_aggregates(df, total_budget, profile=profile))
+
+
+def run_streaming_budget_analysis(job, progress):
+    """
+    Chunked version of run_budget_analysis for files too large to load at once
+    
+    Reads the CSV twice in STREAM_CHUNK_ROWS chunks (see budget_stream) and
+    produces the same analysis as the in-memory path.
+    """
+    chunk_rows = app.config['STREAM_CHUNK_ROWS']
+    file_size = max(os.path.getsize(job.filepath), 1)
+    
+    progress.stage('scanning', 5)
+    with open(job.filepath, 'rb') as f:
+        def report_scan(rows):
+            progress.report(5 + int(35 * min(f.tell() / file_size, 1)))
+        scan = scan_budget_csv(f, chunk_rows=chunk_rows, on_chunk=report_scan)
+    
+    # Validate required columns
+    required_cols = ['Category', 'Amount']
+    missing_cols = [col for col in required_cols if col not in (scan.columns or [])]
+    if missing_cols:
+        raise JobError(f'Missing required columns: {", ".join(missing_cols)}')
+    
+    # Validate Amount column is numeric
+    if scan.invalid_amounts == scan.rows:
+        raise JobError('Amount column contains no valid numbers. Please check your CSV file.')
+    if scan.invalid_amounts > 0:
+        logger.warning('CSV %s has %d non-numeric Amount values — they will be treated as 0.', job.filename, scan.invalid_amounts)
+    
+    # Risk analysis, optimizations, line items and stored frame in one pass
+    progress.stage('analyzing', 40)
+    analysis = BudgetAnalysis(
+        id=job.id,
+        filename=job.filename,
+        total_budget=scan.total_budget,
+        line_items=scan.rows,
+        parent_id=job.parent_id,  # recorded only; streamed files are always analyzed in full
+        upload_date=datetime.now()
+    )
+    
+    # SQLite has one writer: a transaction over the whole stream would keep the job's
+    # heartbeat (and every other upload) out until it ends. There the line items are
+    # committed with each chunk's progress update (SQLite does not enforce their
+    # foreign key) and the analysis row is added with the results, so a half-written
+    # analysis is never listed.
+    commit_chunks = db.session.connection().dialect.name == 'sqlite'
+    on_chunk = None
+    if commit_chunks:
+        delete_line_items(job.id)  # left by an earlier attempt at this job
+        progress.commit()
+        
+        def on_chunk(rows):
+            progress.report(40 + int(50 * rows / max(scan.rows, 1)))
+    else:
+        db.session.add(analysis)
+        db.session.flush()
+    
+    try:
+        streamed = stream_budget_csv(
+            job.filepath, scan, analysis, RiskManager(),
+            chunk_rows=chunk_rows,
+            line_item_chunk_size=app.config['LINE_ITEM_CHUNK_SIZE'],
+            on_chunk=on_chunk
+        )
+    except JobLost:
+        raise
+    except Exception:
+        if commit_chunks:
+            db.session.rollback()
+            delete_line_items(job.id)
+            progress.commit()
+        raise
+    if commit_chunks:
+        db.session.add(analysis)
+    risk_analysis = streamed.risk_analysis
+    optimizations = optimization_recommendations(**streamed.aggregates.recommendation_inputs())
+    
+    analysis.num_departments = streamed.num_departments
+    analysis.risk_level = risk_analysis.get('overall_risk', 'MODERATE')
+    analysis.risk_score = risk_analysis.get('risk_score', 0.0)
+    analysis.optimizations_json = json.dumps(optimizations)
+    save_aggregates(job.id, streamed.aggregate_rows)
+    analysis.analysis_timestamp = datetime.now()
+
+
+analysis_jobs = AnalysisJobQueue(app, runner=run_budget_analysis)
+
+# Pick up jobs interrupted by a restart
+with app.app_context():
+    analysis_jobs.resume_pending()
+
+
 @app.route('/upload', methods=['POST'])
 @limiter.limit('20 per hour')
 def upload_file():
-    """Handle file upload and analysis - SAVE TO DATABASE"""
+    """Handle file upload - queue the analysis and show its progress"""
+    # Streaming mode reads the CSV in chunks, so it accepts much larger files
+    mode = 'stream' if request.args.get('mode') == 'stream' else 'memory'
+    if mode == 'stream':
+        request.max_content_length = app.config['STREAM_MAX_CONTENT_LENGTH']
+    
     if 'file' not in request.files:
         flash('No file uploaded', 'error')
         return redirect(url_for('index'))
@@ -325,94 +535,36 @@ def upload_file():
         flash('No file selected', 'error')
         return redirect(url_for('index'))
     
+    # Optional earlier analysis of the same budget; only the changed rows are re-analyzed
+    parent_id = request.form.get('parent_id') or None
+    if parent_id and not db.session.query(BudgetAnalysis.id).filter_by(id=parent_id).first():
+        flash('The budget this upload revises was not found', 'error')
+        return redirect(url_for('index'))
+    
     if file and allowed_file(file.filename):
         # Secure the filename
         filename = secure_filename(file.filename)
         
-        # Generate unique file ID
+        # Generate unique file ID (also the job and analysis ID)
         file_id = str(uuid.uuid4())
         
-        # Save uploaded file
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_{filename}")
-        file.save(filepath)
-        
         try:
-            # Read CSV
-            df = pd.read_csv(filepath)
-            
-            # Validate required columns
-            required_cols = ['Category', 'Amount']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                flash(f'Missing required columns: {", ".join(missing_cols)}', 'error')
-                return redirect(url_for('index'))
-
-            # Validate Amount column is numeric
-            df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
-            invalid_rows = df['Amount'].isna().sum()
-            if invalid_rows == len(df):
-                flash('Amount column contains no valid numbers. Please check your CSV file.', 'error')
-                return redirect(url_for('index'))
-            if invalid_rows > 0:
-                logger.warning('CSV %s has %d non-numeric Amount values — they will be treated as 0.', filename, invalid_rows)
-                df['Amount'] = df['Amount'].fillna(0)
-            
-            # Perform risk analysis
-            risk_manager = RiskManager()
-            risk_analysis = risk_manager.analyze_risks(df)
+            # Save uploaded file
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_id}_{filename}")
+            file.save(filepath)
             
-            # Find optimizations
-            optimizations = find_optimizations(df)
-            
-            # Calculate metrics
-            total_budget = float(df['Amount'].sum())
-            line_items = len(df)
-            num_departments = len(set(df['Department'])) if 'Department' in df.columns else 0
-            
-            # Determine overall risk level
-            risk_level = risk_analysis.get('overall_risk', 'MODERATE')
-            risk_score = risk_analysis.get('risk_score', 0.0)
-            
-            # CREATE DATABASE RECORD
-            analysis = BudgetAnalysis(
-                id=file_id,
-                filename=filename,
-                total_budget=total_budget,
-                line_items=line_items,
-                num_departments=num_departments,
-                risk_level=risk_level,
-                risk_score=risk_score,
-                dataframe_json=df.to_json(orient='records'),
-                risk_analysis_json=json.dumps(risk_analysis),
-                optimizations_json=json.dumps(optimizations),
-                upload_date=datetime.now(),
-                analysis_timestamp=datetime.now()
-            )
-            
-            db.session.add(analysis)
-            
-            # Add individual line items
-            for idx, row in df.iterrows():
-                line_item = BudgetLineItem(
-                    analysis_id=file_id,
-                    category=str(row.get('Category', '')),
-                    department=str(row.get('Department', '')) if 'Department' in df.columns else '',
-                    description=str(row.get('Description', '')) if 'Description' in df.columns else '',
-                    amount=float(row.get('Amount', 0)),
-                    line_number=idx + 1
-                )
-                db.session.add(line_item)
-            
-            # Commit to database
+            # Queue the analysis
+            job = AnalysisJob(id=file_id, filename=filename, filepath=filepath, mode=mode, parent_id=parent_id)
+            db.session.add(job)
             db.session.commit()
+            analysis_jobs.submit(file_id)
             
-            flash(f'✅ Analysis complete and saved to database!', 'success')
-            return redirect(url_for('view_analysis', file_id=file_id))
+            return redirect(url_for('job_status', job_id=file_id))
             
         except Exception as e:
             db.session.rollback()
-            logger.error('Error analyzing file: %s', e, exc_info=True)
-            flash('An error occurred while analyzing the file. Please check the file format and try again.', 'error')
+            logger.error('Error queueing analysis for %s: %s', filename, e, exc_info=True)
+            flash('An error occurred while uploading the file. Please try again.', 'error')
             return redirect(url_for('index'))
     
     else:
@@ -420,9 +572,103 @@ def upload_file():
         return redirect(url_for('index'))
 
 
+@app.route('/jobs/<job_id>')
+@limiter.exempt
+def job_status(job_id):
+    """Analysis job progress - JSON for pollers, otherwise a self-refreshing page"""
+    # Pick up jobs of workers killed since startup (throttled per process)
+    analysis_jobs.sweep()
+    job = db.session.get(AnalysisJob, job_id)
+    wants_json = request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json'
+    
+    if not job:
+        if wants_json:
+            return jsonify({'error': 'Job not found'}), 404
+        flash('Analysis job not found', 'error')
+        return redirect(url_for('index'))
+    
+    if wants_json:
+        payload = job.to_dict()
+        if job.status == 'done':
+            payload['analysis_url'] = url_for('view_analysis', file_id=job.id)
+        return jsonify(payload)
+    
+    if job.status == 'done':
+        flash(f'✅ Analysis complete and saved to database!', 'success')
+        return redirect(url_for('view_analysis', file_id=job.id))
+    
+    if job.status == 'failed':
+        flash(job.error_message, 'error')
+        return redirect(url_for('index'))
+    
+    stage_label = html_lib.escape(job.stage.replace('_', ' ').title())
+    html = f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <meta http-equiv="refresh" content="2">
+        <title>Analyzing {html_lib.escape(job.filename)}</title>
+        <style>
+            body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background: #f5f7fa; padding: 60px 20px; }}
+            .card {{ max-width: 520px; margin: 0 auto; background: white; border-radius: 12px; padding: 32px; box-shadow: 0 4px 20px rgba(0,0,0,0.08); }}
+            .bar {{ background: #e8f5e9; border-radius: 6px; height: 14px; overflow: hidden; margin: 20px 0 8px; }}
+            .fill {{ background: #27ae60; height: 100%; }}
+            .meta {{ color: #555; font-size: 0.9rem; }}
+        </style>
+    </head>
+    <body>
+        <div class="card">
+            <h2>📊 Analyzing {html_lib.escape(job.filename)}</h2>
+            <div class="bar"><div class="fill" style="width:{job.percent or 0}%;"></div></div>
+            <p class="meta">{stage_label} — {job.percent or 0}%</p>
+            <p class="meta">This page refreshes automatically and opens the analysis when it is ready.</p>
+        </div>
+    </body>
+    </html>
+    """
+    return html
+
+
+analysis_pages = PageCache(app.config['PAGE_CACHE_MAX_BYTES'])
+
+
+def last_modified(analysis):
+    """
+    When an analysis last changed, as an aware UTC datetime
+
+    updated_at is stored in UTC, analysis_timestamp in server local time
+    (it is shown to users as is), so both are made UTC before they are compared.
+    """
+    times = []
+    if analysis.updated_at:
+        times.append(analysis.updated_at.replace(tzinfo=timezone.utc))
+    if analysis.analysis_timestamp:
+        times.append(analysis.analysis_timestamp.astimezone(timezone.utc))
+    return max(times, default=None)
+
+
+def cached_page_response(page):
+    """HTML response for a CachedPage with validators; answers 304 when the client copy is current"""
+    response = app.response_class(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    if page.last_modified:
+        response.last_modified = page.last_modified
+    # Stored but revalidated on every use, so a changed analysis is never shown stale
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @app.route('/analysis/<file_id>')
 def view_analysis(file_id):
     """View detailed analysis results FROM DATABASE"""
+    # Serve the rendered page from cache if this version of the analysis has been rendered
+    version = db.session.query(BudgetAnalysis.content_version).filter_by(id=file_id).scalar()
+    page = analysis_pages.get((file_id, version)) if version is not None else None
+    if page is not None:
+        return cached_page_response(page)
+    
     # Get analysis from database
     analysis = BudgetAnalysis.query.get(file_id)
     
@@ -431,28 +677,26 @@ def view_analysis(file_id):
         return redirect(url_for('index'))
     
     try:
-        # Reconstruct DataFrame from JSON
-        df = pd.read_json(io.StringIO(analysis.dataframe_json))
-        risk_analysis = json.loads(analysis.risk_analysis_json)
-        optimizations = json.loads(analysis.optimizations_json)
+        # Load only the columns this page uses
+        df = analysis.get_dataframe(VIEW_COLUMNS)
+        risk_analysis = analysis.get_risk_analysis()
+        optimizations = analysis.get_optimizations()
+        
+        aggregates = get_aggregates(analysis)
         
         # Prepare chart data
-        chart_data = prepare_chart_data(df)
+        chart_data = prepare_chart_data(df, aggregates)
         
-        # Calculate department stats if available
+        # Department stats from the precomputed totals
         dept_stats = []
-        if 'Department' in df.columns:
-            total = df['Amount'].sum()
-            for dept in df['Department'].unique():
-                dept_df = df[df['Department'] == dept]
-                dept_total = dept_df['Amount'].sum()
-                dept_stats.append({
-                    'name': dept,
-                    'total': dept_total,
-                    'percentage': (dept_total / total * 100) if total > 0 else 0,
-                    'items': len(dept_df)
-                })
-            dept_stats.sort(key=lambda x: x['total'], reverse=True)
+        total = analysis.total_budget
+        for dept in aggregates.ranked('department').itertuples(index=False):
+            dept_stats.append({
+                'name': dept.key,
+                'total': dept.total,
+                'percentage': (dept.total / total * 100) if total > 0 else 0,
+                'items': dept.count
+            })
         
         # Generate chart HTML
         charts_html = generate_chart_html(chart_data)
@@ -481,19 +725,17 @@ def view_analysis(file_id):
         # Build budget (category) breakdown modal rows
         budget_rows = ''
         num_categories = 0
-        if 'Category' in df.columns:
-            cat_totals = df.groupby('Category')['Amount'].agg(['sum', 'count']).reset_index()
-            cat_totals.columns = ['Category', 'Total', 'Items']
-            cat_totals = cat_totals.sort_values('Total', ascending=False)
+        if aggregates.has('category'):
+            cat_totals = aggregates.ranked('category')
             num_categories = len(cat_totals)
-            for _, row in cat_totals.iterrows():
-                pct = (row['Total'] / total_budget * 100) if total_budget > 0 else 0
+            for row in cat_totals.itertuples(index=False):
+                pct = (row.total / total_budget * 100) if total_budget > 0 else 0
                 bar_w = min(100, pct)
                 budget_rows += f"""
                 <tr>
-                    <td><strong>{html_lib.escape(str(row['Category']))}</strong></td>
-                    <td style="text-align:right;font-weight:600;">${row['Total']:,.2f}</td>
-                    <td style="text-align:right;">{int(row['Items'])}</td>
+                    <td><strong>{html_lib.escape(str(row.key))}</strong></td>
+                    <td style="text-align:right;font-weight:600;">${row.total:,.2f}</td>
+                    <td style="text-align:right;">{int(row.count)}</td>
                     <td style="min-width:160px;">
                         <div style="background:#e8f5e9;border-radius:4px;height:10px;overflow:hidden;">
                             <div style="width:{bar_w:.1f}%;background:#27ae60;height:100%;border-radius:4px;"></div>
@@ -1162,7 +1404,8 @@ def view_analysis(file_id):
         </html>
         """
         
-        return html
+        page = analysis_pages.put((analysis.id, analysis.content_version), html, last_modified(analysis))
+        return cached_page_response(page)
         
     except Exception as e:
         logger.error('Error displaying analysis %s: %s', file_id, e, exc_info=True)
@@ -1170,6 +1413,24 @@ def view_analysis(file_id):
         return redirect(url_for('index'))
 
 
+def send_export(analysis, path, download_name, mimetype):
+    """
+    Send a cached export as a conditional download
+    
+    The ETag is the artifact's cache name rather than send_file's default
+    (mtime-based), since the janitor touches files on every hit.
+    """
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype=mimetype,
+        conditional=True,
+        etag=os.path.splitext(os.path.basename(path))[0],
+        last_modified=last_modified(analysis)
+    )
+
+
 @app.route('/export-excel/<file_id>')
 def export_excel_route(file_id):
     """Export analysis to formatted Excel file FROM DATABASE"""
@@ -1180,36 +1441,38 @@ def export_excel_route(file_id):
         return redirect(url_for('index'))
     
     try:
-        df = pd.read_json(io.StringIO(analysis.dataframe_json))
-        
-        # Prepare budget data with safe defaults
-        budget_data = {
-            'filename': analysis.filename,
-            'total_budget': analysis.total_budget,
-            'line_items': analysis.line_items,
-            'num_departments': analysis.num_departments
-        }
-        
-        # Get risk analysis
-        risk_data = {
-            'risk_level': analysis.risk_level,
-            'overall_risk_score': analysis.risk_score
-        }
-        
-        # Get optimizations
-        optimizations = json.loads(analysis.optimizations_json)
-        
-        # Generate Excel file
-        excel_filename = f"budget_analysis_{file_id}.xlsx"
-        excel_path = os.path.join(app.config['OUTPUT_FOLDER'], excel_filename)
+        def build(path):
+            df = analysis.get_dataframe()
+            
+            # Prepare budget data with safe defaults
+            budget_data = {
+                'filename': analysis.filename,
+                'total_budget': analysis.total_budget,
+                'line_items': analysis.line_items,
+                'num_departments': analysis.num_departments
+            }
+            
+            # Get risk analysis
+            risk_data = {
+                'risk_level': analysis.risk_level,
+                'overall_risk_score': analysis.risk_score
+            }
+            
+            # Get optimizations
+            optimizations = analysis.get_optimizations()
+            
+            # Generate Excel file
+            export_to_excel(df, budget_data, risk_data, optimizations, path, aggregates=get_aggregates(analysis),
+                            write_only=len(df) >= app.config['EXCEL_WRITE_ONLY_ROWS'])
         
-        export_to_excel(df, budget_data, risk_data, optimizations, excel_path)
+        # Reuse the workbook generated for this version of the analysis
+        excel_path = export_cache.get_or_create('excel', analysis.id, analysis.content_version, EXCEL_EXPORTER_VERSION, build)
         
         # Send file
-        return send_file(
+        return send_export(
+            analysis,
             excel_path,
-            as_attachment=True,
-            download_name=f"{budget_data['filename']}_analysis.xlsx",
+            download_name=f"{analysis.filename}_analysis.xlsx",
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         
@@ -1229,53 +1492,52 @@ def generate_pdf_report(file_id):
         return redirect(url_for('index'))
     
     try:
-        from pdf_report_generator import generate_pdf_report as gen_pdf
-        
-        df = pd.read_json(io.StringIO(analysis.dataframe_json))
-        
-        # Prepare budget data with safe defaults
-        filename = analysis.filename
-        budget_data = {
-            'filename': filename,
-            'total_budget': analysis.total_budget,
-            'line_items': analysis.line_items,
-            'num_departments': analysis.num_departments,
-            'risk_level': analysis.risk_level,
-            'departments': {}
-        }
+        from pdf_report_generator import generate_pdf_report as gen_pdf, EXPORTER_VERSION as PDF_EXPORTER_VERSION
         
-        # Get department breakdown
-        if 'Department' in df.columns:
-            total = df["Amount"].sum()
-            for dept, group in df.groupby("Department"):
-                dept_total = group["Amount"].sum()
-                budget_data['departments'][dept] = {
-                    "amount": float(dept_total),
-                    "percentage": float(dept_total / total * 100) if total > 0 else 0,
-                    "items": len(group)
+        def build(path):
+            aggregates = get_aggregates(analysis)
+            
+            # Prepare budget data with safe defaults
+            filename = analysis.filename
+            budget_data = {
+                'filename': filename,
+                'total_budget': analysis.total_budget,
+                'line_items': analysis.line_items,
+                'num_departments': analysis.num_departments,
+                'risk_level': analysis.risk_level,
+                'departments': {}
+            }
+            
+            # Get department breakdown
+            total = analysis.total_budget
+            for dept in aggregates.frame('department').itertuples(index=False):
+                budget_data['departments'][dept.key] = {
+                    "amount": float(dept.total),
+                    "percentage": float(dept.total / total * 100) if total > 0 else 0,
+                    "items": dept.count
                 }
+            
+            # Get risk analysis
+            risk_data = {
+                'risk_level': analysis.risk_level,
+                'overall_risk_score': analysis.risk_score,
+                'risk_categories': analysis.get_risk_analysis().get('items_by_category', {})
+            }
+            
+            # Get optimization data
+            optimizations = analysis.get_optimizations()
+            
+            # Generate PDF
+            gen_pdf(budget_data, risk_data, optimizations, path, visualizations=None)
         
-        # Get risk analysis
-        risk_data = {
-            'risk_level': analysis.risk_level,
-            'overall_risk_score': analysis.risk_score,
-            'risk_categories': json.loads(analysis.risk_analysis_json).get('items_by_category', {})
-        }
-        
-        # Get optimization data
-        optimizations = json.loads(analysis.optimizations_json)
-        
-        # Generate PDF
-        pdf_filename = f"budget_report_{file_id}.pdf"
-        pdf_path = os.path.join(app.config['OUTPUT_FOLDER'], pdf_filename)
-        
-        gen_pdf(budget_data, risk_data, optimizations, pdf_path, visualizations=None)
+        # Reuse the report generated for this version of the analysis
+        pdf_path = export_cache.get_or_create('pdf', analysis.id, analysis.content_version, PDF_EXPORTER_VERSION, build)
         
         # Serve the PDF
-        return send_file(
-            pdf_path, 
-            as_attachment=True,
-            download_name=f"{filename}_report.pdf",
+        return send_export(
+            analysis,
+            pdf_path,
+            download_name=f"{analysis.filename}_report.pdf",
             mimetype='application/pdf'
         )
         
@@ -1285,10 +1547,83 @@ def generate_pdf_report(file_id):
         return redirect(url_for('view_analysis', file_id=file_id))
 
 
+# Analyses listed per page in the compare picker and /api/analyses
+PICKER_PAGE_SIZE = 20
+MAX_PICKER_PAGE_SIZE = 100
+
+
+def _picker_entry(analysis):
+    return {
+        'id': analysis.id,
+        'filename': analysis.filename,
+        'total_budget': analysis.total_budget,
+        'upload_date': analysis.upload_date.strftime('%Y-%m-%d')
+    }
+
+
+@app.route('/api/analyses', methods=['GET'])
+def list_analyses_api():
+    """
+    Search stored analyses, newest first, one page at a time
+    
+    Query: q (filename filter), limit, cursor (next_cursor of the previous
+    page), exclude (an analysis id to leave out).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', PICKER_PAGE_SIZE)), 1), MAX_PICKER_PAGE_SIZE)
+        analyses, next_cursor = list_analyses_page(
+            query_text=request.args.get('q', '').strip() or None,
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            exclude_id=request.args.get('exclude') or None
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    
+    return jsonify({'analyses': [_picker_entry(a) for a in analyses], 'next_cursor': next_cursor})
+
+
+# Results of each kind returned by /api/search
+SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+
+
+@app.route('/api/search', methods=['GET'])
+def search_api():
+    """
+    Ranked full-text search over analyses and line items
+    
+    Query: q (words to find; every word must match, "word*" as a prefix), limit.
+    Analyses match on filename, tags and notes; line items on description,
+    department and vendor, across every stored budget. Each result carries
+    an HTML snippet with the matched words in <mark>.
+    """
+    query_text = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', SEARCH_RESULTS)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    if not query_text:
+        return jsonify({'error': 'Pass a search query (q)'}), 400
+    
+    try:
+        results = search_index(query_text, limit=limit)
+    except Exception as e:
+        logger.error('Error searching for %r: %s', query_text, e, exc_info=True)
+        return jsonify({'error': 'Unable to search. Please try again.'}), 500
+    
+    for analysis in results['analyses']:
+        analysis['upload_date'] = analysis['upload_date'].strftime('%Y-%m-%d') if analysis['upload_date'] else None
+        analysis['url'] = url_for('view_analysis', file_id=analysis['id'])
+    for item in results['line_items']:
+        item['url'] = url_for('view_analysis', file_id=item['analysis_id'])
+    return jsonify({'query': query_text, **results})
+
+
 @app.route('/compare/<file_id>')
 def compare_page(file_id):
     """Show budget comparison page"""
-    analysis = BudgetAnalysis.query.get(file_id)
+    analysis = BudgetAnalysis.query.options(load_only(BudgetAnalysis.id, BudgetAnalysis.filename)).filter_by(id=file_id).first()
     
     if not analysis:
         flash('Analysis not found', 'error')
@@ -1296,11 +1631,8 @@ def compare_page(file_id):
     
     csrf_token = generate_csrf()
 
-    # Get all analyses for comparison selection FROM DATABASE
-    all_analyses = BudgetAnalysis.query.order_by(BudgetAnalysis.upload_date.desc()).all()
-    
-    # Remove current analysis from options
-    other_analyses = [a for a in all_analyses if a.id != file_id]
+    # First page of other analyses; the typeahead below fetches the rest from /api/analyses
+    other_analyses, next_cursor = list_analyses_page(limit=PICKER_PAGE_SIZE, exclude_id=file_id)
     
     html = f"""
     <!DOCTYPE html>
@@ -1315,13 +1647,17 @@ def compare_page(file_id):
         <div class="container">
             <div class="header fade-in">
                 <h1>🔄 Budget Comparison</h1>
-                <p>Compare <strong>{analysis.filename}</strong> with another budget</p>
+                <p>Compare <strong>{html_lib.escape(analysis.filename)}</strong> with another budget</p>
             </div>
             
             <div class="section-card fade-in">
                 <h2>Select Budget to Compare With:</h2>
                 <form action="/compare/{file_id}" method="post" class="comparison-form">
                     <input type="hidden" name="csrf_token" value="{csrf_token}">
+                    <div class="form-group">
+                        <label for="budget_search">Search Budgets:</label>
+                        <input type="search" id="budget_search" placeholder="Type a file name…" autocomplete="off">
+                    </div>
                     <div class="form-group">
                         <label for="compare_id">Choose Budget:</label>
                         <select name="compare_id" id="compare_id" required>
@@ -1331,175 +1667,305 @@ def compare_page(file_id):
     for other in other_analyses:
         html += f"""
                             <option value="{other.id}">
-                                {other.filename} - ${other.total_budget:,.2f} ({other.upload_date.strftime('%Y-%m-%d')})
+                                {html_lib.escape(other.filename)} - ${other.total_budget:,.2f} ({other.upload_date.strftime('%Y-%m-%d')})
                             </option>
         """
     
-    html += """
+    html += f"""
                         </select>
+                        <button type="button" id="load_more" class="btn btn-secondary"{'' if next_cursor else ' hidden'}>More…</button>
                     </div>
                     <button type="submit" class="btn btn-primary">🔍 Compare Budgets</button>
                     <a href="/analysis/{file_id}" class="btn btn-secondary">← Back to Analysis</a>
                 </form>
             </div>
         </div>
+        <script>
+        (function() {{
+            const select = document.getElementById('compare_id');
+            const search = document.getElementById('budget_search');
+            const more = document.getElementById('load_more');
+            let cursor = {json.dumps(next_cursor)};
+            let timer = null;
+            let controller = null;
+            
+            function addOptions(analyses) {{
+                for (const a of analyses) {{
+                    const option = document.createElement('option');
+                    option.value = a.id;
+                    option.textContent = a.filename + ' - $' + a.total_budget.toLocaleString(undefined, {{minimumFractionDigits: 2, maximumFractionDigits: 2}}) + ' (' + a.upload_date + ')';
+                    select.appendChild(option);
+                }}
+            }}
+            
+            function load(reset) {{
+                const params = new URLSearchParams({{exclude: {json.dumps(file_id)}, limit: '{PICKER_PAGE_SIZE}'}});
+                if (search.value.trim()) params.set('q', search.value.trim());
+                if (!reset && cursor) params.set('cursor', cursor);
+                // Only the latest request may fill the list: a slow reply for an
+                // older search term must not replace newer results
+                if (controller) controller.abort();
+                controller = new AbortController();
+                const signal = controller.signal;
+                fetch('/api/analyses?' + params, {{signal}}).then(r => r.json()).then(page => {{
+                    if (signal.aborted) return;
+                    if (reset) select.length = 1;
+                    addOptions(page.analyses);
+                    cursor = page.next_cursor;
+                    more.hidden = !cursor;
+                }}).catch(error => {{
+                    if (error.name !== 'AbortError') throw error;
+                }});
+            }}
+            
+            search.addEventListener('input', () => {{
+                clearTimeout(timer);
+                timer = setTimeout(() => load(true), 200);
+            }});
+            more.addEventListener('click', () => load(false));
+        }})();
+        </script>
     </body>
     </html>
-    """.replace('{file_id}', file_id)
+    """
     
     return html
 
 
-@app.route('/compare/<file_id>', methods=['POST'])
-def compare_budgets_route(file_id):
-    """Handle budget comparison FROM DATABASE"""
-    compare_id = request.form.get('compare_id')
+def get_or_create_comparison(analysis1, analysis2):
+    """
+    Stored comparison of two analyses, computed on first use
     
-    if not compare_id:
-        flash('Please select a budget to compare', 'error')
-        return redirect(url_for('compare_page', file_id=file_id))
+    Comparisons are keyed by (analysis1, analysis2, algorithm version). A
+    stored result is reused while both analyses are at the content_version
+    it was computed from; otherwise it is recomputed in place.
     
-    # Get both analyses from database
-    analysis1 = BudgetAnalysis.query.get(file_id)
-    analysis2 = BudgetAnalysis.query.get(compare_id)
+    Returns:
+        BudgetComparison with comparison_data_json and charts_json set (committed)
+    """
+    key = dict(analysis1_id=analysis1.id, analysis2_id=analysis2.id, algorithm_version=COMPARISON_ALGORITHM_VERSION)
+    comparison = BudgetComparison.query.filter_by(**key).first()
+    if (comparison is not None and comparison.charts_json
+            and comparison.analysis1_version == analysis1.content_version
+            and comparison.analysis2_version == analysis2.content_version):
+        return comparison
     
-    if not analysis1 or not analysis2:
-        flash('One or both analyses not found', 'error')
-        return redirect(url_for('index'))
+    # Reconstruct DataFrames
+    df1 = analysis1.get_dataframe(COMPARE_COLUMNS)
+    df2 = analysis2.get_dataframe(COMPARE_COLUMNS)
+    
+    # Perform comparison
+    comparison_result = compare_budgets(df1, df2, analysis1.filename, analysis2.filename,
+                                        aggregates1=get_aggregates(analysis1), aggregates2=get_aggregates(analysis2),
+                                        fuzzy=True)
     
+    # Save comparison and its chart configs to database
+    if comparison is None:
+        comparison = BudgetComparison(**key)
+        db.session.add(comparison)
+    comparison.analysis1_version = analysis1.content_version
+    comparison.analysis2_version = analysis2.content_version
+    comparison.comparison_data_json = json.dumps(comparison_result)
+    comparison.charts_json = json.dumps(generate_all_comparison_charts(comparison_result))
+    comparison.comparison_date = datetime.now()
     try:
-        # Reconstruct DataFrames
-        df1 = pd.read_json(io.StringIO(analysis1.dataframe_json))
-        df2 = pd.read_json(io.StringIO(analysis2.dataframe_json))
-        
-        # Perform comparison
-        comparison_result = compare_budgets(df1, df2, analysis1.filename, analysis2.filename)
-        
-        # Save comparison to database
-        comparison_record = BudgetComparison(
-            analysis1_id=file_id,
-            analysis2_id=compare_id,
-            comparison_data_json=json.dumps(comparison_result),
-            comparison_date=datetime.now()
-        )
-        db.session.add(comparison_record)
         db.session.commit()
-        
-        # Generate comparison charts
-        comparison_charts = generate_comparison_chart_html(comparison_result)
-        
-        # Build comparison results page
-        html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Budget Comparison Results</title>
-            <link rel="stylesheet" href="/static/css/modern-styles.css">
-            <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header fade-in">
-                    <h1>🔄 Budget Comparison Results</h1>
-                    <p>Comparing: <strong>{analysis1.filename}</strong> vs <strong>{analysis2.filename}</strong></p>
-                    <p style="font-size: 0.9rem; color: #666;">
-                        💾 Comparison saved to database
-                    </p>
-                </div>
-                
-                <!-- Summary Stats -->
-                <div class="stats-grid fade-in">
-                    <div class="stat-card">
-                        <div class="stat-icon">📁</div>
-                        <div class="stat-value" style="font-size:1.3rem;word-break:break-word;line-height:1.3;" title="{analysis1.filename}">{analysis1.filename[:28] + '…' if len(analysis1.filename) > 28 else analysis1.filename}</div>
-                        <div class="stat-label">Budget A &nbsp;·&nbsp; ${analysis1.total_budget:,.2f}</div>
-                    </div>
+    except IntegrityError:
+        # A concurrent request stored this pair first; use its result
+        db.session.rollback()
+        comparison = BudgetComparison.query.filter_by(**key).one()
+    return comparison
 
-                    <div class="stat-card">
-                        <div class="stat-icon">📁</div>
-                        <div class="stat-value" style="font-size:1.3rem;word-break:break-word;line-height:1.3;" title="{analysis2.filename}">{analysis2.filename[:28] + '…' if len(analysis2.filename) > 28 else analysis2.filename}</div>
-                        <div class="stat-label">Budget B &nbsp;·&nbsp; ${analysis2.total_budget:,.2f}</div>
-                    </div>
 
-                    <div class="stat-card">
-                        <div class="stat-icon">{'📈' if analysis2.total_budget > analysis1.total_budget else '📉'}</div>
-                        <div class="stat-value">${abs(analysis2.total_budget - analysis1.total_budget):,.2f}</div>
-                        <div class="stat-label">Difference</div>
-                    </div>
+def comparison_page(analysis1, analysis2):
+    """
+    Rendered comparison results page as a CachedPage
+    
+    Pages are cached per pair and content versions, so repeat views skip
+    both the comparison and the rendering.
+    """
+    page_key = (f'compare:{analysis1.id}:{analysis2.id}',
+                (COMPARISON_ALGORITHM_VERSION, analysis1.content_version, analysis2.content_version))
+    page = analysis_pages.get(page_key)
+    if page is not None:
+        return page
+    
+    comparison = get_or_create_comparison(analysis1, analysis2)
+    comparison_result = comparison.get_comparison_data()
+    
+    # Comparison charts from the stored configs
+    comparison_charts = generate_comparison_chart_html(comparison_result, charts=comparison.get_charts())
+    
+    # Build comparison results page
+    html = f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Budget Comparison Results</title>
+        <link rel="stylesheet" href="/static/css/modern-styles.css">
+        <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header fade-in">
+                <h1>🔄 Budget Comparison Results</h1>
+                <p>Comparing: <strong>{analysis1.filename}</strong> vs <strong>{analysis2.filename}</strong></p>
+                <p style="font-size: 0.9rem; color: #666;">
+                    💾 Comparison saved to database · <a href="/compare/{analysis1.id}/{analysis2.id}">Permalink</a>
+                </p>
+            </div>
+            
+            <!-- Summary Stats -->
+            <div class="stats-grid fade-in">
+                <div class="stat-card">
+                    <div class="stat-icon">📁</div>
+                    <div class="stat-value" style="font-size:1.3rem;word-break:break-word;line-height:1.3;" title="{analysis1.filename}">{analysis1.filename[:28] + '…' if len(analysis1.filename) > 28 else analysis1.filename}</div>
+                    <div class="stat-label">Budget A &nbsp;·&nbsp; ${analysis1.total_budget:,.2f}</div>
+                </div>
 
-                    <div class="stat-card">
-                        <div class="stat-icon">{'🔺' if analysis2.total_budget > analysis1.total_budget else '🔻'}</div>
-                        <div class="stat-value" style="color:{'#e74c3c' if analysis2.total_budget > analysis1.total_budget else '#27ae60'};">{((analysis2.total_budget - analysis1.total_budget) / analysis1.total_budget * 100):+.1f}%</div>
-                        <div class="stat-label">Change</div>
-                    </div>
+                <div class="stat-card">
+                    <div class="stat-icon">📁</div>
+                    <div class="stat-value" style="font-size:1.3rem;word-break:break-word;line-height:1.3;" title="{analysis2.filename}">{analysis2.filename[:28] + '…' if len(analysis2.filename) > 28 else analysis2.filename}</div>
+                    <div class="stat-label">Budget B &nbsp;·&nbsp; ${analysis2.total_budget:,.2f}</div>
                 </div>
-                
-                <!-- Comparison Charts -->
-                <div class="section-card fade-in">
-                    {comparison_charts}
+
+                <div class="stat-card">
+                    <div class="stat-icon">{'📈' if analysis2.total_budget > analysis1.total_budget else '📉'}</div>
+                    <div class="stat-value">${abs(analysis2.total_budget - analysis1.total_budget):,.2f}</div>
+                    <div class="stat-label">Difference</div>
                 </div>
-                
-                <!-- Detailed Comparison -->
-                <div class="section-card fade-in">
-                    <h2>📋 Detailed Breakdown</h2>
+
+                <div class="stat-card">
+                    <div class="stat-icon">{'🔺' if analysis2.total_budget > analysis1.total_budget else '🔻'}</div>
+                    <div class="stat-value" style="color:{'#e74c3c' if analysis2.total_budget > analysis1.total_budget else '#27ae60'};">{((analysis2.total_budget - analysis1.total_budget) / analysis1.total_budget * 100):+.1f}%</div>
+                    <div class="stat-label">Change</div>
+                </div>
+            </div>
+            
+            <!-- Comparison Charts -->
+            <div class="section-card fade-in">
+                {comparison_charts}
+            </div>
+            
+            <!-- Detailed Comparison -->
+            <div class="section-card fade-in">
+                <h2>📋 Detailed Breakdown</h2>
+    """
+    
+    # Add category comparison if available
+    if 'category_comparison' in comparison_result:
+        html += """
+                <table class="comparison-table">
+                    <thead>
+                        <tr>
+                            <th>Category</th>
+                            <th>Budget 1</th>
+                            <th>Budget 2</th>
+                            <th>Difference</th>
+                            <th>% Change</th>
+                        </tr>
+                    </thead>
+                    <tbody>
         """
         
-        # Add category comparison if available
-        if 'category_comparison' in comparison_result:
-            html += """
-                    <table class="comparison-table">
-                        <thead>
-                            <tr>
-                                <th>Category</th>
-                                <th>Budget 1</th>
-                                <th>Budget 2</th>
-                                <th>Difference</th>
-                                <th>% Change</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-            """
-            
-            for category, data in comparison_result['category_comparison'].items():
-                diff = data['budget2'] - data['budget1']
-                pct_change = (diff / data['budget1'] * 100) if data['budget1'] > 0 else 0
-                arrow = '↑' if diff > 0 else '↓' if diff < 0 else '='
-                
-                html += f"""
-                            <tr>
-                                <td><strong>{category}</strong></td>
-                                <td>${data['budget1']:,.2f}</td>
-                                <td>${data['budget2']:,.2f}</td>
-                                <td style="color: {'red' if diff > 0 else 'green' if diff < 0 else 'black'};">
-                                    {arrow} ${abs(diff):,.2f}
-                                </td>
-                                <td style="color: {'red' if pct_change > 0 else 'green' if pct_change < 0 else 'black'};">
-                                    {pct_change:+.1f}%
-                                </td>
-                            </tr>
-                """
+        for category, data in comparison_result['category_comparison'].items():
+            diff = data['budget2'] - data['budget1']
+            pct_change = (diff / data['budget1'] * 100) if data['budget1'] > 0 else 0
+            arrow = '↑' if diff > 0 else '↓' if diff < 0 else '='
             
-            html += """
-                        </tbody>
-                    </table>
+            html += f"""
+                        <tr>
+                            <td><strong>{category}</strong></td>
+                            <td>${data['budget1']:,.2f}</td>
+                            <td>${data['budget2']:,.2f}</td>
+                            <td style="color: {'red' if diff > 0 else 'green' if diff < 0 else 'black'};">
+                                {arrow} ${abs(diff):,.2f}
+                            </td>
+                            <td style="color: {'red' if pct_change > 0 else 'green' if pct_change < 0 else 'black'};">
+                                {pct_change:+.1f}%
+                            </td>
+                        </tr>
             """
         
+        html += """
+                    </tbody>
+                </table>
+        """
+    
+    # Line items matched as renamed rather than removed and re-added
+    if comparison_result.get('modified_items'):
         html += f"""
-                </div>
-                
-                <!-- Actions -->
-                <div class="actions fade-in">
-                    <a href="/analysis/{file_id}" class="btn btn-secondary">← Back to Analysis</a>
-                    <a href="/" class="btn btn-primary">🏠 Dashboard</a>
-                </div>
-            </div>
-        </body>
-        </html>
+                <h3>✏️ Renamed Line Items ({comparison_result['total_modified_items']})</h3>
+                <table class="comparison-table">
+                    <thead>
+                        <tr>
+                            <th>Budget 1</th>
+                            <th>Budget 2</th>
+                            <th>Department</th>
+                            <th>Amount Change</th>
+                            <th>Similarity</th>
+                        </tr>
+                    </thead>
+                    <tbody>
         """
-        
-        return html
+        for item in comparison_result['modified_items']:
+            html += f"""
+                        <tr>
+                            <td>{html_lib.escape(item['previous_description'])}</td>
+                            <td>{html_lib.escape(item['description'])}</td>
+                            <td>{html_lib.escape(item['department'])}</td>
+                            <td>${item['previous_amount']:,.2f} → ${item['amount']:,.2f}</td>
+                            <td>{item['similarity'] * 100:.0f}%</td>
+                        </tr>
+            """
+        html += """
+                    </tbody>
+                </table>
+        """
+    
+    html += f"""
+            </div>
+            
+            <!-- Actions -->
+            <div class="actions fade-in">
+                <a href="/analysis/{analysis1.id}" class="btn btn-secondary">← Back to Analysis</a>
+                <a href="/" class="btn btn-primary">🏠 Dashboard</a>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return analysis_pages.put(page_key, html, comparison.comparison_date)
+
+
+@app.route('/compare/<file_id>', methods=['POST'])
+def compare_budgets_route(file_id):
+    """Handle budget comparison FROM DATABASE"""
+    compare_id = request.form.get('compare_id')
+    
+    if not compare_id:
+        flash('Please select a budget to compare', 'error')
+        return redirect(url_for('compare_page', file_id=file_id))
+    
+    return show_comparison(file_id, compare_id)
+
+
+@app.route('/compare/<file_id>/<compare_id>')
+def show_comparison(file_id, compare_id):
+    """Linkable comparison results; served from the stored comparison when current"""
+    # Get both analyses from database
+    analysis1 = BudgetAnalysis.query.get(file_id)
+    analysis2 = BudgetAnalysis.query.get(compare_id)
+    
+    if not analysis1 or not analysis2:
+        flash('One or both analyses not found', 'error')
+        return redirect(url_for('index'))
+    
+    try:
+        return cached_page_response(comparison_page(analysis1, analysis2))
         
     except Exception as e:
         db.session.rollback()
@@ -1508,18 +1974,91 @@ def compare_budgets_route(file_id):
         return redirect(url_for('compare_page', file_id=file_id))
 
 
+@app.route('/api/comparisons/series', methods=['GET'])
+def budget_series_api():
+    """
+    N-way comparison of stored analyses, e.g. successive drafts of one budget
+    
+    Query: ids=<id1>,<id2>,... in version order (oldest first).
+    Returns the per-dimension pivots, step deltas, drift and line-item
+    changes from compare_budget_series, plus Chart.js configs.
+    """
+    ids = [analysis_id for analysis_id in request.args.get('ids', '').split(',') if analysis_id]
+    if not 2 <= len(ids) <= MAX_SERIES_LENGTH:
+        return jsonify({'error': f'Pass between 2 and {MAX_SERIES_LENGTH} analysis ids'}), 400
+    
+    analyses = {a.id: a for a in BudgetAnalysis.query.filter(BudgetAnalysis.id.in_(ids)).all()}
+    missing = [analysis_id for analysis_id in ids if analysis_id not in analyses]
+    if missing:
+        return jsonify({'error': 'Analysis not found', 'ids': missing}), 404
+    
+    try:
+        series = compare_budget_series(
+            [analyses[analysis_id].get_dataframe(COMPARE_COLUMNS) for analysis_id in ids],
+            [analyses[analysis_id].filename for analysis_id in ids]
+        )
+        series['analysis_ids'] = ids
+        return jsonify({'success': True, 'series': series, 'charts': generate_all_series_charts(series)})
+    except Exception as e:
+        logger.error('Error comparing budget series %s: %s', ids, e, exc_info=True)
+        return jsonify({'error': 'Unable to compare budgets. Please try again.'}), 500
+
+
 @app.route('/api/health', methods=['GET'])
+@limiter.exempt
 @csrf.exempt
 def health_check():
-    """Health check endpoint — no auth required."""
+    """
+    Liveness check endpoint — no auth required.
+    Answers without touching the database, so load balancers can probe it constantly;
+    /api/health/deep checks the database too.
+    """
+    return jsonify({'status': 'ok', 'export_cache': export_cache.stats()}), 200
+
+
+@app.route('/api/health/deep', methods=['GET'])
+@limiter.exempt
+@csrf.exempt
+def deep_health_check():
+    """
+    Readiness check endpoint — no auth required.
+    Runs one query against the database and reads the running totals (O(1), see dashboard_stats.py).
+    """
     try:
-        count = BudgetAnalysis.query.count()
-        return jsonify({'status': 'ok', 'analyses': count}), 200
+        started = time.perf_counter()
+        db.session.execute(text('SELECT 1'))
+        latency_ms = (time.perf_counter() - started) * 1000
+        stats = get_database_stats()
+        return jsonify({
+            'status': 'ok',
+            'database': {'dialect': db.engine.dialect.name, 'latency_ms': round(latency_ms, 2)},
+            'analyses': stats['total_analyses'],
+            'line_items': stats['total_line_items'],
+            'export_cache': export_cache.stats(),
+            'archive_cache': get_store().cache.stats()
+        }), 200
     except Exception as e:
-        logger.error('Health check failed: %s', e)
+        logger.error('Deep health check failed: %s', e)
         return jsonify({'status': 'error'}), 500
 
 
+insights_worker = InsightsWorker(app, on_done=analysis_pages.invalidate)
+
+
+def _insights_response(file_id, state):
+    """JSON response for the insights state of an analysis (see InsightsWorker.status)"""
+    if state['status'] == 'done':
+        return jsonify({'success': True, 'status': 'done', 'insights': state['insights']}), 200
+    if state['status'] == 'failed':
+        # The poll succeeded; the failure is the state of the insights
+        return jsonify({'status': 'failed', 'error': state['error']}), 200
+    return jsonify({
+        'status': 'pending',
+        'poll_url': url_for('ai_insights_status', file_id=file_id),
+        'events_url': url_for('ai_insights_events', file_id=file_id)
+    }), 202, {'Location': url_for('ai_insights_status', file_id=file_id), 'Retry-After': '2'}
+
+
 @app.route('/api/ai-insights/<file_id>', methods=['POST'])
 @require_api_key
 @csrf.exempt
@@ -1527,8 +2066,12 @@ def ai_insights(file_id):
     """
     Generate AI-powered narrative insights for a budget analysis.
     Protected by API key: pass X-API-Key header (see api_keys.json / BUDGET_API_KEY in .env).
+    
+    Cached insights are returned right away (200). Otherwise the model call runs
+    in the background (one per analysis, however many requests arrive) and the
+    response is 202 with a poll URL (GET, same path) and a server-sent events URL.
     """
-    analysis = BudgetAnalysis.query.get(file_id)
+    analysis = BudgetAnalysis.query.options(load_only(BudgetAnalysis.id, BudgetAnalysis.ai_insights_json)).filter_by(id=file_id).first()
     if not analysis:
         return jsonify({'error': 'Analysis not found'}), 404
 
@@ -1536,66 +2079,81 @@ def ai_insights(file_id):
     if analysis.ai_insights_json:
         return jsonify({'success': True, 'insights': json.loads(analysis.ai_insights_json), 'cached': True})
 
-    api_key = os.environ.get('ANTHROPIC_API_KEY')
-    if not api_key:
+    if not os.environ.get('ANTHROPIC_API_KEY'):
         return jsonify({'error': 'ANTHROPIC_API_KEY not configured'}), 500
 
     try:
-        risk_data = json.loads(analysis.risk_analysis_json or '{}')
-        optimizations = json.loads(analysis.optimizations_json or '[]')
-
-        prompt = f"""You are a senior film/TV production financial analyst. Review the following budget analysis and provide concise, actionable executive insights.
-
-BUDGET SUMMARY:
-- File: {analysis.filename}
-- Total Budget: ${analysis.total_budget:,.2f}
-- Line Items: {analysis.line_items}
-- Departments: {analysis.num_departments}
-- Risk Level: {analysis.risk_level} (score: {analysis.risk_score:.2f})
-- Analyzed: {analysis.analysis_timestamp.strftime('%Y-%m-%d')}
-
-RISK FLAGS:
-{json.dumps(risk_data.get('items_by_category', {}), indent=2)[:2000]}
-
-OPTIMIZATION OPPORTUNITIES:
-{json.dumps(optimizations, indent=2)[:1000]}
-
-Return ONLY a valid JSON object with this structure:
-{{
-  "executive_summary": "<2-3 sentence overview of the budget health>",
-  "key_concerns": ["<concern 1>", "<concern 2>", "<concern 3>"],
-  "top_recommendations": [
-    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}},
-    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}},
-    {{"action": "<what to do>", "rationale": "<why>", "priority": "<HIGH|MEDIUM|LOW>"}}
-  ],
-  "budget_health_score": <integer 0-100>,
-  "outlook": "<POSITIVE|CAUTIONARY|CRITICAL>"
-}}"""
-
-        client = anthropic.Anthropic(api_key=api_key)
-        message = client.messages.create(
-            model="claude-sonnet-4-6",
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        insights_worker.request(file_id)
+        return _insights_response(file_id, insights_worker.status(file_id))
+    except Exception as e:
+        db.session.rollback()
+        logger.error('Error queueing AI insights for %s: %s', file_id, e, exc_info=True)
+        return jsonify({'error': 'Unable to generate insights. Please try again.'}), 500
+
 
-        response_text = message.content[0].text.strip()
-        if response_text.startswith('```'):
-            response_text = response_text.split('\n', 1)[1]
-            response_text = response_text.rsplit('```', 1)[0]
+@app.route('/api/ai-insights/<file_id>', methods=['GET'])
+@require_api_key
+@limiter.exempt
+def ai_insights_status(file_id):
+    """Poll for insights requested with POST: 200 with the insights or the error, 202 while pending"""
+    state = insights_worker.status(file_id)
+    if state is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    if state['status'] is None:
+        return jsonify({'error': 'Insights not requested', 'status': None}), 404
+    return _insights_response(file_id, state)
 
-        insights = json.loads(response_text)
 
-        # Cache in database
-        analysis.ai_insights_json = json.dumps(insights)
-        db.session.commit()
+@app.route('/api/ai-insights/<file_id>/events', methods=['GET'])
+@require_api_key
+@limiter.exempt
+def ai_insights_events(file_id):
+    """
+    Server-sent events for insights requested with POST
+    
+    Sends a comment every INSIGHTS_SSE_INTERVAL seconds while the call runs, then
+    one 'done' or 'failed' event with the same JSON as the poll route. Gives up
+    with a 'pending' event after INSIGHTS_SSE_TIMEOUT seconds; clients poll or reconnect.
+    """
+    state = insights_worker.status(file_id)
+    if state is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    
+    def events(state):
+        deadline = time.monotonic() + app.config['INSIGHTS_SSE_TIMEOUT']
+        while state['status'] == 'pending' and time.monotonic() < deadline:
+            yield ': pending\n\n'
+            insights_worker.wait(file_id, app.config['INSIGHTS_SSE_INTERVAL'])
+            state = insights_worker.status(file_id)
+        yield f"event: {state['status'] or 'pending'}\ndata: {json.dumps(state)}\n\n"
+    
+    return Response(stream_with_context(events(state)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-        return jsonify({'success': True, 'insights': insights, 'cached': False})
 
+@app.route('/api/admin/insights-cache', methods=['GET'])
+@require_api_key
+@limiter.exempt
+def insights_cache_stats():
+    """
+    AI insight cache metrics across all processes: size, hit rate and model time saved.
+    Protected by API key.
+    """
+    try:
+        return jsonify(insights_worker.cache.stats())
     except Exception as e:
-        logger.error('Error generating AI insights for %s: %s', file_id, e, exc_info=True)
-        return jsonify({'error': 'Unable to generate insights. Please try again.'}), 500
+        logger.error('Error reading insight cache stats: %s', e, exc_info=True)
+        return jsonify({'error': 'Unable to read cache statistics.'}), 500
+
+
+@app.route('/api/admin/insights-cache', methods=['DELETE'])
+@require_api_key
+@csrf.exempt
+def clear_insights_cache():
+    """Empty the AI insight cache and reset its metrics (insights already stored on analyses stay)"""
+    removed = insights_worker.cache.clear()
+    logger.info('Cleared %d AI insight cache entries', removed)
+    return jsonify({'success': True, 'removed': removed})
 
 
 if __name__ == '__main__':